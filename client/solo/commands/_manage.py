@@ -556,16 +556,37 @@ class SoloManage(SoloCommand):
 
         return run_queue, removal_queue
 
+    def _get_multifetch(self, entropy_client, multifetch):
+        """
+        Return the number of parallel downloads to use, reading it
+        from config if not given.
+        """
+        if multifetch <= 1:
+            client_settings = entropy_client.ClientSettings()
+            misc_settings = client_settings['misc']
+            multifetch = misc_settings.get('multifetch', 1)
+        return multifetch
+
+    def _fill_download_data(self, entropy_client, package_matches,
+                            downdata):
+        """
+        Fill downdata (repository -> set of package keys) with the
+        given package matches, see _signal_ugc().
+        """
+        for pkg_id, pkg_repo in package_matches:
+            repo = entropy_client.open_repository(pkg_repo)
+            pkg_atom = repo.retrieveAtom(pkg_id)
+            if pkg_atom:
+                obj = downdata.setdefault(pkg_repo, set())
+                obj.add(entropy.dep.dep_getkey(pkg_atom))
+
     def _download_packages(self, entropy_client, package_matches,
                            downdata, multifetch=1):
         """
         Download packages from mirrors, essentially.
         """
         # read multifetch parameter from config if needed.
-        client_settings = entropy_client.ClientSettings()
-        misc_settings = client_settings['misc']
-        if multifetch <= 1:
-            multifetch = misc_settings.get('multifetch', 1)
+        multifetch = self._get_multifetch(entropy_client, multifetch)
 
         action_factory = entropy_client.PackageActionFactory()
 
@@ -585,13 +606,7 @@ class SoloManage(SoloCommand):
             total = len(myqueue)
             for matches in myqueue:
                 count += 1
-
-                for pkg_id, pkg_repo in matches:
-                    obj = downdata.setdefault(pkg_repo, set())
-                    repo = entropy_client.open_repository(pkg_repo)
-                    pkg_atom = repo.retrieveAtom(pkg_id)
-                    if pkg_atom:
-                        obj.add(entropy.dep.dep_getkey(pkg_atom))
+                self._fill_download_data(entropy_client, matches, downdata)
 
                 pkg = None
                 try:
@@ -634,9 +649,7 @@ class SoloManage(SoloCommand):
 
                 atom = entropy_client.open_repository(
                     repository_id).retrieveAtom(package_id)
-                if atom:
-                    obj = downdata.setdefault(repository_id, set())
-                    obj.add(entropy.dep.dep_getkey(atom))
+                self._fill_download_data(entropy_client, [match], downdata)
 
                 pkg = action_factory.get(
                     action_factory.FETCH_ACTION,
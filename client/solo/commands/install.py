@@ -20,6 +20,8 @@ from entropy.misc import ParallelTask
 from entropy.output import brown, purple, darkred, red, \
     blue, darkblue, darkgreen, bold
 from entropy.client.interfaces.package.actions.action import PackageAction
+from entropy.client.interfaces.package.pipeline import \
+    PackageInstallPipeline
 
 import entropy.tools
 
@@ -565,19 +567,22 @@ Install or update packages or package files.
             if exit_st != 0:
                 return 1, False
 
+        client_settings = entropy_client.ClientSettings()
+        pipelined = client_settings['misc']['pipelined_install'] and not fetch
+
         ugc_thread = None
         down_data = {}
-        exit_st = self._download_packages(
-            entropy_client, run_queue, down_data, multifetch)
-        if exit_st == 0:
+        if not pipelined:
+            exit_st = self._download_packages(
+                entropy_client, run_queue, down_data, multifetch)
+            if exit_st != 0:
+                return 1, False
+
             ugc_thread = ParallelTask(
                 self._signal_ugc, entropy_client, down_data)
             ugc_thread.name = "UgcThread"
             ugc_thread.start()
 
-        elif exit_st != 0:
-            return 1, False
-
         # is --fetch on? then quit.
         if fetch:
             if ugc_thread is not None:
@@ -593,6 +598,24 @@ Install or update packages or package files.
         package_set = set(packages)
         total = len(run_queue)
 
+        opts_map = {}
+        for pkg_match in run_queue:
+            metaopts = {
+                'removeconfig': config_files,
+            }
+
+            if onlydeps:
+                metaopts['install_source'] = \
+                    etpConst['install_sources']['automatic_dependency']
+            elif pkg_match in package_set:
+                metaopts['install_source'] = \
+                    etpConst['install_sources']['user']
+            else:
+                metaopts['install_source'] = \
+                    etpConst['install_sources']['automatic_dependency']
+            opts_map[pkg_match] = metaopts
+
+        pipeline = None
         notif_acquired = False
         try:
             # this is a best effort, we will not sleep if the lock
@@ -606,21 +629,17 @@ Install or update packages or package files.
             # state.
             notif_acquired = notification_lock.try_acquire_shared()
 
-            for count, pkg_match in enumerate(run_queue, 1):
+            if pipelined:
+                # packages are downloaded and unpacked while the
+                # previous ones are being merged
+                pipeline = PackageInstallPipeline(
+                    entropy_client, run_queue, opts_map=opts_map,
+                    multifetch=self._get_multifetch(
+                        entropy_client, multifetch))
+                pipeline.start()
+                pipeline_iter = iter(pipeline)
 
-                metaopts = {
-                    'removeconfig': config_files,
-                }
-
-                if onlydeps:
-                    metaopts['install_source'] = \
-                        etpConst['install_sources']['automatic_dependency']
-                elif pkg_match in package_set:
-                    metaopts['install_source'] = \
-                        etpConst['install_sources']['user']
-                else:
-                    metaopts['install_source'] = \
-                        etpConst['install_sources']['automatic_dependency']
+            for count, pkg_match in enumerate(run_queue, 1):
 
                 package_id, repository_id = pkg_match
                 atom = entropy_client.open_repository(
@@ -628,9 +647,16 @@ Install or update packages or package files.
 
                 pkg = None
                 try:
-                    pkg = action_factory.get(
-                        action_factory.INSTALL_ACTION,
-                        pkg_match, opts=metaopts)
+                    if pipeline is None:
+                        pkg = action_factory.get(
+                            action_factory.INSTALL_ACTION,
+                            pkg_match, opts=opts_map[pkg_match])
+                    else:
+                        _pkg_match, pkg, exit_st = next(pipeline_iter)
+                        if exit_st != 0:
+                            # packages before this one may have been
+                            # merged already
+                            return 1, count > 1
 
                     xterm_header = "equo (%s) :: %d of %d ::" % (
                         _("install"), count, total)
@@ -653,9 +679,18 @@ Install or update packages or package files.
                         pkg.finalize()
 
         finally:
+            if pipeline is not None:
+                pipeline.stop()
             if notif_acquired:
                 notification_lock.release()
 
+        if pipelined:
+            self._fill_download_data(entropy_client, run_queue, down_data)
+            ugc_thread = ParallelTask(
+                self._signal_ugc, entropy_client, down_data)
+            ugc_thread.name = "UgcThread"
+            ugc_thread.start()
+
         if ugc_thread is not None:
             ugc_thread.join()
 
@@ -23,7 +23,7 @@ import tempfile
 
 from entropy.const import etpConst, const_debug_write, \
     const_debug_enabled, const_pid_exists, const_setup_perms, \
-    const_mkdtemp
+    const_setup_file, const_mkdtemp
 from entropy.core import Singleton
 from entropy.misc import TimeScheduled, ParallelTask, Lifo
 import time
@@ -46,6 +46,14 @@ class EntropyCacher(Singleton):
     # yet able to write data to disk.
     STASHING_CACHE = True
 
+    # On-disk storage backend, either "dump" (one entropy.dump file
+    # per cache key) or "sqlite" (one EntropyCacheStore per cache
+    # directory).
+    STORE_BACKEND = os.getenv("ETP_CACHE_BACKEND", "dump")
+
+    _STORES = {}
+    _STORES_LOCK = threading.Lock()
+
     """
     Entropy asynchronous and synchronous cache writer
     and reader. This class is a Singleton and contains
@@ -171,10 +179,18 @@ class EntropyCacher(Singleton):
                 pass
 
         def _commit_data(_massive_data):
+            stores = {}
             for (key, cache_dir), data in _massive_data:
+                store = self._get_store(cache_dir)
+                if store is not None:
+                    obj = stores.setdefault(store, [])
+                    obj.append((key, data))
+                    continue
                 d_o = entropy.dump.dumpobj
                 if d_o is not None:
                     d_o(key, data, dump_dir = cache_dir)
+            for store, items in stores.items():
+                store.store(items)
 
         while self.__alive or run_until_empty:
 
@@ -238,6 +254,29 @@ class EntropyCacher(Singleton):
         """
         return entropy.dump.D_DIR
 
+    @classmethod
+    def _get_store(cls, cache_dir):
+        """
+        Return the EntropyCacheStore instance for the given cache directory,
+        or None if the "dump" storage backend is in use.
+
+        @param cache_dir: cache directory
+        @type cache_dir: string
+        @return: EntropyCacheStore instance or None
+        @rtype: EntropyCacheStore or None
+        """
+        try:
+            if cls.STORE_BACKEND != "sqlite":
+                return None
+        except AttributeError: # interpreter shutdown
+            return None
+        with cls._STORES_LOCK:
+            store = cls._STORES.get(cache_dir)
+            if store is None:
+                store = EntropyCacheStore(cache_dir)
+                cls._STORES[cache_dir] = store
+            return store
+
     def start(self):
         """
         This is the method used to start the asynchronous cache
@@ -321,6 +360,11 @@ class EntropyCacher(Singleton):
         """
         if cache_dir is None:
             cache_dir = self.current_directory()
+        store = self._get_store(cache_dir)
+        if store is not None:
+            if not store.store([(key, data)]):
+                raise IOError("cannot store %s to %s" % (key, cache_dir))
+            return
         try:
             with self.__dump_data_lock:
                 entropy.dump.dumpobj(key, data, dump_dir = cache_dir,
@@ -372,6 +416,10 @@ class EntropyCacher(Singleton):
             #    const_debug_write(__name__,
             #        "EntropyCacher.push, sync push %s, into %s" % (
             #            key, cache_dir,))
+            store = self._get_store(cache_dir)
+            if store is not None:
+                store.store([(key, data)])
+                return
             with self.__dump_data_lock:
                 entropy.dump.dumpobj(key, data, dump_dir = cache_dir)
 
@@ -397,6 +445,10 @@ class EntropyCacher(Singleton):
             if ram_obj is not None:
                 return ram_obj
 
+        store = self._get_store(cache_dir)
+        if store is not None:
+            return store.load(key, aging_days = aging_days)
+
         l_o = entropy.dump.loadobj
         if not l_o:
             return
@@ -416,6 +468,13 @@ class EntropyCacher(Singleton):
             cache_dir = cls.current_directory()
         dump_path = os.path.join(cache_dir, cache_item)
 
+        store = cls._get_store(cache_dir)
+        if store is not None:
+            prefix = os.path.dirname(cache_item)
+            if prefix:
+                prefix += os.path.sep
+            store.discard(prefix)
+
         dump_dir = os.path.dirname(dump_path)
         for currentdir, subdirs, files in os.walk(dump_dir):
             path = os.path.join(dump_dir, currentdir)
@@ -432,6 +491,268 @@ class EntropyCacher(Singleton):
             except (OSError, IOError,):
                 pass
 
+class EntropyCacheStore(object):
+
+    """
+    Single-file, SQLite based, EntropyCacher storage backend. All the cache
+    objects belonging to a cache directory are kept inside one indexed
+    key/value table rather than in one file per key. Writes are batched
+    into a single transaction and the store is kept below MAX_SIZE bytes
+    by evicting the least recently used objects.
+    This backend is selected by setting EntropyCacher.STORE_BACKEND
+    to "sqlite" (or by exporting ETP_CACHE_BACKEND=sqlite).
+    Being just cache, any SQLite error results in a cache miss.
+    """
+
+    # Name of the store file inside the cache directory
+    FILE_NAME = "__entropy_cache_store.db"
+
+    # Maximum size of the stored objects, in bytes
+    MAX_SIZE = 128 * 1024 * 1024
+
+    # When evicting, shrink the store down to this fraction of MAX_SIZE
+    EVICTION_RATIO = 0.8
+
+    def __init__(self, cache_dir):
+        object.__init__(self)
+        self._path = os.path.join(cache_dir, self.FILE_NAME)
+        self._lock = threading.RLock()
+        self._conn = None
+        self._inode = None
+        self._size = 0
+        self._accessed = {}
+
+    def _connection(self):
+        """
+        Return the SQLite connection, (re)opening the store file
+        if it has been removed (for instance by Client.clear_cache()).
+        Must be called with self._lock held.
+        """
+        try:
+            inode = os.stat(self._path).st_ino
+        except OSError:
+            inode = None
+
+        if self._conn is not None and inode == self._inode:
+            return self._conn
+        self._close()
+
+        from sqlite3 import dbapi2
+        cache_dir = os.path.dirname(self._path)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, 0o775)
+            const_setup_perms(cache_dir, etpConst['entropygid'])
+
+        conn = dbapi2.connect(self._path, timeout = 30.0,
+            check_same_thread = False)
+        try:
+            # this is just cache, durability is not required
+            conn.execute("PRAGMA synchronous = OFF")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS store (
+                    key VARCHAR PRIMARY KEY,
+                    data BLOB,
+                    size INTEGER,
+                    mtime FLOAT,
+                    atime FLOAT
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS store_atime ON store ( atime )
+            """)
+            conn.commit()
+            cur = conn.execute("SELECT SUM(size) FROM store")
+            self._size = cur.fetchone()[0] or 0
+        except dbapi2.Error:
+            conn.close()
+            raise
+        try:
+            const_setup_file(self._path, entropy.dump.E_GID, 0o664)
+        except (OSError, IOError):
+            pass
+
+        self._conn = conn
+        self._inode = os.stat(self._path).st_ino
+        return conn
+
+    def _close(self):
+        """
+        Close the SQLite connection, if open.
+        Must be called with self._lock held.
+        """
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+        self._conn = None
+        self._inode = None
+        self._accessed.clear()
+
+    def _reset(self):
+        """
+        Drop a broken store file.
+        Must be called with self._lock held.
+        """
+        self._close()
+        try:
+            os.remove(self._path)
+        except (OSError, IOError):
+            pass
+
+    @staticmethod
+    def _prefix_range(prefix):
+        """
+        Return the (lower, upper) key boundaries matching prefix.
+        """
+        return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+    def store(self, items):
+        """
+        Store the given objects in a single transaction.
+
+        @param items: list of (key, object) tuples
+        @type items: list
+        @return: True, if objects have been stored
+        @rtype: bool
+        """
+        from sqlite3 import dbapi2
+
+        cur_t = time.time()
+        rows = []
+        for key, data in items:
+            blob = entropy.dump.serialize_string(data)
+            rows.append((key, dbapi2.Binary(blob), len(blob), cur_t, cur_t))
+
+        with self._lock:
+            try:
+                conn = self._connection()
+                sizes = {}
+                for key, _data in items:
+                    cur = conn.execute(
+                        "SELECT size FROM store WHERE key = ?", (key,))
+                    row = cur.fetchone()
+                    if row is not None:
+                        sizes[key] = row[0]
+
+                conn.executemany("""
+                INSERT OR REPLACE INTO store VALUES (?, ?, ?, ?, ?)
+                """, rows)
+                if self._accessed:
+                    conn.executemany(
+                        "UPDATE store SET atime = ? WHERE key = ?",
+                        [(v, k) for k, v in self._accessed.items()])
+                    self._accessed.clear()
+                conn.commit()
+
+                self._size -= sum(sizes.values())
+                self._size += sum((x[2] for x in rows))
+                if self._size > self.MAX_SIZE:
+                    self._evict(conn)
+                return True
+            except dbapi2.OperationalError:
+                # locked or read-only store
+                pass
+            except dbapi2.DatabaseError:
+                self._reset()
+            except (dbapi2.Error, OSError, IOError):
+                pass
+        return False
+
+    def _evict(self, conn):
+        """
+        Evict the least recently used objects until the store size
+        is below MAX_SIZE * EVICTION_RATIO.
+        Must be called with self._lock held.
+        """
+        excess = self._size - int(self.MAX_SIZE * self.EVICTION_RATIO)
+        keys = []
+        cur = conn.execute("SELECT key, size FROM store ORDER BY atime")
+        for key, size in cur:
+            if excess <= 0:
+                break
+            keys.append((key,))
+            excess -= size
+            self._size -= size
+        cur.close()
+        conn.executemany("DELETE FROM store WHERE key = ?", keys)
+        conn.commit()
+
+    def load(self, key, aging_days = None):
+        """
+        Load object from the store.
+
+        @param key: cache object identifier
+        @type key: string
+        @keyword aging_days: if int, consider the cached object invalid
+            if older than aging_days.
+        @type aging_days: int
+        @return: object or None
+        @rtype: any Python picklable object or None
+        """
+        from sqlite3 import dbapi2
+
+        with self._lock:
+            try:
+                conn = self._connection()
+                cur = conn.execute(
+                    "SELECT data, mtime FROM store WHERE key = ?", (key,))
+                row = cur.fetchone()
+            except dbapi2.OperationalError:
+                return None
+            except dbapi2.DatabaseError:
+                self._reset()
+                return None
+            except (dbapi2.Error, OSError, IOError):
+                return None
+            if row is None:
+                return None
+
+            cur_t = time.time()
+            data, mtime = row
+            if aging_days is not None:
+                if abs(cur_t - mtime) > (aging_days * 86400):
+                    return None
+            # atime is updated lazily, with the next write
+            self._accessed[key] = cur_t
+
+        try:
+            return entropy.dump.unserialize_string(bytes(data))
+        except Exception:
+            # stale or broken object, treat it as a miss
+            return None
+
+    def discard(self, prefix):
+        """
+        Atomically remove all the objects whose key starts with prefix.
+
+        @param prefix: cache object identifier prefix
+        @type prefix: string
+        """
+        from sqlite3 import dbapi2
+
+        with self._lock:
+            if not os.path.isfile(self._path):
+                return
+            try:
+                conn = self._connection()
+                if prefix:
+                    lower, upper = self._prefix_range(prefix)
+                    conn.execute("""
+                    DELETE FROM store WHERE key >= ? AND key < ?
+                    """, (lower, upper))
+                else:
+                    conn.execute("DELETE FROM store")
+                conn.commit()
+                cur = conn.execute("SELECT SUM(size) FROM store")
+                self._size = cur.fetchone()[0] or 0
+            except dbapi2.OperationalError:
+                pass
+            except dbapi2.DatabaseError:
+                self._reset()
+            except (dbapi2.Error, OSError, IOError):
+                pass
+
 
 class MtimePingus(object):
 
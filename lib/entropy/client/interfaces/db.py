@@ -13,7 +13,6 @@ import codecs
 import errno
 import os
 import shutil
-import subprocess
 import sys
 import threading
 import time
@@ -31,7 +30,8 @@ from entropy.exceptions import RepositoryError, SystemDatabaseError, \
     PermissionDenied
 from entropy.security import Repository as RepositorySecurity
 from entropy.misc import TimeScheduled, ParallelTask
-from entropy.fetchers import UrlFetcher
+from entropy.fetchers import UrlFetcher, BlockSyncFetcher, \
+    HTTPConnectionPool
 from entropy.i18n import _
 from entropy.db.skel import EntropyRepositoryPlugin, EntropyRepositoryBase
 from entropy.db.exceptions import IntegrityError, OperationalError, Error, \
@@ -156,6 +156,10 @@ class AvailablePackagesRepositoryUpdater(object):
     The required logic for updating a repository is stored here.
     """
     WEBSERV_CACHE_ID = 'webserv_repo/segment_'
+    # block-level sync is abandoned in favour of the compressed dump
+    # download if more than this fraction of the dump changed
+    # (SQL dumps compress about tenfold, blocks are fetched uncompressed)
+    BLOCK_SYNC_MAX_FETCH_RATIO = 0.05
 
     FETCH_ERRORS = (
         UrlFetcher.GENERIC_FETCH_WARN,
@@ -174,7 +178,8 @@ class AvailablePackagesRepositoryUpdater(object):
         self._supported_download_items = (
             "db", "dbck", "dblight", "ck", "cklight", "compck",
             "lock", "dbdump", "dbdumplight", "dbdumplightck", "dbdumpck",
-            "meta_file", "meta_file_gpg", "notice_board"
+            "meta_file", "meta_file_gpg", "notice_board", "dbdumplightfile",
+            "dbdumplightblocks"
         )
         self._developer_repo = \
             self._settings['repositories']['developer_repo']
@@ -326,9 +331,6 @@ class AvailablePackagesRepositoryUpdater(object):
     def __get_repo_eapi(self):
 
         eapi_env = os.getenv("FORCE_EAPI")
-        sqlite3_access = os.path.lexists("/usr/bin/sqlite3")
-        sqlite3_rc = subprocess.call("/usr/bin/sqlite3 -version > /dev/null",
-            shell = True)
         try:
             eapi_env_clear = int(eapi_env)
             if eapi_env_clear not in self._supported_apis:
@@ -341,9 +343,7 @@ class AvailablePackagesRepositoryUpdater(object):
         if eapi_avail:
             repo_eapi = 3
         else:
-            if not sqlite3_access or entropy.tools.islive():
-                repo_eapi = 1
-            elif sqlite3_rc != 0:
+            if entropy.tools.islive():
                 repo_eapi = 1
 
         # if differential update is disabled and FORCE_EAPI is not overriding
@@ -907,6 +907,8 @@ class AvailablePackagesRepositoryUpdater(object):
         meta_file_gpg = etpConst['etpdatabasemetafilesfile'] + \
             etpConst['etpgpgextension']
         md5_ext = etpConst['packagesmd5fileext']
+        dumplight = etpConst['etpdatabasedumplight']
+        blocks_ext = etpConst['blockmanifestfileext']
         ec_cm2 = None
         ec_cm3 = None
         ec_cm4 = None
@@ -982,6 +984,14 @@ class AvailablePackagesRepositoryUpdater(object):
                 "%s/%s" % (uri, meta_file_gpg,),
                 "%s/%s" % (repo_dbpath, meta_file_gpg,),
             ),
+            'dbdumplightfile': (
+                "%s/%s" % (uri, dumplight,),
+                "%s/%s" % (repo_dbpath, dumplight,),
+            ),
+            'dbdumplightblocks': (
+                "%s/%s%s" % (uri, dumplight, blocks_ext,),
+                "%s/%s%s" % (repo_dbpath, dumplight, blocks_ext,),
+            ),
         }
 
         url, path = mymap.get(item)
@@ -1058,6 +1068,129 @@ class AvailablePackagesRepositoryUpdater(object):
                 if err.errno != errno.ENOENT:
                     raise
 
+    def _block_database_sync(self, uri, dbfile, dumpfile):
+        """
+        Rebuild the uncompressed repository dump published on the mirror
+        at dumpfile, reusing the content of the local repository and
+        fetching only the changed blocks through HTTP Range requests
+        (see entropy.fetchers.BlockSyncFetcher). The result is verified
+        against the checksum in the block manifest.
+
+        @param uri: repository URI
+        @type uri: string
+        @param dbfile: local repository database path
+        @type dbfile: string
+        @param dumpfile: path where to rebuild the repository dump
+        @type dumpfile: string
+        @return: list of downloaded files on success, None otherwise
+        @rtype: list or None
+        """
+        if UrlFetcher._get_url_protocol(uri) not in ("http", "https"):
+            return None
+        if not const_file_readable(dbfile):
+            # nothing to reuse, the compressed dump is cheaper
+            return None
+
+        blocks_url, blocks_path = self._construct_paths(
+            uri, "dbdumplightblocks", None)
+        mytxt = "%s %s %s" % (
+            red(_("Downloading block manifest")),
+            darkgreen(os.path.basename(blocks_path)),
+            red("..."),
+        )
+        self._entropy.output(
+            mytxt,
+            importance = 0,
+            level = "info",
+            header = "\t"
+        )
+        if not self._download_item(uri, "dbdumplightblocks",
+                                   disallow_redirect = True):
+            return None
+        downloaded_files = [blocks_path]
+        if self._download_item(uri, "dbdumplightblocks",
+                               disallow_redirect = True,
+                               get_signature = True):
+            downloaded_files.append(
+                self.__append_gpg_signature_to_path(blocks_path))
+
+        try:
+            manifest = entropy.tools.read_block_manifest_file(blocks_path)
+        except (ValueError, IOError, OSError) as err:
+            const_debug_write(__name__,
+                "_block_database_sync: invalid manifest: %s" % (err,))
+            return None
+
+        # the seed is the dump of the local repository, which lines up
+        # with the published one
+        seed_path = dumpfile + ".seed"
+        try:
+            dbconn = self._entropy.open_generic_repository(dbfile,
+                xcache = False, indexing_override = False)
+            try:
+                with open(seed_path, "wb") as seed_f:
+                    dbconn.exportRepository(seed_f)
+            finally:
+                dbconn.close()
+        except (IOError, OSError, Error) as err:
+            const_debug_write(__name__,
+                "_block_database_sync: cannot dump repository: %s" % (err,))
+            try:
+                os.remove(seed_path)
+            except OSError:
+                pass
+            return None
+
+        repo_data = self._settings['repositories']['available'][
+            self._repository_id]
+        https_validate_cert = \
+            not repo_data.get('https_validate_cert') == "false"
+        url, path = self._construct_paths(uri, "dbdumplightfile", None)
+        mytxt = "%s %s %s" % (
+            red(_("Synchronizing changed repository blocks")),
+            darkgreen(os.path.basename(path)),
+            red("..."),
+        )
+        self._entropy.output(
+            mytxt,
+            importance = 0,
+            level = "info",
+            header = "\t",
+            back = True
+        )
+        fetcher = BlockSyncFetcher(
+            url, dumpfile, manifest, seed_path,
+            max_fetch_size = int(
+                manifest['length'] * self.BLOCK_SYNC_MAX_FETCH_RATIO),
+            disallow_redirect = True,
+            http_basic_user = repo_data.get('username'),
+            http_basic_pwd = repo_data.get('password'),
+            https_validate_cert = https_validate_cert,
+            connection_pool = HTTPConnectionPool())
+        try:
+            rc = fetcher.download()
+        finally:
+            os.remove(seed_path)
+        if rc in self.FETCH_ERRORS:
+            const_debug_write(__name__,
+                "_block_database_sync: block sync failed: %s" % (rc,))
+            return None
+
+        reused_size, fetched_size = fetcher.get_statistics()
+        mytxt = "%s: %s, %s: %s" % (
+            red(_("Repository blocks downloaded")),
+            bold(entropy.tools.bytes_into_human(fetched_size)),
+            red(_("reused")),
+            darkgreen(entropy.tools.bytes_into_human(reused_size)),
+        )
+        self._entropy.output(
+            mytxt,
+            importance = 1,
+            level = "info",
+            header = "\t"
+        )
+        return downloaded_files
+
     def _is_repository_unlocked(self, uri):
         """
         Returns whether the repository is remotely locked or not.
@@ -2081,6 +2214,7 @@ class AvailablePackagesRepositoryUpdater(object):
         cmethod = etpConst['etpdatabasecompressclasses'].get(
             cformat)
 
+        block_sync_files = None
         while True:
 
             downloaded_db_item = None
@@ -2088,6 +2222,12 @@ class AvailablePackagesRepositoryUpdater(object):
             db_checksum_down_status = False
             if self._repo_eapi < 3:
 
+                if self._repo_eapi == 2:
+                    block_sync_files = self._block_database_sync(
+                        uri, dbfile, dumpfile)
+                    if block_sync_files is not None:
+                        break
+
                 down_status, sig_down_status, downloaded_db_item = \
                     self.__database_download(uri, cmethod)
                 if not down_status:
@@ -2121,6 +2261,8 @@ class AvailablePackagesRepositoryUpdater(object):
                 break
 
         downloaded_files = self._standard_items_download(uri)
+        if block_sync_files is not None:
+            downloaded_files.extend(block_sync_files)
         # also add db file to downloaded item
         # and md5 check repository
         if downloaded_db_item is not None:
@@ -2168,17 +2310,18 @@ class AvailablePackagesRepositoryUpdater(object):
                         __name__, "rename failed: %s" % (err,))
                     do_db_update_transfer = False
 
-            unpack_status, unpacked_item = \
-                self._downloaded_database_unpack(uri, cmethod)
+            if block_sync_files is None:
+                unpack_status, unpacked_item = \
+                    self._downloaded_database_unpack(uri, cmethod)
 
-            if not unpack_status:
-                # delete all
-                self.__remove_repository_files()
-                return EntropyRepositoryBase.REPOSITORY_GENERIC_ERROR
+                if not unpack_status:
+                    # delete all
+                    self.__remove_repository_files()
+                    return EntropyRepositoryBase.REPOSITORY_GENERIC_ERROR
 
-            unpack_url, unpack_path = self._construct_paths(
-                uri, unpacked_item, cmethod)
-            files_to_remove.append(unpack_path)
+                unpack_url, unpack_path = self._construct_paths(
+                    uri, unpacked_item, cmethod)
+                files_to_remove.append(unpack_path)
 
             # re-validate
             if not os.path.isfile(dbfile):
@@ -2455,12 +2598,14 @@ class MaskableRepository(EntropyRepositoryBase):
 
                 return -1, myr
 
-    def _maskFilter_package_license_mask(self, package_id, live):
+    def _maskFilter_package_license_mask(self, package_id, live,
+                                         mylicenses = None):
 
         if not self._settings['license_mask']:
             return
 
-        mylicenses = self.retrieveLicense(package_id)
+        if mylicenses is None:
+            mylicenses = self.retrieveLicense(package_id)
         mylicenses = mylicenses.strip().split()
         lic_mask = self._settings['license_mask']
         for mylicense in mylicenses:
@@ -2479,12 +2624,13 @@ class MaskableRepository(EntropyRepositoryBase):
 
             return -1, myr
 
-    def _maskFilter_keyword_mask(self, package_id, live):
+    def _maskFilter_keyword_mask(self, package_id, live, mykeywords = None):
 
         # WORKAROUND for buggy entries
         # ** is fine then
         # TODO: remove this before 31-12-2011
-        mykeywords = self.retrieveKeywords(package_id)
+        if mykeywords is None:
+            mykeywords = self.retrieveKeywords(package_id)
         if mykeywords == set([""]):
             mykeywords = set(['**'])
 
@@ -2725,6 +2871,88 @@ class MaskableRepository(EntropyRepositoryBase):
         self._mask_filter_store_cache(package_id, data)
         return -1, myr
 
+    def maskFilterMany(self, package_ids, live = True):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        The same checks done by maskFilter() are applied stage by stage
+        to all the uncached package identifiers, and the license and
+        keywords metadata are fetched through retrieveLicenseMap() and
+        retrieveKeywordsMap() only for those still undecided.
+        """
+        validator_cache = self._client_settings.get(
+            'masking_validation', {}).get('cache', {})
+
+        results = {}
+        pending = []
+        for package_id in package_ids:
+            cached = validator_cache.get((package_id, self.name, live))
+            if cached is None:
+                # use on-disk cache?
+                cached = self._mask_filter_fetch_cache(package_id)
+            if cached is not None:
+                results[package_id] = cached
+            else:
+                pending.append(package_id)
+
+        if not pending:
+            return results
+
+        # avoid memleaks
+        if len(validator_cache) > 100000:
+            validator_cache.clear()
+
+        undecided = []
+        for package_id in pending:
+            if live:
+                data = self._maskFilter_live(package_id)
+                if data:
+                    results[package_id] = data
+                    continue
+
+            for validator in (self._maskFilter_user_package_mask,
+                              self._maskFilter_user_package_unmask,
+                              self._maskFilter_packages_db_mask):
+                data = validator(package_id, live)
+                if data:
+                    self._mask_filter_store_cache(package_id, data)
+                    results[package_id] = data
+                    break
+            else:
+                undecided.append(package_id)
+
+        if undecided and self._settings['license_mask']:
+            licenses_map = self.retrieveLicenseMap(undecided)
+            pending, undecided = undecided, []
+            for package_id in pending:
+                data = self._maskFilter_package_license_mask(
+                    package_id, live,
+                    mylicenses = licenses_map.get(package_id) or "")
+                if data:
+                    self._mask_filter_store_cache(package_id, data)
+                    results[package_id] = data
+                else:
+                    undecided.append(package_id)
+
+        if not undecided:
+            return results
+
+        keywords_map = self.retrieveKeywordsMap(undecided)
+        myr = self._settings['pkg_masking_reference']['completely_masked']
+        for package_id in undecided:
+            data = self._maskFilter_keyword_mask(
+                package_id, live, mykeywords = keywords_map[package_id])
+            if data:
+                self._mask_filter_store_cache(package_id, data)
+                results[package_id] = data
+                continue
+
+            # holy crap, can't validate
+            validator_cache[(package_id, self.name, live)] = -1, myr
+            self._mask_filter_store_cache(package_id, data)
+            results[package_id] = -1, myr
+
+        return results
+
     def atomMatchCacheKey(self):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -2870,3 +3098,14 @@ class GenericRepository(CachedRepository, MaskableRepository):
         if not enabled:
             return package_id, 0
         return MaskableRepository.maskFilter(self, package_id, live = live)
+
+    def maskFilterMany(self, package_ids, live = True):
+        """
+        Reimplemented from MaskableRepository.
+        See maskFilter().
+        """
+        enabled = getattr(self, 'enable_mask_filter', False)
+        if not enabled:
+            return dict(((x, (x, 0)) for x in package_ids))
+        return MaskableRepository.maskFilterMany(
+            self, package_ids, live = live)
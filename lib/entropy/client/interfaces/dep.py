@@ -31,6 +31,33 @@ from entropy.client.misc import sharedinstlock
 import entropy.dep
 
 
+class _DependencyStack(Lifo):
+    """
+    Lifo keeping track of the items pushed since the last pop_pushed()
+    call, which are the dependency tree walk frontier.
+    """
+
+    def __init__(self):
+        Lifo.__init__(self)
+        self._pushed = set()
+
+    def push(self, item):
+        """
+        Reimplemented from Lifo.
+        """
+        Lifo.push(self, item)
+        self._pushed.add(item)
+
+    def pop_pushed(self):
+        """
+        Return the set of items pushed since the last call and reset it.
+        Items might have been popped in the meantime.
+        """
+        pushed = self._pushed
+        self._pushed = set()
+        return pushed
+
+
 class CalculatorsMixin:
 
     @sharedinstlock
@@ -184,25 +211,10 @@ class CalculatorsMixin:
 
         cache_key = None
         if self.xcache and use_cache:
-            sha = hashlib.sha1()
-
-            cache_fmt = "a{%s}mr{%s}ms{%s}rh{%s}mf{%s}"
-            cache_fmt += "ar{%s}m{%s}cm{%s}s{%s;%s;%s}"
-            cache_s = cache_fmt % (
-                atom,
-                ";".join(match_repo),
-                match_slot,
-                self.repositories_checksum(),
-                mask_filter,
-                ";".join(sorted(self._settings['repositories']['available'])),
-                self._settings.packages_configuration_hash(),
-                self._settings_client_plugin.packages_configuration_hash(),
-                multi_match,
-                multi_repo,
-                extended_results)
-            sha.update(const_convert_to_rawstring(cache_s))
-
-            cache_key = "atom_match/atom_match_%s" % (sha.hexdigest(),)
+            cache_key = self.__atom_match_cache_key(
+                atom, match_slot, mask_filter, multi_match, multi_repo,
+                match_repo, extended_results,
+                self.__atom_match_cache_data())
 
             cached = self._cacher.pop(cache_key)
             if cached is not None:
@@ -252,12 +264,8 @@ class CalculatorsMixin:
                         )
                         if query_rc == 0:
                             # package found, add to our dictionary
-                            if extended_results:
-                                repo_results[repo] = (query_data[0],
-                                    query_data[2], query_data[3],
-                                    query_data[4])
-                            else:
-                                repo_results[repo] = query_data
+                            repo_results[repo] = self.__atom_match_repo_data(
+                                query_data, extended_results)
                     except TypeError:
                         if not xuse_cache:
                             raise
@@ -270,6 +278,187 @@ class CalculatorsMixin:
                         break
                     break
 
+        dbpkginfo = self.__atom_match_results(
+            atom, repo_results, valid_repos, match_slot, mask_filter,
+            multi_match, multi_repo, extended_results)
+
+        if cache_key is not None:
+            self._cacher.push(cache_key, dbpkginfo)
+
+        return dbpkginfo
+
+    def atom_match_many(self, atoms, match_slot = None, mask_filter = True,
+            multi_match = False, multi_repo = False, match_repo = None,
+            extended_results = False, use_cache = True):
+        """
+        Match many atoms at once inside all the available repositories,
+        returning the same results of atom_match(). Every repository is
+        queried once, through EntropyRepositoryBase.atomMatchMany().
+        See atom_match() for the keyword arguments.
+
+        @param atoms: list of atoms or dependencies
+        @type atoms: iterable
+        @return: dict composed by atom -> atom_match() return value
+        @rtype: dict
+        """
+        repositories = match_repo
+        if repositories is None:
+            repositories = tuple()
+
+        cache_data = None
+        if self.xcache and use_cache:
+            cache_data = self.__atom_match_cache_data()
+
+        results = {}
+        pending = {}
+        for atom in atoms:
+            if atom in results or atom in pending:
+                continue
+
+            _atom, repos = entropy.dep.dep_get_match_in_repos(atom)
+            if repos is not None or \
+                    atom.endswith(etpConst['entropyordepquestion']):
+                # handled by atom_match() directly
+                results[atom] = self.atom_match(atom,
+                    match_slot = match_slot, mask_filter = mask_filter,
+                    multi_match = multi_match, multi_repo = multi_repo,
+                    match_repo = match_repo,
+                    extended_results = extended_results,
+                    use_cache = use_cache)
+                continue
+
+            cache_key = None
+            if cache_data is not None:
+                cache_key = self.__atom_match_cache_key(
+                    atom, match_slot, mask_filter, multi_match, multi_repo,
+                    repositories, extended_results, cache_data)
+
+                cached = self._cacher.pop(cache_key)
+                if cached is not None:
+                    results[atom] = cached
+                    continue
+
+            pending[atom] = cache_key
+
+        if not pending:
+            return results
+
+        valid_repos = self._enabled_repos
+        if repositories and (type(repositories) in (list, tuple, set)):
+            valid_repos = list(repositories)
+
+        pending_atoms = list(pending.keys())
+        repo_results = dict((atom, {}) for atom in pending_atoms)
+        for repo in valid_repos:
+
+            try:
+                dbconn = self.open_repository(repo)
+            except (RepositoryError, SystemDatabaseError):
+                # ouch, repository not available or corrupted !
+                continue
+
+            try:
+                matches = dbconn.atomMatchMany(
+                    pending_atoms,
+                    matchSlot = match_slot,
+                    maskFilter = mask_filter,
+                    extendedResults = extended_results,
+                    useCache = use_cache
+                )
+                for atom in pending_atoms:
+                    try:
+                        query_data, query_rc = matches[atom]
+                    except TypeError:
+                        # broken cache item
+                        if not use_cache:
+                            raise
+                        query_data, query_rc = dbconn.atomMatch(
+                            atom,
+                            matchSlot = match_slot,
+                            maskFilter = mask_filter,
+                            extendedResults = extended_results,
+                            useCache = False
+                        )
+                    if query_rc == 0:
+                        repo_results[atom][repo] = \
+                            self.__atom_match_repo_data(
+                                query_data, extended_results)
+            except (OperationalError, DatabaseError):
+                # OperationalError => error in data format
+                # DatabaseError => database disk image is malformed
+                # repository fooked, skip!
+                for atom in pending_atoms:
+                    repo_results[atom].pop(repo, None)
+                continue
+
+        for atom in pending_atoms:
+            dbpkginfo = self.__atom_match_results(
+                atom, repo_results[atom], valid_repos, match_slot,
+                mask_filter, multi_match, multi_repo, extended_results)
+
+            cache_key = pending[atom]
+            if cache_key is not None:
+                self._cacher.push(cache_key, dbpkginfo)
+            results[atom] = dbpkginfo
+
+        return results
+
+    def __atom_match_cache_data(self):
+        """
+        Return the atom_match() cache key components that do not depend
+        on the atom being matched.
+        """
+        return (
+            self.repositories_checksum(),
+            ";".join(sorted(self._settings['repositories']['available'])),
+            self._settings.packages_configuration_hash(),
+            self._settings_client_plugin.packages_configuration_hash(),
+            )
+
+    def __atom_match_cache_key(self, atom, match_slot, mask_filter,
+                               multi_match, multi_repo, match_repo,
+                               extended_results, cache_data):
+        """
+        Return the atom_match() on-disk cache key.
+        """
+        repo_checksum, available, pkg_hash, client_pkg_hash = cache_data
+        sha = hashlib.sha1()
+
+        cache_fmt = "a{%s}mr{%s}ms{%s}rh{%s}mf{%s}"
+        cache_fmt += "ar{%s}m{%s}cm{%s}s{%s;%s;%s}"
+        cache_s = cache_fmt % (
+            atom,
+            ";".join(match_repo),
+            match_slot,
+            repo_checksum,
+            mask_filter,
+            available,
+            pkg_hash,
+            client_pkg_hash,
+            multi_match,
+            multi_repo,
+            extended_results)
+        sha.update(const_convert_to_rawstring(cache_s))
+
+        return "atom_match/atom_match_%s" % (sha.hexdigest(),)
+
+    def __atom_match_repo_data(self, query_data, extended_results):
+        """
+        Convert a successful EntropyRepositoryBase.atomMatch() result to
+        the per-repository data used by __atom_match_results().
+        """
+        if extended_results:
+            return (query_data[0], query_data[2], query_data[3],
+                    query_data[4])
+        return query_data
+
+    def __atom_match_results(self, atom, repo_results, valid_repos,
+                             match_slot, mask_filter, multi_match,
+                             multi_repo, extended_results):
+        """
+        Return the atom_match() result given the per-repository
+        matches in repo_results.
+        """
         dbpkginfo = (-1, 1)
         if extended_results:
             dbpkginfo = ((-1, None, None, None), 1)
@@ -336,9 +525,6 @@ class CalculatorsMixin:
                         dbpkginfo = (
                             set([(x, dbpkginfo[1]) for x in query_data]), 0)
 
-        if cache_key is not None:
-            self._cacher.push(cache_key, dbpkginfo)
-
         return dbpkginfo
 
     def atom_search(self, keyword, description = False, repositories = None,
@@ -435,6 +621,46 @@ class CalculatorsMixin:
 
         return matches
 
+    def ranked_search(self, keyword, description = False,
+                      repositories = None):
+        """
+        Search packages inside all the available repositories, including the
+        installed packages one, returning package matches ordered by
+        relevance (see EntropyRepositoryBase.searchRanked()). Matches with
+        the same relevance are ordered by repository priority.
+
+        @param keyword: string to search
+        @type keyword: string
+        @keyword description: if True, also search through package description
+            and use flags
+        @type description: bool
+        @keyword repositories: list of repository identifiers to search
+            packages into
+        @type repositories: list
+        @return: list of package matches (pkg_id_int, repo_string)
+        @rtype: list
+        """
+        if repositories is None:
+            repositories = self.repositories()[:]
+            repositories.insert(0, InstalledPackagesRepository.NAME)
+
+        scored = []
+        for repo_idx, repository in enumerate(repositories):
+
+            try:
+                repo = self.open_repository(repository)
+            except (RepositoryError, SystemDatabaseError):
+                # ouch, repository not available or corrupted !
+                continue
+
+            for pkg_id, score in repo.searchRanked(
+                    keyword, description = description):
+                scored.append((-score, repo_idx, pkg_id, repository))
+
+        scored.sort()
+        return [(pkg_id, repository) for _score, _idx, pkg_id, repository \
+                    in scored]
+
     def _resolve_or_dependencies(self, dependencies, selected_matches,
                                  _selected_matches_cache = None):
         """
@@ -704,6 +930,22 @@ class CalculatorsMixin:
                 return True
             return False
 
+        # match the dependencies at once, results are consumed below
+        pending = [x for x in dependencies if x not in depcache \
+                       and not x.startswith("!")]
+        inst_matches = inst_repo.atomMatchMany(pending, multiMatch = True)
+        repo_pending = []
+        for dependency in pending:
+            c_ids, c_rc = inst_matches[dependency]
+            if c_rc != 0:
+                continue
+            if relaxed_deps and not deep_deps and \
+                    etp_get_rev(dependency) != -1:
+                continue
+            repo_pending.append(dependency)
+        repo_matches = self.atom_match_many(
+            repo_pending, match_repo = match_repo)
+
         unsatisfied = set()
         for dependency in dependencies:
 
@@ -739,8 +981,7 @@ class CalculatorsMixin:
                 push_to_cache(dependency, False)
                 continue
 
-            c_ids, c_rc = inst_repo.atomMatch(dependency,
-                multiMatch = True)
+            c_ids, c_rc = inst_matches[dependency]
             if c_rc != 0:
 
                 # check if dependency can be matched in available repos and
@@ -826,7 +1067,7 @@ class CalculatorsMixin:
                 if provide_stop:
                     continue
 
-            r_id, r_repo = self.atom_match(dependency, match_repo = match_repo)
+            r_id, r_repo = repo_matches[dependency]
             if r_id == -1:
                 if const_debug_enabled():
                     const_debug_write(__name__,
@@ -1198,20 +1439,93 @@ class CalculatorsMixin:
 
     DISABLE_AUTOCONFLICT = os.getenv("ETP_DISABLE_AUTOCONFLICT")
 
-    def __generate_dependency_tree_analyze_deplist(self, pkg_match, repo_db,
-        stack, graph, deps_not_found, conflicts, unsat_cache, relaxed_deps,
-        build_deps, deep_deps, empty_deps, recursive, selected_matches,
-        elements_cache, selected_matches_cache):
+    DISABLE_FRONTIER_PREFETCH = os.getenv("ETP_DISABLE_FRONTIER_PREFETCH")
 
-        pkg_id, repo_id = pkg_match
+    def __generate_dependency_tree_excluded_deptypes(self, build_deps):
+        """
+        Return the dependency types not followed by the dependency tree
+        generator.
+        """
         # exclude build dependencies
         excluded_deptypes = [etpConst['dependency_type_ids']['pdepend_id']]
         if not build_deps:
             excluded_deptypes += [etpConst['dependency_type_ids']['bdepend_id']]
+        return excluded_deptypes
+
+    def __generate_dependency_tree_prefetch(self, pkg_matches, build_deps,
+                                            deplist_cache, match_cache):
+        """
+        Fetch, at once, the dependency lists of the given package matches
+        (the frontier of the dependency tree walk), with one query per
+        repository, and match their dependency strings through
+        atom_match_many(). Results are stored into deplist_cache
+        (package match -> (dependencies, post dependencies)) and
+        match_cache (dependency -> atom_match() result), which are then
+        used by __generate_dependency_tree_analyze_deplist().
+        The walk order, and thus the generated graph, are not affected.
+        """
+        repo_map = {}
+        for pkg_id, repo_id in pkg_matches:
+            if (pkg_id, repo_id) in deplist_cache:
+                continue
+            obj = repo_map.setdefault(repo_id, set())
+            obj.add(pkg_id)
+        if not repo_map:
+            return
+
+        excluded_deptypes = self.__generate_dependency_tree_excluded_deptypes(
+            build_deps)
+        dependencies = set()
+        for repo_id, package_ids in repo_map.items():
+            repo_db = self.open_repository(repo_id)
+            deps_map = repo_db.retrieveDependenciesListMap(
+                package_ids, exclude_deptypes = excluded_deptypes)
+            post_deps_map = repo_db.retrieveDependenciesMap(
+                package_ids,
+                deptype = etpConst['dependency_type_ids']['pdepend_id'])
 
-        myundeps = repo_db.retrieveDependenciesList(pkg_id,
-            exclude_deptypes = excluded_deptypes,
-            resolve_conditional_deps = False)
+            for package_id in package_ids:
+                deps = deps_map[package_id]
+                post_deps = post_deps_map[package_id]
+                deplist_cache[(package_id, repo_id)] = (deps, post_deps)
+                dependencies.update(deps)
+                dependencies.update(post_deps)
+
+        # conflicts and conditional dependencies are not matched as they are
+        pending = [x for x in dependencies if x not in match_cache \
+                       and not x.startswith("!") and not x.startswith("(")]
+        if pending:
+            match_cache.update(self.atom_match_many(pending))
+
+        if const_debug_enabled():
+            const_debug_write(__name__,
+                "__generate_dependency_tree_prefetch: %d packages, "
+                "%d dependencies matched" % (
+                    sum(len(x) for x in repo_map.values()), len(pending),))
+
+    def __generate_dependency_tree_analyze_deplist(self, pkg_match, repo_db,
+        stack, graph, deps_not_found, conflicts, unsat_cache, relaxed_deps,
+        build_deps, deep_deps, empty_deps, recursive, selected_matches,
+        elements_cache, selected_matches_cache, deplist_cache, match_cache):
+
+        pkg_id, repo_id = pkg_match
+
+        pkg_post_deps = None
+        cached_deps = deplist_cache.get(pkg_match)
+        if cached_deps is not None:
+            myundeps, pkg_post_deps = cached_deps
+        else:
+            myundeps = repo_db.retrieveDependenciesList(pkg_id,
+                exclude_deptypes = \
+                    self.__generate_dependency_tree_excluded_deptypes(
+                        build_deps),
+                resolve_conditional_deps = False)
+
+        def _atom_match(dependency):
+            match = match_cache.get(dependency)
+            if match is None:
+                match = self.atom_match(dependency)
+            return match
 
         # this solves some conditional dependencies using selected_matches.
         # also expands all the conditional dependencies using
@@ -1272,7 +1586,7 @@ class CalculatorsMixin:
         post_deps = []
         # PDEPENDs support
         myundeps, post_deps = self._lookup_post_dependencies(repo_db,
-            pkg_id, myundeps)
+            pkg_id, myundeps, post_deps = pkg_post_deps)
         if (not empty_deps) and post_deps:
             # validate post dependencies, make them not contain matches already
             # pulled in, this cuts potential circular dependencies:
@@ -1292,7 +1606,7 @@ class CalculatorsMixin:
 
         deps = set()
         for unsat_dep in myundeps:
-            match_pkg_id, match_repo_id = self.atom_match(unsat_dep)
+            match_pkg_id, match_repo_id = _atom_match(unsat_dep)
             if match_pkg_id == -1:
                 # dependency not found !
                 deps_not_found.add(unsat_dep)
@@ -1305,7 +1619,7 @@ class CalculatorsMixin:
 
         post_deps_matches = set()
         for post_dep in post_deps:
-            match_pkg_id, match_repo_id = self.atom_match(post_dep)
+            match_pkg_id, match_repo_id = _atom_match(post_dep)
             # if post dependency is not found, we can happily ignore the fact
             if match_pkg_id == -1:
                 # not adding to deps_not_found
@@ -1379,7 +1693,8 @@ class CalculatorsMixin:
         empty_deps = False, relaxed_deps = False, build_deps = False,
         only_deps = False, deep_deps = False, unsatisfied_deps_cache = None,
         elements_cache = None, post_deps_cache = None, recursive = True,
-        selected_matches = None, selected_matches_cache = None, ldpaths = None):
+        selected_matches = None, selected_matches_cache = None, ldpaths = None,
+        deplist_cache = None, match_cache = None):
 
         pkg_id, pkg_repo = matched_atom
         if (pkg_id == -1) or (pkg_repo == 1):
@@ -1393,6 +1708,11 @@ class CalculatorsMixin:
             unsatisfied_deps_cache = {}
         if post_deps_cache is None:
             post_deps_cache = {}
+        # these caches are filled by __generate_dependency_tree_prefetch()
+        if deplist_cache is None:
+            deplist_cache = {}
+        if match_cache is None:
+            match_cache = {}
 
         if selected_matches is None:
             selected_matches = set()
@@ -1404,7 +1724,7 @@ class CalculatorsMixin:
         conflicts = set()
         first_element = True
 
-        stack = Lifo()
+        stack = _DependencyStack()
         stack.push(matched_atom)
         inverse_dep_stack_cache = {}
         graph_cache = set()
@@ -1420,6 +1740,17 @@ class CalculatorsMixin:
                 continue
             elements_cache.add(pkg_match)
 
+            if (self.DISABLE_FRONTIER_PREFETCH is None) and \
+                    (pkg_match not in deplist_cache):
+                # fetch the whole pending frontier at once, the stack
+                # is still walked in the same order. The items pushed
+                # before the previous fetch are already cached.
+                frontier = set(x for x in stack.pop_pushed() \
+                                   if x not in elements_cache)
+                frontier.add(pkg_match)
+                self.__generate_dependency_tree_prefetch(
+                    frontier, build_deps, deplist_cache, match_cache)
+
             # now we are ready to open repository
             repo_db = self.open_repository(repo_id)
 
@@ -1494,7 +1825,8 @@ class CalculatorsMixin:
                     pkg_match, repo_db, stack, graph, deps_not_found,
                     conflicts, unsatisfied_deps_cache, relaxed_deps,
                     build_deps, deep_deps, empty_deps, recursive,
-                    selected_matches, elements_cache, selected_matches_cache)
+                    selected_matches, elements_cache, selected_matches_cache,
+                    deplist_cache, match_cache)
 
             if post_dep_matches:
                 obj = post_deps_cache.setdefault(pkg_match, set())
@@ -1532,9 +1864,10 @@ class CalculatorsMixin:
         return graph, conflicts
 
     def _lookup_post_dependencies(self, repo_db, repo_package_id,
-        unsatisfied_deps):
+        unsatisfied_deps, post_deps = None):
 
-        post_deps = repo_db.retrievePostDependencies(repo_package_id)
+        if post_deps is None:
+            post_deps = repo_db.retrievePostDependencies(repo_package_id)
 
         if const_debug_enabled():
             const_debug_write(__name__,
@@ -2228,7 +2561,16 @@ class CalculatorsMixin:
         selected_matches_cache = {}
         selected_matches_set = set(package_matches)
         post_deps_cache = {}
+        deplist_cache = {}
+        match_cache = {}
         matchfilter = set()
+
+        if self.DISABLE_FRONTIER_PREFETCH is None:
+            # the requested packages are the first frontier
+            self.__generate_dependency_tree_prefetch(
+                [x for x in package_matches if x[0] != -1 and x[1] != 1],
+                build_deps, deplist_cache, match_cache)
+
         for matched_atom in package_matches:
 
             pkg_id, pkg_repo = matched_atom
@@ -2264,7 +2606,9 @@ class CalculatorsMixin:
                     recursive = recursive,
                     selected_matches = selected_matches_set,
                     selected_matches_cache = selected_matches_cache,
-                    ldpaths = ldpaths
+                    ldpaths = ldpaths,
+                    deplist_cache = deplist_cache,
+                    match_cache = match_cache
                 )
             except DependenciesNotFound as err:
                 deps_not_found |= err.value
@@ -2715,11 +3059,21 @@ class CalculatorsMixin:
             return reverse_deps
 
         def setup_revdeps(filtered_deps):
+            # fetch all the reverse dependencies at once, per repository
+            repo_map = {}
             for d_rev_dep, d_repo_id in filtered_deps:
+                obj = repo_map.setdefault(d_repo_id, set())
+                obj.add(d_rev_dep)
+            reverse_map = {}
+            for d_repo_id, d_rev_deps in repo_map.items():
                 d_repo_db = self.open_repository(d_repo_id)
-                mydepends = d_repo_db.retrieveReverseDependencies(
-                    d_rev_dep, exclude_deptypes = \
-                        (pdepend_id, bdepend_id,))
+                reverse_map[d_repo_id] = \
+                    d_repo_db.retrieveReverseDependenciesMap(
+                        d_rev_deps, exclude_deptypes = \
+                            (pdepend_id, bdepend_id,))
+
+            for d_rev_dep, d_repo_id in filtered_deps:
+                mydepends = reverse_map[d_repo_id][d_rev_dep]
                 deep_dep_map[(d_rev_dep, d_repo_id)] = \
                     set((x, d_repo_id) for x in mydepends)
 
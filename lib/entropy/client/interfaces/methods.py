@@ -37,11 +37,11 @@ from entropy.exceptions import RepositoryError, SystemDatabaseError, \
 from entropy.db.skel import EntropyRepositoryBase
 from entropy.db.exceptions import Error as EntropyRepositoryError
 from entropy.cache import EntropyCacher
-from entropy.misc import FlockFile
+from entropy.misc import FlockFile, ParallelTask
 from entropy.fetchers import UrlFetcher
 from entropy.client.interfaces.db import ClientEntropyRepositoryPlugin, \
     InstalledPackagesRepository, AvailablePackagesRepository, GenericRepository
-from entropy.client.mirrors import StatusInterface
+from entropy.client.mirrors import StatusInterface, MirrorScores
 from entropy.client.misc import sharedinstlock
 from entropy.output import purple, bold, red, blue, darkgreen, darkred, brown, \
     teal
@@ -1268,7 +1268,7 @@ class RepositoryMixin:
             )
         f_out = bz2.BZ2File(comp_backup_path, "wb")
         try:
-            repo_db.exportRepository(f_out)
+            repo_db.exportRepository(f_out, binary = True)
         except DatabaseError as err:
             return False, err
         finally:
@@ -1858,85 +1858,127 @@ class MiscMixin:
 
         return licenses
 
-    def benchmark_mirrors(self, mirrors):
-        """
-        Execute a throughput-oriented benchmark against the
-        list of given Entropy Packages mirrors. Return a new sorted list.
+    def benchmark_mirrors(self, mirrors, max_workers = 8):
+        """
+        Execute a latency and throughput oriented benchmark against the
+        list of given Entropy Packages mirrors. Mirrors are probed
+        concurrently (at most max_workers at a time) and the results are
+        merged into the persistent mirror scores (see
+        entropy.client.mirrors.MirrorScores), which are also updated by
+        real package downloads.
+        Return a new list sorted by score, the best mirror last.
+
+        @param mirrors: list of Entropy Packages mirror URLs
+        @type mirrors: list
+        @keyword max_workers: maximum number of concurrent probes
+        @type max_workers: int
+        @return: the sorted mirror list
+        @rtype: list
         """
         # we believe that if a mirror does not respond in 6
         # seconds, then we should give up.
         reasonable_timeout = 6
-        mirror_stats = {}
-        mirror_cache = set()
         retries = 1
         mirror_test_file = "MIRROR_TEST"
+        mirror_scores = MirrorScores()
+        fetch_errors = (
+            UrlFetcher.TIMEOUT_FETCH_ERROR,
+            UrlFetcher.GENERIC_FETCH_ERROR)
 
+        valid_mirrors = []
+        probe_queue = []
+        mirror_cache = set()
         for mirror in mirrors:
+            url_data = entropy.tools.spliturl(mirror)
+            hostname = url_data.hostname
+            if hostname is None:
+                # mirror string is fucked up
+                continue
+            valid_mirrors.append(mirror)
+            # scores are per host, probe each host once
+            if hostname in mirror_cache:
+                continue
+            mirror_cache.add(hostname)
+            probe_queue.append((mirror, hostname))
 
+        probe_lock = threading.Lock()
+
+        def _probe(mirror, hostname):
             tmp_fd, tmp_path = const_mkstemp(
                 prefix="entropy.client.methods.reorder_mirrors")
             try:
-
-                url_data = entropy.tools.spliturl(mirror)
-                hostname = url_data.hostname
-                if hostname is None:
-                    # mirror string is fucked up
-                    continue
-                if hostname in mirror_cache:
-                    continue
-                mirror_cache.add(hostname)
                 mirror_url = mirror + "/" + mirror_test_file
-
-                mytxt = "%s: %s" % (
-                    blue(_("Checking speed of")),
-                    purple(hostname),
-                )
-                self.output(
-                    mytxt,
-                    importance = 1,
-                    level = "info",
-                    header = purple(" @@ "),
-                    back = True
-                )
-
-                download_speeds = []
-                fetch_errors = (
-                    UrlFetcher.TIMEOUT_FETCH_ERROR,
-                    UrlFetcher.GENERIC_FETCH_ERROR)
+                best_speed = None
                 for idx in range(retries):
                     fetcher = self._url_fetcher(mirror_url, tmp_path,
                         resume = False, show_speed = False,
                         timeout = reasonable_timeout)
                     rc = fetcher.download()
-                    if rc not in fetch_errors:
-                        download_speeds.append(fetcher.get_transfer_rate())
-
-                result_speed = 0.0
-                if download_speeds:
-                    download_speeds.sort(reverse=True)
-                    # take the best
-                    result_speed = download_speeds[0]
-                mirror_stats[mirror] = result_speed
+                    if rc in fetch_errors:
+                        mirror_scores.record(mirror, error = True)
+                        continue
+                    speed = fetcher.get_transfer_rate()
+                    mirror_scores.record(
+                        mirror, transfer_rate = speed,
+                        time_to_first_byte = fetcher.get_time_to_first_byte())
+                    if best_speed is None or speed > best_speed:
+                        best_speed = speed
+            finally:
+                os.close(tmp_fd)
+                os.remove(tmp_path)
 
+            if best_speed is None:
+                mytxt = "%s: %s" % (
+                    blue(_("Mirror not responding")),
+                    purple(hostname),
+                )
+            else:
                 mytxt = "%s: %s, %s/sec" % (
                     blue(_("Mirror speed")),
                     purple(hostname),
-                    teal(str(entropy.tools.bytes_into_human(result_speed))),
+                    teal(str(entropy.tools.bytes_into_human(best_speed))),
                 )
-                self.output(
-                    mytxt,
-                    importance = 1,
-                    level = "info",
-                    header = brown(" @@ ")
-                )
-            finally:
-                os.close(tmp_fd)
-                os.remove(tmp_path)
+            self.output(
+                mytxt,
+                importance = 1,
+                level = "info",
+                header = brown(" @@ ")
+            )
+
+        def _worker():
+            while True:
+                with probe_lock:
+                    if not probe_queue:
+                        return
+                    mirror, hostname = probe_queue.pop(0)
+                _probe(mirror, hostname)
+
+        mytxt = "%s %s %s" % (
+            blue(_("Checking speed of")),
+            purple(str(len(probe_queue))),
+            blue(_("mirrors")),
+        )
+        self.output(
+            mytxt,
+            importance = 1,
+            level = "info",
+            header = purple(" @@ ")
+        )
+
+        workers = []
+        for idx in range(min(max_workers, len(probe_queue))):
+            th = ParallelTask(_worker)
+            th.name = "BenchmarkMirrors-%d" % (idx,)
+            th.daemon = True
+            th.start()
+            workers.append(th)
+        for th in workers:
+            th.join()
+
+        mirror_scores.save()
 
         # calculate new order
-        new_mirrors = sorted(mirror_stats.keys(),
-            key = lambda x: mirror_stats[x])
-        return new_mirrors
+        return mirror_scores.sort(valid_mirrors)[::-1]
 
     def reorder_mirrors(self, repository_id, dry_run = False):
         """
@@ -11,14 +11,25 @@
 """
 import codecs
 import errno
+import functools
+import heapq
+import mmap
 import sys
 import os
+import struct
 
-from entropy.const import etpConst, const_mkstemp
+from entropy.const import etpConst, const_mkstemp, const_isunicode
 
 import entropy.tools
 
 
+# Content files are sequences of binary records, each one composed by
+# a fixed size header (package_id, ftype length, path length) followed by
+# the encoded ftype and path strings. Unlike text lines, records can be
+# parsed in place, without any decoding layer or newline handling.
+_CONTENT_RECORD = struct.Struct(">iHI")
+
+
 class FileContentReader(object):
 
     def __init__(self, path, enc=None):
@@ -27,19 +38,28 @@ class FileContentReader(object):
         else:
             self._enc = enc
         self._cpath = path
-        self._file = None
+        self._map = None
+        self._size = None
+        self._offset = 0
         self._eof = False
 
     def _open_f(self):
-        # opening the file in universal newline mode
-        # fixes the readline() issues wrt
-        # truncated lines.
-        if isinstance(self._cpath, int):
-            self._file = entropy.tools.codecs_fdopen(
-                self._cpath, "rU", self._enc)
+        from_fd = isinstance(self._cpath, int)
+        if from_fd:
+            fd = self._cpath
         else:
-            self._file = codecs.open(
-                self._cpath, "rU", self._enc)
+            fd = os.open(self._cpath, os.O_RDONLY)
+        try:
+            size = os.fstat(fd).st_size
+            # empty files cannot be mapped
+            if size:
+                self._map = mmap.mmap(fd, size, access = mmap.ACCESS_READ)
+        finally:
+            # the mapping does not need the file descriptor
+            if not from_fd:
+                os.close(fd)
+        self._size = size
+        self._offset = 0
 
     def __iter__(self):
         # reset object status, this makes possible
@@ -65,54 +85,29 @@ class FileContentReader(object):
     def next(self):
         if self._eof:
             raise StopIteration()
-        if self._file is None:
+        if self._size is None:
             self._open_f()
 
-        line = self._file.readline()
-        if not line:
+        offset = self._offset
+        if offset >= self._size:
             self.close()
             self._eof = True
             raise StopIteration()
 
-        # non-deterministic BUG with
-        # ca-certificates and Python crappy
-        # API causes readline() to return
-        # partial lines when non ASCII cruft
-        # is on the line. This is probably a
-        # Python bug.
-        # Example of partial readline():
-        # 0|obj|/usr/share/ca-certificates/mozilla/NetLock_Arany_=Class_Gold=_F\xc3\x85
-        # and the next call:
-        # \xc2\x91tan\xc3\x83\xc2\xbas\xc3\x83\xc2\xadtv\xc3\x83\xc2\xa1ny.crt\n
-        # Try to workaround it by reading ahead
-        # if line does not end with \n
-        # HOWEVER: opening the file in
-        # Universal Newline mode fixes it.
-        # But let's keep the check for QA.
-        # 2012-08-14: is has been observed that
-        # Universal Newline mode is not enough
-        # to avoid this issue.
-        while not line.endswith("\n"):
-            part_line = self._file.readline()
-            line += part_line
-            sys.stderr.write(
-                "FileContentReader, broken readline()"
-                ", executing fixup code\n")
-            sys.stderr.write("%s\n" % (repr(part_line),))
-            # break infinite loops
-            # and let it crash
-            if not part_line: # EOF
-                break
-
-        _package_id, _ftype, _path = line[:-1].split("|", 2)
-        # must be legal or die!
-        _package_id = int(_package_id)
+        _package_id, ftype_len, path_len = _CONTENT_RECORD.unpack_from(
+            self._map, offset)
+        offset += _CONTENT_RECORD.size
+        _ftype = self._map[offset:offset + ftype_len].decode(self._enc)
+        offset += ftype_len
+        _path = self._map[offset:offset + path_len].decode(self._enc)
+        self._offset = offset + path_len
         return _package_id, _path, _ftype
 
     def close(self):
-        if self._file is not None:
-            self._file.close()
-            self._file = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._size = None
 
 
 class FileContentWriter(object):
@@ -134,11 +129,9 @@ class FileContentWriter(object):
 
     def _open_f(self):
         if isinstance(self._cpath, int):
-            self._file = entropy.tools.codecs_fdopen(
-                self._cpath, "w", self._enc)
+            self._file = os.fdopen(self._cpath, "wb")
         else:
-            self._file = codecs.open(
-                self._cpath, "w", self._enc)
+            self._file = open(self._cpath, "wb")
 
     def __enter__(self):
         return self
@@ -153,15 +146,15 @@ class FileContentWriter(object):
         if self._file is None:
             self._open_f()
 
-        if package_id is not None:
-            self._file.write(str(package_id))
-        else:
-            self._file.write("0")
-        self._file.write("|")
-        self._file.write(ftype)
-        self._file.write("|")
-        self._file.write(path)
-        self._file.write("\n")
+        if package_id is None:
+            package_id = 0
+        if const_isunicode(ftype):
+            ftype = ftype.encode(self._enc)
+        if const_isunicode(path):
+            path = path.encode(self._enc)
+        self._file.write(
+            _CONTENT_RECORD.pack(package_id, len(ftype), len(path)) \
+                + ftype + path)
 
     def close(self):
         if self._file is not None:
@@ -367,8 +360,8 @@ def generate_content_file(content, package_id = None,
     Generate a file containing the "content" metadata,
     reading by content list or iterator. Each item
     of "content" must contain (path, ftype).
-    Each item shall be written to file, one per line,
-    in the following form: "[<package_id>|]<ftype>|<path>".
+    Each item shall be written to file as a binary record,
+    see FileContentWriter.
     The order of the element in "content" will be kept.
     """
     tmp_dir = os.path.join(
@@ -417,6 +410,34 @@ def generate_content_file(content, package_id = None,
                 pass
 
 
+def _merge_sorted(iterables, cmp_func):
+    """
+    Merge the given sorted iterables of tuples, whose first element is
+    the path, into a single sorted sequence, reading them lazily. Tuples
+    with the same path are yielded in iterables order.
+    It is O(n log k) where n = total number of tuples and
+    k = number of iterables.
+    """
+    key_func = functools.cmp_to_key(cmp_func)
+    heap = []
+    for idx, iterable in enumerate(iterables):
+        iterator = iter(iterable)
+        for item in iterator:
+            heap.append((key_func(item[0]), idx, item, iterator))
+            break
+    heapq.heapify(heap)
+
+    while heap:
+        _key, idx, item, iterator = heap[0]
+        yield item
+        for item in iterator:
+            heapq.heapreplace(
+                heap, (key_func(item[0]), idx, item, iterator))
+            break
+        else:
+            heapq.heappop(heap)
+
+
 def merge_content_file(content_file, sorted_content,
                        cmp_func):
     """
@@ -424,53 +445,38 @@ def merge_content_file(content_file, sorted_content,
     content (sorted_content), apply the "merge" step of a merge
     sort algorithm. In other words, add the sorted_content to
     content_file keeping content_file content ordered.
-    It is of couse O(n+m) where n = lines in content_file and
+    Paths available in both are written only once, taking the
+    content_file entry. Neither of them is ever loaded in memory,
+    sorted_content can be any iterable.
+    It is of couse O(n+m) where n = records in content_file and
     m = sorted_content length.
     """
     tmp_content_file = content_file + FileContentWriter.TMP_SUFFIX
 
-    sorted_ptr = 0
-    _sorted_path = None
-    _sorted_ftype = None
+    def _file_content(reader):
+        for _package_id, _path, _ftype in reader:
+            yield _path, _ftype, _package_id
+
+    def _sorted_content():
+        for _path, _ftype in sorted_content:
+            yield _path, _ftype, None
+
     _package_id = 0 # will be filled
+    _last_path = None
     try:
         with FileContentWriter(tmp_content_file) as tmp_w:
             with FileContentReader(content_file) as tmp_r:
-                for _package_id, _path, _ftype in tmp_r:
-
-                    while True:
-
-                        try:
-                            _sorted_path, _sorted_ftype = \
-                                sorted_content[sorted_ptr]
-                        except IndexError:
-                            _sorted_path = None
-                            _sorted_ftype = None
-
-                        if _sorted_path is None:
-                            tmp_w.write(_package_id, _path, _ftype)
-                            break
-
-                        cmp_outcome = cmp_func(_path, _sorted_path)
-                        if cmp_outcome < 0:
-                            tmp_w.write(_package_id, _path, _ftype)
-                            break
-
-                        # always privilege _ftype over _sorted_ftype
-                        # _sorted_ftype might be invalid
-                        tmp_w.write(
-                            _package_id, _sorted_path, _ftype)
-                        sorted_ptr += 1
-                        if cmp_outcome == 0:
-                            # write only one
-                            break
-
-                # add the remainder
-                if sorted_ptr < len(sorted_content):
-                    _sorted_rem = sorted_content[sorted_ptr:]
-                    for _sorted_path, _sorted_ftype in _sorted_rem:
-                        tmp_w.write(
-                            _package_id, _sorted_path, _sorted_ftype)
+                merged = _merge_sorted(
+                    (_file_content(tmp_r), _sorted_content()),
+                    cmp_func)
+                for _path, _ftype, _item_package_id in merged:
+                    if _last_path is not None and \
+                            cmp_func(_path, _last_path) == 0:
+                        continue
+                    _last_path = _path
+                    if _item_package_id is not None:
+                        _package_id = _item_package_id
+                    tmp_w.write(_package_id, _path, _ftype)
 
         os.rename(tmp_content_file, content_file)
     finally:
@@ -36,6 +36,10 @@ class _PackageInstallRemoveAction(PackageAction):
 
     PRESERVED_LIBS_ENABLED = _preserved_libs_enabled
 
+    # number of content paths whose ownership is resolved at once,
+    # see _iter_content_owned()
+    _CONTENT_OWNERS_CHUNK = 4096
+
     def __init__(self, entropy_client, package_match, opts = None):
         super(_PackageInstallRemoveAction, self).__init__(
             entropy_client, package_match, opts = opts)
@@ -428,6 +432,43 @@ class _PackageInstallRemoveAction(PackageAction):
 
         return in_mask, protected, tofile, do_continue
 
+    def _iter_content_owned(self, inst_repo, content, resolve):
+        """
+        Iterate over the (package_id, path, type) content tuples, adding
+        whether the path is owned by any installed package. Ownership is
+        resolved in chunks, through a single repository query per chunk.
+
+        @param inst_repo: the installed packages repository
+        @type inst_repo: EntropyRepositoryBase
+        @param content: iterable of (package_id, path, type) tuples
+        @type content: iterable
+        @param resolve: if False, do not resolve ownership and always
+            report paths as not owned
+        @type resolve: bool
+        @return: generator of (package_id, path, type, owned) tuples
+        @rtype: generator
+        """
+        if not resolve:
+            for package_id, path, ftype in content:
+                yield package_id, path, ftype, False
+            return
+
+        chunk = []
+        content_iter = iter(content)
+        while True:
+            del chunk[:]
+            for item in content_iter:
+                chunk.append(item)
+                if len(chunk) >= self._CONTENT_OWNERS_CHUNK:
+                    break
+            if not chunk:
+                break
+
+            owned = inst_repo.searchBelongsMap(
+                [path for _pkg_id, path, _ftype in chunk if path])
+            for package_id, path, ftype in chunk:
+                yield package_id, path, ftype, path in owned
+
     def _remove_content_from_system_loop(self, inst_repo, remove_atom,
                                          remove_content, remove_config,
                                          affected_directories,
@@ -457,7 +498,10 @@ class _PackageInstallRemoveAction(PackageAction):
                 if paths is not None:
                     preserved_lib_paths.update(paths)
 
-        for _pkg_id, item, _ftype in remove_content:
+        content_iter = self._iter_content_owned(
+            inst_repo, remove_content, col_protect > 0)
+
+        for _pkg_id, item, _ftype, owned in content_iter:
 
             if not item:
                 continue # empty element??
@@ -473,8 +517,7 @@ class _PackageInstallRemoveAction(PackageAction):
             # collision check
             if col_protect > 0:
 
-                if inst_repo.isFileAvailable(item) \
-                    and os.path.isfile(sys_root_item_encoded):
+                if owned and os.path.isfile(sys_root_item_encoded):
 
                     # in this way we filter out directories
                     colliding_path_messages.add(sys_root_item)
@@ -17,7 +17,7 @@ import stat
 
 from entropy.const import etpConst, const_debug_write, const_debug_enabled, \
     const_mkstemp
-from entropy.client.mirrors import StatusInterface
+from entropy.client.mirrors import StatusInterface, MirrorScores
 from entropy.exceptions import InterruptError
 from entropy.fetchers import UrlFetcher
 from entropy.i18n import _
@@ -102,9 +102,9 @@ class _PackageFetchAction(PackageAction):
                 self._package_match)
 
         repo = self._entropy.open_repository(self._repository_id)
-        edelta_support = self._entropy.ClientSettings(
-            )['misc']['edelta_support']
-        metadata['edelta_support'] = edelta_support
+        misc_settings = self._entropy.ClientSettings()['misc']
+        metadata['edelta_support'] = misc_settings['edelta_support']
+        metadata['download_segments'] = misc_settings['download_segments']
         metadata['checksum'] = repo.retrieveDigest(self._package_id)
         sha1, sha256, sha512, gpg = repo.retrieveSignatures(
             self._package_id)
@@ -525,9 +525,12 @@ class _PackageFetchAction(PackageAction):
 
     def _download_file(self, url, download_path, digest = None,
                        resume = True, package_id = None,
-                       repository_id = None):
+                       repository_id = None, segment_urls = None):
         """
         Internal method. Try to download the package file.
+        segment_urls, if given, is the list of alternative URLs (on
+        other mirrors) of the same file, used by segmented downloads.
+        The outcome of the transfer is recorded in MirrorScores.
         """
 
         def do_stfu_rm(xpath):
@@ -572,7 +575,9 @@ class _PackageFetchAction(PackageAction):
             abort_check_func = fetch_abort_function,
             http_basic_user = basic_user,
             http_basic_pwd = basic_pwd,
-            https_validate_cert = https_validate_cert)
+            https_validate_cert = https_validate_cert,
+            segments = self._meta.get('download_segments', 1),
+            segment_urls = segment_urls)
 
         if (package_id is not None) and (repository_id is not None):
             self._setup_differential_download(
@@ -597,6 +602,7 @@ class _PackageFetchAction(PackageAction):
             raise
 
         except:
+            MirrorScores().record(url, error = True)
             if const_debug_enabled():
                 self._entropy.output(
                     "fetch_file:",
@@ -609,6 +615,13 @@ class _PackageFetchAction(PackageAction):
                 do_stfu_rm(download_path)
             return -1, data_transfer, resumed
 
+        fetch_failed = fetch_checksum in (
+            UrlFetcher.GENERIC_FETCH_ERROR, UrlFetcher.TIMEOUT_FETCH_ERROR)
+        MirrorScores().record(
+            url, transfer_rate = data_transfer,
+            time_to_first_byte = fetch_intf.get_time_to_first_byte(),
+            error = fetch_failed or bool(digest and fetch_checksum != digest))
+
         if fetch_checksum == UrlFetcher.GENERIC_FETCH_ERROR:
             # !! not found
             # maybe we already have it?
@@ -666,6 +679,8 @@ class _PackageFetchAction(PackageAction):
             else:
                 uris = avail_data[repository_id]['packages'][::-1]
 
+        # try the best scored mirrors first
+        uris = MirrorScores().sort(uris)
         remaining = set(uris)
         mirror_status = StatusInterface()
 
@@ -739,7 +754,10 @@ class _PackageFetchAction(PackageAction):
                         package_id = package_id,
                         repository_id = repository_id,
                         digest = checksum,
-                        resume = do_resume
+                        resume = do_resume,
+                        segment_urls = [
+                            x + "/" + download for x in uris
+                            if x in remaining]
                     )
 
                 if exit_st == 0:
@@ -870,13 +888,17 @@ class _PackageFetchAction(PackageAction):
                 level = "info",
                 header = red("   ## ")
             )
-            return self._download_package(
-                self._package_id,
-                self._repository_id,
-                download,
-                path,
-                checksum
-            )
+            try:
+                return self._download_package(
+                    self._package_id,
+                    self._repository_id,
+                    download,
+                    path,
+                    checksum
+                )
+            finally:
+                # persist what we learnt about mirrors
+                MirrorScores().save()
 
         locks = []
         try:
@@ -227,9 +227,12 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
         metadata['phases'].append(self._remove_conflicts_phase)
 
         if metadata['merge_from']:
-            metadata['phases'].append(self._merge_phase)
+            metadata['image_phase'] = self._merge_phase
         else:
-            metadata['phases'].append(self._unpack_phase)
+            metadata['image_phase'] = self._unpack_phase
+        metadata['phases'].append(metadata['image_phase'])
+        # set by prepare()
+        metadata['prepared'] = False
 
         metadata['phases'].append(self._setup_package_phase)
         metadata['phases'].append(self._tarball_ownership_fixup_phase)
@@ -244,11 +247,21 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
 
         self._meta = metadata
 
-    def _run(self):
+    def prepare(self):
         """
-        Execute the action. Return an exit status.
+        Execute the phases that only work on the package image (unpack or
+        merge from) ahead of start(), which is then going to skip them.
+        This makes possible to prepare the next package while the
+        current one is being merged. This method can be called from a
+        thread different from the one calling start(), but not
+        concurrently with it.
+
+        @return: an exit status
+        @rtype: int
         """
         self.setup()
+        if self._meta['prepared']:
+            return 0
 
         spm_class = self._entropy.Spm_class()
         exit_st = spm_class.entropy_install_setup_hook(
@@ -256,6 +269,26 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
         if exit_st != 0:
             return exit_st
 
+        image_phase = self._meta['image_phase']
+        exit_st = image_phase()
+        if exit_st == 0:
+            self._meta['phases'].remove(image_phase)
+            self._meta['prepared'] = True
+        return exit_st
+
+    def _run(self):
+        """
+        Execute the action. Return an exit status.
+        """
+        self.setup()
+
+        if not self._meta['prepared']:
+            spm_class = self._entropy.Spm_class()
+            exit_st = spm_class.entropy_install_setup_hook(
+                self._entropy, self._meta)
+            if exit_st != 0:
+                return exit_st
+
         for method in self._meta['phases']:
             exit_st = method()
             if exit_st != 0:
@@ -1432,17 +1465,40 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
 
         return 0
 
+    def _get_image_file_owners(self, inst_repo, image_dir):
+        """
+        Return the installed packages owning the files in the package
+        image directory, resolved all at once.
+
+        @param inst_repo: the installed packages repository
+        @type inst_repo: EntropyRepositoryBase
+        @param image_dir: the package image directory
+        @type image_dir: string
+        @return: dict composed by path (relative to image_dir) ->
+            frozenset of package identifiers, unowned paths are not returned
+        @rtype: dict
+        """
+        paths = []
+        for currentdir, subdirs, files in os.walk(image_dir):
+            for item in files:
+                fromfile = os.path.join(currentdir, item)
+                paths.append(const_convert_to_unicode(
+                    fromfile[len(image_dir):]))
+        return inst_repo.searchBelongsMap(paths)
+
     def _handle_install_collision_protect_unlocked(self, inst_repo,
                                                    remove_package_id,
                                                    tofile,
-                                                   todbfile):
+                                                   todbfile,
+                                                   file_owners = None):
         """
         Handle files collition protection for the install phase.
         """
-
-        avail = inst_repo.isFileAvailable(
-            const_convert_to_unicode(todbfile),
-            get_id = True)
+        todbfile = const_convert_to_unicode(todbfile)
+        if file_owners is not None:
+            avail = file_owners.get(todbfile, frozenset())
+        else:
+            avail = inst_repo.isFileAvailable(todbfile, get_id = True)
 
         if (remove_package_id not in avail) and avail:
             mytxt = darkred(_("Collision found during install for"))
@@ -1497,6 +1553,12 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
                 from_enctype = etpConst['conf_encoding'])
         movefile = entropy.tools.movefile
 
+        # resolve the owners of all the package files at once rather than
+        # querying the installed packages repository once per file.
+        file_owners = None
+        if col_protect > 1:
+            file_owners = self._get_image_file_owners(inst_repo, image_dir)
+
         def workout_subdir(currentdir, subdir):
 
             imagepath_dir = os.path.join(currentdir, subdir)
@@ -1737,7 +1799,8 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
             if col_protect > 1:
                 todbfile = fromfile[len(image_dir):]
                 myrc = self._handle_install_collision_protect_unlocked(
-                    inst_repo, remove_package_id, tofile, todbfile)
+                    inst_repo, remove_package_id, tofile, todbfile,
+                    file_owners = file_owners)
                 if not myrc:
                     return 0
 
@@ -15,7 +15,7 @@ import os
 import threading
 
 from entropy.const import etpConst, const_setup_perms, const_mkstemp
-from entropy.client.mirrors import StatusInterface
+from entropy.client.mirrors import StatusInterface, MirrorScores
 from entropy.exceptions import InterruptError
 from entropy.fetchers import UrlFetcher
 from entropy.output import blue, darkblue, bold, red, darkred, brown, darkgreen
@@ -81,6 +81,7 @@ class _PackageMultiFetchAction(_PackageFetchAction):
 
         misc_settings = self._entropy.ClientSettings()['misc']
         metadata['edelta_support'] = misc_settings['edelta_support']
+        metadata['download_segments'] = misc_settings['download_segments']
 
         metadata['matches'] = self._package_matches
 
@@ -382,10 +383,18 @@ class _PackageMultiFetchAction(_PackageFetchAction):
 
         return fetched_url_data, data_transfer, 0
 
-    def _download_files(self, url_data, resume = True, repository_id = None):
+    def _download_files(self, url_data, resume = True, repository_id = None,
+                        segment_urls = None):
         """
         Effectively fetch the package files.
+
+        segment_urls, if given, maps the url of an url_data item to the
+        list of URLs (url first, then the ones on other mirrors) of the
+        same file, used by segmented downloads. Files are only downloaded
+        from their url, failing over to other mirrors is up to the caller.
         """
+        if segment_urls is None:
+            segment_urls = {}
         self._setup_url_directories(url_data)
 
         @contextlib.contextmanager
@@ -451,7 +460,8 @@ class _PackageMultiFetchAction(_PackageFetchAction):
         url_path_list = []
         last_repos_id = None
         for pkg_id, repository_id, url, download_path, _cksum, _sig in url_data:
-            url_path_list.append((url, download_path))
+            url_path_list.append(
+                (segment_urls.get(url, url), download_path))
 
             lock = None
             try:
@@ -488,7 +498,9 @@ class _PackageMultiFetchAction(_PackageFetchAction):
             post_download_hook = post_download_hook,
             http_basic_user = basic_user,
             http_basic_pwd = basic_pwd,
-            https_validate_cert = https_validate_cert)
+            https_validate_cert = https_validate_cert,
+            mirror_scores = MirrorScores(),
+            segments = self._meta.get('download_segments', 1))
         try:
             # make sure that we don't need to abort already
             # doing the check here avoids timeouts
@@ -506,14 +518,13 @@ class _PackageMultiFetchAction(_PackageFetchAction):
                 # valid, nothing to do
                 continue
 
-            (_pkg_id, repository_id, _url,
+            (_pkg_id, repository_id, url,
              _download_path, _ignore_checksum, signatures) = tup
 
             # use the outcome returned by download(), it
             # contains an error code if download failed.
             val = data.get(download_id)
-            failed_map[url_path_list[download_id - 1][0]] = (
-                val, signatures)
+            failed_map[url] = (val, signatures)
 
         exit_st = 0
         if failed_map:
@@ -568,6 +579,11 @@ class _PackageMultiFetchAction(_PackageFetchAction):
             for new_obj in new_ones:
                 obj.insert(0, new_obj)
 
+        # try the best scored mirrors first
+        mirror_scores = MirrorScores()
+        for repository_id, uris in tuple(repo_uris.items()):
+            repo_uris[repository_id] = mirror_scores.sort(uris)
+
         remaining = repo_uris.copy()
         mirror_status = StatusInterface()
 
@@ -694,6 +710,7 @@ class _PackageMultiFetchAction(_PackageFetchAction):
                         _("data not available on this mirror"),)
                 elif p_exit_st == -2:
                     mirror_status.add_failing_mirror(best_mirror, 1)
+                    mirror_scores.record(best_mirror, error = True)
                     txt += " - %s." % (_("wrong checksum"),)
 
                 elif p_exit_st == -3:
@@ -733,6 +750,7 @@ class _PackageMultiFetchAction(_PackageFetchAction):
 
             while True:
                 fetch_files_list = []
+                segment_urls = {}
 
                 for pkg_id, repository_id, fname, cksum, signs in d_list:
                     best_mirror = get_best_mirror(repository_id)
@@ -748,6 +766,11 @@ class _PackageMultiFetchAction(_PackageFetchAction):
                         return 3, d_list
 
                     myuri = os.path.join(best_mirror, fname)
+                    # best_mirror comes first, the file is downloaded
+                    # from it, other mirrors only serve segments.
+                    segment_urls[myuri] = [
+                        os.path.join(x, fname) for x in
+                        remaining[repository_id]]
                     pkg_path = self.get_standard_fetch_disk_path(fname)
                     fetch_files_list.append(
                         (pkg_id, repository_id, myuri, pkg_path, cksum, signs)
@@ -772,7 +795,8 @@ class _PackageMultiFetchAction(_PackageFetchAction):
                          data_transfer) = self._download_files(
                              updated_fetch_files_list,
                              resume = do_resume,
-                             repository_id = repository_id)
+                             repository_id = repository_id,
+                             segment_urls = segment_urls)
 
                 if exit_st == 0:
                     show_successful_download(
@@ -838,8 +862,12 @@ class _PackageMultiFetchAction(_PackageFetchAction):
             header = red("   ## ")
         )
 
-        exit_st, err_list = self._download_packages(
-            self._meta['multi_fetch_list'])
+        try:
+            exit_st, err_list = self._download_packages(
+                self._meta['multi_fetch_list'])
+        finally:
+            # persist what we learnt about mirrors
+            MirrorScores().save()
         if exit_st == 0:
             return 0
 
@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+"""
+
+    @author: Fabio Erculiani <lxnay@sabayon.org>
+    @contact: lxnay@sabayon.org
+    @copyright: Fabio Erculiani
+    @license: GPL-2
+
+    B{Entropy Package Manager Client Package Install Pipeline}.
+
+"""
+import os
+import threading
+
+from entropy.const import const_debug_write
+from entropy.exceptions import InterruptError
+from entropy.i18n import _
+from entropy.misc import ParallelTask
+from entropy.output import darkred, purple, red
+
+import entropy.tools
+
+
+class PackageInstallPipeline(object):
+    """
+    Pipelined package installation scheduler built on top of
+    PackageActionFactory.
+
+    Packages are downloaded (and verified) by a fetcher thread and unpacked
+    into their image directories by an unpacker thread, ahead of their
+    installation, so that package N+1 is downloaded while package N is
+    unpacked and unpacked while package N is merged. Merging (the live
+    filesystem and Installed Packages Repository changes) is left to the
+    caller and happens serially, in the given (install queue) order.
+
+    Example code:
+
+    >>> pipeline = PackageInstallPipeline(entropy_client, install_queue)
+    >>> pipeline.start()
+    >>> try:
+    ...     for pkg_match, pkg, exit_st in pipeline:
+    ...         try:
+    ...             if exit_st == 0:
+    ...                 exit_st = pkg.start()
+    ...         finally:
+    ...             if pkg is not None:
+    ...                 pkg.finalize()
+    ...         if exit_st != 0:
+    ...             break
+    ... finally:
+    ...     pipeline.stop()
+
+    The fetch and unpack stages respect the same package file locks
+    used by the PackageAction objects. Iteration stops at the first
+    fetch or unpack error, which is returned as exit status.
+
+    Unlike downloading the whole install queue first, a fetch error may
+    show up after some packages have been merged. To reduce the chance
+    of such partial installations, the repositories packages have to be
+    downloaded from are checked to be reachable before the first package
+    is handed over, if any of them is not, the first package is returned
+    with a failing exit status.
+    """
+
+    # Maximum number of packages downloaded ahead of the one being merged
+    FETCH_AHEAD = 3
+
+    # Maximum number of packages unpacked ahead of the one being merged
+    UNPACK_AHEAD = 1
+
+    def __init__(self, entropy_client, package_matches, opts_map = None,
+                 multifetch = 1):
+        """
+        Object constructor.
+
+        @param entropy_client: a valid Client instance.
+        @type entropy_client: entropy.client.interfaces.Client
+        @param package_matches: ordered list of package matches to install,
+            as returned by Client.get_install_queue()
+        @type package_matches: list
+        @keyword opts_map: map composed by package match -> install action
+            options (see PackageActionFactory.get())
+        @type opts_map: dict
+        @keyword multifetch: number of packages to download in parallel
+        @type multifetch: int
+        """
+        self._entropy = entropy_client
+        self._factory = entropy_client.PackageActionFactory()
+        self._package_matches = list(package_matches)
+        if opts_map is None:
+            opts_map = {}
+        self._opts_map = opts_map
+        self._multifetch = max(1, multifetch)
+
+        # slots are taken by the stages and given back once the
+        # package has been merged, hence the + 1
+        fetch_slots = max(self.FETCH_AHEAD, self._multifetch) + 1
+        unpack_slots = self.UNPACK_AHEAD + 1
+        self._fetch_slots = threading.Semaphore(fetch_slots)
+        self._unpack_slots = threading.Semaphore(unpack_slots)
+        self._slots_max = fetch_slots + unpack_slots
+
+        # package match -> fetch exit status
+        self._fetched = {}
+        self._fetched_cond = threading.Condition()
+        # ready (pkg_match, action, exit_st) tuples, in install order
+        self._ready = []
+        self._ready_cond = threading.Condition()
+
+        self._stop_event = threading.Event()
+        self._fetcher_th = None
+        self._unpacker_th = None
+
+    def _fetch_abort(self):
+        """
+        Fetchers abort callback, raising InterruptError on stop().
+        """
+        if self._stop_event.is_set():
+            raise InterruptError("pipeline stopped")
+
+    def _fetch_chunks(self):
+        """
+        Split the package matches into download chunks.
+        """
+        matches = self._package_matches
+        return [matches[x:x + self._multifetch] for x in \
+                    range(0, len(matches), self._multifetch)]
+
+    def _is_repository_reachable(self, repository_id):
+        """
+        Return whether any of the package mirrors of the given repository
+        can be reached.
+        """
+        avail_data = self._entropy.Settings()['repositories']['available']
+        repo_data = avail_data.get(repository_id)
+        if repo_data is None:
+            return False
+        for uri in repo_data['packages']:
+            if entropy.tools.is_url_reachable(uri):
+                return True
+        return False
+
+    def _unreachable_repositories(self):
+        """
+        Return the sorted list of repositories packages have to be
+        downloaded from whose package mirrors cannot be reached. Packages
+        whose files are already available locally are not considered.
+        """
+        repository_ids = set()
+        for pkg_match in self._package_matches:
+            _package_id, repository_id = pkg_match
+            if repository_id in repository_ids:
+                continue
+            if self._entropy._is_package_repository(repository_id):
+                continue
+
+            pkg = self._factory.get(self._factory.FETCH_ACTION, pkg_match)
+            try:
+                pkg.setup()
+                pkg_path = pkg.package_path()
+            finally:
+                pkg.finalize()
+            if not os.path.isfile(pkg_path):
+                repository_ids.add(repository_id)
+
+        return sorted(x for x in repository_ids if \
+                          not self._is_repository_reachable(x))
+
+    def _check_repositories(self):
+        """
+        Verify that the repositories packages have to be downloaded from
+        are reachable, return an exit status.
+        """
+        try:
+            unreachable = self._unreachable_repositories()
+        except Exception:
+            entropy.tools.print_traceback()
+            return 1
+
+        for repository_id in unreachable:
+            self._entropy.output(
+                "%s: %s" % (
+                    red(_("Repository cannot be reached, "
+                          "nothing will be installed")),
+                    purple(repository_id),),
+                importance = 1,
+                level = "error",
+                header = darkred("   ## ")
+            )
+        if unreachable:
+            return 1
+        return 0
+
+    def _fetcher(self):
+        """
+        Fetcher thread body.
+        """
+        exit_st = self._check_repositories()
+        if exit_st != 0:
+            with self._fetched_cond:
+                for pkg_match in self._package_matches:
+                    self._fetched[pkg_match] = exit_st
+                self._fetched_cond.notify_all()
+            return
+
+        opts = {
+            'fetch_abort_function': self._fetch_abort,
+        }
+        for chunk in self._fetch_chunks():
+            for _pkg_match in chunk:
+                self._fetch_slots.acquire()
+            if self._stop_event.is_set():
+                break
+
+            pkg = None
+            exit_st = 1
+            try:
+                if len(chunk) == 1:
+                    pkg = self._factory.get(
+                        self._factory.FETCH_ACTION, chunk[0], opts = opts)
+                else:
+                    pkg = self._factory.get(
+                        self._factory.MULTI_FETCH_ACTION, chunk,
+                        opts = opts)
+                exit_st = pkg.start()
+            except Exception:
+                entropy.tools.print_traceback()
+            finally:
+                if pkg is not None:
+                    pkg.finalize()
+
+            with self._fetched_cond:
+                for pkg_match in chunk:
+                    self._fetched[pkg_match] = exit_st
+                self._fetched_cond.notify_all()
+            if exit_st != 0:
+                break
+
+    def _wait_fetched(self, pkg_match):
+        """
+        Wait for the given package match to be downloaded and return the
+        fetch exit status, or None if the pipeline has been stopped.
+        """
+        with self._fetched_cond:
+            while pkg_match not in self._fetched:
+                if self._stop_event.is_set():
+                    return None
+                self._fetched_cond.wait(1.0)
+            return self._fetched[pkg_match]
+
+    def _push_ready(self, pkg_match, pkg, exit_st):
+        """
+        Hand an install action over to the consumer.
+        """
+        with self._ready_cond:
+            self._ready.append((pkg_match, pkg, exit_st))
+            self._ready_cond.notify_all()
+
+    def _unpacker(self):
+        """
+        Unpacker thread body.
+        """
+        for pkg_match in self._package_matches:
+            exit_st = self._wait_fetched(pkg_match)
+            if exit_st is None:
+                break
+
+            self._unpack_slots.acquire()
+            if self._stop_event.is_set():
+                break
+
+            pkg = None
+            try:
+                pkg = self._factory.get(
+                    self._factory.INSTALL_ACTION, pkg_match,
+                    opts = self._opts_map.get(pkg_match))
+                if exit_st == 0:
+                    exit_st = pkg.prepare()
+            except Exception:
+                entropy.tools.print_traceback()
+                exit_st = 1
+
+            if pkg is None:
+                # cannot hand anything over, stop here
+                self._stop_event.set()
+                self._push_ready(pkg_match, None, exit_st)
+                break
+
+            const_debug_write(
+                __name__,
+                "PackageInstallPipeline: %s ready, exit status: %s" % (
+                    pkg_match, exit_st))
+            self._push_ready(pkg_match, pkg, exit_st)
+            if exit_st != 0:
+                break
+
+    def start(self):
+        """
+        Start the fetch and unpack stages.
+        """
+        self._fetcher_th = ParallelTask(self._fetcher)
+        self._fetcher_th.name = "PipelineFetcher"
+        self._fetcher_th.daemon = True
+        self._fetcher_th.start()
+
+        self._unpacker_th = ParallelTask(self._unpacker)
+        self._unpacker_th.name = "PipelineUnpacker"
+        self._unpacker_th.daemon = True
+        self._unpacker_th.start()
+
+    def __iter__(self):
+        """
+        Yield (package match, install action, exit status) tuples in install
+        order, as soon as packages are downloaded and unpacked. The
+        install action is None if it could not be created. Callers
+        must finalize() the returned install actions.
+        """
+        for pkg_match in self._package_matches:
+            with self._ready_cond:
+                while not self._ready:
+                    if not self._unpacker_th.is_alive():
+                        break
+                    self._ready_cond.wait(1.0)
+                if self._ready:
+                    item = self._ready.pop(0)
+                else:
+                    # the unpacker went away without telling us why
+                    item = (pkg_match, None, 1)
+
+            yield item
+
+            # the package has been merged (or the consumer gave up),
+            # free its slots.
+            self._fetch_slots.release()
+            self._unpack_slots.release()
+
+            _pkg_match, _pkg, exit_st = item
+            if exit_st != 0:
+                break
+
+    def stop(self):
+        """
+        Stop the fetch and unpack stages, waiting for them to terminate.
+        Install actions prepared and not consumed are finalized.
+        """
+        self._stop_event.set()
+        # wake up the stages blocked on their slots
+        for _x in range(self._slots_max):
+            self._fetch_slots.release()
+            self._unpack_slots.release()
+        with self._fetched_cond:
+            self._fetched_cond.notify_all()
+
+        for th in (self._fetcher_th, self._unpacker_th):
+            if th is not None:
+                th.join()
+
+        with self._ready_cond:
+            ready = self._ready[:]
+            del self._ready[:]
+        for _pkg_match, pkg, _exit_st in ready:
+            if pkg is not None:
+                pkg.finalize()
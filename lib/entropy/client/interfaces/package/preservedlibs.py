@@ -282,14 +282,16 @@ class PreservedLibraries(object):
         """
         failed = collections.deque()
 
-        for lib_path in self._follow(library_path):
+        lib_paths = self._follow(library_path)
+        lib_paths_owners = self._inst_repo.searchBelongsMap(lib_paths)
+
+        for lib_path in lib_paths:
             root_lib_path = self._root + lib_path
 
             # Guard against cross package symlinking. Example:
             # vmware-workstation pkg conaining symlinks to libssl.so.x
             # See Sabayon bug #5182.
-            lib_path_pkg_ids = self._inst_repo.isFileAvailable(
-                lib_path, get_id=True)
+            lib_path_pkg_ids = lib_paths_owners.get(lib_path)
             if lib_path_pkg_ids:
                 pkg_atoms = [self._inst_repo.retrieveAtom(x) for x in lib_path_pkg_ids]
                 failed.append(
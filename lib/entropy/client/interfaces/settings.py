@@ -386,6 +386,8 @@ class ClientSystemSettingsPlugin(SystemSettingsPlugin):
             'splitdebug': etpConst['splitdebug'],
             'splitdebug_dirs': etpConst['splitdebug_dirs'],
             'multifetch': 1,
+            'download_segments': 1,
+            'pipelined_install': False,
             'collisionprotect': etpConst['collisionprotect'],
             'configprotect': set(),
             'configprotectmask': set(),
@@ -439,6 +441,16 @@ class ClientSystemSettingsPlugin(SystemSettingsPlugin):
                 if bool_setting:
                     data['multifetch'] = 3
 
+        def _download_segments(setting):
+            int_setting = entropy.tools.setting_to_int(setting, 1, 16)
+            if int_setting is not None:
+                data['download_segments'] = int_setting
+
+        def _pipelined_install(setting):
+            bool_setting = entropy.tools.setting_to_bool(setting)
+            if bool_setting is not None:
+                data['pipelined_install'] = bool_setting
+
         def _gpg(setting):
             bool_setting = entropy.tools.setting_to_bool(setting)
             if bool_setting is not None:
@@ -485,6 +497,8 @@ class ClientSystemSettingsPlugin(SystemSettingsPlugin):
             'packagehashes': _packagehashes,
             'package-hashes': _packagehashes,
             'multifetch': _multifetch,
+            'download-segments': _download_segments,
+            'pipelined-install': _pipelined_install,
             'gpg': _gpg,
             'ignore-spm-downgrades': _spm_downgrades,
             'splitdebug': _splitdebug,
@@ -9,8 +9,16 @@
     B{Entropy Package Manager Client Download Mirrors Interface}.
 
 """
+import os
+import threading
+import time
+
+from entropy.const import etpConst
 from entropy.core import Singleton
 
+import entropy.dump
+import entropy.tools
+
 class StatusInterface(Singleton, dict):
 
     def init_singleton(self):
@@ -38,4 +46,208 @@ class StatusInterface(Singleton, dict):
 
     def clear(self):
         self.__last_mirrorname = None
-        return dict.clear(self)
\ No newline at end of file
+        return dict.clear(self)
+
+
+class MirrorScores(Singleton):
+    """
+    Persistent, exponentially decayed mirror quality records.
+
+    For every mirror (identified by its URL network location, so that
+    all the repositories hosted on the same server share the record),
+    time to first byte, transfer rate and error rate are kept as
+    exponentially weighted moving averages. Samples come from both
+    mirror benchmarks and real package downloads. The weight of the
+    accumulated history halves every HALF_LIFE seconds, so that a
+    mirror that got better (or worse) is re-ranked quickly.
+
+    The object is thread-safe and it is shared across the whole process.
+    Call save() to make the collected records survive the current run.
+    """
+
+    # weight given to a new sample over a fresh record
+    ALPHA = 0.3
+
+    # seconds after which the weight of the history is halved
+    HALF_LIFE = 7 * 86400
+
+    # records older than this are discarded at load time
+    MAX_AGE = 60 * 86400
+
+    def init_singleton(self, scores_file = None):
+        if scores_file is None:
+            scores_file = os.path.join(
+                etpConst['entropyworkdir'], "mirror_scores")
+        self._scores_file = scores_file
+        self._lock = threading.RLock()
+        self._records = None
+
+    @staticmethod
+    def mirror_key(url):
+        """
+        Return the key used to identify the mirror serving the given URL,
+        or None if the URL does not point to a remote location.
+
+        @param url: mirror or file URL
+        @type url: string
+        @return: the mirror key or None
+        @rtype: string or None
+        """
+        try:
+            netloc = entropy.tools.spliturl(url).netloc
+        except (AttributeError, ValueError):
+            return None
+        if not netloc:
+            return None
+        # strip any user:password@ component
+        return netloc.rsplit("@", 1)[-1].lower()
+
+    def _load(self):
+        """
+        Load the records from disk, if not done already.
+        Must be called with the lock held.
+        """
+        if self._records is not None:
+            return self._records
+
+        records = {}
+        data = entropy.dump.loadobj(self._scores_file, complete_path = True)
+        if isinstance(data, dict):
+            cur_t = time.time()
+            for key, record in data.items():
+                if not isinstance(record, dict):
+                    continue
+                if cur_t - record.get('mtime', 0.0) > self.MAX_AGE:
+                    continue
+                records[key] = record
+
+        self._records = records
+        return records
+
+    def save(self):
+        """
+        Write the mirror records to disk. Errors are ignored, since scoring
+        data is not critical.
+        """
+        with self._lock:
+            if self._records is None:
+                return
+            records = dict((k, dict(v)) for k, v in self._records.items())
+        entropy.dump.dumpobj(self._scores_file, records,
+            complete_path = True)
+
+    def clear(self):
+        """
+        Forget all the mirror records (on-disk ones included, at the next
+        save() call).
+        """
+        with self._lock:
+            self._records = {}
+
+    def record(self, url, transfer_rate = None, time_to_first_byte = None,
+               error = False):
+        """
+        Add a new sample for the mirror serving the given URL.
+
+        @param url: mirror or file URL
+        @type url: string
+        @keyword transfer_rate: measured transfer rate, in bytes/sec
+        @type transfer_rate: float
+        @keyword time_to_first_byte: measured time to first byte, in seconds
+        @type time_to_first_byte: float
+        @keyword error: True, if the transfer failed
+        @type error: bool
+        """
+        key = self.mirror_key(url)
+        if key is None:
+            return
+
+        cur_t = time.time()
+        with self._lock:
+            records = self._load()
+            record = records.get(key)
+            if record is None:
+                record = {
+                    'rate': None,
+                    'ttfb': None,
+                    'errors': 0.0,
+                    'samples': 0,
+                    'mtime': cur_t,
+                }
+                records[key] = record
+                alpha = 1.0
+            else:
+                age = max(0.0, cur_t - record['mtime'])
+                history = (1.0 - self.ALPHA) * \
+                    0.5 ** (age / self.HALF_LIFE)
+                alpha = 1.0 - history
+
+            def _blend(old, new):
+                if new is None:
+                    return old
+                if old is None:
+                    return float(new)
+                return old + alpha * (new - old)
+
+            if error:
+                record['errors'] = _blend(record['errors'], 1.0)
+            else:
+                record['errors'] = _blend(record['errors'], 0.0)
+                if transfer_rate:
+                    record['rate'] = _blend(record['rate'], transfer_rate)
+                record['ttfb'] = _blend(record['ttfb'], time_to_first_byte)
+
+            record['samples'] += 1
+            record['mtime'] = cur_t
+
+    def score(self, url):
+        """
+        Return the score of the mirror serving the given URL, the higher
+        the better, or None if the mirror is unknown.
+
+        The score is the expected transfer rate, penalized by the time to
+        first byte and by the error rate.
+
+        @param url: mirror or file URL
+        @type url: string
+        @return: mirror score or None
+        @rtype: float or None
+        """
+        key = self.mirror_key(url)
+        if key is None:
+            return None
+
+        with self._lock:
+            record = self._load().get(key)
+            if record is None:
+                return None
+            rate = record['rate'] or 0.0
+            ttfb = record['ttfb'] or 0.0
+            errors = record['errors']
+
+        return rate * (1.0 - errors) / (1.0 + ttfb)
+
+    def sort(self, urls):
+        """
+        Sort the given mirror (or file) URLs by score, best first.
+        Unknown mirrors are considered as good as the median known one,
+        the sort is stable so that the given order is kept among
+        equally scored mirrors.
+
+        @param urls: list of URLs
+        @type urls: list
+        @return: a new, sorted, list of URLs
+        @rtype: list
+        """
+        scores = dict((url, self.score(url)) for url in urls)
+        known = sorted(x for x in scores.values() if x is not None)
+        if not known:
+            return list(urls)
+
+        median = known[len(known) // 2]
+        def _key(url):
+            score = scores[url]
+            if score is None:
+                score = median
+            return -score
+        return sorted(urls, key = _key)
@@ -590,6 +590,73 @@ class ClientWebService(WebService):
                 except KeyError:
                     pass
 
+    def _split_package_cache(self, func_name, params, package_names, obj):
+        """
+        Store the outcome of a multi-package call into per-package on-disk
+        cache entries, so that a single remote call for many packages
+        satisfies subsequent cached requests for each of them.
+
+        @param func_name: API function name
+        @type func_name: string
+        @param params: request parameters, as passed to _method_getter()
+            before any generic parameter got added
+        @type params: dict
+        @param package_names: list of package names the call was made for
+        @type package_names: list
+        @param obj: raw call outcome, mapping package names to their data
+        @type obj: dict
+        """
+        if len(package_names) < 2 or not isinstance(obj, dict):
+            return
+        for package_name in package_names:
+            # packages missing from the outcome are cached as such, exactly
+            # like a single-package call would have done
+            pkg_obj = {}
+            if package_name in obj:
+                pkg_obj[package_name] = obj[package_name]
+            pkg_params = params.copy()
+            pkg_params["package_names"] = package_name
+            cache_key = self._get_cache_key(func_name, pkg_params)
+            self._set_cached(cache_key, pkg_obj)
+
+    def _packages_method_getter(self, func_name, params, package_names,
+                                cache = True, cached = False):
+        """
+        _method_getter() for multi-package calls. The outcome of an actual
+        remote call is also stored into per-package on-disk cache entries,
+        see _split_package_cache(). Outcomes served by the on-disk cache
+        are not split again.
+
+        @param func_name: API function name
+        @type func_name: string
+        @param params: request parameters
+        @type params: dict
+        @param package_names: list of package names the call is made for
+        @type package_names: list
+        @keyword cache: True means use on-disk cache if available?
+        @type cache: bool
+        @keyword cached: if True, it will only use the on-disk cached call
+            result and raise WebService.CacheMiss if not found.
+        @type cached: bool
+        @return: the call outcome
+        @rtype: dict
+        """
+        # _method_getter() adds the generic parameters to the given dict
+        if cache or cached:
+            try:
+                return self._method_getter(func_name, params.copy(),
+                    cached = True, require_credentials = False)
+            except WebService.CacheMiss:
+                if cached:
+                    raise
+
+        outcome = self._method_getter(func_name, params.copy(),
+            cache = False, require_credentials = False)
+        if cache:
+            self._split_package_cache(func_name, params,
+                package_names, outcome)
+        return outcome
+
     class DocumentError(WebService.WebServiceException):
         """
         Generic Document error object. Raised when Document object is
@@ -656,8 +723,8 @@ class ClientWebService(WebService):
                 return live_cached
         else:
             self._clear_live_cache(lcache_key)
-        outcome = self._method_getter("get_votes", params, cache = cache,
-            cached = cached, require_credentials = False)
+        outcome = self._packages_method_getter("get_votes", params,
+            package_names, cache = cache, cached = cached)
         self._live_cache[lcache_key] = outcome
         return outcome
 
@@ -753,8 +820,8 @@ class ClientWebService(WebService):
         params = {
             "package_names": packages_str,
         }
-        outcome = self._method_getter("get_downloads", params, cache = cache,
-            cached = cached, require_credentials = False)
+        outcome = self._packages_method_getter("get_downloads", params,
+            package_names, cache = cache, cached = cached)
         self._live_cache[lcache_key] = outcome
         return outcome
 
@@ -1182,8 +1249,8 @@ class ClientWebService(WebService):
         }
         if service_cache:
             params["cache"] = "1"
-        objs = self._method_getter("get_documents", params, cache = cache,
-            cached = cached, require_credentials = False)
+        objs = self._packages_method_getter("get_documents", params,
+            package_names, cache = cache, cached = cached)
         data = {}
         for package_name in package_names:
             objs_map = objs.get(package_name)
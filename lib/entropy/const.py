@@ -479,6 +479,9 @@ def const_default_settings(rootdir):
         'packagessha512fileext': ".sha512",
         'packagessha256fileext': ".sha256",
         'packagessha1fileext': ".sha1",
+        # Extension of the file that contains the block checksums
+        # manifest of its related file, see block-level sync
+        'blockmanifestfileext': ".blocks",
         # Supported Entropy Client package hashes encodings
         'packagehashes': ("sha1", "sha256", "sha512", "gpg"),
         # Used by Entropy client to override some digest checks
@@ -561,6 +564,10 @@ def const_default_settings(rootdir):
         'officialrepositoryid': "sabayonlinux.org",
         # tag to append to .tbz2 file before entropy database (must be 32bytes)
         'databasestarttag': "|ENTROPY:PROJECT:DB:MAGIC:START|",
+        # tag closing the fixed-size footer appended to .tbz2 file after
+        # entropy database, preceded by the database offset (8 bytes,
+        # big endian)
+        'databaseendtag': "|ENTROPY:PROJECT:DB:MAGIC:END|",
         # option to keep a backup of config files after
         # being overwritten by equo conf update
         'filesbackup': True,
@@ -9,8 +9,12 @@
     I{EntropyRepository} caching interface.
 
 """
+import sys
+import threading
 import weakref
 
+from collections import OrderedDict
+
 from entropy.core import Singleton
 
 import entropy.tools
@@ -20,59 +24,307 @@ class EntropyRepositoryCacher(Singleton):
     """
     Tiny singleton-based helper class used by EntropyRepository in order
     to keep cached items in RAM.
+
+    Cached items can belong to a namespace (EntropyRepository instances use
+    their live cache key prefix). Namespaces can be given a budget, in
+    number of entries and (estimated) bytes, through set_budget(): when
+    the budget is exceeded, least recently used items are evicted.
+    Hit, miss and eviction counters are kept for every item prefix
+    and can be retrieved through stats().
     """
+
+    # Object types stored through weak references by default. These
+    # are kept alive by their consumers and don't count against budgets.
+    WEAKREF_TYPES = (set, frozenset)
+
+    # Number of items sampled when estimating containers size
+    _SIZE_SAMPLES = 8
+
     def init_singleton(self):
+        # key -> (value, namespace, size), size is None for weak references
         self.__live_cache = {}
+        # namespace -> OrderedDict(key -> size), in LRU order, strong
+        # references only
+        self.__lru = {}
+        # namespace -> [entries, bytes]
+        self.__usage = {}
+        # namespace -> (max_entries, max_bytes)
+        self.__budgets = {}
+        # namespace -> {prefix -> [hits, misses, evictions]}
+        self.__stats = {}
+        self.__lock = threading.RLock()
+
+    @staticmethod
+    def _stats_prefix(item):
+        """
+        Return the statistics prefix of a cache item (without namespace),
+        for instance "checksum" for "checksum_False_True_True_False".
+        """
+        stripped = item.lstrip("_")
+        head = item[:len(item) - len(stripped)]
+        return head + stripped.split("_", 1)[0]
+
+    def _estimate_size(self, obj):
+        """
+        Return the estimated memory footprint of obj, in bytes. Containers
+        are estimated by sampling at most _SIZE_SAMPLES of their items.
+        """
+        size = sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            length = len(obj)
+            if not length:
+                return size
+            sample = 0
+            count = 0
+            for key, value in obj.items():
+                sample += self._estimate_size(key)
+                sample += self._estimate_size(value)
+                count += 1
+                if count >= self._SIZE_SAMPLES:
+                    break
+            return size + (sample * length) // count
+        if isinstance(obj, (list, tuple, set, frozenset)):
+            length = len(obj)
+            if not length:
+                return size
+            sample = 0
+            count = 0
+            for item in obj:
+                sample += self._estimate_size(item)
+                count += 1
+                if count >= self._SIZE_SAMPLES:
+                    break
+            return size + (sample * length) // count
+        return size
+
+    def _account(self, namespace, key, counter):
+        """
+        Increment the given statistics counter (0: hits, 1: misses,
+        2: evictions) for key. Must be called with the lock held.
+        """
+        item = key
+        if namespace and key.startswith(namespace):
+            item = key[len(namespace):]
+        ns_stats = self.__stats.setdefault(namespace, {})
+        prefix = self._stats_prefix(item)
+        counters = ns_stats.get(prefix)
+        if counters is None:
+            counters = [0, 0, 0]
+            ns_stats[prefix] = counters
+        counters[counter] += 1
+
+    def _remove(self, key):
+        """
+        Remove key from the cache, updating the namespace usage.
+        Must be called with the lock held.
+        """
+        entry = self.__live_cache.pop(key, None)
+        if entry is None:
+            return None
+        _value, namespace, size = entry
+        if size is None:
+            # weak references are not accounted
+            return entry
+        lru = self.__lru.get(namespace)
+        if lru is not None:
+            lru.pop(key, None)
+        usage = self.__usage.get(namespace)
+        if usage is not None:
+            usage[0] -= 1
+            usage[1] -= size
+        return entry
+
+    def _enforce_budget(self, namespace):
+        """
+        Evict least recently used items of namespace until its budget
+        is respected. Must be called with the lock held.
+        """
+        budget = self.__budgets.get(namespace)
+        if budget is None:
+            return
+        max_entries, max_bytes = budget
+        usage = self.__usage[namespace]
+        lru = self.__lru[namespace]
+        while lru:
+            over_entries = max_entries is not None and usage[0] > max_entries
+            over_bytes = max_bytes is not None and usage[1] > max_bytes
+            if not (over_entries or over_bytes):
+                break
+            key = next(iter(lru))
+            self._remove(key)
+            self._account(namespace, key, 2)
+
+    def set_budget(self, namespace, max_entries = None, max_bytes = None):
+        """
+        Set the cache budget for the given namespace. None means unlimited.
+
+        @param namespace: cache namespace (key prefix)
+        @type namespace: string
+        @keyword max_entries: maximum number of cached items
+        @type max_entries: int
+        @keyword max_bytes: maximum (estimated) size of cached items
+        @type max_bytes: int
+        """
+        with self.__lock:
+            if max_entries is None and max_bytes is None:
+                self.__budgets.pop(namespace, None)
+                return
+            self.__budgets[namespace] = (max_entries, max_bytes)
+            if namespace in self.__usage:
+                self._enforce_budget(namespace)
+
+    def usage(self, namespace):
+        """
+        Return the number of items and their estimated size in bytes
+        currently cached for namespace. Items held through weak
+        references are not counted.
+
+        @param namespace: cache namespace (key prefix)
+        @type namespace: string
+        @return: tuple composed by (entries, bytes)
+        @rtype: tuple
+        """
+        with self.__lock:
+            usage = self.__usage.get(namespace, (0, 0))
+            return usage[0], usage[1]
+
+    def stats(self, namespace = None):
+        """
+        Return the cache hit, miss and eviction counters for each item
+        prefix (for instance: "reverseDependenciesMetadata", "checksum").
+
+        @keyword namespace: restrict the counters to the given namespace
+        @type namespace: string
+        @return: dict composed by prefix -> {"hits": int, "misses": int,
+            "evictions": int}
+        @rtype: dict
+        """
+        with self.__lock:
+            if namespace is None:
+                sources = list(self.__stats.values())
+            else:
+                sources = [self.__stats.get(namespace, {})]
+            stats = {}
+            for ns_stats in sources:
+                for prefix, (hits, misses, evictions) in ns_stats.items():
+                    obj = stats.setdefault(prefix, {
+                        "hits": 0, "misses": 0, "evictions": 0})
+                    obj["hits"] += hits
+                    obj["misses"] += misses
+                    obj["evictions"] += evictions
+            return stats
 
     def clear(self):
         """
         Clear all the cached items
         """
-        self.__live_cache.clear()
+        with self.__lock:
+            self.__live_cache.clear()
+            self.__lru.clear()
+            self.__usage.clear()
 
     def clear_key(self, key):
         """
         Clear just the cached item at key (hash table).
         """
-        try:
-            del self.__live_cache[key]
-        except KeyError:
-            pass
+        with self.__lock:
+            self._remove(key)
 
     def keys(self):
         """
         Return a list of available cache keys
         """
-        return list(self.__live_cache.keys())
+        with self.__lock:
+            return list(self.__live_cache.keys())
 
     def discard(self, key):
         """
         Discard all the cache items with hash table key starting with "key".
         """
-        for dkey in tuple(self.__live_cache.keys()):
-            if dkey.startswith(key):
-                try:
-                    self.__live_cache.pop(dkey)
-                except KeyError:
-                    pass
+        with self.__lock:
+            for dkey in tuple(self.__live_cache.keys()):
+                if dkey.startswith(key):
+                    self._remove(dkey)
 
-    def get(self, key):
+    def get(self, key, namespace = None):
         """
         Get the cached item, if exists.
+
+        @param key: cache key
+        @type key: string
+        @keyword namespace: namespace the key belongs to, used for
+            accounting
+        @type namespace: string
         """
-        obj = self.__live_cache.get(key)
-        if isinstance(obj, weakref.ref):
-            return obj()
-        return obj
+        with self.__lock:
+            entry = self.__live_cache.get(key)
+            if entry is None:
+                self._account(namespace, key, 1)
+                return None
+
+            obj, namespace, size = entry
+            if isinstance(obj, weakref.ref):
+                obj = obj()
+                if obj is None:
+                    # referent is gone
+                    self._remove(key)
+                    self._account(namespace, key, 1)
+                    return None
+
+            if size is not None:
+                lru = self.__lru[namespace]
+                # move to the most recently used end
+                lru[key] = lru.pop(key)
+            self._account(namespace, key, 0)
+            return obj
 
-    def set(self, key, value):
+    def set(self, key, value, namespace = None, weak = None):
         """
         Set item in cache.
+
+        @param key: cache key
+        @type key: string
+        @param value: object to cache
+        @type value: any Python object
+        @keyword namespace: namespace the key belongs to, used for
+            budget enforcement and accounting
+        @type namespace: string
+        @keyword weak: store a weak reference to value. If None, weak
+            references are used for objects in WEAKREF_TYPES.
+        @type weak: bool
         """
-        if isinstance(value, (set, frozenset)):
-            self.__live_cache[key] = weakref.ref(value)
-        else:
-            self.__live_cache[key] = value
+        if weak is None:
+            weak = isinstance(value, self.WEAKREF_TYPES)
+
+        obj = value
+        size = None
+        if weak:
+            try:
+                obj = weakref.ref(value)
+            except TypeError:
+                # not weak referenceable
+                weak = False
+        if not weak:
+            size = self._estimate_size(value)
+
+        with self.__lock:
+            self._remove(key)
+            self.__live_cache[key] = (obj, namespace, size)
+            if size is None:
+                # weak references don't count against budgets
+                return
+            lru = self.__lru.get(namespace)
+            if lru is None:
+                lru = OrderedDict()
+                self.__lru[namespace] = lru
+            lru[key] = size
+            usage = self.__usage.get(namespace)
+            if usage is None:
+                usage = [0, 0]
+                self.__usage[namespace] = usage
+            usage[0] += 1
+            usage[1] += size
+            self._enforce_budget(namespace)
 
 
 class EntropyRepositoryCachePolicies(object):
@@ -88,9 +340,17 @@ class EntropyRepositoryCachePolicies(object):
         NONE,
         # All the queries that make sense to cache are cached in RAM.
         ALL,
-    ) = range(2)
+        # Like ALL, but the in-RAM cache of every repository is kept
+        # within BOUNDED_MAX_ENTRIES and BOUNDED_MAX_BYTES, evicting
+        # the least recently used items.
+        BOUNDED,
+    ) = range(3)
+
+    # Per-repository in-RAM cache budget used by the BOUNDED policy.
+    BOUNDED_MAX_ENTRIES = 512
+    BOUNDED_MAX_BYTES = 32 * 1024 * 1024
 
     if entropy.tools.total_memory() >= 4000:
         DEFAULT_CACHE_POLICY = ALL
     else:
-        DEFAULT_CACHE_POLICY = NONE
+        DEFAULT_CACHE_POLICY = BOUNDED
@@ -913,9 +913,10 @@ class EntropyMySQLRepository(EntropySQLRepository):
         except OSError:
             return 1
 
-    def exportRepository(self, dumpfile):
+    def exportRepository(self, dumpfile, binary = False):
         """
         Reimplemented from EntropyRepositoryBase.
+        The binary format is not supported, SQL is always written.
         """
         try:
             proc = subprocess.Popen(
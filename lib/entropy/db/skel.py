@@ -19,7 +19,6 @@ import contextlib
 import threading
 
 from entropy.i18n import _
-from entropy.exceptions import InvalidAtom
 from entropy.const import etpConst, const_cmp, const_debug_write, \
     const_convert_to_rawstring, const_mkstemp, const_is_python3
 from entropy.output import TextInterface, brown, bold, red, blue, purple, \
@@ -358,6 +357,66 @@ class EntropyRepositoryPluginStore(EntropyPluginStore):
         meta[key] = value
 
 
+class _AtomMatchMetadata(object):
+    """
+    Repository metadata proxy used by EntropyRepositoryBase.atomMatchMany().
+    Lookups of packages fetched through _atomMatchPrefetch() are served
+    from memory, everything else is forwarded to the repository.
+    """
+
+    def __init__(self, repository, names, metadata):
+        self._repository = repository
+        self._names = names
+        self._metadata = metadata
+        self._by_name = {}
+        for package_id, data in metadata.items():
+            obj = self._by_name.setdefault(data[1], [])
+            obj.append(package_id)
+
+    def __getattr__(self, name):
+        return getattr(self._repository, name)
+
+    def searchName(self, keyword, sensitive = False, just_id = False):
+        if sensitive and just_id and keyword in self._names:
+            return tuple(self._by_name.get(keyword, ()))
+        return self._repository.searchName(
+            keyword, sensitive = sensitive, just_id = just_id)
+
+    def searchNameCategory(self, name, category, just_id = False):
+        if just_id and name in self._names:
+            return frozenset((x for x in self._by_name.get(name, ()) \
+                                  if self._metadata[x][0] == category))
+        return self._repository.searchNameCategory(
+            name, category, just_id = just_id)
+
+    def _get(self, package_id, index, getter):
+        data = self._metadata.get(package_id)
+        if data is None:
+            return getter(package_id)
+        return data[index]
+
+    def retrieveCategory(self, package_id):
+        return self._get(package_id, 0, self._repository.retrieveCategory)
+
+    def retrieveKeySplit(self, package_id):
+        data = self._metadata.get(package_id)
+        if data is None:
+            return self._repository.retrieveKeySplit(package_id)
+        return data[0], data[1]
+
+    def retrieveVersion(self, package_id):
+        return self._get(package_id, 2, self._repository.retrieveVersion)
+
+    def retrieveTag(self, package_id):
+        return self._get(package_id, 3, self._repository.retrieveTag)
+
+    def retrieveRevision(self, package_id):
+        return self._get(package_id, 4, self._repository.retrieveRevision)
+
+    def retrieveSlot(self, package_id):
+        return self._get(package_id, 5, self._repository.retrieveSlot)
+
+
 class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
     """
     EntropyRepository interface base class.
@@ -1980,6 +2039,37 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
 
         return data
 
+    def getPackagesData(self, package_ids, get_content = True,
+            content_insert_formatted = False, get_changelog = True,
+            get_content_safety = True):
+        """
+        Reconstruct all the package metadata belonging to the provided
+        package identifiers, see getPackageData(). Metadata is generated
+        package by package, in the same order of package_ids, so that
+        memory usage is bounded even when many packages are requested.
+        Subclasses should reimplement this to fetch metadata in bulk.
+
+        @param package_ids: package indentifiers
+        @type package_ids: iterable
+        @keyword get_content: see getPackageData()
+        @type get_content: bool
+        @keyword content_insert_formatted: see getPackageData()
+        @type content_insert_formatted: bool
+        @keyword get_changelog: see getPackageData()
+        @type get_changelog: bool
+        @keyword get_content_safety: see getPackageData()
+        @type get_content_safety: bool
+        @return: iterator of tuples composed by (package_id, package
+            metadata), the latter is None if package_id is not available
+        @rtype: iterator
+        """
+        for package_id in package_ids:
+            yield package_id, self.getPackageData(
+                package_id, get_content = get_content,
+                content_insert_formatted = content_insert_formatted,
+                get_changelog = get_changelog,
+                get_content_safety = get_content_safety)
+
     def getPackageXmlData(self, package_ids, get_content=True,
                           get_changelog=True, get_content_safety=True):
         """
@@ -2010,11 +2100,10 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         package_changelogs_id = 1
         package_changelogs = {}
 
-        for package_id in package_ids:
-            data = self.getPackageData(
-                package_id, get_content = get_content,
+        for package_id, data in self.getPackagesData(
+                package_ids, get_content = get_content,
                 get_changelog = get_changelog,
-                get_content_safety = get_content_safety)
+                get_content_safety = get_content_safety):
 
             package = doc.createElement("package")
             package.setAttribute("id", "id-%d" % (package_id,))
@@ -3475,6 +3564,61 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def retrieveDependenciesListMap(self, package_ids, exclude_deptypes = None):
+        """
+        Return the dependencies, including conflicts, of many packages at
+        once. Conditional dependencies are not resolved.
+        This is equivalent to calling retrieveDependenciesList() with
+        resolve_conditional_deps = False for every package identifier, but
+        subclasses can implement it much more efficiently.
+
+        @param package_ids: list of package indentifiers
+        @type package_ids: iterable
+        @keyword exclude_deptypes: exclude given dependency types from returned
+            data. Please see etpConst['dependency_type_ids'] for valid values.
+            Anything != int will raise AttributeError
+        @type exclude_deptypes: iterable of ints
+        @return: dict composed by package_id -> frozenset of dependencies
+        @rtype: dict
+        @raise AttributeError: if exclude_deptypes contains illegal values
+        """
+        return dict((package_id, self.retrieveDependenciesList(
+                    package_id, exclude_deptypes = exclude_deptypes,
+                    resolve_conditional_deps = False)) \
+                        for package_id in package_ids)
+
+    def retrieveDependenciesMap(self, package_ids, deptype = None,
+        exclude_deptypes = None, resolve_conditional_deps = True):
+        """
+        Return the dependencies of many packages at once.
+        This is equivalent to calling retrieveDependencies() for every
+        package identifier, but subclasses can implement it much more
+        efficiently.
+
+        @param package_ids: list of package indentifiers
+        @type package_ids: iterable
+        @keyword deptype: return only given type of dependencies
+            see etpConst['dependency_type_ids']['*depend_id'] for dependency type
+            identifiers
+        @type deptype: bool
+        @keyword exclude_deptypes: exclude given dependency types from returned
+            data. Please see etpConst['dependency_type_ids'] for valid values.
+            Anything != int will raise AttributeError
+        @type exclude_deptypes: iterable of ints
+        @keyword resolve_conditional_deps: resolve conditional dependencies
+            automatically by default, stuff like
+            ( app-foo/foo | app-foo/bar ) & bar-baz/foo
+        @type resolve_conditional_deps: bool
+        @return: dict composed by package_id -> frozenset of dependencies
+        @rtype: dict
+        @raise AttributeError: if exclude_deptypes contains illegal values
+        """
+        return dict((package_id, self.retrieveDependencies(
+                    package_id, deptype = deptype,
+                    exclude_deptypes = exclude_deptypes,
+                    resolve_conditional_deps = resolve_conditional_deps)) \
+                        for package_id in package_ids)
+
     def retrieveKeywords(self, package_id):
         """
         Return package SPM keyword list for given package identifier.
@@ -3486,6 +3630,21 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def retrieveKeywordsMap(self, package_ids):
+        """
+        Return the SPM keywords of many packages at once.
+        This is equivalent to calling retrieveKeywords() for every
+        package identifier, but subclasses can implement it much more
+        efficiently.
+
+        @param package_ids: list of package indentifiers
+        @type package_ids: iterable
+        @return: dict composed by package_id -> frozenset of keywords
+        @rtype: dict
+        """
+        return dict((package_id, self.retrieveKeywords(package_id)) \
+                        for package_id in package_ids)
+
     def retrieveProtect(self, package_id):
         """
         Return CONFIG_PROTECT (configuration file protection) string
@@ -3758,6 +3917,21 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def retrieveLicenseMap(self, package_ids):
+        """
+        Return the "license" metadatum of many packages at once.
+        This is equivalent to calling retrieveLicense() for every
+        package identifier, but subclasses can implement it much more
+        efficiently.
+
+        @param package_ids: list of package indentifiers
+        @type package_ids: iterable
+        @return: dict composed by package_id -> license string (or None)
+        @rtype: dict
+        """
+        return dict((package_id, self.retrieveLicense(package_id)) \
+                        for package_id in package_ids)
+
     def retrieveCompileFlags(self, package_id):
         """
         Return Compiler flags during building of package.
@@ -3800,6 +3974,29 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def retrieveReverseDependenciesMap(self, package_ids,
+                                       exclude_deptypes = None):
+        """
+        Return reverse (or inverse) dependencies for many packages at once.
+        This is equivalent to calling retrieveReverseDependencies() for
+        every package identifier, but subclasses can implement it
+        much more efficiently.
+
+        @param package_ids: list of package indentifiers
+        @type package_ids: iterable
+        @keyword exclude_deptypes: exclude given dependency types from returned
+            data. Please see etpConst['dependency_type_ids'] for valid values.
+            Anything != int will raise AttributeError
+        @type exclude_deptypes: iterable of ints
+        @return: dict composed by package_id -> frozenset of reverse
+            dependency package identifiers
+        @rtype: dict
+        @raise AttributeError: if exclude_deptypes contains illegal values
+        """
+        return dict((package_id, self.retrieveReverseDependencies(
+                    package_id, exclude_deptypes = exclude_deptypes)) \
+                        for package_id in package_ids)
+
     def retrieveUnusedPackageIds(self):
         """
         Return packages (through their identifiers) not referenced by any
@@ -3986,6 +4183,25 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def searchBelongsMap(self, paths):
+        """
+        Search the packages owning many file paths at once.
+        This is equivalent to calling searchBelongs() for every path,
+        but subclasses can implement it much more efficiently.
+
+        @param paths: list of file paths to search
+        @type paths: iterable
+        @return: dict composed by path -> frozenset of package identifiers,
+            paths not owned by any package are not returned
+        @rtype: dict
+        """
+        result = {}
+        for path in paths:
+            package_ids = self.searchBelongs(path)
+            if package_ids:
+                result[path] = package_ids
+        return result
+
     def searchContentSafety(self, sfile):
         """
         Search content safety metadata (usually, sha256 and mtime) related to
@@ -4225,6 +4441,28 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def searchRanked(self, keyword, description = False):
+        """
+        Search packages using given keyword, returning package identifiers
+        ordered by relevance. Package names matching exactly are more
+        relevant than package names starting with keyword, which are
+        more relevant than atoms and provides containing it. If
+        description is True, package descriptions (all the keyword
+        words must be found) and use flags are searched as well, with
+        the lowest relevance.
+
+        @param keyword: search term
+        @type keyword: string
+        @keyword description: also search through package description and
+            use flags
+        @type description: bool
+        @return: tuple of tuples of length 2 composed by package identifier
+            and relevance score (float, the higher the better), sorted by
+            descending relevance
+        @rtype: tuple
+        """
+        raise NotImplementedError()
+
     def searchUseflag(self, keyword, just_id = False):
         """
         Search packages using given use flag string as keyword. An exact search
@@ -4633,11 +4871,13 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
 
         maxcount = len(added_ids)
         mycount = 0
-        for package_id in added_ids:
+        for package_id, mydata in dbconn.getPackagesData(
+                sorted(added_ids), get_content = True,
+                content_insert_formatted = True):
             mycount += 1
             mytxt = "%s: %s" % (
                 red(_("Adding entry")),
-                blue(str(dbconn.retrieveAtom(package_id))),
+                blue(str(mydata['atom'])),
             )
             self.output(
                 mytxt,
@@ -4647,8 +4887,6 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
                 back = True,
                 count = (mycount, maxcount)
             )
-            mydata = dbconn.getPackageData(package_id, get_content = True,
-                content_insert_formatted = True)
             self.addPackage(
                 mydata,
                 revision = mydata['revision'],
@@ -4687,12 +4925,16 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
-    def exportRepository(self, dumpfile):
+    def exportRepository(self, dumpfile, binary = False):
         """
         Export running database to file.
 
         @param dumpfile: dump file object to write to
         @type dumpfile: file object (hint: open())
+        @keyword binary: write a backend specific binary dump, which can
+            only be read by importRepository(), instead of SQL statements
+            (if supported)
+        @type binary: bool
         """
         raise NotImplementedError()
 
@@ -4989,6 +5231,22 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         return package_id, 0
 
+    def maskFilterMany(self, package_ids, live = True):
+        """
+        Apply maskFilter() to all the given package identifiers at once.
+        Subclasses can reimplement this in order to speed up bulk
+        filtering.
+
+        @param package_ids: package indentifiers
+        @type package_ids: iterable
+        @keyword live: use live masking feature
+        @type live: bool
+        @return: dict composed by package_id -> maskFilter() return value
+        @rtype: dict
+        """
+        return dict((package_id, self.maskFilter(package_id, live = live)) \
+                        for package_id in package_ids)
+
     def atomMatchCacheKey(self):
         """
         Return a string that shall be used as part of the atomMatch cache key
@@ -5046,76 +5304,150 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
                 if rc == 0:
                     return data, rc
 
-        matchTag = entropy.dep.dep_gettag(atom)
-        try:
-            matchUse = entropy.dep.dep_getusedeps(atom)
-        except InvalidAtom:
-            matchUse = ()
-        atomSlot = entropy.dep.dep_getslot(atom)
-        matchRevision = entropy.dep.dep_get_entropy_revision(atom)
-        if isinstance(matchRevision, int):
-            if matchRevision < 0:
-                matchRevision = None
-
-        # use match
-        scan_atom = entropy.dep.remove_usedeps(atom)
-        # tag match
-        scan_atom = entropy.dep.remove_tag(scan_atom)
-
-        # slot match
-        scan_atom = entropy.dep.remove_slot(scan_atom)
-        if (matchSlot is None) and (atomSlot is not None):
-            matchSlot = atomSlot
+        parsed = self.__atomMatchParse(atom)
+        found_ids, default_package_ids = self.__atomMatchFindIds(
+            parsed, matchSlot, multiMatch, self)
+        if found_ids and maskFilter:
+            def _filter(pkg_id):
+                pkg_id, pkg_reason = self.maskFilter(pkg_id)
+                return pkg_id != -1
+            found_ids = set(filter(_filter, found_ids))
 
-        # revision match
-        scan_atom = entropy.dep.remove_entropy_revision(scan_atom)
+        return self.__atomMatchResult(atom, parsed, found_ids,
+            default_package_ids, matchSlot, multiMatch, maskFilter,
+            extendedResults, self)
 
-        direction = ''
-        justname = True
-        pkgkey = ''
-        pkgname = ''
-        pkgcat = ''
-        pkgversion = ''
-        stripped_atom = ''
-        found_ids = []
-        default_package_ids = None
+    def atomMatchMany(self, atoms, matchSlot = None, multiMatch = False,
+        maskFilter = True, extendedResults = False, useCache = True):
+        """
+        Match the given atoms (or dependencies) in repository, returning
+        the same results of atomMatch(). Every atom is parsed once, the
+        metadata of the candidate packages is fetched at once through
+        _atomMatchPrefetch() and the masking filter is applied through
+        maskFilterMany().
 
-        if scan_atom:
+        @param atoms: list of atoms or dependencies to match in repository
+        @type atoms: iterable
+        @keyword matchSlot: match packages with given slot
+        @type matchSlot: string
+        @keyword multiMatch: match all the available packages, not just the
+            best one
+        @type multiMatch: bool
+        @keyword maskFilter: enable package masking filter
+        @type maskFilter: bool
+        @keyword extendedResults: return extended results
+        @type extendedResults: bool
+        @keyword useCache: use on-disk cache
+        @type useCache: bool
+        @return: dict composed by atom -> atomMatch() return value
+        @rtype: dict
+        """
+        results = {}
+        pending = []
+        for atom in atoms:
+            if atom in results:
+                continue
 
-            while True:
-                # check for direction
-                scan_cpv = entropy.dep.dep_getcpv(scan_atom)
-                stripped_atom = scan_cpv
-                if scan_atom.endswith("*"):
-                    stripped_atom += "*"
-                direction = scan_atom[0:-len(stripped_atom)]
-
-                justname = entropy.dep.isjustname(scan_cpv)
-                pkgkey = stripped_atom
-                if justname == 0:
-                    # get version
-                    data = entropy.dep.catpkgsplit(scan_cpv)
-                    if data is None:
-                        break # badly formatted
-                    wildcard = ""
-                    if scan_atom.endswith("*"):
-                        wildcard = "*"
-                    pkgversion = data[2]+wildcard+"-"+data[3]
-                    pkgkey = entropy.dep.dep_getkey(stripped_atom)
-
-                splitkey = pkgkey.split("/")
-                if (len(splitkey) == 2):
-                    pkgcat, pkgname = splitkey
-                else:
-                    pkgcat, pkgname = "null", splitkey[0]
+            if not atom or atom.endswith(etpConst['entropyordepquestion']):
+                # nothing to gain here
+                results[atom] = self.atomMatch(atom, matchSlot = matchSlot,
+                    multiMatch = multiMatch, maskFilter = maskFilter,
+                    extendedResults = extendedResults, useCache = useCache)
+                continue
 
-                break
+            if useCache:
+                cached = self.__atomMatchFetchCache(atom, matchSlot,
+                    multiMatch, maskFilter, extendedResults)
+                if cached is not None:
+                    results[atom] = cached
+                    continue
 
+            results[atom] = None
+            pending.append((atom, self.__atomMatchParse(atom)))
+
+        if not pending:
+            return results
+
+        names = set()
+        for atom, parsed in pending:
+            scan_atom, pkgname = parsed[0], parsed[8]
+            if scan_atom:
+                names.add(pkgname)
+
+        meta = self
+        metadata = self._atomMatchPrefetch(names)
+        if metadata is not None:
+            meta = _AtomMatchMetadata(self, names, metadata)
+
+        found = []
+        candidate_ids = set()
+        for atom, parsed in pending:
+            found_ids, default_package_ids = self.__atomMatchFindIds(
+                parsed, matchSlot, multiMatch, meta)
+            found.append((found_ids, default_package_ids))
+            candidate_ids.update(found_ids)
+
+        masks = None
+        if maskFilter and candidate_ids:
+            masks = self.maskFilterMany(candidate_ids)
+
+        for (atom, parsed), (found_ids, default_package_ids) in zip(
+                pending, found):
+            if found_ids and masks is not None:
+                found_ids = set((pkg_id for pkg_id in found_ids \
+                                     if masks[pkg_id][0] != -1))
+            results[atom] = self.__atomMatchResult(atom, parsed, found_ids,
+                default_package_ids, matchSlot, multiMatch, maskFilter,
+                extendedResults, meta)
+
+        return results
+
+    def _atomMatchPrefetch(self, names):
+        """
+        Fetch, at once, the metadata used by atomMatchMany() of all the
+        packages with the given names. The base implementation returns
+        None, meaning that metadata is retrieved package by package.
+
+        @param names: package names
+        @type names: set
+        @return: dict composed by package_id -> (category, name, version,
+            versiontag, revision, slot) or None
+        @rtype: dict or None
+        """
+        return None
 
+    def __atomMatchParse(self, atom):
+        """
+        Parse atom, as required by atomMatch(). The returned tuple must be
+        considered opaque.
+        """
+        parsed = entropy.dep.parse_atom(atom)
+        return (parsed.scan_atom, parsed.tag, parsed.usedeps, parsed.slot,
+                parsed.revision, parsed.direction, parsed.justname,
+                parsed.key, parsed.name, parsed.category, parsed.version,
+                parsed.stripped_atom)
+
+    def __atomMatchFindIds(self, parsed, matchSlot, multiMatch, meta):
+        """
+        Return the package identifiers matching the parsed atom (see
+        __atomMatchParse()) and the old-style virtual packages ones, if
+        any. Package masking is not applied here.
+        Repository metadata is read through meta, which is either
+        the repository itself or an _AtomMatchMetadata instance.
+        """
+        (scan_atom, matchTag, matchUse, atomSlot, matchRevision,
+         direction, justname, pkgkey, pkgname, pkgcat, pkgversion,
+         stripped_atom) = parsed
+        if (matchSlot is None) and (atomSlot is not None):
+            matchSlot = atomSlot
+
+        found_ids = []
+        default_package_ids = None
+        if scan_atom:
             # IDs found in the database that match our search
             try:
                 found_ids, default_package_ids = self.__generate_found_ids_match(
-                    pkgkey, pkgname, pkgcat, multiMatch)
+                    pkgkey, pkgname, pkgcat, multiMatch, meta)
             except OperationalError:
                 # we are fault tolerant, cannot crash because
                 # tables are not available and validateDatabase()
@@ -5124,23 +5456,31 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
                 # default_package_ids = None
                 pass
 
-        ### FILTERING
         # filter slot and tag
         if found_ids:
             found_ids = self.__filterSlotTagUse(found_ids, matchSlot,
-                matchTag, matchUse, direction)
-            if maskFilter:
-                def _filter(pkg_id):
-                    pkg_id, pkg_reason = self.maskFilter(pkg_id)
-                    return pkg_id != -1
-                found_ids = set(filter(_filter, found_ids))
+                matchTag, matchUse, direction, meta)
+
+        return found_ids, default_package_ids
 
-        ### END FILTERING
+    def __atomMatchResult(self, atom, parsed, found_ids,
+                          default_package_ids, matchSlot, multiMatch,
+                          maskFilter, extendedResults, meta):
+        """
+        Select the best match among found_ids (see __atomMatchFindIds()),
+        store it in cache and return it in the atomMatch() format.
+        """
+        (scan_atom, matchTag, matchUse, atomSlot, matchRevision,
+         direction, justname, pkgkey, pkgname, pkgcat, pkgversion,
+         stripped_atom) = parsed
+        if (matchSlot is None) and (atomSlot is not None):
+            matchSlot = atomSlot
 
         dbpkginfo = set()
         if found_ids:
             dbpkginfo = self.__handle_found_ids_match(found_ids, direction,
-                matchTag, matchRevision, justname, stripped_atom, pkgversion)
+                matchTag, matchRevision, justname, stripped_atom, pkgversion,
+                meta)
 
         if not dbpkginfo:
             if extendedResults:
@@ -5168,8 +5508,8 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
 
         if multiMatch:
             if extendedResults:
-                x = set([(x[0], 0, x[1], self.retrieveTag(x[0]), \
-                    self.retrieveRevision(x[0])) for x in dbpkginfo])
+                x = set([(x[0], 0, x[1], meta.retrieveTag(x[0]), \
+                    meta.retrieveRevision(x[0])) for x in dbpkginfo])
                 self.__atomMatchStoreCache(
                     atom, matchSlot,
                     multiMatch, maskFilter,
@@ -5188,8 +5528,8 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         if len(dbpkginfo) == 1:
             x = dbpkginfo.pop()
             if extendedResults:
-                x = (x[0], 0, x[1], self.retrieveTag(x[0]),
-                    self.retrieveRevision(x[0]),)
+                x = (x[0], 0, x[1], meta.retrieveTag(x[0]),
+                    meta.retrieveRevision(x[0]),)
 
                 self.__atomMatchStoreCache(
                     atom, matchSlot,
@@ -5223,8 +5563,8 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         versions = set()
 
         for x in dbpkginfo:
-            info_tuple = (x[1], self.retrieveTag(x[0]), \
-                self.retrieveRevision(x[0]))
+            info_tuple = (x[1], meta.retrieveTag(x[0]), \
+                meta.retrieveRevision(x[0]))
             versions.add(info_tuple)
             pkgdata[info_tuple] = x[0]
 
@@ -5276,13 +5616,15 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
             )
             return x, rc
 
-    def __generate_found_ids_match(self, pkgkey, pkgname, pkgcat, multiMatch):
+
+    def __generate_found_ids_match(self, pkgkey, pkgname, pkgcat, multiMatch,
+                                   meta):
 
         if pkgcat == "null":
-            results = self.searchName(pkgname, sensitive = True,
+            results = meta.searchName(pkgname, sensitive = True,
                 just_id = True)
         else:
-            results = self.searchNameCategory(pkgname, pkgcat, just_id = True)
+            results = meta.searchNameCategory(pkgname, pkgcat, just_id = True)
 
         old_style_virtuals = None
         # if it's a PROVIDE, search with searchProvide
@@ -5290,7 +5632,7 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         if (not results) and (pkgcat == self.VIRTUAL_META_PACKAGE_CATEGORY):
 
             # look for default old-style virtual
-            virtuals = self.searchProvidedVirtualPackage(pkgkey)
+            virtuals = meta.searchProvidedVirtualPackage(pkgkey)
             if virtuals:
                 old_style_virtuals = set([x[0] for x in virtuals if x[1]])
                 flat_virtuals = [x[0] for x in virtuals]
@@ -5315,7 +5657,7 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
             found_id = None
             cats = set()
             for package_id in results:
-                cat = self.retrieveCategory(package_id)
+                cat = meta.retrieveCategory(package_id)
                 cats.add(cat)
                 if (cat == pkgcat) or \
                     ((pkgcat == self.VIRTUAL_META_PACKAGE_CATEGORY) and \
@@ -5340,7 +5682,7 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
             # we need to search using the category
             if (not multiMatch) and (pkgcat == "null"):
                 # we searched by name, we need to search using category
-                results = self.searchNameCategory(
+                results = meta.searchNameCategory(
                     pkgname, pkgcat, just_id = True)
 
             # if we get here, we have found the needed IDs
@@ -5356,11 +5698,11 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
             (old_style_virtuals is not None):
             # in case of virtual packages only
             # (that they're not stored as provide)
-            pkgcat, pkgname = self.retrieveKeySplit(package_id)
+            pkgcat, pkgname = meta.retrieveKeySplit(package_id)
 
         # check if category matches
         if pkgcat != "null":
-            found_cat = self.retrieveCategory(package_id)
+            found_cat = meta.retrieveCategory(package_id)
             if pkgcat == found_cat:
                 return set([package_id]), old_style_virtuals
             del results
@@ -5372,7 +5714,7 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
 
 
     def __handle_found_ids_match(self, found_ids, direction, matchTag,
-            matchRevision, justname, stripped_atom, pkgversion):
+            matchRevision, justname, stripped_atom, pkgversion, meta):
 
         dbpkginfo = set()
         # now we have to handle direction
@@ -5403,7 +5745,7 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
 
                 for package_id in found_ids:
 
-                    dbver = self.retrieveVersion(package_id)
+                    dbver = meta.retrieveVersion(package_id)
                     if (direction == "~"):
                         myrev = entropy.dep.dep_get_spm_revision(
                             dbver)
@@ -5417,7 +5759,7 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
                             if dbver.startswith(pkgversion[:-1]):
                                 dbpkginfo.add((package_id, dbver))
                         elif (matchRevision is not None) and (pkgversion == dbver):
-                            dbrev = self.retrieveRevision(package_id)
+                            dbrev = meta.retrieveRevision(package_id)
                             if dbrev == matchRevision:
                                 dbpkginfo.add((package_id, dbver))
                         elif (pkgversion == dbver) and (matchRevision is None):
@@ -5437,14 +5779,14 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
                         revcmp = 0
                         tagcmp = 0
                         if matchRevision is not None:
-                            dbrev = self.retrieveRevision(package_id)
+                            dbrev = meta.retrieveRevision(package_id)
                             revcmp = const_cmp(matchRevision, dbrev)
 
                         if matchTag is not None:
-                            dbtag = self.retrieveTag(package_id)
+                            dbtag = meta.retrieveTag(package_id)
                             tagcmp = const_cmp(matchTag, dbtag)
 
-                        dbver = self.retrieveVersion(package_id)
+                        dbver = meta.retrieveVersion(package_id)
                         pkgcmp = entropy.dep.compare_versions(
                             pkgversion, dbver)
 
@@ -5505,7 +5847,7 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
 
         else: # just the key
 
-            dbpkginfo = set([(x, self.retrieveVersion(x),) for x in found_ids])
+            dbpkginfo = set([(x, meta.retrieveVersion(x),) for x in found_ids])
 
         return dbpkginfo
 
@@ -5548,27 +5890,27 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
                 kwargs.get('result'),
                 async = False)
 
-    def __filterSlot(self, package_id, slot):
+    def __filterSlot(self, package_id, slot, meta):
         if slot is None:
             return package_id
-        dbslot = self.retrieveSlot(package_id)
+        dbslot = meta.retrieveSlot(package_id)
         if dbslot == slot:
             return package_id
 
-    def __filterTag(self, package_id, tag, operators):
+    def __filterTag(self, package_id, tag, operators, meta):
         if tag is None:
             return package_id
 
-        dbtag = self.retrieveTag(package_id)
+        dbtag = meta.retrieveTag(package_id)
         compare = const_cmp(tag, dbtag)
         # cannot do operator compare because it breaks the tag concept
         if compare == 0:
             return package_id
 
-    def __filterUse(self, package_id, uses):
+    def __filterUse(self, package_id, uses, meta):
         if not uses:
             return package_id
-        pkguse = set(self.retrieveUseflags(package_id))
+        pkguse = set(meta.retrieveUseflags(package_id))
         enabled = set([x for x in uses if not x.startswith("-")])
         disabled = set(uses) - enabled
 
@@ -5635,19 +5977,20 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
             return None
         return package_id
 
-    def __filterSlotTagUse(self, found_ids, slot, tag, use, operators):
+    def __filterSlotTagUse(self, found_ids, slot, tag, use, operators,
+                           meta):
 
         def myfilter(package_id):
 
-            package_id = self.__filterSlot(package_id, slot)
+            package_id = self.__filterSlot(package_id, slot, meta)
             if not package_id:
                 return False
 
-            package_id = self.__filterUse(package_id, use)
+            package_id = self.__filterUse(package_id, use, meta)
             if not package_id:
                 return False
 
-            package_id = self.__filterTag(package_id, tag, operators)
+            package_id = self.__filterTag(package_id, tag, operators, meta)
             if not package_id:
                 return False
 
@@ -11,6 +11,7 @@
 
 """
 import os
+import copy
 import hashlib
 import itertools
 import time
@@ -31,7 +32,8 @@ import entropy.dep
 import entropy.tools
 
 from entropy.db.skel import EntropyRepositoryBase
-from entropy.db.cache import EntropyRepositoryCacher
+from entropy.db.cache import EntropyRepositoryCacher, \
+    EntropyRepositoryCachePolicies
 from entropy.db.exceptions import Warning, Error, InterfaceError, \
     DatabaseError, DataError, OperationalError, IntegrityError, \
     InternalError, ProgrammingError, NotSupportedError
@@ -606,6 +608,17 @@ class EntropySQLRepository(EntropyRepositoryBase):
     # "UPDATE OR REPLACE" dialect
     _UPDATE_OR_REPLACE = None
 
+    # maximum number of package names per _atomMatchPrefetch() query
+    _ATOM_MATCH_PREFETCH_CHUNK = 256
+
+    # maximum number of package identifiers per retrieve*Map() query
+    _PACKAGE_IDS_QUERY_CHUNK = 256
+
+    # settings table entry containing the incrementally
+    # maintained checksum state, see _storeChecksumState()
+    _CHECKSUM_STATE_SETTING = "_checksum_state"
+    _CHECKSUM_STATE_VERSION = "2"
+
     _MAIN_THREAD = threading.current_thread()
 
     @classmethod
@@ -637,6 +650,12 @@ class EntropySQLRepository(EntropyRepositoryBase):
                                        temporary, name, direct=direct,
                                        cache_policy=cache_policy)
 
+        if self.cache_policy() == EntropyRepositoryCachePolicies.BOUNDED:
+            self._live_cacher.set_budget(
+                self._getLiveCacheKey(),
+                max_entries=EntropyRepositoryCachePolicies.BOUNDED_MAX_ENTRIES,
+                max_bytes=EntropyRepositoryCachePolicies.BOUNDED_MAX_BYTES)
+
     def _cursor_connection_pool_key(self):
         """
         Return the Cursor and Connection Pool key
@@ -859,13 +878,15 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Save a new key -> value pair to the in-memory cache.
         """
-        self._live_cacher.set(self._getLiveCacheKey() + key, value)
+        namespace = self._getLiveCacheKey()
+        self._live_cacher.set(namespace + key, value, namespace=namespace)
 
     def _getLiveCache(self, key):
         """
         Lookup a key value from the in-memory cache.
         """
-        return self._live_cacher.get(self._getLiveCacheKey() + key)
+        namespace = self._getLiveCacheKey()
+        return self._live_cacher.get(namespace + key, namespace=namespace)
 
     def _getLiveCacheKey(self):
         """
@@ -1007,6 +1028,8 @@ class EntropySQLRepository(EntropyRepositoryBase):
             # to disk, causing a tricky race condition hard to exploit.
             # So, FIRST commit changes, then call plugins.
             try:
+                if not self.readonly():
+                    self._storeChecksumState()
                 self._connection().commit()
             except OperationalError as err:
                 # catch stupid sqlite3 error
@@ -1023,6 +1046,8 @@ class EntropySQLRepository(EntropyRepositoryBase):
         Reimplemented from EntropyRepositoryBase.
         """
         self._connection().rollback()
+        # the in-memory checksum state may refer to discarded changes
+        self._clearLiveCache("checksumState")
 
     def initializeRepository(self):
         """
@@ -1383,6 +1408,8 @@ class EntropySQLRepository(EntropyRepositoryBase):
         if original_repository is not None:
             self.storeInstalledPackage(package_id, original_repository)
 
+        self._updateSearchIndex(package_id)
+
         # baseinfo and extrainfo are tainted
         # ensure that cache is clear even here
         self.clearCache()
@@ -1405,7 +1432,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
                 formatted_content = formatted_content)
             return package_id
         except:
-            self._connection().rollback()
+            self.rollback()
             raise
 
     def removePackage(self, package_id, from_add_package = False):
@@ -1419,10 +1446,12 @@ class EntropySQLRepository(EntropyRepositoryBase):
                 package_id, from_add_package = from_add_package)
             self.clearCache()
 
-            return self._removePackage(package_id,
+            removed = self._removePackage(package_id,
                 from_add_package = from_add_package)
+            self._updateSearchIndex(package_id)
+            return removed
         except:
-            self._connection().rollback()
+            self.rollback()
             raise
 
     def _removePackage(self, package_id, from_add_package = False):
@@ -1503,7 +1532,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
         cur = self._cursor().execute("""
         INSERT INTO dependenciesreference VALUES (NULL, ?)
         """, (dependency,))
-        return cur.lastrowid
+        iddependency = cur.lastrowid
+        self._updateReverseDependenciesMetadata(iddependency, dependency)
+        return iddependency
 
     def _addKeyword(self, keyword):
         """
@@ -1622,6 +1653,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cursor().execute("""
         UPDATE baseinfo SET name = ? WHERE idpackage = ?
         """, (name, package_id,))
+        self._updateSearchIndex(package_id)
 
     def setDependency(self, iddependency, dependency):
         """
@@ -1631,6 +1663,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         UPDATE dependenciesreference SET dependency = ?
         WHERE iddependency = ?
         """, (dependency, iddependency,))
+        self._updateReverseDependenciesMetadata(iddependency, dependency)
 
     def setAtom(self, package_id, atom):
         """
@@ -1639,6 +1672,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cursor().execute("""
         UPDATE baseinfo SET atom = ? WHERE idpackage = ?
         """, (atom, package_id,))
+        self._updateSearchIndex(package_id)
 
     def setSlot(self, package_id, slot):
         """
@@ -2582,6 +2616,385 @@ class EntropySQLRepository(EntropyRepositoryBase):
         cur = self._cursor().execute(sql, (package_id,))
         return cur.fetchone()
 
+    def getPackagesData(self, package_ids, get_content = True,
+            content_insert_formatted = False, get_changelog = True,
+            get_content_safety = True):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        Package identifiers are processed in chunks and every metadata
+        table is read using a single query per chunk.
+        """
+        package_ids = list(package_ids)
+        chunk_size = self._PACKAGE_IDS_QUERY_CHUNK
+        for idx in range(0, len(package_ids), chunk_size):
+            chunk = package_ids[idx:idx + chunk_size]
+            pkgs_data = self._getPackagesDataChunk(
+                frozenset(chunk), get_content, content_insert_formatted,
+                get_changelog, get_content_safety)
+            seen = set()
+            for package_id in chunk:
+                data = pkgs_data.get(package_id)
+                if package_id in seen:
+                    # callers are allowed to modify the returned metadata
+                    data = copy.deepcopy(data)
+                seen.add(package_id)
+                yield package_id, data
+
+    def _getPackagesDataChunk(self, package_ids, get_content,
+            content_insert_formatted, get_changelog, get_content_safety):
+        """
+        Reconstruct the metadata of the given package identifiers, the
+        result must match what getPackageData() returns for each of them.
+        The amount of package identifiers must be bounded by the caller,
+        see getPackagesData().
+
+        @param package_ids: package identifiers
+        @type package_ids: frozenset
+        @param get_content: see getPackageData()
+        @type get_content: bool
+        @param content_insert_formatted: see getPackageData()
+        @type content_insert_formatted: bool
+        @param get_changelog: see getPackageData()
+        @type get_changelog: bool
+        @param get_content_safety: see getPackageData()
+        @type get_content_safety: bool
+        @return: dict composed by package_id -> package metadata,
+            packages that are not available are not returned
+        @rtype: dict
+        """
+        ids_str = ", ".join((str(x) for x in package_ids))
+
+        def _select(sql):
+            return self._cursor().execute(sql % (ids_str,))
+
+        def _group(sql):
+            # group rows by their first column, the package identifier
+            groups = {}
+            for row in _select(sql):
+                obj = groups.get(row[0])
+                if obj is None:
+                    obj = groups[row[0]] = []
+                obj.append(row[1:])
+            return groups
+
+        base_data = dict((row[0], row[1:]) for row in _select("""
+        SELECT
+            baseinfo.idpackage,
+            baseinfo.atom,
+            baseinfo.name,
+            baseinfo.version,
+            baseinfo.versiontag,
+            extrainfo.description,
+            baseinfo.category,
+            extrainfo.chost,
+            extrainfo.cflags,
+            extrainfo.cxxflags,
+            extrainfo.homepage,
+            baseinfo.license,
+            baseinfo.branch,
+            extrainfo.download,
+            extrainfo.digest,
+            baseinfo.slot,
+            baseinfo.etpapi,
+            extrainfo.datecreation,
+            extrainfo.size,
+            baseinfo.revision
+        FROM
+            baseinfo,
+            extrainfo
+        WHERE
+            baseinfo.idpackage IN (%s)
+            AND baseinfo.idpackage = extrainfo.idpackage
+        """))
+        if not base_data:
+            return {}
+
+        contents = {}
+        if get_content:
+            contents = _group("""
+            SELECT idpackage, idpackage, file, type FROM content
+            WHERE idpackage IN (%s)
+            """)
+
+        changelogs = {}
+        if get_changelog:
+            changelogs = dict(_select("""
+            SELECT baseinfo.idpackage, packagechangelogs.changelog
+            FROM packagechangelogs, baseinfo
+            WHERE baseinfo.idpackage IN (%s) AND
+            packagechangelogs.category = baseinfo.category AND
+            packagechangelogs.name = baseinfo.name
+            """))
+
+        contents_safety = {}
+        if get_content_safety:
+            contents_safety = _group("""
+            SELECT idpackage, file, sha256, mtime FROM contentsafety
+            WHERE idpackage IN (%s)
+            """)
+
+        counters = dict(_select("""
+        SELECT counters.idpackage, counters.counter FROM counters, baseinfo
+        WHERE counters.idpackage IN (%s) AND
+        baseinfo.idpackage = counters.idpackage AND
+        baseinfo.branch = counters.branch
+        """))
+        triggers = dict(_select("""
+        SELECT idpackage, data FROM triggers WHERE idpackage IN (%s)
+        """))
+        disksizes = dict(_select("""
+        SELECT idpackage, size FROM sizes WHERE idpackage IN (%s)
+        """))
+        injected = self._cur2frozenset(_select("""
+        SELECT idpackage FROM injected WHERE idpackage IN (%s)
+        """))
+        system_packages = self._cur2frozenset(_select("""
+        SELECT idpackage FROM systempackages WHERE idpackage IN (%s)
+        """))
+        protects = dict(_select("""
+        SELECT configprotect.idpackage, protect
+        FROM configprotect, configprotectreference
+        WHERE configprotect.idpackage IN (%s) AND
+        configprotect.idprotect = configprotectreference.idprotect
+        """))
+        protect_masks = dict(_select("""
+        SELECT configprotectmask.idpackage, protect
+        FROM configprotectmask, configprotectreference
+        WHERE configprotectmask.idpackage IN (%s) AND
+        configprotectmask.idprotect = configprotectreference.idprotect
+        """))
+        useflags = _group("""
+        SELECT useflags.idpackage, useflagsreference.flagname
+        FROM useflags, useflagsreference
+        WHERE useflags.idpackage IN (%s)
+        AND useflags.idflag = useflagsreference.idflag
+        """)
+        keywords = _group("""
+        SELECT keywords.idpackage, keywordname
+        FROM keywords, keywordsreference
+        WHERE keywords.idpackage IN (%s) AND
+        keywords.idkeyword = keywordsreference.idkeyword
+        """)
+        sources = _group("""
+        SELECT sources.idpackage, sourcesreference.source
+        FROM sources, sourcesreference
+        WHERE sources.idpackage IN (%s) AND
+        sources.idsource = sourcesreference.idsource
+        """)
+        needed_libs = _group("""
+        SELECT idpackage, lib_user_path, lib_user_soname, soname,
+            elfclass, rpath
+        FROM needed_libs WHERE idpackage IN (%s)
+        """)
+        provided_libs = _group("""
+        SELECT idpackage, library, path, elfclass FROM provided_libs
+        WHERE idpackage IN (%s)
+        """)
+        provides = _group("""
+        SELECT idpackage, atom, is_default FROM provide
+        WHERE idpackage IN (%s)
+        """)
+        conflicts = _group("""
+        SELECT idpackage, conflict FROM conflicts WHERE idpackage IN (%s)
+        """)
+        dependencies = _group("""
+        SELECT dependencies.idpackage, dependenciesreference.dependency,
+            dependencies.type
+        FROM dependencies, dependenciesreference
+        WHERE dependencies.idpackage IN (%s) AND
+        dependencies.iddependency = dependenciesreference.iddependency
+        """)
+        signatures = dict((row[0], row[1:]) for row in _select("""
+        SELECT idpackage, sha1, sha256, sha512, gpg FROM packagesignatures
+        WHERE idpackage IN (%s)
+        """))
+        spm_phases = dict(_select("""
+        SELECT idpackage, phases FROM packagespmphases
+        WHERE idpackage IN (%s)
+        """))
+        spm_repositories = dict(_select("""
+        SELECT idpackage, repository FROM packagespmrepository
+        WHERE idpackage IN (%s)
+        """))
+        desktop_mimes = _group("""
+        SELECT idpackage, name, mimetype, executable, icon
+        FROM packagedesktopmime WHERE idpackage IN (%s)
+        """)
+        provided_mimes = _group("""
+        SELECT idpackage, mimetype FROM provided_mime
+        WHERE idpackage IN (%s)
+        """)
+        original_repositories = dict(_select("""
+        SELECT idpackage, repositoryname FROM installedtable
+        WHERE idpackage IN (%s)
+        """))
+        extra_downloads = _group("""
+        SELECT idpackage, download, type, size, disksize, md5, sha1,
+            sha256, sha512, gpg
+        FROM packagedownloads WHERE idpackage IN (%s)
+        """)
+
+        def _unicode(text):
+            try:
+                return const_convert_to_unicode(text)
+            except UnicodeDecodeError:
+                return const_convert_to_unicode(text, enctype = 'utf-8')
+
+        license_names = set()
+        for base in base_data.values():
+            if base[10] is not None:
+                license_names.update(
+                    x for x in base[10].split() if x.strip() and \
+                        entropy.tools.is_valid_string(x))
+        license_names = sorted(license_names)
+        licenses_text = {}
+        chunk_size = self._PACKAGE_IDS_QUERY_CHUNK
+        for idx in range(0, len(license_names), chunk_size):
+            chunk = license_names[idx:idx + chunk_size]
+            cur = self._cursor().execute("""
+            SELECT licensename, text FROM licensedata
+            WHERE licensename IN (%s)
+            """ % (", ".join(["?"] * len(chunk)),), chunk)
+            for licname, lictext in cur:
+                licenses_text[licname] = _unicode(lictext)
+
+        mirrors = {}
+        pkgs_data = {}
+        for package_id, base in base_data.items():
+            atom, name, version, versiontag, \
+            description, category, chost, \
+            cflags, cxxflags, homepage, \
+            mylicense, branch, download, \
+            digest, slot, etpapi, \
+            datecreation, size, revision = base
+
+            content = {}
+            if get_content:
+                rows = contents.get(package_id, ())
+                if content_insert_formatted:
+                    content = tuple(rows)
+                else:
+                    content = dict(x[1:] for x in rows)
+
+            pkg_sources = frozenset(
+                x for x, in sources.get(package_id, ()))
+            mirrornames = set()
+            for x in pkg_sources:
+                if x.startswith("mirror://"):
+                    mirrornames.add(x.split("/")[2])
+            for x in mirrornames:
+                if x not in mirrors:
+                    mirrors[x] = self.retrieveMirrorData(x)
+
+            sha1, sha256, sha512, gpg = signatures.get(
+                package_id, (None, None, None, None))
+
+            changelog = None
+            if package_id in changelogs:
+                changelog = _unicode(changelogs[package_id])
+
+            content_safety = dict(
+                (path, {'sha256': sha256, 'mtime': mtime}) for path, \
+                    sha256, mtime in contents_safety.get(package_id, ()))
+
+            pkg_needed_libs = frozenset(needed_libs.get(package_id, ()))
+            compat_needed_libs = tuple(
+                sorted((soname, elfclass) for _x, _x, soname, elfclass, _x
+                        in pkg_needed_libs)
+            )
+
+            licensedata = {}
+            if mylicense is not None:
+                for licname in mylicense.split():
+                    if licname in licenses_text:
+                        licensedata[licname] = licenses_text[licname]
+
+            desktop_mime = []
+            for row in desktop_mimes.get(package_id, ()):
+                item = {}
+                item['name'], item['mimetype'], item['executable'], \
+                    item['icon'] = row
+                desktop_mime.append(item)
+
+            extra_download = []
+            for download_data in extra_downloads.get(package_id, ()):
+                d_download, d_type, d_size, d_disksize, md5, d_sha1, \
+                    d_sha256, d_sha512, d_gpg = download_data
+                extra_download.append({
+                    "download": d_download,
+                    "type": d_type,
+                    "size": d_size,
+                    "disksize": d_disksize,
+                    "md5": md5,
+                    "sha1": d_sha1,
+                    "sha256": d_sha256,
+                    "sha512": d_sha512,
+                    "gpg": d_gpg,
+                })
+
+            pkgs_data[package_id] = {
+                'atom': atom,
+                'name': name,
+                'version': version,
+                'versiontag': versiontag,
+                'description': description,
+                'category': category,
+                'chost': chost,
+                'cflags': cflags,
+                'cxxflags': cxxflags,
+                'homepage': homepage,
+                'license': mylicense,
+                'branch': branch,
+                'download': download,
+                'digest': digest,
+                'slot': slot,
+                'etpapi': etpapi,
+                'datecreation': datecreation,
+                'size': size,
+                'revision': revision,
+                'counter': counters.get(package_id, -1),
+                'trigger': const_convert_to_rawstring(
+                    triggers.get(package_id, '')),
+                'disksize': disksizes.get(package_id, 0),
+                'changelog': changelog,
+                'injected': package_id in injected,
+                'systempackage': package_id in system_packages,
+                'config_protect': protects.get(package_id, ''),
+                'config_protect_mask': protect_masks.get(package_id, ''),
+                'useflags': frozenset(
+                    x for x, in useflags.get(package_id, ())),
+                'keywords': frozenset(
+                    x for x, in keywords.get(package_id, ())),
+                'sources': pkg_sources,
+                'needed': compat_needed_libs,
+                'needed_libs': pkg_needed_libs,
+                'provided_libs': frozenset(
+                    provided_libs.get(package_id, ())),
+                'provide_extended': frozenset(provides.get(package_id, ())),
+                'conflicts': frozenset(
+                    x for x, in conflicts.get(package_id, ())),
+                'licensedata': licensedata,
+                'content': content,
+                'content_safety': content_safety,
+                'pkg_dependencies': tuple(dependencies.get(package_id, ())),
+                'mirrorlinks': [[x, mirrors[x]] for x in mirrornames],
+                'signatures': {
+                    'sha1': sha1,
+                    'sha256': sha256,
+                    'sha512': sha512,
+                    'gpg': gpg,
+                },
+                'spm_phases': spm_phases.get(package_id),
+                'spm_repository': spm_repositories.get(package_id),
+                'desktop_mime': desktop_mime,
+                'provided_mime': frozenset(
+                    x for x, in provided_mimes.get(package_id, ())),
+                'original_repository': original_repositories.get(package_id),
+                'extra_download': tuple(extra_download),
+            }
+
+        return pkgs_data
+
     def retrieveRepositoryUpdatesDigest(self, repository):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -3278,8 +3691,79 @@ class EntropySQLRepository(EntropyRepositoryBase):
         if resolve_conditional_deps:
             return iter_obj(entropy.dep.expand_dependencies(
                     cur, [self]))
+        if not extended:
+            return self._cur2frozenset(cur)
         return iter_obj(cur)
 
+    def retrieveDependenciesListMap(self, package_ids, exclude_deptypes = None):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        package_ids = list(package_ids)
+        result = dict((package_id, set()) for package_id in package_ids)
+
+        excluded_deptypes_query = ""
+        if exclude_deptypes is not None:
+            for dep_type in exclude_deptypes:
+                excluded_deptypes_query += \
+                    " AND dependencies.type != %d" % (dep_type,)
+
+        concat = self._concatOperator(
+            ("'!'", "conflict"))
+        chunk_size = self._PACKAGE_IDS_QUERY_CHUNK
+        for idx in range(0, len(package_ids), chunk_size):
+            ids_str = ", ".join(
+                (str(x) for x in package_ids[idx:idx + chunk_size]))
+            cur = self._cursor().execute("""
+            SELECT dependencies.idpackage, dependenciesreference.dependency
+            FROM dependencies, dependenciesreference
+            WHERE dependencies.idpackage IN ( %s ) AND
+            dependencies.iddependency = dependenciesreference.iddependency %s
+            UNION SELECT idpackage, %s FROM conflicts
+            WHERE idpackage IN ( %s )""" % (
+                ids_str, excluded_deptypes_query, concat, ids_str,))
+            for package_id, dependency in cur:
+                result[package_id].add(dependency)
+
+        return dict((k, frozenset(v)) for k, v in result.items())
+
+    def retrieveDependenciesMap(self, package_ids, deptype = None,
+        exclude_deptypes = None, resolve_conditional_deps = True):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        package_ids = list(package_ids)
+        result = dict((package_id, []) for package_id in package_ids)
+
+        depstring = ''
+        if deptype is not None:
+            depstring = 'AND dependencies.type = %d' % (deptype,)
+
+        excluded_deptypes_query = ""
+        if exclude_deptypes is not None:
+            for dep_type in exclude_deptypes:
+                excluded_deptypes_query += " AND dependencies.type != %d" % (
+                    dep_type,)
+
+        chunk_size = self._PACKAGE_IDS_QUERY_CHUNK
+        for idx in range(0, len(package_ids), chunk_size):
+            ids_str = ", ".join(
+                (str(x) for x in package_ids[idx:idx + chunk_size]))
+            cur = self._cursor().execute("""
+            SELECT dependencies.idpackage, dependenciesreference.dependency
+            FROM dependencies,dependenciesreference
+            WHERE dependencies.idpackage IN ( %s ) AND
+            dependencies.iddependency =
+            dependenciesreference.iddependency %s %s""" % (
+                ids_str, depstring, excluded_deptypes_query,))
+            for package_id, dependency in cur:
+                result[package_id].append(dependency)
+
+        if resolve_conditional_deps:
+            return dict((k, frozenset(entropy.dep.expand_dependencies(
+                            v, [self]))) for k, v in result.items())
+        return dict((k, frozenset(v)) for k, v in result.items())
+
     def retrieveKeywords(self, package_id):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -3290,6 +3774,27 @@ class EntropySQLRepository(EntropyRepositoryBase):
         keywords.idkeyword = keywordsreference.idkeyword""", (package_id,))
         return self._cur2frozenset(cur)
 
+    def retrieveKeywordsMap(self, package_ids):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        package_ids = list(package_ids)
+        result = dict((package_id, set()) for package_id in package_ids)
+
+        chunk_size = self._PACKAGE_IDS_QUERY_CHUNK
+        for idx in range(0, len(package_ids), chunk_size):
+            ids_str = ", ".join(
+                (str(x) for x in package_ids[idx:idx + chunk_size]))
+            cur = self._cursor().execute("""
+            SELECT keywords.idpackage, keywordsreference.keywordname
+            FROM keywords, keywordsreference
+            WHERE keywords.idpackage IN ( %s ) AND
+            keywords.idkeyword = keywordsreference.idkeyword""" % (ids_str,))
+            for package_id, keyword in cur:
+                result[package_id].add(keyword)
+
+        return dict((k, frozenset(v)) for k, v in result.items())
+
     def retrieveProtect(self, package_id):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -3686,6 +4191,24 @@ class EntropySQLRepository(EntropyRepositoryBase):
         if licname:
             return licname[0]
 
+    def retrieveLicenseMap(self, package_ids):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        package_ids = list(package_ids)
+        result = dict((package_id, None) for package_id in package_ids)
+
+        chunk_size = self._PACKAGE_IDS_QUERY_CHUNK
+        for idx in range(0, len(package_ids), chunk_size):
+            ids_str = ", ".join(
+                (str(x) for x in package_ids[idx:idx + chunk_size]))
+            cur = self._cursor().execute("""
+            SELECT idpackage, license FROM baseinfo
+            WHERE idpackage IN ( %s )""" % (ids_str,))
+            result.update(cur)
+
+        return result
+
     def retrieveCompileFlags(self, package_id):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -3703,11 +4226,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
-        cached = self._getLiveCache("reverseDependenciesMetadata")
-        if cached is None:
-            cached = self._generateReverseDependenciesMetadata()
+        cached = self._getReverseDependenciesIndex()
 
-        dep_ids = set((k for k, v in cached.items() if package_id in v))
+        dep_ids = cached.get(package_id)
         if not dep_ids:
             # avoid python3.x memleak
             del cached
@@ -3822,17 +4343,61 @@ class EntropySQLRepository(EntropyRepositoryBase):
         del cached
         return result
 
+    def retrieveReverseDependenciesMap(self, package_ids,
+                                       exclude_deptypes = None):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        cached = self._getReverseDependenciesIndex()
+
+        result = {}
+        dep_ids = set()
+        for package_id in package_ids:
+            result[package_id] = frozenset()
+            pkg_dep_ids = cached.get(package_id)
+            if pkg_dep_ids:
+                dep_ids |= pkg_dep_ids
+        if not dep_ids:
+            # avoid python3.x memleak
+            del cached
+            return result
+
+        excluded_deptypes_query = ""
+        if exclude_deptypes is not None:
+            for dep_type in exclude_deptypes:
+                excluded_deptypes_query += " AND type != %d" % (
+                    dep_type,)
+
+        cur = self._cursor().execute("""
+        SELECT iddependency, idpackage FROM dependencies
+        WHERE iddependency IN ( %s ) %s""" % (
+            ', '.join((str(x) for x in dep_ids)),
+            excluded_deptypes_query,))
+        dep_map = {}
+        for iddep, package_id in cur:
+            obj = dep_map.setdefault(iddep, set())
+            obj.add(package_id)
+
+        for package_id in result:
+            pkg_dep_ids = cached.get(package_id)
+            if not pkg_dep_ids:
+                continue
+            reverse_ids = set()
+            for iddep in pkg_dep_ids:
+                reverse_ids |= dep_map.get(iddep, set())
+            result[package_id] = frozenset(reverse_ids)
+
+        # avoid python3.x memleak
+        del cached
+        return result
+
     def retrieveUnusedPackageIds(self):
         """
         Reimplemented from EntropyRepositoryBase.
         """
-        cached = self._getLiveCache("reverseDependenciesMetadata")
-        if cached is None:
-            cached = self._generateReverseDependenciesMetadata()
+        cached = self._getReverseDependenciesIndex()
 
-        pkg_ids = set()
-        for v in cached.values():
-            pkg_ids |= v
+        pkg_ids = set(cached.keys())
         if not pkg_ids:
             # avoid python3.x memleak
             del cached
@@ -4091,6 +4656,25 @@ class EntropySQLRepository(EntropyRepositoryBase):
 
         return self._cur2frozenset(cur)
 
+    def searchBelongsMap(self, paths):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        paths = list(set(paths))
+        result = {}
+        chunk_size = self._PACKAGE_IDS_QUERY_CHUNK
+        for idx in range(0, len(paths), chunk_size):
+            chunk = paths[idx:idx + chunk_size]
+            cur = self._cursor().execute("""
+            SELECT content.file, content.idpackage
+            FROM content, baseinfo WHERE file IN ( %s )
+            AND content.idpackage = baseinfo.idpackage""" % (
+                ", ".join(["?"] * len(chunk)),), chunk)
+            for path, package_id in cur:
+                result.setdefault(path, set()).add(package_id)
+
+        return dict((k, frozenset(v)) for k, v in result.items())
+
     def searchContentSafety(self, sfile):
         """
         Search content safety metadata (usually, sha256 and mtime) related to
@@ -4388,6 +4972,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         if just_id:
             search_elements = 'idpackage'
 
+        search_index = self._searchIndexTable()
         if sensitive:
             cur = self._cursor().execute("""
             SELECT DISTINCT %s FROM (
@@ -4401,6 +4986,20 @@ class EntropySQLRepository(EntropyRepositoryBase):
             """ % (search_elements, search_elements_all,
                 search_elements_provide_all, slotstring, tagstring,
                 order_by_string), searchkeywords)
+        elif search_index is not None:
+            cur = self._cursor().execute("""
+            SELECT DISTINCT %s FROM (
+                SELECT %s FROM baseinfo t
+                    WHERE t.idpackage IN (
+                        SELECT rowid FROM %s WHERE atom LIKE ?)
+                UNION ALL
+                SELECT %s FROM baseinfo d
+                    WHERE d.idpackage IN (
+                        SELECT rowid FROM %s WHERE provide LIKE ?)
+            ) WHERE 1=1 %s %s %s
+            """ % (search_elements, search_elements_all, search_index,
+                search_elements_provide_all, search_index, slotstring,
+                tagstring, order_by_string), searchkeywords)
         else:
             cur = self._cursor().execute("""
             SELECT DISTINCT %s FROM (
@@ -4442,12 +5041,19 @@ class EntropySQLRepository(EntropyRepositoryBase):
         Reimplemented from EntropyRepositoryBase.
         """
         keyword_split = keyword.split()
+        search_index = self._searchIndexTable()
         query_str_list = []
         query_args = []
         for sub_keyword in keyword_split:
-            query_str_list.append("LOWER(extrainfo.description) LIKE ?")
+            if search_index is not None:
+                query_str_list.append("description LIKE ?")
+            else:
+                query_str_list.append("LOWER(extrainfo.description) LIKE ?")
             query_args.append("%" + sub_keyword + "%")
         query_str = " AND ".join(query_str_list)
+        if search_index is not None:
+            query_str = """extrainfo.idpackage IN (
+            SELECT rowid FROM %s WHERE %s)""" % (search_index, query_str,)
         if just_id:
             cur = self._cursor().execute("""
             SELECT baseinfo.idpackage FROM extrainfo, baseinfo
@@ -4463,6 +5069,43 @@ class EntropySQLRepository(EntropyRepositoryBase):
             """ % (query_str,), query_args)
             return frozenset(cur)
 
+    @staticmethod
+    def _searchRelevance(keyword, name, atom):
+        """
+        Return the relevance score of a package matching keyword through
+        its atom or provides, see searchRanked().
+        """
+        keyword = keyword.lower()
+        name = name.lower()
+        if name == keyword:
+            return 3.0
+        if name.startswith(keyword):
+            return 2.0
+        if keyword in atom.lower():
+            return 1.0
+        # matched through provide
+        return 0.5
+
+    def searchRanked(self, keyword, description = False):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        scores = {}
+        for atom, package_id, _branch in self.searchPackages(keyword):
+            name = entropy.dep.dep_getkey(atom).split("/")[-1]
+            scores[package_id] = self._searchRelevance(keyword, name, atom)
+
+        if description:
+            extra_ids = set()
+            if keyword.split():
+                extra_ids.update(
+                    self.searchDescription(keyword, just_id = True))
+            extra_ids.update(self.searchUseflag(keyword, just_id = True))
+            for package_id in extra_ids:
+                scores.setdefault(package_id, 0.0)
+
+        return tuple(sorted(scores.items(), key = lambda x: (-x[1], x[0])))
+
     def searchUseflag(self, keyword, just_id = False):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -4567,6 +5210,26 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """, (name, category))
         return tuple(cur)
 
+    def _atomMatchPrefetch(self, names):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        names = list(names)
+        chunk_size = self._ATOM_MATCH_PREFETCH_CHUNK
+        metadata = {}
+        try:
+            for idx in range(0, len(names), chunk_size):
+                chunk = names[idx:idx + chunk_size]
+                cur = self._cursor().execute("""
+                SELECT idpackage, category, name, version, versiontag,
+                revision, slot FROM baseinfo WHERE name IN (%s)
+                """ % (", ".join(["?"] * len(chunk)),), chunk)
+                for record in cur:
+                    metadata[record[0]] = record[1:]
+        except OperationalError:
+            return None
+        return metadata
+
     def isPackageScopeAvailable(self, atom, slot, revision):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -4911,7 +5574,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         raise NotImplementedError()
 
-    def exportRepository(self, dumpfile):
+    def exportRepository(self, dumpfile, binary = False):
         """
         Not implemented, subclasses must implement this.
         """
@@ -4934,7 +5597,21 @@ class EntropySQLRepository(EntropyRepositoryBase):
                  include_dependencies = False):
         """
         Reimplemented from EntropyRepositoryBase.
+        If do_order is False, the checksum is derived from the
+        incrementally maintained checksum state (see
+        _getChecksumState()) and it is only meant to be used locally,
+        for instance as cache key. Ordered checksums are computed
+        hashing the whole repository and can be compared across
+        repositories.
         """
+        if not do_order and self._doesTableExist("baseinfo"):
+            state = self._getChecksumState()
+            m = hashlib.sha1()
+            m.update(const_convert_to_rawstring("%040x_%s_%s_%s" % (
+                state, strict, include_signatures,
+                include_dependencies)))
+            return m.hexdigest()
+
         cache_key = "checksum_%s_%s_True_%s_%s" % (
             do_order, strict, include_signatures, include_dependencies)
         cached = self._getLiveCache(cache_key)
@@ -4944,7 +5621,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         del cached
 
         package_id_order = ""
-        depenenciesref_order = ""
+        dependenciesref_order = ""
         dependencies_order = ""
         if do_order:
             package_id_order = "order by idpackage"
@@ -5019,6 +5696,237 @@ class EntropySQLRepository(EntropyRepositoryBase):
 
         return result
 
+    def _checksumDigests(self, where = "", args = ()):
+        """
+        Compute the checksum digests of the packages selected by the
+        given baseinfo WHERE clause (all the packages if empty).
+        A package digest covers its baseinfo, extrainfo, signatures
+        and dependencies metadata.
+
+        @keyword where: SQL WHERE clause applied to baseinfo
+        @type where: string
+        @keyword args: arguments of the WHERE clause
+        @type args: tuple
+        @return: dict composed by package_id -> digest (int)
+        @rtype: dict
+        """
+        selection = ""
+        if where:
+            selection = """
+            WHERE idpackage IN (SELECT idpackage FROM baseinfo %s)
+            """ % (where,)
+
+        if const_is_python3():
+            def _record_data(record):
+                return repr(record).encode("utf-8")
+        else:
+            _record_data = repr
+
+        digests = {}
+        cur = self._cursor().execute("""
+        SELECT * FROM baseinfo %s
+        """ % (where,), args)
+        for record in cur:
+            m = hashlib.sha1()
+            m.update(_record_data(record))
+            digests[record[0]] = m
+
+        if not digests:
+            return {}
+
+        queries = ("""
+        SELECT * FROM extrainfo %s
+        """ % (selection,), """
+        SELECT idpackage, sha1, gpg FROM packagesignatures %s
+        """ % (selection,), """
+        SELECT idpackage, dependency, type FROM (
+            SELECT dependencies.idpackage AS idpackage,
+            dependenciesreference.dependency AS dependency,
+            dependencies.type AS type
+            FROM dependencies, dependenciesreference
+            WHERE dependencies.iddependency =
+                dependenciesreference.iddependency
+        ) %s ORDER BY idpackage, dependency, type
+        """ % (selection,))
+
+        for query in queries:
+            cur = self._cursor().execute(query, args)
+            for record in cur:
+                m = digests.get(record[0])
+                if m is not None:
+                    m.update(_record_data(record))
+
+        return dict((package_id, int(m.hexdigest(), 16)) for \
+                        package_id, m in digests.items())
+
+    def _checksumChangesSupported(self):
+        """
+        Return whether the repository records the packages whose checksum
+        digest may have changed into the checksumchanges table. Records
+        are added by triggers, regardless of the writer, backends not
+        supporting them fall back to computing the checksum state from
+        scratch once per cache lifetime.
+
+        @return: True, if changes are recorded
+        @rtype: bool
+        """
+        return self._doesTableExist("checksumchanges") and \
+            self._doesTableExist("checksumdigests")
+
+    def _checksumGeneration(self):
+        """
+        Return the identifier of the last change recorded in the
+        checksumchanges table, it changes on every write to the tables
+        covered by the package digests, or None if no changes have been
+        recorded since the checksum state was stored.
+
+        @return: the last change identifier or None
+        @rtype: int or None
+        """
+        cur = self._cursor().execute("""
+        SELECT MAX(idchange) FROM checksumchanges
+        """)
+        return cur.fetchone()[0]
+
+    def _loadChecksumState(self):
+        """
+        Load the checksum state stored in the settings table, it is the
+        XOR of the package digests stored in the checksumdigests table.
+
+        @return: the stored checksum state or None
+        @rtype: int or None
+        """
+        try:
+            cur = self._cursor().execute("""
+            SELECT setting_value FROM settings WHERE setting_name = ?
+            LIMIT 1
+            """, (self._CHECKSUM_STATE_SETTING,))
+            setting = cur.fetchone()
+        except Error:
+            return None
+        if setting is None:
+            return None
+
+        try:
+            version, digest = setting[0].split(":")
+            state = int(digest, 16)
+        except ValueError:
+            return None
+        if version != self._CHECKSUM_STATE_VERSION:
+            return None
+        return state
+
+    def _computeChecksumState(self, supported):
+        """
+        Compute the checksum state of the repository, that is the XOR of
+        all the package digests, so that it can be updated incrementally,
+        regardless of the order.
+        If supported is True and a checksum state is stored, the digests
+        of the packages changed since then are folded into it, otherwise
+        the state is computed from scratch.
+
+        @param supported: see _checksumChangesSupported()
+        @type supported: bool
+        @return: tuple composed by (checksum state, changed package
+            identifiers or None if the state was computed from scratch,
+            dict composed by package_id -> new digest)
+        @rtype: tuple
+        """
+        state = None
+        if supported:
+            state = self._loadChecksumState()
+
+        if state is None:
+            digests = self._checksumDigests()
+            state = 0
+            for pkg_digest in digests.values():
+                state ^= pkg_digest
+            return state, None, digests
+
+        cur = self._cursor().execute("""
+        SELECT DISTINCT idpackage FROM checksumchanges
+        """)
+        package_ids = self._cur2tuple(cur)
+
+        digests = {}
+        chunk_size = self._PACKAGE_IDS_QUERY_CHUNK
+        for idx in range(0, len(package_ids), chunk_size):
+            chunk = package_ids[idx:idx + chunk_size]
+            placeholders = ", ".join(["?"] * len(chunk))
+            cur = self._cursor().execute("""
+            SELECT digest FROM checksumdigests WHERE idpackage IN (%s)
+            """ % (placeholders,), chunk)
+            for pkg_digest, in cur:
+                state ^= int(pkg_digest, 16)
+            chunk_digests = self._checksumDigests(
+                "WHERE idpackage IN (%s)" % (placeholders,), chunk)
+            for pkg_digest in chunk_digests.values():
+                state ^= pkg_digest
+            digests.update(chunk_digests)
+
+        return state, package_ids, digests
+
+    def _getChecksumState(self):
+        """
+        Return the current checksum state of the repository. The
+        in-memory state is validated against the last recorded change,
+        so that writes made through other connections or by code not
+        aware of the checksum state are taken into account.
+
+        @return: the checksum state
+        @rtype: int
+        """
+        supported = self._checksumChangesSupported()
+        generation = None
+        if supported:
+            generation = self._checksumGeneration()
+
+        cached = self._getLiveCache("checksumState")
+        if cached is not None:
+            state, cached_generation = cached
+            if cached_generation == generation:
+                return state
+
+        state, _package_ids, _digests = self._computeChecksumState(
+            supported)
+        self._setLiveCache("checksumState", (state, generation))
+        return state
+
+    def _storeChecksumState(self):
+        """
+        Fold the package digests changed since the checksum state was
+        stored into it, storing the result into the settings table and
+        the new package digests into the checksumdigests table.
+        """
+        if not self._checksumChangesSupported():
+            return
+        if self._checksumGeneration() is None and \
+                self._loadChecksumState() is not None:
+            # nothing changed
+            return
+
+        state, package_ids, digests = self._computeChecksumState(True)
+
+        cursor = self._cursor()
+        if package_ids is None:
+            cursor.execute("DELETE FROM checksumdigests")
+        else:
+            chunk_size = self._PACKAGE_IDS_QUERY_CHUNK
+            for idx in range(0, len(package_ids), chunk_size):
+                chunk = package_ids[idx:idx + chunk_size]
+                cursor.execute("""
+                DELETE FROM checksumdigests WHERE idpackage IN (%s)
+                """ % (", ".join(["?"] * len(chunk)),), chunk)
+        cursor.executemany("""
+        INSERT INTO checksumdigests VALUES (?, ?)
+        """, [(package_id, "%040x" % (pkg_digest,)) for \
+                  package_id, pkg_digest in digests.items()])
+        cursor.execute("DELETE FROM checksumchanges")
+
+        self._setSetting(self._CHECKSUM_STATE_SETTING, "%s:%040x" % (
+            self._CHECKSUM_STATE_VERSION, state))
+        self._setLiveCache("checksumState", (state, None))
+
     def storeInstalledPackage(self, package_id, repoid, source = 0):
         """
         Reimplemented from EntropySQLRepository.
@@ -5132,6 +6040,35 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         raise NotImplementedError()
 
+    def _searchIndexTable(self):
+        """
+        Return the name of the full-text search index table, kept in sync
+        by _updateSearchIndex(), or None if not available. In this case,
+        searches fall back to LIKE based table scans.
+        Subclasses supporting full-text search should reimplement this.
+
+        @return: the search index table name or None
+        @rtype: string or None
+        """
+        return None
+
+    def _createSearchIndex(self):
+        """
+        Create and fill the full-text search index, called by
+        createAllIndexes(). Subclasses supporting full-text search
+        should reimplement this.
+        """
+
+    def _updateSearchIndex(self, package_id):
+        """
+        Update the full-text search index entry of the given package,
+        removing it if the package is no longer available.
+        Subclasses supporting full-text search should reimplement this.
+
+        @param package_id: package identifier
+        @type package_id: int
+        """
+
     def createAllIndexes(self):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -5160,6 +6097,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._createDesktopMimeIndex()
         self._createProvidedMimeIndex()
         self._createPackageDownloadsIndex()
+        self._createSearchIndex()
 
     def _createTrashedCountersIndex(self):
         try:
@@ -5537,7 +6475,8 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reverse dependencies dynamic metadata generation.
         """
-        checksum = self.checksum()
+        # dependency strings can change without touching packages
+        checksum = self.checksum(include_dependencies = True)
         try:
             mtime = repr(self.mtime())
         except (OSError, IOError):
@@ -5555,6 +6494,8 @@ class EntropySQLRepository(EntropyRepositoryBase):
         sha.update(hash_str)
         cache_key = "__generateReverseDependenciesMetadata2_" + \
             sha.hexdigest()
+        # the inverted index is generated from this metadata
+        self._clearLiveCache("reverseDependenciesIndex")
         rev_deps_data = self._cacher.pop(cache_key)
         if rev_deps_data is not None:
             self._setLiveCache("reverseDependenciesMetadata",
@@ -5567,22 +6508,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
             if iddep == -1:
                 continue
 
-            if atom.endswith(etpConst['entropyordepquestion']):
-                or_atoms = atom[:-1].split(etpConst['entropyordepsep'])
-                for or_atom in or_atoms:
-                    # not safe to use cache here, people messing with multiple
-                    # instances can make this crash
-                    package_id, rc = self.atomMatch(or_atom, useCache = False)
-                    if package_id != -1:
-                        obj = dep_data.setdefault(iddep, set())
-                        obj.add(package_id)
-            else:
-                # not safe to use cache here, people messing with multiple
-                # instances can make this crash
-                package_id, rc = self.atomMatch(atom, useCache = False)
-                if package_id != -1:
-                    obj = dep_data.setdefault(iddep, set())
-                    obj.add(package_id)
+            package_ids = self._matchReverseDependency(atom)
+            if package_ids:
+                dep_data[iddep] = package_ids
 
         self._setLiveCache("reverseDependenciesMetadata", dep_data)
         try:
@@ -5592,6 +6520,83 @@ class EntropySQLRepository(EntropyRepositoryBase):
             pass
         return dep_data
 
+    def _matchReverseDependency(self, dependency):
+        """
+        Return the set of package identifiers the given dependency string
+        resolves to, as stored in the reverse dependencies metadata.
+        """
+        package_ids = set()
+        if dependency.endswith(etpConst['entropyordepquestion']):
+            atoms = dependency[:-1].split(etpConst['entropyordepsep'])
+        else:
+            atoms = [dependency]
+
+        for atom in atoms:
+            # not safe to use cache here, people messing with multiple
+            # instances can make this crash
+            package_id, rc = self.atomMatch(atom, useCache = False)
+            if package_id != -1:
+                package_ids.add(package_id)
+        return package_ids
+
+    def _getReverseDependenciesIndex(self):
+        """
+        Return the inverted reverse dependencies metadata index, a dict
+        composed by package_id -> set of dependency identifiers resolving
+        to package_id. The index is lazily generated and kept in the
+        live cache.
+        """
+        index = self._getLiveCache("reverseDependenciesIndex")
+        if index is not None:
+            return index
+
+        cached = self._getLiveCache("reverseDependenciesMetadata")
+        if cached is None:
+            cached = self._generateReverseDependenciesMetadata()
+
+        index = {}
+        for iddep, package_ids in cached.items():
+            for package_id in package_ids:
+                obj = index.setdefault(package_id, set())
+                obj.add(iddep)
+
+        self._setLiveCache("reverseDependenciesIndex", index)
+        # avoid python3.x memleak
+        del cached
+        return index
+
+    def _updateReverseDependenciesMetadata(self, iddep, dependency):
+        """
+        Update the reverse dependencies metadata and its inverted index,
+        if loaded, after dependency string at iddep has been added or
+        changed.
+        """
+        cached = self._getLiveCache("reverseDependenciesMetadata")
+        if cached is None:
+            self._clearLiveCache("reverseDependenciesIndex")
+            return
+        index = self._getLiveCache("reverseDependenciesIndex")
+
+        old_package_ids = cached.pop(iddep, set())
+        package_ids = self._matchReverseDependency(dependency)
+        if package_ids:
+            cached[iddep] = package_ids
+
+        if index is not None:
+            for package_id in old_package_ids - package_ids:
+                obj = index.get(package_id)
+                if obj is not None:
+                    obj.discard(iddep)
+                    if not obj:
+                        del index[package_id]
+            for package_id in package_ids - old_package_ids:
+                obj = index.setdefault(package_id, set())
+                obj.add(iddep)
+
+        # avoid python3.x memleak
+        del cached
+        del index
+
     def moveSpmUidsToBranch(self, to_branch):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -10,22 +10,24 @@
     the repository interface.
 
 """
+import binascii
 import collections
 import errno
 import os
 import hashlib
+import re
+import struct
 import time
 try:
     import thread
 except ImportError:
     import _thread as thread
 import threading
-import subprocess
 
 from entropy.const import etpConst, const_convert_to_unicode, \
     const_get_buffer, const_convert_to_rawstring, const_pid_exists, \
     const_is_python3, const_debug_write, const_file_writable, \
-    const_setup_directory, const_setup_file
+    const_setup_directory, const_setup_file, const_isnumber
 from entropy.exceptions import SystemDatabaseError
 from entropy.output import bold, red, blue, purple
 from entropy.locks import ResourceLock
@@ -33,6 +35,7 @@ from entropy.locks import ResourceLock
 from entropy.db.exceptions import Warning, Error, InterfaceError, \
     DatabaseError, DataError, OperationalError, IntegrityError, \
     InternalError, ProgrammingError, NotSupportedError, LockAcquireError
+from entropy.db.skel import EntropyRepositoryBase, EntropyRepositoryPlugin
 from entropy.db.sql import EntropySQLRepository, SQLConnectionWrapper, \
     SQLCursorWrapper
 
@@ -42,6 +45,14 @@ import entropy.dep
 import entropy.tools
 
 
+class _DumpRawText(bytes):
+
+    """
+    Raw TEXT value, as returned by SQLiteConnectionWrapper.rawtext(),
+    used to tell TEXT values apart from BLOBs when dumping a repository.
+    """
+
+
 class SQLiteCursorWrapper(SQLCursorWrapper):
 
     """
@@ -113,6 +124,12 @@ class SQLiteConnectionWrapper(SQLConnectionWrapper):
     def rawstring(self):
         self._con.text_factory = const_convert_to_rawstring
 
+    def rawtext(self):
+        """
+        Enforce byte strings, returned as _DumpRawText objects.
+        """
+        self._con.text_factory = _DumpRawText
+
     def interrupt(self):
         return self._proxy_call(self._excs, self._con.interrupt)
 
@@ -133,16 +150,68 @@ class EntropySQLiteRepository(EntropySQLRepository):
 
     # bump this every time schema changes and databaseStructureUpdate
     # should be triggered
-    _SCHEMA_REVISION = 6
+    _SCHEMA_REVISION = 8
 
     _INSERT_OR_REPLACE = "INSERT OR REPLACE"
     _INSERT_OR_IGNORE = "INSERT OR IGNORE"
     _UPDATE_OR_REPLACE = "UPDATE OR REPLACE"
     _CACHE_SIZE = 8192
 
+    # FTS5 full-text search index table, see _createSearchIndex()
+    _SEARCH_INDEX_TABLE = "entropy_search"
+    # search index columns relevance weights, used by searchRanked()
+    _SEARCH_INDEX_WEIGHTS = (5.0, 10.0, 3.0, 1.0, 1.0)
+    _SEARCH_INDEX_SELECT = """
+    SELECT b.idpackage, b.atom, b.name,
+        (SELECT group_concat(p.atom, char(10)) FROM provide p
+            WHERE p.idpackage = b.idpackage),
+        (SELECT e.description FROM extrainfo e
+            WHERE e.idpackage = b.idpackage),
+        (SELECT group_concat(r.flagname, " ")
+            FROM useflags u, useflagsreference r
+            WHERE u.idpackage = b.idpackage AND u.idflag = r.idflag)
+    FROM baseinfo b
+    """
+
     SETTING_KEYS = ("arch", "on_delete_cascade", "schema_revision",
         "_baseinfo_extrainfo_2010")
 
+    # number of rows handed to executemany() at once by insertContent()
+    # when using the compacted content layout, see _migrateContentDirs()
+    _CONTENT_INSERT_CHUNK = 1024
+
+    # package metadata columns pointing to a shared values table, see
+    # alignDatabases(): (table, column) -> (reference table, value column)
+    # where the reference table primary key has the same column name
+    _DUMP_BATCH_SIZE = 4096
+    # transaction statements found in SQL dumps, see _importSqlDump()
+    _DUMP_SQL_TRANSACTIONS = frozenset([
+        "BEGIN", "BEGIN TRANSACTION", "COMMIT", "COMMIT TRANSACTION",
+        "END", "END TRANSACTION"])
+    _DUMP_SQL_LITERAL = re.compile(b"'(?:[^']|'')*'")
+
+    # binary dump format, see exportRepository(): the magic header is
+    # followed by (record type, payload length) headers and payloads
+    _BINARY_DUMP_MAGIC = b"ENTROPY-SQLITE-DUMP\x00\x01\n"
+    _BINARY_DUMP_RECORD = struct.Struct(">BI")
+    _BINARY_DUMP_END = 0
+    _BINARY_DUMP_SQL = 1
+    _BINARY_DUMP_TABLE = 2
+    _BINARY_DUMP_ROWS = 3
+
+    _ALIGN_REFERENCES = {
+        ("dependencies", "iddependency"): (
+            "dependenciesreference", "dependency"),
+        ("sources", "idsource"): ("sourcesreference", "source"),
+        ("useflags", "idflag"): ("useflagsreference", "flagname"),
+        ("keywords", "idkeyword"): ("keywordsreference", "keywordname"),
+        ("configprotect", "idprotect"): (
+            "configprotectreference", "protect"),
+        ("configprotectmask", "idprotect"): (
+            "configprotectreference", "protect"),
+        ("contentfiles", "iddir"): ("contentdirs", "dir"),
+    }
+
     class SQLiteProxy(object):
 
         _mod = None
@@ -513,7 +582,8 @@ class EntropySQLiteRepository(EntropySQLRepository):
         if self.__cur_mtime != mtime:
             self.__cur_mtime = mtime
             self._discardLiveCache()
-        return self._live_cacher.get(self._getLiveCacheKey() + key)
+        namespace = self._getLiveCacheKey()
+        return self._live_cacher.get(namespace + key, namespace=namespace)
 
     def _get_reslock(self, mode):
         """
@@ -708,6 +778,12 @@ class EntropySQLiteRepository(EntropySQLRepository):
         """
         my = self.Schema()
         self.dropAllIndexes()
+        # views (and their triggers) would shadow the tables created below
+        cur = self._cursor().execute("""
+        SELECT name FROM SQLITE_MASTER WHERE type = "view"
+        """)
+        for view in self._cur2tuple(cur):
+            self._cursor().execute("DROP VIEW IF EXISTS %s" % (view,))
         for table in self._listAllTables():
             try:
                 self._cursor().execute("DROP TABLE %s" % (table,))
@@ -715,9 +791,10 @@ class EntropySQLiteRepository(EntropySQLRepository):
                 # skip tables that can't be dropped
                 continue
         self._cursor().executescript(my.get_init())
-        self.commit()
+        # the checksum tables are gone, see commit()
         self._clearLiveCache("_doesTableExist")
         self._clearLiveCache("_doesColumnInTableExist")
+        self.commit()
         self._setupInitialSettings()
         # set cache size
         self._setCacheSize(self._CACHE_SIZE)
@@ -957,6 +1034,57 @@ class EntropySQLiteRepository(EntropySQLRepository):
             super(EntropySQLiteRepository, self)._insertExtraDownload(
                 package_id, package_downloads_data)
 
+    def insertContent(self, package_id, content, already_formatted = False):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle the compacted content layout.
+        """
+        if not self._isContentCompacted():
+            return super(EntropySQLiteRepository, self).insertContent(
+                package_id, content, already_formatted = already_formatted)
+
+        if already_formatted:
+            items = ((path, ftype) for _pkg_id, path, ftype in content)
+        else:
+            items = ((path, content[path]) for path in content)
+
+        query = "INSERT INTO contentfiles VALUES (?, ?, ?, ?)"
+        dir_ids = {}
+        rows = []
+        for path, ftype in items:
+            dirname, basename = self._splitContentPath(path)
+            iddir = dir_ids.get(dirname)
+            if iddir is None:
+                iddir = self._addContentDir(dirname)
+                dir_ids[dirname] = iddir
+            rows.append((package_id, iddir, basename, ftype))
+            if len(rows) >= self._CONTENT_INSERT_CHUNK:
+                self._cursor().executemany(query, rows)
+                rows = []
+        if rows:
+            self._cursor().executemany(query, rows)
+
+    def _addContentDir(self, dirname):
+        """
+        Return the identifier (iddir) of the given content directory,
+        adding it to the repository if needed.
+
+        @param dirname: directory path, including the trailing slash
+        @type dirname: string
+        @return: directory identifier (iddir)
+        @rtype: int
+        """
+        cur = self._cursor().execute("""
+        SELECT iddir FROM contentdirs WHERE dir = ? LIMIT 1
+        """, (dirname,))
+        result = cur.fetchone()
+        if result:
+            return result[0]
+        cur = self._cursor().execute("""
+        INSERT INTO contentdirs VALUES (NULL, ?)
+        """, (dirname,))
+        return cur.lastrowid
+
     def listAllPreservedLibraries(self):
         """
         Reimplemented from EntropySQLRepository.
@@ -1025,6 +1153,26 @@ class EntropySQLiteRepository(EntropySQLRepository):
         super(EntropySQLiteRepository, self)._cleanupDependencies()
         self._clearLiveCache("retrieveDependencies")
 
+    def clean(self):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle the compacted content layout.
+        """
+        super(EntropySQLiteRepository, self).clean()
+        self._cleanupContentDirs()
+
+    def _cleanupContentDirs(self):
+        """
+        Cleanup content directories no longer referenced by any package
+        file to save space.
+        """
+        if not self._isContentCompacted():
+            return
+        self._cursor().execute("""
+        DELETE FROM contentdirs WHERE iddir NOT IN
+        (SELECT DISTINCT iddir FROM contentfiles)
+        """)
+
     def getVersioningData(self, package_id):
         """
         Reimplemented from EntropySQLRepository.
@@ -1183,6 +1331,34 @@ class EntropySQLiteRepository(EntropySQLRepository):
         cur = self._cursor().execute(sql, (package_id,))
         return cur.fetchone()
 
+    def getPackagesData(self, package_ids, get_content = True,
+            content_insert_formatted = False, get_changelog = True,
+            get_content_safety = True):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle backward compatibility.
+        """
+        bulk = self._isBaseinfoExtrainfo2010()
+        if bulk:
+            for table in ("packagedownloads", "packagedesktopmime",
+                          "provided_mime", "contentsafety"):
+                if not self._doesTableExist(table):
+                    bulk = False
+                    break
+        if bulk:
+            return super(EntropySQLiteRepository, self).getPackagesData(
+                package_ids, get_content = get_content,
+                content_insert_formatted = content_insert_formatted,
+                get_changelog = get_changelog,
+                get_content_safety = get_content_safety)
+
+        # retrieve*() methods know how to deal with the old schema
+        return EntropyRepositoryBase.getPackagesData(
+            self, package_ids, get_content = get_content,
+            content_insert_formatted = content_insert_formatted,
+            get_changelog = get_changelog,
+            get_content_safety = get_content_safety)
+
     def retrieveDigest(self, package_id):
         """
         Reimplemented from EntropySQLRepository.
@@ -1456,6 +1632,25 @@ class EntropySQLiteRepository(EntropySQLRepository):
                     data, [self]))
         return iter_obj(data)
 
+    def retrieveDependenciesMap(self, package_ids, deptype = None,
+        exclude_deptypes = None, resolve_conditional_deps = True):
+        """
+        Reimplemented from EntropySQLRepository.
+        Dependencies are already memoized by retrieveDependencies(), use them.
+        """
+        if self.directed() or self.cache_policy_none():
+            return super(EntropySQLiteRepository,
+                         self).retrieveDependenciesMap(
+                package_ids, deptype = deptype,
+                exclude_deptypes = exclude_deptypes,
+                resolve_conditional_deps = resolve_conditional_deps)
+
+        return dict((package_id, self.retrieveDependencies(
+                    package_id, deptype = deptype,
+                    exclude_deptypes = exclude_deptypes,
+                    resolve_conditional_deps = resolve_conditional_deps)) \
+                        for package_id in package_ids)
+
     def retrieveDesktopMime(self, package_id):
         """
         Reimplemented from EntropySQLRepository.
@@ -1759,6 +1954,100 @@ class EntropySQLiteRepository(EntropySQLRepository):
                 raise
             return tuple()
 
+    def isFileAvailable(self, path, get_id = False):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle the compacted content layout.
+        """
+        if not self._isContentCompacted():
+            return super(EntropySQLiteRepository, self).isFileAvailable(
+                path, get_id = get_id)
+
+        dirname, basename = self._splitContentPath(path)
+        cur = self._cursor().execute("""
+        SELECT contentfiles.idpackage FROM contentdirs, contentfiles
+        WHERE contentdirs.dir = ?
+        AND contentfiles.iddir = contentdirs.iddir
+        AND contentfiles.basename = ?""", (dirname, basename,))
+        result = self._cur2frozenset(cur)
+        if get_id:
+            return result
+        elif result:
+            return True
+        return False
+
+    def searchBelongs(self, bfile, like = False):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle the compacted content layout.
+        """
+        if like or not self._isContentCompacted():
+            # LIKE lookups go through the "content" view
+            return super(EntropySQLiteRepository, self).searchBelongs(
+                bfile, like = like)
+
+        dirname, basename = self._splitContentPath(bfile)
+        cur = self._cursor().execute("""
+        SELECT contentfiles.idpackage
+        FROM contentdirs, contentfiles, baseinfo
+        WHERE contentdirs.dir = ?
+        AND contentfiles.iddir = contentdirs.iddir
+        AND contentfiles.basename = ?
+        AND contentfiles.idpackage = baseinfo.idpackage""",
+            (dirname, basename,))
+        return self._cur2frozenset(cur)
+
+    def searchBelongsMap(self, paths):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle the compacted content layout.
+        """
+        if not self._isContentCompacted():
+            return super(EntropySQLiteRepository, self).searchBelongsMap(
+                paths)
+
+        split_paths = {}
+        for path in paths:
+            split_paths[self._splitContentPath(path)] = path
+        if not split_paths:
+            return {}
+
+        random_str = "%s%s" % (os.getpid(), id(split_paths),)
+        if const_is_python3():
+            random_str = const_convert_to_rawstring(random_str)
+        randomtable = "cbelongs%s" % (hashlib.md5(random_str).hexdigest(),)
+
+        self._cursor().executescript("""
+            DROP TABLE IF EXISTS `%s`;
+            CREATE TEMPORARY TABLE `%s` (
+                dir VARCHAR, basename VARCHAR );
+            """ % (randomtable, randomtable,))
+
+        try:
+            self._cursor().executemany("""
+            INSERT INTO `%s` VALUES (?, ?)""" % (randomtable,),
+                split_paths.keys())
+
+            cur = self._cursor().execute("""
+            SELECT paths.dir, paths.basename, contentfiles.idpackage
+            FROM `%s` AS paths, contentdirs, contentfiles, baseinfo
+            WHERE contentdirs.dir = paths.dir
+            AND contentfiles.iddir = contentdirs.iddir
+            AND contentfiles.basename = paths.basename
+            AND contentfiles.idpackage = baseinfo.idpackage""" % (
+                    randomtable,))
+
+            result = {}
+            for dirname, basename, package_id in cur:
+                path = split_paths[(dirname, basename)]
+                result.setdefault(path, set()).add(package_id)
+
+        finally:
+            self._cursor().execute('DROP TABLE IF EXISTS `%s`' % (
+                    randomtable,))
+
+        return dict((k, frozenset(v)) for k, v in result.items())
+
     def searchCategory(self, keyword, like = False, just_id = True):
         """
         Reimplemented from EntropySQLRepository.
@@ -1829,6 +2118,16 @@ class EntropySQLiteRepository(EntropySQLRepository):
             return frozenset((y for x, y in data))
         return data
 
+    def _atomMatchPrefetch(self, names):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle _baseinfo_extrainfo_2010.
+        """
+        if not self._isBaseinfoExtrainfo2010():
+            return None
+        return super(EntropySQLiteRepository, self)._atomMatchPrefetch(
+            names)
+
     def listPackageIdsInCategory(self, category, order_by = None):
         """
         Reimplemented from EntropySQLRepository.
@@ -2006,8 +2305,14 @@ class EntropySQLiteRepository(EntropySQLRepository):
         # added on Sept. 2010, keep forever? ;-)
         self._migrateBaseinfoExtrainfo()
 
+        self._migrateContentDirs()
+
         self._foreignKeySupport()
 
+        # added on Oct. 2026, tables may have been rebuilt above,
+        # together with their triggers
+        self._createChecksumTables()
+
         self._readonly = old_readonly
         self._connection().commit()
 
@@ -2035,7 +2340,9 @@ class EntropySQLiteRepository(EntropySQLRepository):
     def importRepository(dumpfile, db, data = None):
         """
         Reimplemented from EntropyRepositoryBase.
-        @todo: remove /usr/bin/sqlite3 dependency
+        Both SQL text dumps and binary dumps (see exportRepository()) are
+        supported. Data is loaded into a temporary file, using large
+        transactions and no journal, which replaces db only on success.
         """
         dbfile = os.path.realpath(db)
         tmp_dbfile = dbfile + ".import_repository"
@@ -2044,27 +2351,327 @@ class EntropySQLiteRepository(EntropySQLRepository):
             raise AttributeError("dbfile value is invalid")
         if not entropy.tools.is_valid_path_string(dumpfile):
             raise AttributeError("dumpfile value is invalid")
-        with open(dumpfile, "rb") as in_f:
+
+        dbapi2 = EntropySQLiteRepository.ModuleProxy.get()
+        try:
+            os.remove(tmp_dbfile)
+        except OSError as err:
+            if err.errno != errno.ENOENT:
+                return 1
+
+        conn = None
+        try:
+            # transactions are handled by the import functions
+            conn = dbapi2.connect(tmp_dbfile, isolation_level = None)
+            if not const_is_python3():
+                # allow binding raw (8-bit) strings as TEXT
+                conn.text_factory = str
+            conn.execute("PRAGMA journal_mode = OFF")
+            conn.execute("PRAGMA synchronous = OFF")
+            with open(dumpfile, "rb") as in_f:
+                magic = EntropySQLiteRepository._BINARY_DUMP_MAGIC
+                if in_f.read(len(magic)) == magic:
+                    EntropySQLiteRepository._importBinaryDump(conn, in_f)
+                else:
+                    in_f.seek(0)
+                    EntropySQLiteRepository._importSqlDump(conn, in_f)
+            conn.close()
+            conn = None
+        except (dbapi2.Error, IOError, OSError, ValueError,
+                struct.error) as err:
+            const_debug_write(__name__,
+                "importRepository: cannot import %s: %s" % (
+                    dumpfile, repr(err),))
+            if conn is not None:
+                conn.close()
             try:
-                proc = subprocess.Popen(("/usr/bin/sqlite3", tmp_dbfile,),
-                    bufsize = -1, stdin = in_f)
+                os.remove(tmp_dbfile)
             except OSError:
-                # ouch ! wtf!
-                return 1
-            rc = proc.wait()
-            if rc == 0:
-                os.rename(tmp_dbfile, dbfile)
-        return rc
+                pass
+            return 1
+
+        os.rename(tmp_dbfile, dbfile)
+        return 0
+
+    @staticmethod
+    def _dumpSqlText(sql):
+        """
+        Convert a raw SQL statement read from a dump file into a string
+        that can be handed to the SQLite module, preserving the raw bytes
+        of its string literals (that are not necessarily valid UTF-8).
+
+        @param sql: raw SQL statement
+        @type sql: bytes
+        @return: SQL statement
+        @rtype: string
+        """
+        if not const_is_python3():
+            return sql
+        try:
+            return sql.decode("utf-8")
+        except UnicodeDecodeError:
+            pass
+
+        def _literal(match):
+            literal = match.group(0)
+            try:
+                literal.decode("utf-8")
+                return literal
+            except UnicodeDecodeError:
+                data = literal[1:-1].replace(b"''", b"'")
+                return b"CAST(X'" + binascii.hexlify(data) + b"' AS TEXT)"
+
+        return EntropySQLiteRepository._DUMP_SQL_LITERAL.sub(
+            _literal, sql).decode("utf-8")
+
+    @staticmethod
+    def _importSqlDump(conn, dump_f):
+        """
+        Load an SQL text dump into the given connection, executing
+        statements in batches, each one inside its own transaction.
+        Transaction statements contained in the dump are ignored.
+
+        @param conn: SQLite connection, in autocommit mode
+        @type conn: sqlite3.Connection
+        @param dump_f: dump file object, opened in binary mode
+        @type dump_f: file object
+        """
+        dbapi2 = EntropySQLiteRepository.ModuleProxy.get()
+        batch_size = EntropySQLiteRepository._DUMP_BATCH_SIZE
+        skip = EntropySQLiteRepository._DUMP_SQL_TRANSACTIONS
+        semicolon = const_convert_to_rawstring(";")
+        py3 = const_is_python3()
+
+        batch = []
+        lines = []
+        for line in dump_f:
+            lines.append(line)
+            if not line.rstrip().endswith(semicolon):
+                continue
+            sql = const_convert_to_rawstring("").join(lines)
+            check_sql = sql
+            if py3:
+                # quotes and semicolons are ASCII, this cannot fail
+                check_sql = sql.decode("latin-1")
+            if not dbapi2.complete_statement(check_sql):
+                continue
+            del lines[:]
 
-    def exportRepository(self, dumpfile):
+            if len(check_sql) < 32 and \
+                    check_sql.strip().rstrip(";").upper() in skip:
+                continue
+            batch.append(EntropySQLiteRepository._dumpSqlText(sql))
+            if len(batch) >= batch_size:
+                conn.executescript("BEGIN;\n%sCOMMIT;\n" % ("".join(batch),))
+                del batch[:]
+
+        if const_convert_to_rawstring("").join(lines).strip():
+            raise ValueError("truncated SQL dump")
+        if batch:
+            conn.executescript("BEGIN;\n%sCOMMIT;\n" % ("".join(batch),))
+
+    @staticmethod
+    def _importBinaryDump(conn, dump_f):
+        """
+        Load a binary dump (see exportRepository()) into the given
+        connection, magic header excluded. Table rows are inserted using
+        executemany(), schema statements are executed in order, so that
+        indexes are built after the data load.
+
+        @param conn: SQLite connection, in autocommit mode
+        @type conn: sqlite3.Connection
+        @param dump_f: dump file object, opened in binary mode
+        @type dump_f: file object
+        """
+        record = EntropySQLiteRepository._BINARY_DUMP_RECORD
+        insert = None
+        columns = 0
+        conn.execute("BEGIN")
+        while True:
+            header = dump_f.read(record.size)
+            if len(header) != record.size:
+                raise ValueError("truncated binary dump")
+            rec_type, length = record.unpack(header)
+            payload = dump_f.read(length)
+            if len(payload) != length:
+                raise ValueError("truncated binary dump")
+
+            if rec_type == EntropySQLiteRepository._BINARY_DUMP_END:
+                break
+            elif rec_type == EntropySQLiteRepository._BINARY_DUMP_SQL:
+                conn.execute(payload.decode("utf-8"))
+            elif rec_type == EntropySQLiteRepository._BINARY_DUMP_TABLE:
+                columns, = struct.unpack_from(">H", payload)
+                insert = 'INSERT INTO "%s" VALUES (%s)' % (
+                    payload[2:].decode("utf-8"),
+                    ", ".join(["?"] * columns),)
+            elif rec_type == EntropySQLiteRepository._BINARY_DUMP_ROWS:
+                if insert is None:
+                    raise ValueError("binary dump rows without table")
+                EntropySQLiteRepository._insertBinaryDumpRows(
+                    conn, insert, columns, payload)
+            else:
+                raise ValueError("invalid binary dump record")
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _insertBinaryDumpRows(conn, insert, columns, payload):
+        """
+        Decode a binary dump rows batch and insert it.
+
+        @param conn: SQLite connection
+        @type conn: sqlite3.Connection
+        @param insert: INSERT statement, with placeholders
+        @type insert: string
+        @param columns: number of table columns
+        @type columns: int
+        @param payload: encoded rows, see _encodeBinaryDumpRows()
+        @type payload: bytes
+        """
+        buf = const_get_buffer()
+        py3 = const_is_python3()
+        rows, = struct.unpack_from(">I", payload)
+        offset = 4
+        values = []
+        invalid_text = False
+        for _col in range(columns):
+            types = payload[offset:offset + rows]
+            offset += rows
+
+            count, = struct.unpack_from(">I", payload, offset)
+            ints = struct.unpack_from(">%dq" % (count,), payload, offset + 4)
+            offset += 4 + 8 * count
+            count, = struct.unpack_from(">I", payload, offset)
+            floats = struct.unpack_from(
+                ">%dd" % (count,), payload, offset + 4)
+            offset += 4 + 8 * count
+            count, = struct.unpack_from(">I", payload, offset)
+            lengths = struct.unpack_from(
+                ">%dI" % (count,), payload, offset + 4)
+            offset += 4 + 4 * count
+            strings = []
+            for length in lengths:
+                strings.append(payload[offset:offset + length])
+                offset += length
+
+            if len(ints) == rows:
+                values.append(ints)
+                continue
+            if len(floats) == rows:
+                values.append(floats)
+                continue
+
+            ints_it, floats_it, strings_it = iter(ints), iter(floats), \
+                iter(strings)
+            col_values = []
+            for rec_type in bytearray(types):
+                if rec_type == 0x54: # T
+                    value = next(strings_it)
+                    if py3:
+                        try:
+                            value = value.decode("utf-8")
+                        except UnicodeDecodeError:
+                            # keep the raw bytes, see below
+                            value = _DumpRawText(value)
+                            invalid_text = True
+                    col_values.append(value)
+                elif rec_type == 0x4e: # N
+                    col_values.append(None)
+                elif rec_type == 0x49: # I
+                    col_values.append(next(ints_it))
+                elif rec_type == 0x46: # F
+                    col_values.append(next(floats_it))
+                elif rec_type == 0x42: # B
+                    col_values.append(buf(next(strings_it)))
+                else:
+                    raise ValueError("invalid binary dump value")
+            values.append(col_values)
+
+        data = list(zip(*values))
+        if not invalid_text:
+            conn.executemany(insert, data)
+            return
+
+        for row in data:
+            if not any(isinstance(x, _DumpRawText) for x in row):
+                conn.execute(insert, row)
+                continue
+            # store the invalid UTF-8 text as-is
+            params = ", ".join(
+                "CAST(? AS TEXT)" if isinstance(x, _DumpRawText) else "?" \
+                    for x in row)
+            conn.execute(insert[:insert.rindex("(")] + "(%s)" % (params,),
+                [bytes(x) if isinstance(x, _DumpRawText) else x \
+                     for x in row])
+
+    @staticmethod
+    def _encodeBinaryDumpRows(rows):
+        """
+        Encode a rows batch for the binary dump format. Values are stored
+        column by column: a type code for each row (N, I, F, T, B), then
+        the integer, float and string (text and blob) values.
+
+        @param rows: list of table rows, as returned when using
+            SQLiteConnectionWrapper.rawtext()
+        @type rows: list
+        @return: encoded rows
+        @rtype: bytes
+        """
+        chunks = [struct.pack(">I", len(rows))]
+        for col_values in zip(*rows):
+            types = bytearray()
+            ints = []
+            floats = []
+            strings = []
+            for value in col_values:
+                if value is None:
+                    types.append(0x4e) # N
+                elif const_isnumber(value):
+                    types.append(0x49) # I
+                    ints.append(value)
+                elif isinstance(value, float):
+                    types.append(0x46) # F
+                    floats.append(value)
+                elif isinstance(value, _DumpRawText):
+                    types.append(0x54) # T
+                    strings.append(value)
+                else:
+                    types.append(0x42) # B
+                    strings.append(bytes(value))
+            chunks.append(bytes(types))
+            chunks.append(struct.pack(">I%dq" % (len(ints),),
+                                      len(ints), *ints))
+            chunks.append(struct.pack(">I%dd" % (len(floats),),
+                                      len(floats), *floats))
+            chunks.append(struct.pack(">I%dI" % (len(strings),),
+                len(strings), *[len(x) for x in strings]))
+            chunks.extend(strings)
+        return const_convert_to_rawstring("").join(chunks)
+
+    def exportRepository(self, dumpfile, binary = False):
         """
         Reimplemented from EntropyRepositoryBase.
+        The binary format is much smaller and faster to load than the
+        SQL one, but it can only be read by importRepository().
         """
         exclude_tables = []
         gentle_with_tables = True
         toraw = const_convert_to_rawstring
+        batch_size = self._DUMP_BATCH_SIZE
+        record = self._BINARY_DUMP_RECORD
+
+        def _write_sql(sql):
+            if binary:
+                sql = toraw(sql, from_enctype = "utf-8")
+                dumpfile.write(record.pack(self._BINARY_DUMP_SQL, len(sql)))
+                dumpfile.write(sql)
+            else:
+                dumpfile.write(toraw("%s;\n" % sql))
 
-        dumpfile.write(toraw("BEGIN TRANSACTION;\n"))
+        if binary:
+            dumpfile.write(self._BINARY_DUMP_MAGIC)
+        else:
+            dumpfile.write(toraw("BEGIN TRANSACTION;\n"))
         cur = self._cursor().execute("""
         SELECT name, type, sql FROM sqlite_master
         WHERE sql NOT NULL AND type=='table'
@@ -2082,33 +2689,65 @@ class EntropySQLiteRepository(EntropySQLRepository):
             )
             if name.startswith("sqlite_"):
                 continue
+            if name.startswith(self._SEARCH_INDEX_TABLE):
+                # derived data, rebuilt by createAllIndexes()
+                continue
 
             t_cmd = "CREATE TABLE"
             if sql.startswith(t_cmd) and gentle_with_tables:
                 sql = "CREATE TABLE IF NOT EXISTS"+sql[len(t_cmd):]
-            dumpfile.write(toraw("%s;\n" % sql))
+            _write_sql(sql)
 
             if name in exclude_tables:
                 continue
 
             cur2 = self._cursor().execute("PRAGMA table_info('%s')" % name)
             cols = [r[1] for r in cur2.fetchall()]
+
+            if binary:
+                # TEXT values must be stored byte by byte
+                self._connection().rawtext()
+                table = toraw(name, from_enctype = "utf-8")
+                table = struct.pack(">H", len(cols)) + table
+                dumpfile.write(record.pack(
+                    self._BINARY_DUMP_TABLE, len(table)))
+                dumpfile.write(table)
+                cur3 = self._cursor().execute(
+                    'SELECT * FROM "%s"' % (name,))
+                while True:
+                    rows = cur3.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    data = self._encodeBinaryDumpRows(rows)
+                    dumpfile.write(record.pack(
+                        self._BINARY_DUMP_ROWS, len(data)))
+                    dumpfile.write(data)
+                self._connection().unicode()
+                continue
+
             q = "SELECT 'INSERT INTO \"%(tbl_name)s\" VALUES("
             q += ", ".join(["'||quote(" + x + ")||'" for x in cols])
             q += ")' FROM '%(tbl_name)s'"
             self._connection().unicode()
             cur3 = self._cursor().execute(q % {'tbl_name': name})
-            for row in cur3:
-                dumpfile.write(toraw("%s;\n" % (row[0],)))
+            while True:
+                rows = cur3.fetchmany(batch_size)
+                if not rows:
+                    break
+                dumpfile.write(toraw(
+                    "".join(["%s;\n" % (row[0],) for row in rows])))
 
         cur4 = self._cursor().execute("""
         SELECT name, type, sql FROM sqlite_master
         WHERE sql NOT NULL AND type!='table' AND type!='meta'
         """)
         for name, x, sql in cur4.fetchall():
-            dumpfile.write(toraw("%s;\n" % sql))
+            _write_sql(sql)
 
-        dumpfile.write(toraw("COMMIT;\n"))
+        if binary:
+            dumpfile.write(record.pack(self._BINARY_DUMP_END, 0))
+        else:
+            dumpfile.write(toraw("COMMIT;\n"))
         if hasattr(dumpfile, 'flush'):
             dumpfile.flush()
 
@@ -2120,6 +2759,321 @@ class EntropySQLiteRepository(EntropySQLRepository):
         )
         # remember to close the file
 
+    def alignDatabases(self, dbconn, force = False, output_header = "  ",
+        align_limit = 300):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        If dbconn is an on-disk SQLite repository using the same schema,
+        its file is attached to this repository and packages are moved
+        table by table through set-based queries, inside a single
+        transaction. In this case, align_limit is not enforced.
+        Otherwise, the superclass method is called.
+        """
+        if not self._canAlignAttached(dbconn):
+            return super(EntropySQLiteRepository, self).alignDatabases(
+                dbconn, force = force, output_header = output_header,
+                align_limit = align_limit)
+
+        added_ids, removed_ids = self._getIdpackagesDifferences(
+            dbconn.listAllPackageIds())
+        if not added_ids and not removed_ids:
+            return -1
+
+        # ATTACH cannot be executed inside a transaction
+        self._connection().commit()
+        self._cursor().execute(
+            "ATTACH DATABASE ? AS align_src", (dbconn._db,))
+        try:
+            tables = self._alignTables()
+            if tables is not None:
+                mytxt = red("%s, %s ...") % (
+                    _("Syncing current database"),
+                    _("please wait"),
+                )
+                self.output(
+                    mytxt,
+                    importance = 1,
+                    level = "info",
+                    header = output_header,
+                    back = True
+                )
+                try:
+                    self._alignAttached(tables, added_ids, removed_ids)
+                except:
+                    self.rollback()
+                    raise
+                self._connection().commit()
+        finally:
+            for table in ("align_added", "align_removed", "align_refmap"):
+                self._cursor().execute(
+                    "DROP TABLE IF EXISTS temp.%s" % (table,))
+            self._cursor().execute("DETACH DATABASE align_src")
+
+        if tables is None:
+            return super(EntropySQLiteRepository, self).alignDatabases(
+                dbconn, force = force, output_header = output_header,
+                align_limit = align_limit)
+
+        # do some cleanups
+        self.clean()
+        # clear caches
+        self.clearCache()
+        self.commit()
+        dbconn.clearCache()
+
+        # verify both checksums, if they don't match, bomb out
+        mycheck = self.checksum(do_order = True, strict = False)
+        outcheck = dbconn.checksum(do_order = True, strict = False)
+        if mycheck == outcheck:
+            return 1
+        return 0
+
+    def _canAlignAttached(self, dbconn):
+        """
+        Return whether alignDatabases() can attach the given foreign
+        repository and move packages using set-based queries. This is not
+        possible if dbconn is not stored in a file or if any repository
+        plugin wants to be notified about package additions and removals.
+
+        @param dbconn: foreign repository instance
+        @type dbconn: entropy.db.EntropyRepository
+        @return: True, if the attached alignment can be used
+        @rtype: bool
+        """
+        if not isinstance(dbconn, EntropySQLiteRepository):
+            return False
+        if dbconn._db is None or dbconn._is_memory():
+            return False
+        if dbconn._db == self._db:
+            return False
+
+        def _hook(klass, name):
+            method = getattr(klass, name)
+            return getattr(method, "__func__", method)
+
+        plugins = self.get_plugins()
+        for plug_inst in plugins.values():
+            for name in ("add_package_hook", "remove_package_hook"):
+                if _hook(plug_inst.__class__, name) is not _hook(
+                        EntropyRepositoryPlugin, name):
+                    return False
+        return True
+
+    def _alignTableColumns(self, schema, table):
+        """
+        Return the column names of the given table, in order.
+
+        @param schema: database schema name ("main", "align_src")
+        @type schema: string
+        @param table: table name
+        @type table: string
+        @return: column names (empty if the table does not exist)
+        @rtype: tuple
+        """
+        cur = self._cursor().execute(
+            "PRAGMA %s.table_info(%s)" % (schema, table,))
+        return tuple(x[1] for x in cur)
+
+    def _alignTables(self):
+        """
+        Return the package metadata tables that alignDatabases() moves from
+        the attached "align_src" repository, baseinfo first, or None if the
+        two repositories are not using the same layout (different columns,
+        legacy tables with unknown references, etc).
+
+        @return: list of tuples composed by (table name, column names,
+            referenced column or None)
+        @rtype: list or None
+        """
+        cur = self._cursor().execute("""
+        SELECT name FROM main.sqlite_master
+        WHERE type = "table" AND NOT name LIKE "sqlite_%"
+        """)
+        tables = []
+        for table in self._cur2tuple(cur):
+            columns = self._alignTableColumns("main", table)
+            if "idpackage" not in columns:
+                continue
+            if columns != self._alignTableColumns("align_src", table):
+                return None
+
+            ref_columns = [x for x in columns if x.startswith("id") \
+                               and x != "idpackage"]
+            if len(ref_columns) > 1:
+                return None
+            ref_column = None
+            if ref_columns:
+                ref_column = ref_columns[0]
+                ref = self._ALIGN_REFERENCES.get((table, ref_column))
+                if ref is None:
+                    return None
+                ref_table, value = ref
+                for schema in ("main", "align_src"):
+                    if self._alignTableColumns(schema, ref_table) != (
+                            ref_column, value):
+                        return None
+            tables.append((table, columns, ref_column))
+
+        if "baseinfo" not in [x[0] for x in tables]:
+            return None
+        for table in ("licensedata", "packagechangelogs", "mirrorlinks"):
+            columns = self._alignTableColumns("main", table)
+            if columns != self._alignTableColumns("align_src", table):
+                return None
+
+        tables.sort(key = lambda x: x[0] != "baseinfo")
+        return tables
+
+    def _alignAttached(self, tables, added_ids, removed_ids):
+        """
+        Remove the given package identifiers and copy the added ones from
+        the attached "align_src" repository, see alignDatabases().
+        The reference tables values are merged and the package rows
+        remapped to the local identifiers.
+
+        @param tables: tables as returned by _alignTables()
+        @type tables: list
+        @param added_ids: package identifiers to copy
+        @type added_ids: set
+        @param removed_ids: package identifiers to remove
+        @type removed_ids: set
+        """
+        cursor = self._cursor()
+        # do not use executescript(), it would commit the transaction
+        for table in ("align_added", "align_removed", "align_refmap"):
+            cursor.execute("DROP TABLE IF EXISTS temp.%s" % (table,))
+        cursor.execute("""
+        CREATE TEMP TABLE align_added (idpackage INTEGER PRIMARY KEY)
+        """)
+        cursor.execute("""
+        CREATE TEMP TABLE align_removed (idpackage INTEGER PRIMARY KEY)
+        """)
+        cursor.execute("""
+        CREATE TEMP TABLE align_refmap (
+            srcid INTEGER PRIMARY KEY, dstid INTEGER)
+        """)
+        cursor.executemany("INSERT INTO temp.align_added VALUES (?)",
+            [(x,) for x in added_ids])
+        cursor.executemany("INSERT INTO temp.align_removed VALUES (?)",
+            [(x,) for x in removed_ids])
+        added = "SELECT idpackage FROM temp.align_added"
+        removed = "SELECT idpackage FROM temp.align_removed"
+
+        # dependent tables first, baseinfo last
+        for table, _columns, _ref_column in reversed(tables):
+            cursor.execute("""
+            DELETE FROM main.%s WHERE idpackage IN (%s)
+            """ % (table, removed,))
+
+        for table, columns, ref_column in tables:
+            sql_columns = ", ".join(columns)
+            if ref_column is None:
+                cursor.execute("""
+                INSERT INTO main.%s (%s) SELECT %s FROM align_src.%s
+                WHERE idpackage IN (%s) ORDER BY rowid
+                """ % (table, sql_columns, sql_columns, table, added,))
+                continue
+
+            ref_table, value = self._ALIGN_REFERENCES[(table, ref_column)]
+            params = {
+                "table": table,
+                "columns": sql_columns,
+                "ref_table": ref_table,
+                "id": ref_column,
+                "value": value,
+                "added": added,
+                "select": ", ".join(
+                    "m.dstid" if x == ref_column else "t." + x \
+                        for x in columns),
+            }
+            cursor.execute("""
+            INSERT INTO main.%(ref_table)s (%(value)s)
+            SELECT DISTINCT r.%(value)s FROM align_src.%(ref_table)s r
+            WHERE r.%(id)s IN (
+                SELECT %(id)s FROM align_src.%(table)s
+                WHERE idpackage IN (%(added)s))
+            AND r.%(value)s NOT IN (
+                SELECT %(value)s FROM main.%(ref_table)s
+                WHERE %(value)s IS NOT NULL)
+            """ % params)
+            cursor.execute("DELETE FROM temp.align_refmap")
+            cursor.execute("""
+            INSERT INTO temp.align_refmap
+            SELECT r.%(id)s, MIN(l.%(id)s)
+            FROM align_src.%(ref_table)s r, main.%(ref_table)s l
+            WHERE r.%(id)s IN (
+                SELECT %(id)s FROM align_src.%(table)s
+                WHERE idpackage IN (%(added)s))
+            AND l.%(value)s = r.%(value)s
+            GROUP BY r.%(id)s
+            """ % params)
+            cursor.execute("""
+            INSERT INTO main.%(table)s (%(columns)s)
+            SELECT %(select)s
+            FROM align_src.%(table)s t, temp.align_refmap m
+            WHERE t.idpackage IN (%(added)s) AND m.srcid = t.%(id)s
+            ORDER BY t.rowid
+            """ % params)
+
+        # license texts are shared, only add the missing ones
+        cur = cursor.execute("""
+        SELECT DISTINCT license FROM align_src.baseinfo
+        WHERE idpackage IN (%s)
+        """ % (added,))
+        licenses = set()
+        for (license_str,) in cur.fetchall():
+            if license_str:
+                licenses.update(x for x in license_str.split() \
+                                    if entropy.tools.is_valid_string(x))
+        licenses = sorted(licenses)
+        chunk_size = self._PACKAGE_IDS_QUERY_CHUNK
+        for idx in range(0, len(licenses), chunk_size):
+            chunk = licenses[idx:idx + chunk_size]
+            cursor.execute("""
+            %s INTO main.licensedata
+            SELECT * FROM align_src.licensedata WHERE licensename IN (%s)
+            """ % (self._INSERT_OR_IGNORE, ", ".join(["?"] * len(chunk)),),
+                chunk)
+
+        cursor.execute("""
+        %s INTO main.packagechangelogs
+        SELECT c.* FROM align_src.packagechangelogs c, align_src.baseinfo b
+        WHERE b.idpackage IN (%s)
+        AND c.category = b.category AND c.name = b.name
+        """ % (self._INSERT_OR_REPLACE, added,))
+
+        # like addPackage(), the source package mirrors referenced by the
+        # added packages replace the local ones
+        cur = cursor.execute("""
+        SELECT DISTINCT r.source
+        FROM align_src.sources s, align_src.sourcesreference r
+        WHERE s.idpackage IN (%s) AND r.idsource = s.idsource
+        AND r.source LIKE "mirror://%%"
+        """ % (added,))
+        mirror_names = sorted(set(
+            x.split("/")[2] for (x,) in cur.fetchall()))
+        for idx in range(0, len(mirror_names), chunk_size):
+            chunk = mirror_names[idx:idx + chunk_size]
+            placeholders = ", ".join(["?"] * len(chunk))
+            cursor.execute("""
+            DELETE FROM main.mirrorlinks WHERE mirrorname IN (%s)
+            """ % (placeholders,), chunk)
+            cursor.execute("""
+            INSERT INTO main.mirrorlinks
+            SELECT * FROM align_src.mirrorlinks WHERE mirrorname IN (%s)
+            ORDER BY rowid
+            """ % (placeholders,), chunk)
+
+        if self._searchIndexTable() is not None:
+            cursor.execute("""
+            DELETE FROM %s WHERE rowid IN (%s UNION %s)
+            """ % (self._SEARCH_INDEX_TABLE, removed, added,))
+            cursor.execute("""
+            INSERT INTO %s (rowid, atom, name, provide, description, useflags)
+            %s WHERE b.idpackage IN (%s)
+            """ % (self._SEARCH_INDEX_TABLE, self._SEARCH_INDEX_SELECT,
+                   added,))
+
     def _listAllTables(self):
         """
         List all available tables in this repository database.
@@ -2156,7 +3110,8 @@ class EntropySQLiteRepository(EntropySQLRepository):
                          self).checksum(
                 do_order = do_order,
                 strict = strict,
-                include_signatures = include_signatures)
+                include_signatures = include_signatures,
+                include_dependencies = include_dependencies)
 
         # backward compatibility
         # !!! keep aligned !!!
@@ -2368,6 +3323,17 @@ class EntropySQLiteRepository(EntropySQLRepository):
                 raise
             return {}
 
+    def dropContent(self):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle the compacted content layout.
+        """
+        if not self._isContentCompacted():
+            return super(EntropySQLiteRepository, self).dropContent()
+        self._cursor().execute('DELETE FROM contentfiles')
+        self._cursor().execute('DELETE FROM contentdirs')
+        self.dropContentSafety()
+
     def dropContentSafety(self):
         """
         Reimplemented from EntropySQLRepository.
@@ -2394,6 +3360,7 @@ class EntropySQLiteRepository(EntropySQLRepository):
                 self._cursor().execute('DROP INDEX IF EXISTS %s' % (index,))
             except OperationalError:
                 continue
+        self._dropSearchIndex()
 
     def createAllIndexes(self):
         """
@@ -2406,6 +3373,117 @@ class EntropySQLiteRepository(EntropySQLRepository):
             self.__createCategoriesIndex()
             self.__createCompileFlagsIndex()
 
+    def _createSearchIndex(self):
+        """
+        Reimplemented from EntropySQLRepository.
+        Create and fill the full-text search index used by searchPackages(),
+        searchDescription() and searchRanked(), if the SQLite library
+        supports FTS5 and its trigram tokenizer (which makes substring LIKE
+        queries use the index).
+        """
+        if self._doesTableExist(self._SEARCH_INDEX_TABLE):
+            return
+        try:
+            self._cursor().execute("""
+            CREATE VIRTUAL TABLE %s USING fts5(
+                atom, name, provide, description, useflags,
+                tokenize = "trigram")
+            """ % (self._SEARCH_INDEX_TABLE,))
+        except OperationalError:
+            # not supported, keep using LIKE queries
+            return
+        self._clearLiveCache("_doesTableExist")
+        self._cursor().execute("""
+        INSERT INTO %s (rowid, atom, name, provide, description, useflags)
+        %s""" % (self._SEARCH_INDEX_TABLE, self._SEARCH_INDEX_SELECT,))
+
+    def _dropSearchIndex(self):
+        """
+        Drop the full-text search index.
+        """
+        try:
+            self._cursor().execute(
+                "DROP TABLE IF EXISTS %s" % (self._SEARCH_INDEX_TABLE,))
+        except OperationalError:
+            # FTS5 not supported
+            pass
+        self._clearLiveCache("_doesTableExist")
+
+    def _searchIndexTable(self):
+        """
+        Reimplemented from EntropySQLRepository.
+        """
+        if self._doesTableExist(self._SEARCH_INDEX_TABLE):
+            return self._SEARCH_INDEX_TABLE
+        return None
+
+    def _updateSearchIndex(self, package_id):
+        """
+        Reimplemented from EntropySQLRepository.
+        """
+        if self._searchIndexTable() is None:
+            return
+        self._cursor().execute("""
+        DELETE FROM %s WHERE rowid = ?
+        """ % (self._SEARCH_INDEX_TABLE,), (package_id,))
+        self._cursor().execute("""
+        INSERT INTO %s (rowid, atom, name, provide, description, useflags)
+        %s WHERE b.idpackage = ?
+        """ % (self._SEARCH_INDEX_TABLE, self._SEARCH_INDEX_SELECT,),
+            (package_id,))
+
+    def searchRanked(self, keyword, description = False):
+        """
+        Reimplemented from EntropySQLRepository.
+        The full-text search index is used, if available, and packages with
+        the same relevance are ordered by their Okapi BM25 score.
+        """
+        terms = [keyword]
+        if description:
+            terms.extend(keyword.split())
+        # trigram tokenizer, shorter terms cannot be matched
+        if self._searchIndexTable() is None or not keyword.split() or \
+                min(len(x) for x in terms) < 3:
+            return super(EntropySQLiteRepository, self).searchRanked(
+                keyword, description = description)
+
+        def _phrase(term):
+            return '"%s"' % (term.replace('"', '""'),)
+
+        query = "{atom provide} : %s" % (_phrase(keyword),)
+        if description:
+            query = "(%s) OR ({description useflags} : (%s))" % (
+                query, " AND ".join(_phrase(x) for x in keyword.split()))
+
+        cur = self._cursor().execute("""
+        SELECT rowid, name, atom, provide, bm25(%s, %s) FROM %s
+        WHERE %s MATCH ?
+        """ % (self._SEARCH_INDEX_TABLE,
+               ", ".join(str(x) for x in self._SEARCH_INDEX_WEIGHTS),
+               self._SEARCH_INDEX_TABLE, self._SEARCH_INDEX_TABLE,),
+            (query,))
+        rows = cur.fetchall()
+        if not rows:
+            return tuple()
+
+        # bm25() returns negative values, the lower the better
+        best_bm25 = min(x[4] for x in rows)
+        lower_keyword = keyword.lower()
+        scores = {}
+        for package_id, name, atom, provide, bm25 in rows:
+            if lower_keyword in atom.lower() or \
+                    lower_keyword in (provide or "").lower():
+                score = self._searchRelevance(keyword, name, atom)
+            else:
+                # matched through description or use flags
+                score = 0.0
+            if best_bm25 < 0:
+                # keep the score within its relevance class
+                score += 0.49 * bm25 / best_bm25
+            scores[package_id] = score
+
+        return tuple(sorted(scores.items(), key = lambda x: (-x[1], x[0])))
+
     def __createCompileFlagsIndex(self):
         try:
             self._cursor().execute("""
@@ -2426,6 +3504,20 @@ class EntropySQLiteRepository(EntropySQLRepository):
         CREATE INDEX IF NOT EXISTS licensesindex ON licenses ( license )
         """)
 
+    def _createContentIndex(self):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle the compacted content layout.
+        """
+        if not self._isContentCompacted():
+            return super(EntropySQLiteRepository, self)._createContentIndex()
+        self._cursor().executescript("""
+        CREATE INDEX IF NOT EXISTS contentfilesindex_couple
+            ON contentfiles ( idpackage );
+        CREATE INDEX IF NOT EXISTS contentfilesindex_file
+            ON contentfiles ( iddir, basename );
+        """)
+
     def _createBaseinfoIndex(self):
         """
         Reimplemented from EntropySQLRepository.
@@ -2585,6 +3677,124 @@ class EntropySQLiteRepository(EntropySQLRepository):
         self._setSetting("_baseinfo_extrainfo_2010", "1")
         self._connection().commit()
 
+    @staticmethod
+    def _splitContentPath(path):
+        """
+        Split a content path into its directory part, including the
+        trailing slash, and its basename, so that the two strings
+        concatenated give back the original path. This must match what
+        the "content" view triggers do, see _migrateContentDirs().
+
+        @param path: content path
+        @type path: string
+        @return: tuple composed by directory and basename
+        @rtype: tuple
+        """
+        idx = path.rfind("/") + 1
+        return path[:idx], path[idx:]
+
+    def _isContentCompacted(self):
+        """
+        Return whether package content metadata is stored using the
+        compacted layout (contentdirs and contentfiles tables, with
+        "content" being a view).
+        """
+        return self._doesTableExist("contentdirs")
+
+    def _migrateContentDirs(self):
+        """
+        Migrate the "content" table to the compacted layout: directories
+        are interned into the "contentdirs" table and package files are
+        stored in the "contentfiles" table as (idpackage, iddir, basename,
+        type) rows. "content" becomes a view with the very same columns
+        and INSTEAD OF triggers, so that the old SQL keeps working.
+        """
+        if self._isContentCompacted():
+            return
+        if not self._doesTableExist("content"):
+            return
+
+        cur = self._cursor().execute("SELECT 1 FROM content LIMIT 1")
+        if cur.fetchone() is not None:
+            mytxt = "%s: [%s] %s" % (
+                bold(_("ATTENTION")),
+                purple(self.name),
+                red(_("compacting repository content metadata, please wait!")),
+            )
+            self.output(
+                mytxt,
+                importance = 1,
+                level = "warning")
+
+        self._cursor().execute("pragma foreign_keys = OFF").fetchall()
+        self._cursor().executescript("""
+            BEGIN TRANSACTION;
+
+            DROP TABLE IF EXISTS contentdirs;
+            CREATE TABLE contentdirs (
+                iddir INTEGER PRIMARY KEY,
+                dir VARCHAR UNIQUE
+            );
+            INSERT INTO contentdirs (dir)
+                SELECT DISTINCT rtrim(file, replace(file, '/', ''))
+                FROM content;
+
+            DROP TABLE IF EXISTS contentfiles;
+            CREATE TABLE contentfiles (
+                idpackage INTEGER,
+                iddir INTEGER,
+                basename VARCHAR,
+                type VARCHAR,
+                FOREIGN KEY(idpackage)
+                    REFERENCES baseinfo(idpackage) ON DELETE CASCADE
+            );
+            INSERT INTO contentfiles
+                SELECT content.idpackage, contentdirs.iddir,
+                    substr(content.file, length(contentdirs.dir) + 1),
+                    content.type
+                FROM content, contentdirs
+                WHERE contentdirs.dir =
+                    rtrim(content.file, replace(content.file, '/', ''));
+
+            DROP TABLE content;
+            CREATE VIEW content AS
+                SELECT contentfiles.idpackage AS idpackage,
+                    contentdirs.dir || contentfiles.basename AS file,
+                    contentfiles.type AS type
+                FROM contentfiles, contentdirs
+                WHERE contentfiles.iddir = contentdirs.iddir;
+
+            CREATE TRIGGER content_insert INSTEAD OF INSERT ON content
+            BEGIN
+                INSERT OR IGNORE INTO contentdirs (dir)
+                    VALUES (rtrim(NEW.file, replace(NEW.file, '/', '')));
+                INSERT INTO contentfiles
+                    SELECT NEW.idpackage, iddir,
+                        substr(NEW.file, length(dir) + 1), NEW.type
+                    FROM contentdirs WHERE dir =
+                        rtrim(NEW.file, replace(NEW.file, '/', ''));
+            END;
+
+            CREATE TRIGGER content_delete INSTEAD OF DELETE ON content
+            BEGIN
+                DELETE FROM contentfiles
+                WHERE idpackage = OLD.idpackage
+                AND iddir = (SELECT iddir FROM contentdirs WHERE dir =
+                    rtrim(OLD.file, replace(OLD.file, '/', '')))
+                AND basename = substr(OLD.file, length(
+                    rtrim(OLD.file, replace(OLD.file, '/', ''))) + 1);
+            END;
+
+            COMMIT;
+        """)
+        self._cursor().execute("pragma foreign_keys = ON").fetchall()
+
+        self._clearLiveCache("_doesTableExist")
+        self._clearLiveCache("_doesColumnInTableExist")
+        if self._indexing:
+            self._createContentIndex()
+        self._connection().commit()
+
     def _foreignKeySupport(self):
 
         # entropy.qa uses this name, must skip migration
@@ -2708,6 +3918,79 @@ class EntropySQLiteRepository(EntropySQLRepository):
         self._clearLiveCache("_doesTableExist")
         self._clearLiveCache("_doesColumnInTableExist")
 
+    def _createChecksumTables(self):
+        """
+        Create the tables keeping the checksum state (see
+        EntropySQLRepository._getChecksumState()) and the triggers
+        recording the packages whose checksum digest may have changed.
+        Triggers are stored in the repository, so that every writer
+        records its changes. The stored checksum state is dropped, the
+        repository may have been modified without the triggers.
+        """
+        script = """
+            CREATE TABLE IF NOT EXISTS checksumdigests (
+                idpackage INTEGER PRIMARY KEY,
+                digest VARCHAR
+            );
+
+            CREATE TABLE IF NOT EXISTS checksumchanges (
+                idchange INTEGER PRIMARY KEY AUTOINCREMENT,
+                idpackage INTEGER
+            );
+        """
+        # the tables covered by the package digests
+        for table in ("baseinfo", "extrainfo", "packagesignatures",
+                      "dependencies"):
+            script += """
+            CREATE TRIGGER IF NOT EXISTS checksum_%(table)s_insert
+            AFTER INSERT ON %(table)s
+            BEGIN
+                INSERT INTO checksumchanges (idpackage)
+                    VALUES (NEW.idpackage);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS checksum_%(table)s_update
+            AFTER UPDATE ON %(table)s
+            BEGIN
+                INSERT INTO checksumchanges (idpackage)
+                    SELECT OLD.idpackage UNION SELECT NEW.idpackage;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS checksum_%(table)s_delete
+            AFTER DELETE ON %(table)s
+            BEGIN
+                INSERT INTO checksumchanges (idpackage)
+                    VALUES (OLD.idpackage);
+            END;
+            """ % {'table': table,}
+
+        script += """
+            CREATE TRIGGER IF NOT EXISTS checksum_dependenciesreference_update
+            AFTER UPDATE ON dependenciesreference
+            BEGIN
+                INSERT INTO checksumchanges (idpackage)
+                    SELECT DISTINCT idpackage FROM dependencies
+                    WHERE iddependency IN
+                        (OLD.iddependency, NEW.iddependency);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS checksum_dependenciesreference_delete
+            AFTER DELETE ON dependenciesreference
+            BEGIN
+                INSERT INTO checksumchanges (idpackage)
+                    SELECT DISTINCT idpackage FROM dependencies
+                    WHERE iddependency = OLD.iddependency;
+            END;
+        """
+        self._cursor().executescript(script)
+        self._cursor().execute("""
+        DELETE FROM settings WHERE setting_name = ?
+        """, (self._CHECKSUM_STATE_SETTING,))
+        self._settings_cache.clear()
+        self._clearLiveCache("checksumState")
+        self._clearLiveCache("_doesTableExist")
+        self._clearLiveCache("_doesColumnInTableExist")
+
     def _createProvidedLibs(self):
 
         def do_create():
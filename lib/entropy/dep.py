@@ -11,7 +11,9 @@
     This module contains Entropy package dependency manipulation functions.
 
 """
+import functools
 import re
+
 from entropy.exceptions import InvalidAtom, EntropyException
 from entropy.const import etpConst, const_cmp
 
@@ -43,6 +45,38 @@ endversion_keys = ["pre", "p", "alpha", "beta", "rc"]
 valid_category = re.compile("^\w[\w-]*")
 invalid_atom_chars_regexp = re.compile("[()|@]")
 
+# Maximum number of entries kept by each memoization cache of this module,
+# caches are flushed when full.
+MEMOIZE_CACHE_SIZE = 16384
+
+def _memoize(func):
+    """
+    Decorator memoizing the results of a function taking a single string
+    argument. Results are kept separately for each argument type, so that
+    str and unicode objects don't share entries.
+    """
+    caches = {}
+
+    @functools.wraps(func)
+    def wrapper(arg):
+        cache = caches.get(arg.__class__)
+        if cache is None:
+            cache = caches.setdefault(arg.__class__, {})
+        try:
+            return cache[arg]
+        except KeyError:
+            pass
+        except TypeError:
+            # unhashable
+            return func(arg)
+        result = func(arg)
+        if len(cache) >= MEMOIZE_CACHE_SIZE:
+            cache.clear()
+        cache[arg] = result
+        return result
+
+    return wrapper
+
 def _ververify(myver):
     if myver.endswith("*"):
         m = ver_regexp.match(myver[:-1])
@@ -99,6 +133,7 @@ def _generic_sorter(inputlist, cmp_func):
 
     return inputs
 
+@_memoize
 def isjustname(mypkg):
     """
     Checks to see if the depstring is only the package name (no version parts)
@@ -123,6 +158,7 @@ def isjustname(mypkg):
     ver_rev = '-'.join(mypkg.split('-')[-2:])
     return not _ververify(ver_rev)
 
+@_memoize
 def catpkgsplit(mydata):
     """
     Takes a Category/Package-Version-Rev and returns a list of each.
@@ -150,6 +186,7 @@ def catpkgsplit(mydata):
     retval += p_split
     return retval
 
+@_memoize
 def dep_getkey(mydep):
     """
     Return the category/package-name of a depstring.
@@ -191,6 +228,7 @@ def remove_cat(mydep):
         return mydep.split("/", 1)[1]
     return mydep
 
+@_memoize
 def dep_getcpv(mydep):
     """
     Return the category-package-version with any operators/slot specifications stripped off
@@ -220,6 +258,7 @@ def dep_getcpv(mydep):
 
     return mydep
 
+@_memoize
 def dep_getslot(mydep):
     """
     # Imported from portage.dep
@@ -246,6 +285,7 @@ def dep_getslot(mydep):
             return mydep[colon+1:bracket]
     return None
 
+@_memoize
 def dep_getusedeps(depend):
     """
     # Imported from portage.dep
@@ -498,51 +538,240 @@ def remove_package_operators(atom):
     """
     return atom.lstrip("><=~")
 
+class ParsedAtom(object):
+    """
+    Decomposition of a dependency string into the components used for
+    matching it against repositories. Objects are immutable by convention
+    and shared, use parse_atom() to retrieve them.
+    """
+
+    __slots__ = ("atom", "scan_atom", "tag", "usedeps", "slot",
+                 "revision", "direction", "justname", "key", "name",
+                 "category", "version", "stripped_atom")
+
+    def __init__(self, atom):
+        """
+        ParsedAtom constructor.
+
+        @param atom: the dependency string
+        @type atom: string
+        """
+        self.atom = atom
+        self.tag = dep_gettag(atom)
+        try:
+            self.usedeps = dep_getusedeps(atom)
+        except InvalidAtom:
+            self.usedeps = ()
+        self.slot = dep_getslot(atom)
+        revision = dep_get_entropy_revision(atom)
+        if isinstance(revision, int):
+            if revision < 0:
+                revision = None
+        self.revision = revision
+
+        scan_atom = remove_usedeps(atom)
+        scan_atom = remove_tag(scan_atom)
+        scan_atom = remove_slot(scan_atom)
+        scan_atom = remove_entropy_revision(scan_atom)
+        self.scan_atom = scan_atom
+
+        self.direction = ''
+        self.justname = True
+        self.key = ''
+        self.name = ''
+        self.category = ''
+        self.version = ''
+        self.stripped_atom = ''
+        if scan_atom:
+            self._parse_scan_atom(scan_atom)
+
+    def _parse_scan_atom(self, scan_atom):
+        """
+        Fill the operator, key and version components from the
+        dependency string stripped of USE deps, tag, slot and revision.
+        """
+        scan_cpv = dep_getcpv(scan_atom)
+        stripped_atom = scan_cpv
+        wildcard = ""
+        if scan_atom.endswith("*"):
+            wildcard = "*"
+            stripped_atom += wildcard
+        self.stripped_atom = stripped_atom
+        self.direction = scan_atom[0:-len(stripped_atom)]
+
+        justname = isjustname(scan_cpv)
+        self.justname = justname
+        key = stripped_atom
+        if justname == 0:
+            data = catpkgsplit(scan_cpv)
+            if data is None:
+                # badly formatted
+                self.key = key
+                return
+            self.version = data[2] + wildcard + "-" + data[3]
+            key = dep_getkey(stripped_atom)
+        self.key = key
+
+        splitkey = key.split("/")
+        if len(splitkey) == 2:
+            self.category, self.name = splitkey
+        else:
+            self.category, self.name = "null", splitkey[0]
+
+    def __repr__(self):
+        return "<ParsedAtom %r>" % (self.atom,)
+
+@_memoize
+def parse_atom(atom):
+    """
+    Return the (shared) ParsedAtom object for the given dependency string.
+
+    Example usage:
+        >>> parse_atom('>=app-foo/foo-1.2.3:2').key
+        'app-foo/foo'
+
+    @param atom: the dependency string
+    @type atom: string
+    @return: the ParsedAtom object
+    @rtype: ParsedAtom
+    """
+    return ParsedAtom(atom)
+
+class _Version(object):
+    """
+    Pre-parsed version string, see _parse_version().
+    """
+
+    __slots__ = ("major", "minors", "has_minors", "letter", "suffixes",
+                 "revision", "key", "sortable")
+
+    def __init__(self, match):
+        self.major = int(match.group(2))
+        self.has_minors = len(match.group(3)) > 0
+        self.minors = match.group(3)[1:].split(".")
+        self.letter = match.group(5)
+        self.suffixes = [suffix_regexp.match(x).groups() for x in \
+                             match.group(6).split("_")[1:]]
+        revision = match.group(10)
+        if revision:
+            self.revision = int(revision)
+        else:
+            self.revision = 0
+
+        # compare_versions() considers "_p" and "_p0" (and, in general,
+        # suffix numbers only differing by leading zeroes) equal and stops
+        # comparing there, which cannot be expressed by a sort key.
+        self.sortable = True
+        for s_name, s_num in self.suffixes:
+            if s_num.startswith("0") or (s_name == "p" and not s_num):
+                self.sortable = False
+                break
+
+        self.key = self._version_key()
+
+    def _version_key(self):
+        """
+        Build the tuple that sorts like compare_versions() does.
+        """
+        numbers = [self.major]
+        if self.has_minors:
+            for minor in self.minors:
+                # a leading zero means "compare as a fraction": these
+                # always sort before the other numbers (0.0x < 0.1)
+                if minor[0] != "0":
+                    numbers.append((1, int(minor)))
+                else:
+                    numbers.append((0, float("0." + minor)))
+
+        if self.letter:
+            letter = ord(self.letter)
+        else:
+            letter = 0
+
+        # missing suffixes compare as "_p0", drop the trailing ones and
+        # make the others carry the direction of the first following
+        # suffix that is not "_p0", so that plain tuple comparison works.
+        suffixes = []
+        direction = 0
+        for s_name, s_num in reversed(self.suffixes):
+            value = (suffix_value[s_name], int(s_num or 0))
+            if value == (0, 0):
+                if direction == 0:
+                    continue
+                suffixes.append(value + (direction,))
+            else:
+                direction = value > (0, 0) and 1 or -1
+                suffixes.append(value + (0,))
+        suffixes.reverse()
+        suffixes.append((0, 0, 0))
+
+        return (tuple(numbers), letter, tuple(suffixes), self.revision)
+
+@_memoize
+def _parse_version(ver):
+    """
+    Return the (shared) _Version object for the given version string,
+    or None if it is not valid.
+    """
+    if not ver:
+        return None
+    match = ver_regexp.match(ver)
+    if not match:
+        return None
+    if not match.groups():
+        return None
+    return _Version(match)
+
+def version_key(ver):
+    """
+    Return a precomputed key for the given version string, which sorts
+    natively like compare_versions() does, or None if the version string
+    is not valid.
+
+    Example usage:
+        >>> version_key("1.0.1") > version_key("1.0")
+        True
+
+    @param ver: version string
+    @type ver: string
+    @return: the version key
+    @rtype: tuple or None
+    """
+    version = _parse_version(ver)
+    if version is None:
+        return None
+    return version.key
+
 def compare_versions(ver1, ver2):
     """
-    docstring_title
+    Compare two version strings.
 
-    @param ver1: 
-    @type ver1: 
-    @param ver2: 
-    @type ver2: 
-    @return: 
-    @rtype: 
+    @param ver1: version string
+    @type ver1: string
+    @param ver2: version string
+    @type ver2: string
+    @return: negative number if ver1 < ver2, positive number if ver1 > ver2,
+        zero if they are equal or ver1 is not valid
+    @rtype: int or float
     """
     if ver1 == ver2:
         return 0
-    match1 = None
-    match2 = None
-    if ver1:
-        match1 = ver_regexp.match(ver1)
-    if ver2:
-        match2 = ver_regexp.match(ver2)
-
-    # checking that the versions are valid
-    invalid = False
-    invalid_rc = 0
-    if not match1:
-        invalid = True
-    elif not match1.groups():
-        invalid = True
-    elif not match2:
-        invalid_rc = 1
-        invalid = True
-    elif not match2.groups():
-        invalid_rc = 1
-        invalid = True
-    if invalid:
-        return invalid_rc
+    version1 = _parse_version(ver1)
+    if version1 is None:
+        return 0
+    version2 = _parse_version(ver2)
+    if version2 is None:
+        return 1
 
     # building lists of the version parts before the suffix
     # first part is simple
-    list1 = [int(match1.group(2))]
-    list2 = [int(match2.group(2))]
+    list1 = [version1.major]
+    list2 = [version2.major]
 
     # this part would greatly benefit from a fixed-length version pattern
-    if len(match1.group(3)) or len(match2.group(3)):
-        vlist1 = match1.group(3)[1:].split(".")
-        vlist2 = match2.group(3)[1:].split(".")
+    if version1.has_minors or version2.has_minors:
+        vlist1 = version1.minors
+        vlist2 = version2.minors
         for i in range(0, max(len(vlist1), len(vlist2))):
             # Implcit .0 is given a value of -1, so that 1.0.0 > 1.0, since it
             # would be ambiguous if two versions that aren't literally equal
@@ -563,10 +792,10 @@ def compare_versions(ver1, ver2):
                 list2.append(float("0."+vlist2[i]))
 
     # and now the final letter
-    if len(match1.group(5)):
-        list1.append(ord(match1.group(5)))
-    if len(match2.group(5)):
-        list2.append(ord(match2.group(5)))
+    if version1.letter:
+        list1.append(ord(version1.letter))
+    if version2.letter:
+        list2.append(ord(version2.letter))
 
     for i in range(0, max(len(list1), len(list2))):
         if len(list1) <= i:
@@ -577,18 +806,18 @@ def compare_versions(ver1, ver2):
             return list1[i] - list2[i]
 
     # main version is equal, so now compare the _suffix part
-    list1 = match1.group(6).split("_")[1:]
-    list2 = match2.group(6).split("_")[1:]
+    list1 = version1.suffixes
+    list2 = version2.suffixes
 
     for i in range(0, max(len(list1), len(list2))):
         if len(list1) <= i:
             s1 = ("p", "0")
         else:
-            s1 = suffix_regexp.match(list1[i]).groups()
+            s1 = list1[i]
         if len(list2) <= i:
             s2 = ("p", "0")
         else:
-            s2 = suffix_regexp.match(list2[i]).groups()
+            s2 = list2[i]
         if s1[0] != s2[0]:
             return suffix_value[s1[0]] - suffix_value[s2[0]]
         if s1[1] != s2[1]:
@@ -605,15 +834,7 @@ def compare_versions(ver1, ver2):
             return r1 - r2
 
     # the suffix part is equal to, so finally check the revision
-    if match1.group(10):
-        r1 = int(match1.group(10))
-    else:
-        r1 = 0
-    if match2.group(10):
-        r2 = int(match2.group(10))
-    else:
-        r2 = 0
-    return r1 - r2
+    return version1.revision - version2.revision
 
 tag_regexp = re.compile("^([A-Za-z0-9+_.-]+)?$")
 def is_valid_package_tag(tag):
@@ -703,7 +924,14 @@ def get_newer_version(versions):
     @return: sorted version list
     @rtype: list
     """
-    return _generic_sorter(versions, compare_versions)
+    keys = []
+    for ver in versions:
+        version = _parse_version(ver)
+        if version is None or not version.sortable:
+            return _generic_sorter(versions, compare_versions)
+        keys.append(version.key)
+    order = sorted(range(len(keys)), key = keys.__getitem__, reverse = True)
+    return [versions[idx] for idx in order]
 
 def get_entropy_newer_version(versions):
     """
@@ -714,7 +942,25 @@ def get_entropy_newer_version(versions):
     @return: sorted list
     @rtype: list
     """
-    return _generic_sorter(versions, entropy_compare_versions)
+    tagged = None
+    keys = []
+    for ver_data in versions:
+        ver, tag, rev = ver_data
+        version = _parse_version(ver)
+        if version is None or not version.sortable:
+            return _generic_sorter(versions, entropy_compare_versions)
+        if tagged is None:
+            tagged = bool(tag)
+        elif tagged != bool(tag):
+            # tags are compared first only if both packages are tagged,
+            # mixed lists have no consistent sort key.
+            return _generic_sorter(versions, entropy_compare_versions)
+        if tagged:
+            keys.append((tag, version.key, rev))
+        else:
+            keys.append((version.key, tag, rev))
+    order = sorted(range(len(keys)), key = keys.__getitem__, reverse = True)
+    return [versions[idx] for idx in order]
 
 sha1_re = re.compile(r"(.*)\.([a-f\d]{40})(.*)")
 def get_entropy_package_sha1(package_name):
@@ -17,20 +17,27 @@
     Permissions are set using entropy.const's const_setup_perms and
     const_setup_file functions.
 
-    Objects are serialized using Python's cPickle/pickle modules, thus
-    they must be "pickable". Please read Python Library reference for
+    Objects are serialized through a pluggable serializer layer (see
+    PickleSerializer and CompactSerializer). Every serialized stream starts
+    with a small format header (DUMP_MAGIC, DUMP_FORMAT_VERSION, serializer
+    identifier), so that stale on-disk cache objects written by older
+    Entropy versions (text pickles) are detected and discarded.
+    Objects must be "pickable". Please read Python Library reference for
     more information.
 
 """
 
 import sys
 import os
+import errno
+import marshal
+import struct
 import time
 
 from entropy.const import etpConst, const_setup_file, const_is_python3, \
     const_mkstemp
 # Always use MAX pickle protocol to <=2, to allow Python 2 and 3 support
-COMPAT_PICKLE_PROTOCOL = 0
+COMPAT_PICKLE_PROTOCOL = 2
 
 if const_is_python3():
     import pickle
@@ -43,6 +50,221 @@ else:
 pickle.HIGHEST_PROTOCOL = COMPAT_PICKLE_PROTOCOL
 pickle.DEFAULT_PROTOCOL = COMPAT_PICKLE_PROTOCOL
 
+# Serialized object header: magic, format version, serializer id and
+# Python major version of the writer.
+DUMP_MAGIC = b"EDMP"
+DUMP_FORMAT_VERSION = 1
+_DUMP_HEADER_FMT = "!4sBBB"
+_DUMP_HEADER_LEN = struct.calcsize(_DUMP_HEADER_FMT)
+
+
+class SerializerError(Exception):
+    """
+    Raised by Serializer.dumps() when the given object is not supported
+    by the serializer.
+    """
+
+
+class Serializer(object):
+    """
+    Base class for entropy.dump object serializers.
+    Subclasses must provide a unique, non-zero, ID and a NAME.
+    """
+
+    ID = 0
+    NAME = None
+
+    def dumps(self, obj):
+        """
+        Serialize object to raw string.
+
+        @param obj: object to serialize
+        @type obj: any Python object
+        @return: serialized data
+        @rtype: raw string
+        @raise SerializerError: if object is not supported
+        """
+        raise NotImplementedError()
+
+    def loads(self, data, py_version):
+        """
+        Unserialize raw string back to object.
+
+        @param data: serialized data
+        @type data: raw string
+        @param py_version: Python major version of the writer
+        @type py_version: int
+        @return: rebuilt object
+        @rtype: any Python object
+        @raise SerializerError: if data cannot be rebuilt by this
+            Python interpreter
+        """
+        raise NotImplementedError()
+
+
+class PickleSerializer(Serializer):
+    """
+    Binary pickle (COMPAT_PICKLE_PROTOCOL) serializer. Handles
+    any picklable object.
+    """
+
+    ID = 1
+    NAME = "pickle"
+
+    def dumps(self, obj):
+        """
+        Reimplemented from Serializer.
+        """
+        if const_is_python3():
+            return pickle.dumps(obj, protocol = COMPAT_PICKLE_PROTOCOL,
+                fix_imports = True)
+        return pickle.dumps(obj, COMPAT_PICKLE_PROTOCOL)
+
+    def loads(self, data, py_version):
+        """
+        Reimplemented from Serializer.
+        """
+        return _pickle_loads(data)
+
+
+class CompactSerializer(Serializer):
+    """
+    Compact serializer based on the marshal module, meant for the common
+    cache object shapes (tuples, sets, ints, strings and nested
+    combinations of them). Objects containing other types are rejected
+    with SerializerError. Since marshal string types differ between
+    Python 2 and 3, data written by another Python major version is
+    rejected as well.
+    """
+
+    ID = 2
+    NAME = "compact"
+    _MARSHAL_VERSION = 2
+
+    def dumps(self, obj):
+        """
+        Reimplemented from Serializer.
+        """
+        try:
+            return marshal.dumps(obj, self._MARSHAL_VERSION)
+        except ValueError as err:
+            raise SerializerError(repr(err))
+
+    def loads(self, data, py_version):
+        """
+        Reimplemented from Serializer.
+        """
+        if py_version != sys.version_info[0]:
+            raise SerializerError("unsupported Python version")
+        try:
+            return marshal.loads(data)
+        except (ValueError, EOFError, TypeError) as err:
+            raise SerializerError(repr(err))
+
+
+_SERIALIZERS = {}
+for _ser_class in (PickleSerializer, CompactSerializer):
+    _SERIALIZERS[_ser_class.ID] = _ser_class()
+del _ser_class
+_FALLBACK_SERIALIZER = _SERIALIZERS[PickleSerializer.ID]
+_DEFAULT_SERIALIZER = _FALLBACK_SERIALIZER
+
+
+def register_serializer(serializer):
+    """
+    Register a new Serializer instance. Its ID must not be already taken.
+
+    @param serializer: Serializer instance
+    @type serializer: Serializer
+    @raise KeyError: if the serializer ID is already registered
+    """
+    if serializer.ID in _SERIALIZERS:
+        raise KeyError("serializer ID %d already registered" % (
+            serializer.ID,))
+    _SERIALIZERS[serializer.ID] = serializer
+
+def get_serializer():
+    """
+    Return the Serializer instance used to write new objects.
+
+    @return: the default Serializer
+    @rtype: Serializer
+    """
+    return _DEFAULT_SERIALIZER
+
+def set_serializer(name):
+    """
+    Set the Serializer used to write new objects, given its name.
+    Objects that are not supported by it are transparently written using
+    the pickle serializer.
+
+    @param name: Serializer name (for instance: "pickle", "compact")
+    @type name: string
+    @raise KeyError: if no serializer with the given name is available
+    """
+    global _DEFAULT_SERIALIZER
+    for serializer in _SERIALIZERS.values():
+        if serializer.NAME == name:
+            _DEFAULT_SERIALIZER = serializer
+            return
+    raise KeyError("serializer %s not available" % (name,))
+
+_env_serializer = os.getenv("ETP_DUMP_SERIALIZER")
+if _env_serializer:
+    try:
+        set_serializer(_env_serializer)
+    except KeyError:
+        pass
+del _env_serializer
+
+def _pickle_loads(data):
+    """
+    Unpickle raw string (any protocol) to object.
+    """
+    if const_is_python3():
+        return pickle.loads(data, fix_imports = True,
+            encoding = etpConst['conf_raw_encoding'])
+    return pickle.loads(data)
+
+def _encode(my_object):
+    """
+    Serialize object to raw string, header included, using the default
+    serializer and falling back to the pickle one.
+    """
+    serializer = _DEFAULT_SERIALIZER
+    try:
+        data = serializer.dumps(my_object)
+    except SerializerError:
+        serializer = _FALLBACK_SERIALIZER
+        data = serializer.dumps(my_object)
+    header = struct.pack(_DUMP_HEADER_FMT, DUMP_MAGIC,
+        DUMP_FORMAT_VERSION, serializer.ID, sys.version_info[0])
+    return header + data
+
+def _decode(data, accept_legacy = True):
+    """
+    Unserialize raw string, header included, back to object.
+    If the header is missing, data is considered a legacy (header-less)
+    pickle stream and loaded as such only if accept_legacy is True.
+
+    @raise SerializerError: if data is stale or cannot be rebuilt
+    """
+    if data[:len(DUMP_MAGIC)] != DUMP_MAGIC:
+        if not accept_legacy:
+            raise SerializerError("legacy data")
+        return _pickle_loads(data)
+
+    if len(data) < _DUMP_HEADER_LEN:
+        raise SerializerError("truncated data")
+    _magic, version, ser_id, py_version = struct.unpack(
+        _DUMP_HEADER_FMT, data[:_DUMP_HEADER_LEN])
+    if version != DUMP_FORMAT_VERSION:
+        raise SerializerError("unsupported format version")
+    serializer = _SERIALIZERS.get(ser_id)
+    if serializer is None:
+        raise SerializerError("unsupported serializer")
+    return serializer.loads(data[_DUMP_HEADER_LEN:], py_version)
+
 D_EXT = etpConst['cachedumpext']
 D_DIR = etpConst['dumpstoragedir']
 E_GID = etpConst['entropygid']
@@ -72,11 +294,11 @@ def dumpobj(name, my_object, complete_path = False, ignore_exceptions = True,
     @type custom_permissions: octal
     @return: None
     @rtype: None
-    @raise EOFError: could be caused by pickle.dump, ignored if
+    @raise EOFError: could be caused by the serializer, ignored if
         ignore_exceptions is True
-    @raise IOError: could be caused by pickle.dump, ignored if
+    @raise IOError: could be caused by the serializer, ignored if
         ignore_exceptions is True
-    @raise OSError: could be caused by pickle.dump, ignored if
+    @raise OSError: could be caused by the serializer, ignored if
         ignore_exceptions is True
     """
     if dump_dir is None:
@@ -114,11 +336,7 @@ def dumpobj(name, my_object, complete_path = False, ignore_exceptions = True,
             # is causing EBADF. There is probably a race
             # condition down in the stack.
             with open(tmp_dmpfile, "wb") as dmp_f:
-                if const_is_python3():
-                    pickle.dump(my_object, dmp_f,
-                        protocol = COMPAT_PICKLE_PROTOCOL, fix_imports = True)
-                else:
-                    pickle.dump(my_object, dmp_f)
+                dmp_f.write(_encode(my_object))
 
             const_setup_file(tmp_dmpfile, E_GID, custom_permissions)
             os.rename(tmp_dmpfile, dmpfile)
@@ -165,11 +383,7 @@ def serialize(myobj, ser_f, do_seek = True):
         race conditions on multi-processing or multi-threading
     @raise pickle.PicklingError: when object cannot be recreated
     """
-    if const_is_python3():
-        pickle.dump(myobj, ser_f, protocol = COMPAT_PICKLE_PROTOCOL,
-            fix_imports = True)
-    else:
-        pickle.dump(myobj, ser_f)
+    ser_f.write(_encode(myobj))
     ser_f.flush()
     if do_seek:
         ser_f.seek(0)
@@ -184,12 +398,9 @@ def unserialize(serial_f):
     @return: rebuilt object
     @rtype: any Python pickable object
     @raise pickle.UnpicklingError: when object cannot be recreated
+    @raise SerializerError: when object cannot be recreated
     """
-    if const_is_python3():
-        return pickle.load(serial_f, fix_imports = True,
-            encoding = etpConst['conf_raw_encoding'])
-    else:
-        return pickle.load(serial_f)
+    return _decode(serial_f.read())
 
 def unserialize_string(mystring):
     """
@@ -200,12 +411,9 @@ def unserialize_string(mystring):
     @return: reconstructed object
     @rtype: any Python pickable object
     @raise pickle.UnpicklingError: when object cannot be recreated
+    @raise SerializerError: when object cannot be recreated
     """
-    if const_is_python3():
-        return pickle.loads(mystring, fix_imports = True,
-            encoding = etpConst['conf_raw_encoding'])
-    else:
-        return pickle.loads(mystring)
+    return _decode(mystring)
 
 def serialize_string(myobj):
     """
@@ -217,13 +425,10 @@ def serialize_string(myobj):
     @rtype: string
     @raise pickle.PicklingError: when object cannot be recreated
     """
-    if const_is_python3():
-        return pickle.dumps(myobj, protocol = COMPAT_PICKLE_PROTOCOL,
-            fix_imports = True, encoding = etpConst['conf_raw_encoding'])
-    else:
-        return pickle.dumps(myobj)
+    return _encode(myobj)
 
-def loadobj(name, complete_path = False, dump_dir = None, aging_days = None):
+def loadobj(name, complete_path = False, dump_dir = None, aging_days = None,
+    accept_legacy = None):
     """
     Load object from a file
     @param name: name of the object to load
@@ -236,11 +441,19 @@ def loadobj(name, complete_path = False, dump_dir = None, aging_days = None):
     @keyword aging_days: if int, consider the cached file invalid
         if older than aging_days.
     @type aging_days: int
+    @keyword accept_legacy: if True, load objects written without the
+        format header (old text pickles) as well. If False, such objects
+        are considered stale: None is returned and the file is removed.
+        Defaults to the value of complete_path, since objects living in
+        the dump directory are just cache.
+    @type accept_legacy: bool
     @return: object or None
     @rtype: any Python pickable object or None
     """
     if dump_dir is None:
         dump_dir = D_DIR
+    if accept_legacy is None:
+        accept_legacy = complete_path
 
     while True:
         if complete_path:
@@ -269,14 +482,19 @@ def loadobj(name, complete_path = False, dump_dir = None, aging_days = None):
             with open(dmpfile, "rb") as dmp_f:
                 obj = None
                 try:
-                    if const_is_python3():
-                        obj = pickle.load(dmp_f, fix_imports = True,
-                            encoding = etpConst['conf_raw_encoding'])
-                    else:
-                        obj = pickle.load(dmp_f)
+                    obj = _decode(dmp_f.read(),
+                        accept_legacy = accept_legacy)
+                except SerializerError:
+                    # stale or unsupported cache object, get rid of it
+                    if not complete_path:
+                        try:
+                            os.remove(dmpfile)
+                        except (IOError, OSError):
+                            pass
                 except (ValueError, EOFError, IOError,
                     OSError, pickle.UnpicklingError, TypeError,
-                    AttributeError, ImportError, SystemError,):
+                    AttributeError, ImportError, SystemError,
+                    KeyError, IndexError,):
                     pass
                 return obj
         except (IOError, OSError,):
@@ -19,6 +19,7 @@ except ImportError:
     # python 3.x
     import http.client as httplib
 import hashlib
+import select
 import socket
 import pty
 import subprocess
@@ -32,23 +33,389 @@ from entropy.const import const_is_python3, const_file_readable
 if const_is_python3():
     import urllib.request as urlmod
     import urllib.error as urlmod_error
+    from urllib.parse import urljoin
 else:
     import urllib2 as urlmod
     import urllib2 as urlmod_error
+    from urlparse import urljoin
 
 from entropy.exceptions import InterruptError
 from entropy.tools import print_traceback, \
     convert_seconds_to_fancy_output, bytes_into_human, spliturl, \
-    add_proxy_opener, md5sum
+    add_proxy_opener, md5sum, content_defined_blocks, block_digest
 from entropy.const import etpConst, const_isfileobj, const_debug_write
 from entropy.output import TextInterface, darkblue, darkred, purple, blue, \
     brown, darkgreen, red
 
 from entropy.i18n import _, ngettext
+from entropy.core import Singleton
 from entropy.misc import ParallelTask
 from entropy.core.settings.base import SystemSettings
 
 
+class HTTPConnectionPool(Singleton):
+
+    """
+    Thread-safe pool of persistent (keep-alive) HTTP and HTTPS connections,
+    keyed by (scheme, host, port). Connections are handed out to one
+    thread at a time and are put back into the pool once the response has
+    been entirely read. At most MAX_PER_HOST connections per key are
+    active at the same time, further requests wait for a connection to be
+    released. Idle connections are closed after IDLE_TIMEOUT seconds.
+    HTTPS connections share one SSL context per certificate validation
+    mode, so that CA certificates are loaded once.
+
+    Example code:
+
+    >>> pool = HTTPConnectionPool()
+    >>> conn, reused = pool.acquire("https", "example.org", None, 10.0)
+    >>> reusable = False
+    >>> try:
+    ...     conn.request("GET", "/")
+    ...     data = conn.getresponse().read()
+    ...     reusable = True
+    ... finally:
+    ...     pool.release("https", "example.org", None, conn,
+    ...         reusable = reusable)
+    """
+
+    # maximum number of active connections per (scheme, host, port)
+    MAX_PER_HOST = 4
+    # idle connections older than this are closed, in seconds. Kept below
+    # the most common server keep-alive timeouts (Apache: 5 seconds).
+    IDLE_TIMEOUT = 4.0
+    # maximum number of HTTP redirects followed by urlopen()
+    MAX_REDIRECTS = 5
+
+    def init_singleton(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = {}
+        self._active = {}
+        self._ssl_contexts = {}
+
+    @staticmethod
+    def _key(scheme, host, port):
+        if port is None:
+            if scheme == "https":
+                port = httplib.HTTPS_PORT
+            else:
+                port = httplib.HTTP_PORT
+        return scheme, host.lower(), int(port)
+
+    def ssl_context(self, validate_cert = True):
+        """
+        Return the shared SSL context for the given certificate validation
+        mode, or None if not supported by this Python version.
+
+        @keyword validate_cert: validate server certificates
+        @type validate_cert: bool
+        @return: the SSL context
+        @rtype: ssl.SSLContext or None
+        """
+        with self._cond:
+            ctx = self._ssl_contexts.get(validate_cert)
+            if ctx is None and hasattr(ssl, "create_default_context"):
+                ctx = ssl.create_default_context()
+                if not validate_cert:
+                    ctx.check_hostname = False
+                    ctx.verify_mode = ssl.CERT_NONE
+                self._ssl_contexts[validate_cert] = ctx
+            return ctx
+
+    def _evict_idle(self, cur_t):
+        """
+        Close expired idle connections, must be called with the lock held.
+        """
+        for key, idle in list(self._idle.items()):
+            alive = []
+            for conn, idle_t in idle:
+                if cur_t - idle_t > self.IDLE_TIMEOUT:
+                    conn.close()
+                else:
+                    alive.append((conn, idle_t))
+            if alive:
+                self._idle[key] = alive
+            else:
+                del self._idle[key]
+
+    @staticmethod
+    def _is_dropped(conn):
+        """
+        Return whether the given idle connection has been closed by the
+        server. Nothing is expected to be readable from an idle connection,
+        end of file included.
+        """
+        sock = conn.sock
+        if sock is None:
+            return True
+        try:
+            readable, _writable, _errors = select.select([sock], [], [], 0)
+        except (select.error, socket.error, ValueError):
+            return True
+        return bool(readable)
+
+    def acquire(self, scheme, host, port, timeout, validate_cert = True,
+                fresh = False):
+        """
+        Get a connection for the given endpoint, waiting if MAX_PER_HOST
+        connections are already in use. The connection must be given back
+        through release().
+
+        @param scheme: either "http" or "https"
+        @type scheme: string
+        @param host: host name
+        @type host: string
+        @param port: port number, None for the scheme default
+        @type port: int
+        @param timeout: socket timeout, in seconds
+        @type timeout: float
+        @keyword validate_cert: validate server certificates (https only)
+        @type validate_cert: bool
+        @keyword fresh: close the idle connections to the endpoint and
+            return a new connection, used when the idle ones turned out to
+            be stale
+        @type fresh: bool
+        @return: tuple composed by the connection object and a bool stating
+            whether the connection has already been used (and might have
+            been closed by the server in the meantime)
+        @rtype: tuple
+        """
+        key = self._key(scheme, host, port)
+        ssl_context = None
+        if scheme == "https":
+            ssl_context = self.ssl_context(validate_cert)
+
+        with self._cond:
+            while self._active.get(key, 0) >= self.MAX_PER_HOST:
+                self._cond.wait()
+            self._active[key] = self._active.get(key, 0) + 1
+
+            self._evict_idle(time.time())
+            conn = None
+            if fresh:
+                idle = self._idle.pop(key, None)
+                for candidate, _idle_t in idle or ():
+                    candidate.close()
+                idle = None
+            else:
+                idle = self._idle.get(key)
+            while idle:
+                candidate, _idle_t = idle.pop()
+                if getattr(candidate, "_entropy_ssl_context", None) \
+                        is ssl_context and not self._is_dropped(candidate):
+                    conn = candidate
+                    break
+                candidate.close()
+
+        if conn is not None:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn, True
+
+        try:
+            if scheme == "https":
+                if ssl_context is not None:
+                    conn = httplib.HTTPSConnection(
+                        host, port, timeout = timeout, context = ssl_context)
+                else:
+                    conn = httplib.HTTPSConnection(
+                        host, port, timeout = timeout)
+            else:
+                conn = httplib.HTTPConnection(host, port, timeout = timeout)
+        except BaseException:
+            self._done(key)
+            raise
+        conn._entropy_ssl_context = ssl_context
+        return conn, False
+
+    def _done(self, key):
+        with self._cond:
+            self._active[key] -= 1
+            if not self._active[key]:
+                del self._active[key]
+            self._cond.notify()
+
+    def release(self, scheme, host, port, conn, reusable = True):
+        """
+        Give back a connection obtained through acquire(). If reusable is
+        True and the connection is still open, it is kept for later use,
+        otherwise it is closed. The last response must have been entirely
+        read for a connection to be reusable.
+
+        @param scheme: either "http" or "https"
+        @type scheme: string
+        @param host: host name
+        @type host: string
+        @param port: port number, None for the scheme default
+        @type port: int
+        @param conn: the connection object
+        @type conn: httplib.HTTPConnection
+        @keyword reusable: if False, the connection is closed
+        @type reusable: bool
+        """
+        key = self._key(scheme, host, port)
+        if reusable and conn.sock is None:
+            # closed, either by us or because the server asked so
+            reusable = False
+        if not reusable:
+            conn.close()
+
+        with self._cond:
+            if reusable:
+                cur_t = time.time()
+                idle = self._idle.setdefault(key, [])
+                idle.append((conn, cur_t))
+                while len(idle) > self.MAX_PER_HOST:
+                    old_conn, _idle_t = idle.pop(0)
+                    old_conn.close()
+            self._active[key] -= 1
+            if not self._active[key]:
+                del self._active[key]
+            self._cond.notify()
+
+    def clear(self):
+        """
+        Close all the idle connections.
+        """
+        with self._cond:
+            for idle in self._idle.values():
+                for conn, _idle_t in idle:
+                    conn.close()
+            self._idle.clear()
+
+    def urlopen(self, url, headers, timeout, validate_cert = True,
+                follow_redirects = True):
+        """
+        Issue a GET request for the given HTTP or HTTPS URL over a pooled
+        connection, following redirects. The returned response object
+        offers the urllib response methods used by UrlFetcher (read(),
+        close(), getcode(), geturl() and the "headers" attribute) and
+        gives the connection back to the pool once closed.
+
+        @param url: the URL
+        @type url: string
+        @param headers: request headers
+        @type headers: dict
+        @param timeout: socket timeout, in seconds
+        @type timeout: float
+        @keyword validate_cert: validate server certificates (https only)
+        @type validate_cert: bool
+        @keyword follow_redirects: follow HTTP redirects
+        @type follow_redirects: bool
+        @return: the response object
+        @rtype: _PooledResponse
+        @raise urllib2.HTTPError: on HTTP error status codes
+        @raise urllib2.URLError: on connection errors
+        """
+        for _redirect in range(self.MAX_REDIRECTS + 1):
+            url_data = spliturl(url)
+            scheme = url_data.scheme
+            if scheme not in ("http", "https") or not url_data.hostname:
+                raise urlmod_error.URLError("unsupported URL: %s" % (url,))
+            host, port = url_data.hostname, url_data.port
+            path = url_data.path or "/"
+            if url_data.query:
+                path += "?" + url_data.query
+
+            conn, response = self._get(
+                scheme, host, port, path, headers, timeout, validate_cert)
+
+            status = response.status
+            location = response.getheader("location")
+            if follow_redirects and location and \
+                    status in (301, 302, 303, 307, 308):
+                # drain the (usually tiny) body to keep the connection
+                try:
+                    response.read()
+                    reusable = True
+                except (httplib.HTTPException, socket.error):
+                    reusable = False
+                self.release(scheme, host, port, conn, reusable = reusable)
+                url = urljoin(url, location)
+                continue
+
+            pooled = _PooledResponse(
+                self, scheme, host, port, conn, response, url)
+            if status >= 400:
+                pooled.close()
+                raise urlmod_error.HTTPError(
+                    url, status, response.reason, response.msg, None)
+            return pooled
+
+        raise urlmod_error.URLError("too many redirects: %s" % (url,))
+
+    def _get(self, scheme, host, port, path, headers, timeout,
+             validate_cert):
+        """
+        Issue a GET request over a pooled connection and return the
+        connection along with its response. If a reused keep-alive
+        connection turns out to be stale, the request is retried once on a
+        new connection, after closing the other idle connections to the
+        same endpoint, likely stale as well.
+        """
+        last_err = None
+        for attempt in range(2):
+            conn, reused = self.acquire(
+                scheme, host, port, timeout,
+                validate_cert = validate_cert, fresh = attempt > 0)
+            try:
+                conn.request("GET", path, headers = headers)
+                return conn, conn.getresponse()
+            except socket.timeout:
+                self.release(scheme, host, port, conn, reusable = False)
+                raise
+            except (httplib.HTTPException, socket.error) as err:
+                self.release(scheme, host, port, conn, reusable = False)
+                if not reused:
+                    if isinstance(err, socket.error):
+                        raise
+                    raise urlmod_error.URLError(err)
+                last_err = err
+            except BaseException:
+                self.release(scheme, host, port, conn, reusable = False)
+                raise
+
+        raise urlmod_error.URLError(last_err)
+
+
+class _PooledResponse(object):
+
+    """
+    urllib-like response object returned by HTTPConnectionPool.urlopen().
+    """
+
+    def __init__(self, pool, scheme, host, port, conn, response, url):
+        self._pool = pool
+        self._endpoint = (scheme, host, port)
+        self._conn = conn
+        self._response = response
+        self._url = url
+        self.headers = response.msg
+
+    def read(self, *args):
+        return self._response.read(*args)
+
+    def getcode(self):
+        return self._response.status
+
+    def geturl(self):
+        return self._url
+
+    def close(self):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        # the connection can be reused only if the response has been
+        # entirely consumed.
+        reusable = self._response.isclosed() and \
+            not self._response.will_close
+        if not reusable:
+            self._response.close()
+        scheme, host, port = self._endpoint
+        self._pool.release(scheme, host, port, conn, reusable = reusable)
+
+
 class UrlFetcher(TextInterface):
 
     """
@@ -74,6 +441,13 @@ class UrlFetcher(TextInterface):
     TIMEOUT_FETCH_ERROR = "-4"
     GENERIC_FETCH_WARN = "-2"
 
+    # minimum size of a segment, in bytes, when segmented download is enabled
+    SEGMENT_MIN_SIZE = 4 * 1024 * 1024
+    # read buffer size used by segment workers
+    SEGMENT_BUFFER_SIZE = 65536
+    # extension of the file storing per-segment download state
+    SEGMENT_STATE_EXT = ".segments"
+
     def __init__(self, url, path_to_save, checksum = True,
                  show_speed = True, resume = True,
                  abort_check_func = None, disallow_redirect = False,
@@ -81,7 +455,8 @@ class UrlFetcher(TextInterface):
                  timeout = None, download_context_func = None,
                  pre_download_hook = None, post_download_hook = None,
                  http_basic_user = None, http_basic_pwd = None,
-                 https_validate_cert = True):
+                 https_validate_cert = True, segments = 1,
+                 segment_urls = None, connection_pool = None):
         """
         Entropy URL downloader constructor.
 
@@ -128,6 +503,19 @@ class UrlFetcher(TextInterface):
             The function takes a path (the download path) and the download
             status and the download id as arguments.
         @type post_download_hook: callable
+        @keyword segments: if greater than 1, HTTP(S) files larger than
+            SEGMENT_MIN_SIZE are downloaded using up to the given number
+            of concurrent HTTP Range requests (if the server supports them),
+            into a preallocated file. Download state is kept per segment,
+            so that resume works for each of them.
+        @type segments: int
+        @keyword segment_urls: list of alternative URLs of the same file
+            (on other mirrors), segments are spread across url and these.
+        @type segment_urls: list
+        @keyword connection_pool: if not None, HTTP and HTTPS requests are
+            issued over persistent connections taken from the given pool
+            (unless a proxy is configured).
+        @type connection_pool: HTTPConnectionPool
         """
         self.__supported_uris = {
             'file': self._urllib_download,
@@ -176,6 +564,12 @@ class UrlFetcher(TextInterface):
         # SSL Context options
         self.__https_validate_cert = https_validate_cert
 
+        self.__connection_pool = connection_pool
+        self.__segments = segments
+        if segment_urls is None:
+            segment_urls = []
+        self.__segment_urls = [x for x in segment_urls if x != url]
+
         self._init_vars()
         self.__init_urllib()
 
@@ -207,6 +601,7 @@ class UrlFetcher(TextInterface):
         self.__elapsed = 0.0
         self.__updatestep = 0.2
         self.__starttime = time.time()
+        self.__first_byte_time = None
         self.__last_update_time = self.__starttime
         self.__last_downloadedsize = 0
         self.__existed_before = False
@@ -577,36 +972,32 @@ class UrlFetcher(TextInterface):
         urrlib2 based downloader. This is the default for HTTP and FTP urls.
         """
         self._setup_urllib_proxy()
+        url_protocol = UrlFetcher._get_url_protocol(self.__url)
+
+        if self.__segments > 1 and url_protocol in ("http", "https"):
+            status = self.__segmented_download()
+            if status is not None:
+                return status
+            # server or file not suitable, go ahead with a plain download
+            self._init_vars()
+
+        if os.path.lexists(self.__segment_state_path()):
+            # leftover of an interrupted segmented download, the file is
+            # preallocated to its full size and is not a valid prefix.
+            self.__remove_segment_state()
+            try:
+                os.remove(self.__path_to_save)
+            except OSError:
+                pass
+
         self.__setup_urllib_resume_support()
         # we're going to feed the md5 digestor on the way.
         self.__use_md5_checksum = True
         url = self.__encode_url(self.__url)
-        url_protocol = UrlFetcher._get_url_protocol(self.__url)
-        uname = os.uname()
-        user_agent = "Entropy/%s (compatible; %s; %s: %s %s %s)" % (
-            etpConst['entropyversion'],
-            "Entropy",
-            os.path.basename(url),
-            uname[0],
-            uname[4],
-            uname[2],
-        )
+        headers = self.__urllib_headers(url)
+        user_agent = headers['User-Agent']
 
         if url_protocol in ("http", "https"):
-
-            # Handle HTTP Basic auth
-            if self.__http_basic_user and self.__http_basic_pwd:
-                basic_header = base64.b64encode(('%s:%s' % (
-                    self.__http_basic_user, self.__http_basic_pwd)
-                ).encode('utf-8')).decode('utf-8')
-
-                headers = {
-                    'User-Agent': user_agent,
-                    'Authorization': 'Basic %s' % basic_header,
-                }
-            else:
-                headers = {'User-Agent': user_agent,}
-
             req = urlmod.Request(url, headers = headers)
 
         else:
@@ -618,18 +1009,7 @@ class UrlFetcher(TextInterface):
 
             # get file size if available
             try:
-                if url_protocol in ("https") and \
-                    not self.__https_validate_cert:
-
-                    ctx = ssl.create_default_context()
-                    ctx.check_hostname = False
-                    ctx.verify_mode = ssl.CERT_NONE
-
-                    self.__remotefile = urlmod.urlopen(req, None, self.__timeout,
-                            context=ctx)
-
-                else:
-                    self.__remotefile = urlmod.urlopen(req, None, self.__timeout)
+                self.__remotefile = self.__urllib_urlopen(req, url_protocol)
             except KeyboardInterrupt:
                 self.__urllib_close(False)
                 raise
@@ -725,8 +1105,8 @@ class UrlFetcher(TextInterface):
                     self.__remotefile.close()
                 except:
                     pass
-                self.__remotefile = urlmod.urlopen(
-                    request, None, self.__timeout)
+                self.__remotefile = self.__urllib_urlopen(
+                    request, url_protocol)
 
             elif self.__startingposition == self.__remotesize:
                 # all fine then!
@@ -814,7 +1194,427 @@ class UrlFetcher(TextInterface):
         self.__urllib_close(False)
         return self.__prepare_return()
 
+    def __urllib_headers(self, url):
+        """
+        Return the HTTP request headers (User-Agent and, if
+        configured, HTTP Basic Authentication) for the given URL.
+        """
+        uname = os.uname()
+        user_agent = "Entropy/%s (compatible; %s; %s: %s %s %s)" % (
+            etpConst['entropyversion'],
+            "Entropy",
+            os.path.basename(url),
+            uname[0],
+            uname[4],
+            uname[2],
+        )
+        headers = {'User-Agent': user_agent,}
+
+        # Handle HTTP Basic auth
+        if self.__http_basic_user and self.__http_basic_pwd:
+            basic_header = base64.b64encode(('%s:%s' % (
+                self.__http_basic_user, self.__http_basic_pwd)
+            ).encode('utf-8')).decode('utf-8')
+            headers['Authorization'] = 'Basic %s' % basic_header
+
+        return headers
+
+    def __use_connection_pool(self, url_protocol):
+        """
+        Return whether requests for the given protocol can go through
+        the connection pool, which does not support proxies.
+        """
+        if self.__connection_pool is None:
+            return False
+        if url_protocol not in ("http", "https"):
+            return False
+        proxy_data = self.__system_settings['system']['proxy']
+        if proxy_data.get(url_protocol) or proxy_data.get('http'):
+            return False
+        if urlmod.getproxies().get(url_protocol):
+            return False
+        return True
+
+    def __urllib_urlopen(self, req, url_protocol):
+        """
+        urlopen() wrapper honouring the https_validate_cert setting and
+        using the connection pool, if any.
+        """
+        if self.__use_connection_pool(url_protocol):
+            if isinstance(req, urlmod.Request):
+                url = req.get_full_url()
+                headers = dict(req.header_items())
+            else:
+                url, headers = req, {}
+            return self.__connection_pool.urlopen(
+                url, headers, self.__timeout,
+                validate_cert = self.__https_validate_cert)
+
+        if url_protocol == "https" and not self.__https_validate_cert:
+            ctx = ssl.create_default_context()
+            ctx.check_hostname = False
+            ctx.verify_mode = ssl.CERT_NONE
+            return urlmod.urlopen(req, None, self.__timeout, context=ctx)
+        return urlmod.urlopen(req, None, self.__timeout)
+
+    def _open_range(self, start, end):
+        """
+        Issue an HTTP(S) Range request for the [start, end) bytes of the
+        download URL and return the response object, or None if the
+        server did not honour it (or redirected the request when
+        redirects are disallowed). The caller must close the response.
+
+        @param start: first byte offset
+        @type start: int
+        @param end: end byte offset (excluded)
+        @type end: int
+        @return: the response object or None
+        @rtype: response object
+        @raise urllib2.URLError: on connection or HTTP errors
+        """
+        self._setup_urllib_proxy()
+        url_protocol = UrlFetcher._get_url_protocol(self.__url)
+        url = self.__encode_url(self.__url)
+        headers = self.__urllib_headers(url)
+        headers['Range'] = "bytes=%d-%d" % (start, end - 1)
+
+        remote = self.__urllib_urlopen(
+            urlmod.Request(url, headers = headers), url_protocol)
+        if remote.getcode() != 206 or \
+                (self.__disallow_redirect and (url != remote.geturl())):
+            remote.close()
+            return None
+        return remote
+
+    def __segment_state_path(self):
+        return self.__path_to_save + UrlFetcher.SEGMENT_STATE_EXT
+
+    def __load_segment_state(self, remote_size):
+        """
+        Load the per-segment download state of a previously interrupted
+        segmented download of the same file. Return None if not available
+        or not matching.
+        """
+        state_path = self.__segment_state_path()
+        try:
+            if os.path.getsize(self.__path_to_save) != remote_size:
+                return None
+            with open(state_path, "r") as state_f:
+                lines = state_f.read().split("\n")
+        except (IOError, OSError):
+            return None
+
+        try:
+            if int(lines[0].split()[1]) != remote_size:
+                return None
+            segments = []
+            for line in lines[1:]:
+                if not line.strip():
+                    continue
+                start, end, pos = [int(x) for x in line.split()]
+                if not (0 <= start <= pos <= end <= remote_size):
+                    return None
+                segments.append([start, end, pos])
+        except (IndexError, ValueError):
+            return None
+
+        if not segments:
+            return None
+        return segments
+
+    def __save_segment_state(self, remote_size, segments):
+        """
+        Atomically store the per-segment download state.
+        """
+        state_path = self.__segment_state_path()
+        tmp_path = state_path + ".tmp"
+        try:
+            with open(tmp_path, "w") as state_f:
+                state_f.write("size %d\n" % (remote_size,))
+                for start, end, pos in segments:
+                    state_f.write("%d %d %d\n" % (start, end, pos))
+            os.rename(tmp_path, state_path)
+        except (IOError, OSError):
+            pass
+
+    def __remove_segment_state(self):
+        try:
+            os.remove(self.__segment_state_path())
+        except OSError:
+            pass
+
+    def __probe_segmented_download(self, url, url_protocol, headers):
+        """
+        Return the remote file size if the server supports HTTP Range
+        requests for the given URL, None otherwise.
+        """
+        probe_headers = dict(headers)
+        probe_headers['Range'] = "bytes=0-0"
+        remote = None
+        try:
+            remote = self.__urllib_urlopen(
+                urlmod.Request(url, headers = probe_headers), url_protocol)
+            if remote.getcode() != 206:
+                return None
+            if self.__disallow_redirect and (url != remote.geturl()):
+                return None
+            content_range = remote.headers.get("content-range", "")
+            # bytes 0-0/<size>
+            remote_size = int(content_range.rsplit("/", 1)[1])
+            # consume the response, so that the connection can be reused
+            remote.read()
+            return remote_size
+        except (urlmod_error.URLError, httplib.HTTPException,
+                socket.error, ValueError, IndexError):
+            return None
+        finally:
+            if remote is not None:
+                try:
+                    remote.close()
+                except socket.error:
+                    pass
+
+    def __fetch_segment(self, url, url_protocol, headers, segment,
+                        segments_lock, stop_event):
+        """
+        Fetch a single segment ([start, end, position] list, updated in
+        place) into the preallocated download file. Return None on
+        success (or when interrupted), an UrlFetcher error code otherwise.
+        """
+        _start, end, pos = segment
+        if pos >= end:
+            return None
+
+        segment_headers = dict(headers)
+        segment_headers['Range'] = "bytes=%d-%d" % (pos, end - 1)
+        remote = None
+        try:
+            remote = self.__urllib_urlopen(
+                urlmod.Request(url, headers = segment_headers), url_protocol)
+            if remote.getcode() != 206:
+                # server ignored the Range header
+                return UrlFetcher.GENERIC_FETCH_ERROR
+
+            with open(self.__path_to_save, "r+b") as local_f:
+                local_f.seek(pos)
+                while pos < end:
+                    if stop_event.is_set():
+                        return None
+                    data = remote.read(
+                        min(UrlFetcher.SEGMENT_BUFFER_SIZE, end - pos))
+                    if not data:
+                        break
+                    local_f.write(data)
+                    pos += len(data)
+                    with segments_lock:
+                        if self.__first_byte_time is None:
+                            self.__first_byte_time = time.time()
+                        segment[2] = pos
+                        self.__downloadedsize += len(data)
+
+                    if self.__speedlimit:
+                        while self.__datatransfer > self.__speedlimit*1000:
+                            if stop_event.is_set():
+                                return None
+                            time.sleep(0.1)
+
+            if pos < end:
+                return UrlFetcher.GENERIC_FETCH_ERROR
+            return None
+
+        except socket.timeout:
+            return UrlFetcher.TIMEOUT_FETCH_ERROR
+        except (urlmod_error.URLError, httplib.HTTPException,
+                socket.error, IOError, OSError, ValueError):
+            return UrlFetcher.GENERIC_FETCH_ERROR
+        finally:
+            if remote is not None:
+                try:
+                    remote.close()
+                except socket.error:
+                    pass
+
+    def __segmented_download(self):
+        """
+        HTTP Range based segmented downloader. Segments are fetched
+        concurrently, spread across the download URL and the alternative
+        ones (segment_urls), into a preallocated file. The MD5 checksum is
+        computed once the file is complete.
+        Return None if the server or the file are not suitable for a
+        segmented download, so that the caller can fall back to a plain
+        download.
+        """
+        url_protocol = UrlFetcher._get_url_protocol(self.__url)
+        url = self.__encode_url(self.__url)
+        headers = self.__urllib_headers(url)
+
+        remote_size = self.__probe_segmented_download(
+            url, url_protocol, headers)
+        if remote_size is None:
+            return None
+
+        segment_count = min(
+            self.__segments, remote_size // UrlFetcher.SEGMENT_MIN_SIZE)
+        if segment_count < 2:
+            return None
+
+        urls = [url]
+        for segment_url in self.__segment_urls:
+            if UrlFetcher._get_url_protocol(segment_url) in ("http", "https"):
+                urls.append(self.__encode_url(segment_url))
+
+        segments = None
+        if self.__resume:
+            segments = self.__load_segment_state(remote_size)
+
+        try:
+            if segments is None:
+                # a plain partial download is a valid prefix, a file left
+                # by a segmented download without usable state is not.
+                existing_size = 0
+                if self.__resume and const_file_readable(
+                        self.__path_to_save) and not os.path.lexists(
+                        self.__segment_state_path()):
+                    existing_size = os.path.getsize(self.__path_to_save)
+                    if existing_size >= remote_size:
+                        existing_size = 0
+
+                segment_size = remote_size // segment_count
+                segments = []
+                for idx in range(segment_count):
+                    start = idx * segment_size
+                    end = start + segment_size
+                    if idx == segment_count - 1:
+                        end = remote_size
+                    pos = max(start, min(end, existing_size))
+                    segments.append([start, end, pos])
+
+                mode = "r+b"
+                if not existing_size:
+                    mode = "wb"
+                with open(self.__path_to_save, mode) as local_f:
+                    local_f.truncate(remote_size)
+                    if mode == "wb" and hasattr(os, "posix_fallocate"):
+                        try:
+                            os.posix_fallocate(
+                                local_f.fileno(), 0, remote_size)
+                        except OSError:
+                            pass
+            else:
+                self.__resumed = True
+        except (IOError, OSError):
+            self.__status = UrlFetcher.GENERIC_FETCH_ERROR
+            return self.__status
+
+        self.__remotesize = float(remote_size) / 1000
+        self.__startingposition = sum(x[2] - x[0] for x in segments)
+        self.__downloadedsize = self.__startingposition
+        self.__last_downloadedsize = self.__startingposition
+        if self.__startingposition:
+            self.__resumed = True
+        self.__save_segment_state(remote_size, segments)
+
+        segments_lock = threading.Lock()
+        stop_event = threading.Event()
+        errors = {}
+
+        def _segment_worker(seg_idx):
+            for attempt in range(len(urls)):
+                seg_url = urls[(seg_idx + attempt) % len(urls)]
+                err = self.__fetch_segment(
+                    seg_url, url_protocol, headers, segments[seg_idx],
+                    segments_lock, stop_event)
+                if err is None:
+                    errors.pop(seg_idx, None)
+                    return
+                errors[seg_idx] = err
+                if stop_event.is_set():
+                    return
+
+        workers = []
+        for seg_idx, (start, end, pos) in enumerate(segments):
+            if pos >= end:
+                continue
+            th = ParallelTask(_segment_worker, seg_idx)
+            th.name = "UrlFetcherSegment{%s, %d}" % (url, seg_idx)
+            th.daemon = True
+            th.start()
+            workers.append(th)
+
+        last_save_t = time.time()
+        try:
+            while workers:
+                for th in workers[:]:
+                    th.join(0.2)
+                    if not th.is_alive():
+                        workers.remove(th)
+
+                if self.__abort_check_func != None:
+                    self.__abort_check_func()
+                if self.__thread_stop_func != None:
+                    self.__thread_stop_func()
+
+                self.__segmented_progress()
+                cur_t = time.time()
+                if cur_t - last_save_t > 1.0:
+                    with segments_lock:
+                        state = [list(x) for x in segments]
+                    self.__save_segment_state(remote_size, state)
+                    last_save_t = cur_t
+
+        except BaseException:
+            stop_event.set()
+            for th in workers:
+                th.join()
+            self.__save_segment_state(remote_size, segments)
+            raise
+
+        self.__segmented_progress()
+
+        if errors:
+            if self.__resume:
+                self.__save_segment_state(remote_size, segments)
+            else:
+                self.__remove_segment_state()
+                if not self.__existed_before:
+                    try:
+                        os.remove(self.__path_to_save)
+                    except OSError:
+                        pass
+            if UrlFetcher.TIMEOUT_FETCH_ERROR in errors.values():
+                self.__status = UrlFetcher.TIMEOUT_FETCH_ERROR
+            else:
+                self.__status = UrlFetcher.GENERIC_FETCH_ERROR
+            return self.__status
+
+        self.__remove_segment_state()
+        # the md5 digestor cannot be fed on the way, segments are written
+        # out of order, compute it from the complete file.
+        self.__use_md5_checksum = False
+        return self.__prepare_return()
+
+    def __segmented_progress(self):
+        kbytecount = float(self.__downloadedsize)/1000
+        try:
+            average = int((kbytecount/self.__remotesize)*100)
+        except ZeroDivisionError:
+            average = 0
+        if average > 100:
+            average = 100
+        self.__average = average
+        self._update_speed()
+        if self.__show_speed:
+            self.handle_statistics(self.__th_id, self.__downloadedsize,
+                self.__remotesize, self.__average, self.__oldaverage,
+                self.__updatestep, self.__show_speed, self.__datatransfer,
+                self.__time_remaining, self.__time_remaining_secs
+            )
+            self.update()
+            self.__oldaverage = self.__average
+
     def __urllib_commit(self, mybuffer):
+        if self.__first_byte_time is None:
+            self.__first_byte_time = time.time()
         # writing file buffer
         self.__localfile.write(mybuffer)
         self.__md5_checksum.update(mybuffer)
@@ -924,6 +1724,19 @@ class UrlFetcher(TextInterface):
         """
         return self.__resumed
 
+    def get_time_to_first_byte(self):
+        """
+        Return the time elapsed between the download start and the arrival
+        of the first byte of data, in seconds, or None if no data has been
+        received (or the protocol handler does not support this).
+
+        @return: time to first byte
+        @rtype: float or None
+        """
+        if self.__first_byte_time is None:
+            return None
+        return self.__first_byte_time - self.__starttime
+
     def handle_statistics(self, th_id, downloaded_size, total_size,
             average, old_average, update_step, show_speed, data_transfer,
             time_remaining, time_remaining_secs):
@@ -1013,10 +1826,15 @@ class MultipleUrlFetcher(TextInterface):
                  download_context_func = None,
                  pre_download_hook = None, post_download_hook = None,
                  http_basic_user = None, http_basic_pwd = None,
-                 https_validate_cert = True):
+                 https_validate_cert = True, mirror_scores = None,
+                 segments = 1, connection_pool = None):
         """
         @param url_path_list: list of tuples composed by url and
-            path to save, for eg. [(url,path_to_save,),...]
+            path to save, for eg. [(url,path_to_save,),...]. The url
+            can also be a list of URLs of the same file, on different
+            mirrors: the first one is downloaded, the others are used
+            as segment URLs (see the segments keyword). Failing over
+            to another mirror is left to the caller.
         @type url_path_list: list
         @keyword checksum: return md5 hash instead of status code
         @type checksum: bool
@@ -1057,6 +1875,18 @@ class MultipleUrlFetcher(TextInterface):
             The function takes a path (the download path) and the download
             status and the download id as arguments.
         @type post_download_hook: callable
+        @keyword mirror_scores: if not None, an object exposing the
+            entropy.client.mirrors.MirrorScores record() method, fed with
+            the outcome of every transfer.
+        @type mirror_scores: entropy.client.mirrors.MirrorScores
+        @keyword segments: maximum number of HTTP Range segments each file
+            can be split into, see UrlFetcher. Alternative URLs (if any)
+            are used to fetch segments from several mirrors at once.
+        @type segments: int
+        @keyword connection_pool: pool of persistent HTTP connections shared
+            by the downloads, if None, the process-wide HTTPConnectionPool
+            is used.
+        @type connection_pool: HTTPConnectionPool
         """
         self._progress_data = {}
         self._url_path_list = url_path_list
@@ -1071,8 +1901,15 @@ class MultipleUrlFetcher(TextInterface):
         self.__download_context_func = download_context_func
         self.__pre_download_hook = pre_download_hook
         self.__post_download_hook = post_download_hook
+        self.__mirror_scores = mirror_scores
+        self.__segments = segments
+        if connection_pool is None:
+            connection_pool = HTTPConnectionPool()
+        self.__connection_pool = connection_pool
 
         # important to have a declaration here
+        self.__downloaders = {}
+        self.__download_urls = {}
         self.__data_transfer = 0
         self.__average = 0
         self.__old_average = 0
@@ -1096,6 +1933,8 @@ class MultipleUrlFetcher(TextInterface):
         self._progress_data.clear()
         self._progress_data_lock = threading.Lock()
         self.__thread_pool = {}
+        self.__downloaders = {}
+        self.__download_urls = {}
         self.__download_statuses = {}
         self.__show_progress = False
         self.__stop_threads = False
@@ -1157,9 +1996,12 @@ class MultipleUrlFetcher(TextInterface):
                 return self.__multiple_fetcher.handle_statistics(*args,
                     **kwargs)
 
-        th_id = 0
-        for url, path_to_save in self._url_path_list:
-            th_id += 1
+        fetch_errors = (
+            UrlFetcher.TIMEOUT_FETCH_ERROR,
+            UrlFetcher.GENERIC_FETCH_ERROR,
+        )
+
+        def make_downloader(dth_id, url, path_to_save, urls):
             downloader = MyFetcher(
                 self.__url_fetcher, self, url, path_to_save,
                 checksum = self.__checksum, show_speed = self.__show_speed,
@@ -1174,16 +2016,42 @@ class MultipleUrlFetcher(TextInterface):
                 post_download_hook = self.__post_download_hook,
                 http_basic_user = self.__http_basic_user,
                 http_basic_pwd = self.__http_basic_pwd,
-                https_validate_cert = self.__https_validate_cert
+                https_validate_cert = self.__https_validate_cert,
+                segments = self.__segments,
+                segment_urls = urls,
+                connection_pool = self.__connection_pool
             )
-            downloader.set_id(th_id)
+            downloader.set_id(dth_id)
+            self.__downloaders[dth_id] = downloader
+            return downloader
+
+        def do_download(ds, dth_id, downloader, url):
+            status = downloader.download()
+            if self.__mirror_scores is not None:
+                self.__mirror_scores.record(
+                    url,
+                    transfer_rate = downloader.get_transfer_rate(),
+                    time_to_first_byte = \
+                        downloader.get_time_to_first_byte(),
+                    error = status in fetch_errors)
+            ds[dth_id] = status
 
-            def do_download(ds, dth_id, downloader):
-                ds[dth_id] = downloader.download()
+        th_id = 0
+        for url, path_to_save in self._url_path_list:
+            th_id += 1
+
+            if isinstance(url, (list, tuple)):
+                urls = list(url)
+            else:
+                urls = [url]
+
+            self.__download_urls[th_id] = urls[0]
+            downloader = make_downloader(
+                th_id, urls[0], path_to_save, urls)
 
             t = ParallelTask(do_download, self.__download_statuses, th_id,
-                downloader)
-            t.name = "UrlFetcher{%s}" % (url,)
+                downloader, urls[0])
+            t.name = "UrlFetcher{%s}" % (urls[0],)
             t.daemon = True
             self.__thread_pool[th_id] = t
             t.start()
@@ -1228,6 +2096,21 @@ class MultipleUrlFetcher(TextInterface):
         """
         return self.__data_transfer
 
+    def get_download_stats(self):
+        """
+        Return per-download statistics of the last download() call, useful
+        to evaluate the quality of the mirrors in use.
+
+        @return: dict composed by download id (see download()) as key and
+            (transfer rate, time to first byte) tuple as value, see
+            UrlFetcher.get_transfer_rate() and
+            UrlFetcher.get_time_to_first_byte().
+        @rtype: dict
+        """
+        return dict((th_id, (downloader.get_transfer_rate(),
+                             downloader.get_time_to_first_byte()))
+                    for th_id, downloader in self.__downloaders.items())
+
     def get_average(self):
         """
         Get current download percentage.
@@ -1248,7 +2131,8 @@ class MultipleUrlFetcher(TextInterface):
 
     def __show_download_files_info(self):
         count = 0
-        pl = self._url_path_list[:]
+        pl = [(self.__download_urls[th_id], save_path) for th_id, (_url,
+              save_path) in enumerate(self._url_path_list, 1)]
         TextInterface.output(
             "%s: %s %s" % (
                 darkblue(_("Aggregated download")),
@@ -1427,3 +2311,215 @@ class MultipleUrlFetcher(TextInterface):
         your output devices.
         """
         return self._push_progress_to_output()
+
+
+class BlockSyncFetcher(UrlFetcher):
+
+    """
+    zsync-like fetcher, rebuilding a remote file from a local, outdated
+    copy of it (the seed) and the block manifest of the remote file (see
+    entropy.tools.create_block_manifest_file()). Blocks found in the seed
+    are copied locally, only the missing ones are downloaded through HTTP
+    Range requests, so any plain HTTP(S) mirror works.
+    Blocks are content-defined (see entropy.tools.content_defined_blocks())
+    so that, for line based files like SQL dumps, inserted or removed
+    lines do not shift the following blocks.
+    """
+
+    # missing blocks separated by up to this many bytes of available
+    # blocks are fetched with a single Range request
+    RANGE_MERGE_GAP = 8 * 1024
+    # maximum size of a single Range request, in bytes
+    RANGE_MAX_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, url, path_to_save, manifest, seed_path,
+                 max_fetch_size = None, **kwargs):
+        """
+        BlockSyncFetcher constructor. Other keyword arguments are passed
+        to UrlFetcher, resume and show_speed are not supported.
+
+        @param url: download URL of the remote file (HTTP or HTTPS)
+        @type url: string
+        @param path_to_save: file path where to rebuild the remote file
+        @type path_to_save: string
+        @param manifest: block manifest of the remote file, as returned by
+            entropy.tools.read_block_manifest_file()
+        @type manifest: dict
+        @param seed_path: path to the local copy of the file, it may not
+            exist
+        @type seed_path: string
+        @keyword max_fetch_size: if not None, give up (without downloading
+            anything) when more than max_fetch_size bytes are missing
+        @type max_fetch_size: int
+        """
+        kwargs['resume'] = False
+        kwargs['show_speed'] = False
+        super(BlockSyncFetcher, self).__init__(url, path_to_save, **kwargs)
+        self.__url = url
+        self.__path_to_save = path_to_save
+        self.__manifest = manifest
+        self.__seed_path = seed_path
+        self.__max_fetch_size = max_fetch_size
+        self.__reused_size = 0
+        self.__fetched_size = 0
+
+        self.__offsets = []
+        offset = 0
+        for length, _digest in manifest['blocks']:
+            self.__offsets.append(offset)
+            offset += length
+        self.__offsets.append(offset)
+
+    def get_statistics(self):
+        """
+        Return the amount of data reused from the seed and the amount
+        of data downloaded by the last download() call.
+
+        @return: tuple composed by (reused bytes, fetched bytes)
+        @rtype: tuple
+        """
+        return self.__reused_size, self.__fetched_size
+
+    def __copy_seed_blocks(self, local_f):
+        """
+        Copy the blocks available in the seed to the local file and
+        return the sorted list of the missing ones.
+        """
+        wanted = {}
+        for block, entry in enumerate(self.__manifest['blocks']):
+            wanted.setdefault(entry, []).append(block)
+
+        try:
+            seed_f = open(self.__seed_path, "rb")
+        except (IOError, OSError) as err:
+            if err.errno != errno.ENOENT:
+                raise
+            return list(range(len(self.__manifest['blocks'])))
+
+        with seed_f:
+            for data in content_defined_blocks(seed_f):
+                blocks = wanted.pop((len(data), block_digest(data)), None)
+                if blocks is None:
+                    continue
+                for block in blocks:
+                    local_f.seek(self.__offsets[block])
+                    local_f.write(data)
+                    self.__reused_size += len(data)
+
+        return sorted(
+            block for blocks in wanted.values() for block in blocks)
+
+    def __missing_ranges(self, missing):
+        """
+        Coalesce the sorted list of missing blocks into a list of
+        [first block, last block + 1) ranges.
+        """
+        offsets = self.__offsets
+        ranges = []
+        for block in missing:
+            if ranges:
+                first, end = ranges[-1]
+                gap = offsets[block] - offsets[end]
+                size = offsets[block + 1] - offsets[first]
+                if gap <= BlockSyncFetcher.RANGE_MERGE_GAP and \
+                        size <= BlockSyncFetcher.RANGE_MAX_SIZE:
+                    ranges[-1][1] = block + 1
+                    continue
+            ranges.append([block, block + 1])
+        return ranges
+
+    def __fetch_range(self, local_f, first, end):
+        """
+        Download the given range of blocks, verify their digests and
+        write them to the local file. Return None on success, an
+        UrlFetcher error code otherwise.
+        """
+        blocks = self.__manifest['blocks']
+        start, stop = self.__offsets[first], self.__offsets[end]
+
+        remote = None
+        try:
+            remote = self._open_range(start, stop)
+            if remote is None:
+                return UrlFetcher.GENERIC_FETCH_ERROR
+
+            local_f.seek(start)
+            for length, digest in blocks[first:end]:
+                data = remote.read(length)
+                while data and len(data) < length:
+                    chunk = remote.read(length - len(data))
+                    if not chunk:
+                        break
+                    data += chunk
+                if block_digest(data) != digest:
+                    # short read or mirror content changed
+                    return UrlFetcher.GENERIC_FETCH_ERROR
+                local_f.write(data)
+                self.__fetched_size += length
+            # consume the response, so that the connection can be reused
+            remote.read()
+            return None
+
+        except socket.timeout:
+            return UrlFetcher.TIMEOUT_FETCH_ERROR
+        except (urlmod_error.URLError, httplib.HTTPException,
+                socket.error, ValueError):
+            return UrlFetcher.GENERIC_FETCH_ERROR
+        finally:
+            if remote is not None:
+                try:
+                    remote.close()
+                except socket.error:
+                    pass
+
+    def download(self):
+        """
+        Rebuild the remote file at path_to_save.
+
+        @return: the SHA256 hex digest of the rebuilt file, matching the
+            manifest one, or UrlFetcher.GENERIC_FETCH_ERROR or
+            UrlFetcher.TIMEOUT_FETCH_ERROR
+        @rtype: string
+        """
+        self.__reused_size = 0
+        self.__fetched_size = 0
+        url_protocol = UrlFetcher._get_url_protocol(self.__url)
+        if url_protocol not in ("http", "https"):
+            return UrlFetcher.GENERIC_FETCH_ERROR
+
+        status = UrlFetcher.GENERIC_FETCH_ERROR
+        try:
+            with open(self.__path_to_save, "wb") as local_f:
+                local_f.truncate(self.__manifest['length'])
+                missing = self.__copy_seed_blocks(local_f)
+                if self.__max_fetch_size is not None:
+                    missing_size = sum(
+                        self.__manifest['blocks'][x][0] for x in missing)
+                    if missing_size > self.__max_fetch_size:
+                        return status
+
+                for first, end in self.__missing_ranges(missing):
+                    fetch_status = self.__fetch_range(local_f, first, end)
+                    if fetch_status is not None:
+                        status = fetch_status
+                        return status
+
+            checksum = hashlib.sha256()
+            with open(self.__path_to_save, "rb") as local_f:
+                data = local_f.read(UrlFetcher.SEGMENT_BUFFER_SIZE)
+                while data:
+                    checksum.update(data)
+                    data = local_f.read(UrlFetcher.SEGMENT_BUFFER_SIZE)
+            if checksum.hexdigest() == self.__manifest['sha256']:
+                status = checksum.hexdigest()
+            return status
+
+        except (IOError, OSError):
+            return status
+        finally:
+            if status in (UrlFetcher.GENERIC_FETCH_ERROR,
+                          UrlFetcher.TIMEOUT_FETCH_ERROR):
+                try:
+                    os.remove(self.__path_to_save)
+                except OSError:
+                    pass
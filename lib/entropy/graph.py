@@ -13,7 +13,6 @@
     based on Tarjan's.
 
 """
-from entropy.misc import Lifo
 
 class GraphNode(object):
 
@@ -220,6 +219,10 @@ class TopologicalSorter(object):
     """
     This class implements the topological sorting algorithm presented by
     R. E. Tarjan in 1972.
+    Strongly connected components are found iteratively, thus deep
+    graphs do not hit the Python recursion limit, and both the
+    components search and the sorting run in O(V+E) time over
+    integer-indexed adjacency lists.
     """
 
     def __init__(self, adjacency_map):
@@ -231,78 +234,129 @@ class TopologicalSorter(object):
         """
         object.__init__(self)
         self.__adjacency_map = adjacency_map
-        self.__stack = Lifo()
 
-    def __topological_sort_visit_node(self, node, low, result):
+    @staticmethod
+    def _strongly_connected_components(successors):
         """
-        Internal method, visits a node ad push to stack.
-        """
-        if node in low:
-            return
-
-        num = len(low)
-        low[node] = num
-        stack_pos = len(self.__stack)
-        self.__stack.push(node)
-
-        for successor in self.__adjacency_map[node]:
-            self.__topological_sort_visit_node(successor, low, result)
-            low[node] = min(low[node], low[successor])
+        Find the strongly connected components of an integer-indexed
+        graph using Tarjan's algorithm, without recursion.
 
-        if num == low[node]:
-            component = tuple()
-            while len(self.__stack) > stack_pos:
-                component += (self.__stack.pop(),)
-            result.append(component)
-            for item in component:
-                low[item] = len(self.__adjacency_map)
-
-    def __strongly_connected_nodes(self):
-        """
-        Find the strongly connected nodes in a adjacency_map using
-        Tarjan's algorithm.
-
-        adjacency_map should be a dictionary mapping node names to
-        lists of successor nodes.
+        @param successors: list, indexed by node, of the successor node
+            indexes
+        @type successors: list
+        @return: list of components (tuples of node indexes), in
+            reverse topological order
+        @rtype: list
         """
+        node_count = len(successors)
+        # -1 means not visited yet
+        number = [-1] * node_count
+        low = [0] * node_count
+        stack = []
         result = []
-        low = {}
-
-        for node in self.__adjacency_map:
-            self.__topological_sort_visit_node(node, low, result)
+        counter = 0
+
+        for root in range(node_count):
+            if number[root] != -1:
+                continue
+
+            number[root] = low[root] = counter
+            counter += 1
+            # call stack frames: [node, next successor offset, stack position]
+            frames = [[root, 0, len(stack)]]
+            stack.append(root)
+
+            while frames:
+                frame = frames[-1]
+                node = frame[0]
+                node_successors = successors[node]
+                offset = frame[1]
+
+                if offset < len(node_successors):
+                    frame[1] = offset + 1
+                    successor = node_successors[offset]
+                    if number[successor] == -1:
+                        # "recurse" into the successor
+                        number[successor] = low[successor] = counter
+                        counter += 1
+                        frames.append([successor, 0, len(stack)])
+                        stack.append(successor)
+                    elif low[successor] < low[node]:
+                        low[node] = low[successor]
+                    continue
+
+                frames.pop()
+                if number[node] == low[node]:
+                    stack_pos = frame[2]
+                    component = tuple(reversed(stack[stack_pos:]))
+                    del stack[stack_pos:]
+                    for item in component:
+                        low[item] = node_count
+                    result.append(component)
+
+                if frames:
+                    parent = frames[-1][0]
+                    if low[node] < low[parent]:
+                        low[parent] = low[node]
 
         return result
 
-
-    def __topological_sort(self, graph):
+    @staticmethod
+    def _sort_indexed(successors):
         """
-        Effectively executes topological sorting on given graph.
+        Identify the strongly connected components of an integer-indexed
+        graph, then perform a topological sort on them.
+
+        @param successors: list, indexed by node, of the successor node
+            indexes
+        @type successors: list
+        @return: sorted graph representation, mapping dependency levels to
+            components (tuples of node indexes)
+        @rtype: dict
         """
+        components = TopologicalSorter._strongly_connected_components(
+            successors)
 
-        # initialize count map
-        count = dict((node, 0) for node in graph)
+        node_component = [0] * len(successors)
+        for component_id, component in enumerate(components):
+            for node in component:
+                node_component[node] = component_id
 
-        for node in graph:
-            for successor in graph[node]:
-                count[successor] += 1
+        # components are ordered by their first node, their successors
+        # are listed once per arch, like the nodes ones.
+        order = []
+        component_successors = [None] * len(components)
+        for node, node_successors in enumerate(successors):
+            node_c = node_component[node]
+            obj = component_successors[node_c]
+            if obj is None:
+                obj = []
+                component_successors[node_c] = obj
+                order.append(node_c)
+            for successor in node_successors:
+                successor_c = node_component[successor]
+                if node_c != successor_c:
+                    obj.append(successor_c)
 
-        ready_stack = Lifo()
-        for node in graph:
-            if count[node] == 0:
-                ready_stack.push(node)
+        count = [0] * len(components)
+        for obj in component_successors:
+            for successor_c in obj:
+                count[successor_c] += 1
+
+        ready_stack = [x for x in order if count[x] == 0]
 
         dep_level = 1
         result = {}
-        while ready_stack.is_filled():
+        while ready_stack:
 
-            node = ready_stack.pop()
-            result[dep_level] = node
+            component_id = ready_stack.pop()
+            result[dep_level] = components[component_id]
             dep_level += 1
 
-            for successor in graph[node]:
-                count[successor] -= 1
-                if count[successor] == 0:
-                    ready_stack.push(successor)
+            for successor_c in component_successors[component_id]:
+                count[successor_c] -= 1
+                if count[successor_c] == 0:
+                    ready_stack.append(successor_c)
 
         return result
 
@@ -323,26 +377,14 @@ class TopologicalSorter(object):
         @return: sorted graph representation
         @rtype: dict
         """
-        # clear stack
-        self.__stack.clear()
+        nodes = list(self.__adjacency_map.keys())
+        node_index = dict((node, idx) for idx, node in enumerate(nodes))
+        successors = [[node_index[x] for x in self.__adjacency_map[node]] \
+                          for node in nodes]
 
-        components = self.__strongly_connected_nodes()
-
-        node_component = {}
-        for component in components:
-            for node in component:
-                node_component[node] = component
-
-        component_graph = {}
-        for node in self.__adjacency_map:
-            node_c = node_component[node]
-            obj = component_graph.setdefault(node_c, [])
-            for successor in self.__adjacency_map[node]:
-                successor_c = node_component[successor]
-                if node_c != successor_c:
-                    obj.append(successor_c)
-
-        return self.__topological_sort(component_graph)
+        sorted_data = self._sort_indexed(successors)
+        return dict((dep_level, tuple(nodes[x] for x in component)) \
+                        for dep_level, component in sorted_data.items())
 
 
 class Graph(object):
@@ -352,6 +394,12 @@ class Graph(object):
     add() method and sorted using solve(). This class can also return an
     adjacency map representing the currently stored elements in graph.
     A topological sorting algorithm (using Tarjan's) is used to by solve().
+
+    Every GraphNode gets an integer index when it is added, and the
+    outgoing arches are kept, in parallel, as integer adjacency lists,
+    updated by add() as it goes. This way, solving the graph does not
+    need to walk the GraphNode and GraphArchSet objects.
+    GraphNode arches must then be only changed through add().
     """
 
     def __init__(self):
@@ -362,6 +410,11 @@ class Graph(object):
         self.__graph = {}
         self.__archs_map = {}
         self.__graph_map_cache = None
+        # integer-indexed view of the graph
+        self.__nodes = []
+        self.__node_index = {}
+        self.__successors = []
+        self.__successors_set = []
 
     def destroy(self):
         """
@@ -381,12 +434,17 @@ class Graph(object):
             pass
         try:
             if self.__graph_map_cache is not None:
-                for obj in self.__graph_map_cache.values():
-                    obj._clear()
                 self.__graph_map_cache.clear()
                 self.__graph_map_cache = None
         except (NameError, AttributeError):
             pass
+        try:
+            del self.__nodes[:]
+            self.__node_index.clear()
+            del self.__successors[:]
+            del self.__successors_set[:]
+        except (NameError, AttributeError):
+            pass
 
     def __invalidate_cache(self):
         """
@@ -394,6 +452,24 @@ class Graph(object):
         """
         self.__graph_map_cache = None
 
+    def __get_node_index(self, item):
+        """
+        Return the index of the GraphNode bound to item, creating both
+        if needed.
+        """
+        graph_node = self.__graph.get(item)
+        if graph_node is None:
+            graph_node = GraphNode(item)
+            self.__graph[item] = graph_node
+        idx = self.__node_index.get(graph_node)
+        if idx is None:
+            idx = len(self.__nodes)
+            self.__node_index[graph_node] = idx
+            self.__nodes.append(graph_node)
+            self.__successors.append([])
+            self.__successors_set.append(set())
+        return idx
+
     def get_node(self, item):
         """
         Return GraphNode instance for added item (through add())
@@ -418,15 +494,24 @@ class Graph(object):
         """
         self.__invalidate_cache()
 
-        graph_node = self.__graph.setdefault(item, GraphNode(item))
-        arch = self.__archs_map.setdefault(graph_node, GraphArchSet(graph_node))
+        idx = self.__get_node_index(item)
+        graph_node = self.__nodes[idx]
+        arch = self.__archs_map.get(graph_node)
+        if arch is None:
+            arch = GraphArchSet(graph_node)
+            self.__archs_map[graph_node] = arch
         graph_node.add_arch(arch)
 
+        successors = self.__successors[idx]
+        successors_set = self.__successors_set[idx]
         for dep_item in dependency_items:
-            graph_node_dep = self.__graph.setdefault(dep_item,
-                GraphNode(dep_item))
+            dep_idx = self.__get_node_index(dep_item)
+            graph_node_dep = self.__nodes[dep_idx]
             arch.add_endpoint(graph_node_dep)
             graph_node_dep.add_arch(arch)
+            if dep_idx not in successors_set:
+                successors_set.add(dep_idx)
+                successors.append(dep_idx)
 
     def get_adjacency_map(self):
         """
@@ -438,15 +523,10 @@ class Graph(object):
         if self.__graph_map_cache is not None:
             return self.__graph_map_cache.copy()
 
-        graph_map = {}
-        for node_item in self.__graph.values():
-
-            my_graph_map = set()
-            for arch in node_item.arches():
-                if node_item.is_arch_outgoing(arch):
-                    my_graph_map |= arch.endpoints()
-
-            graph_map[node_item] = my_graph_map
+        nodes = self.__nodes
+        graph_map = dict((nodes[idx], set(nodes[x] for x in successors)) \
+                             for idx, successors in \
+                             enumerate(self.__successors))
 
         self.__graph_map_cache = graph_map.copy()
         return graph_map
@@ -460,9 +540,10 @@ class Graph(object):
         @return: sorted graph representation (returning GraphNode objects)
         @rtype: dict
         """
-        adj_map = self.get_adjacency_map()
-        sorter = TopologicalSorter(adj_map)
-        return sorter.sort()
+        nodes = self.__nodes
+        sorted_data = TopologicalSorter._sort_indexed(self.__successors)
+        return dict((dep_level, tuple(nodes[x] for x in component)) \
+                        for dep_level, component in sorted_data.items())
 
     def solve(self):
         """
@@ -474,11 +555,10 @@ class Graph(object):
         @return: sorted graph representation
         @rtype: dict
         """
-        def trans_vals(node_list):
-            return tuple([x.item() for x in node_list])
-
-        sorted_data = self.solve_nodes()
-        return dict((x, trans_vals(y),) for x, y in sorted_data.items())
+        nodes = self.__nodes
+        sorted_data = TopologicalSorter._sort_indexed(self.__successors)
+        return dict((dep_level, tuple(nodes[x].item() for x in component)) \
+                        for dep_level, component in sorted_data.items())
 
     def raw(self):
         """
@@ -626,6 +626,18 @@ class ServerPackagesRepositoryUpdater(object):
                 critical.append(data['dump_path_digest_light'])
                 gpg_signed_files.append(data['dump_path_digest_light'])
 
+                # uncompressed dump + block manifest, used by clients
+                # for block-level differential updates
+                data['dump_path_light_plain'] = os.path.join(
+                    self._entropy._get_local_repository_dir(
+                        self._repository_id), etpConst['etpdatabasedumplight'])
+                critical.append(data['dump_path_light_plain'])
+
+                data['dump_path_light_blocks'] = data['dump_path_light_plain'] \
+                    + etpConst['blockmanifestfileext']
+                critical.append(data['dump_path_light_blocks'])
+                gpg_signed_files.append(data['dump_path_light_blocks'])
+
         # EAPI 1
         if 1 not in disabled_eapis:
 
@@ -1275,6 +1287,15 @@ Name:    %s
             level = "info",
             header = brown("    # ")
         )
+        self._entropy.output(
+            "%s: %s" % (
+                _("dump light block manifest"),
+                blue(upload_data['dump_path_light_blocks']),
+            ),
+            importance = 0,
+            level = "info",
+            header = brown("    # ")
+        )
 
         self._entropy.output(
             "%s: %s" % (_("opener"), blue(str(cmethod[0])),),
@@ -1546,17 +1567,20 @@ Name:    %s
             eapi2_tmp_dbconn.dropChangelog()
             eapi2_tmp_dbconn.commit()
 
-            # opener = cmethod[0]
-            f_out = cmethod[0](upload_data['dump_path_light'], "wb")
-            try:
-                eapi2_tmp_dbconn.exportRepository(f_out)
-            finally:
-                f_out.close()
-                eapi2_tmp_dbconn.close()
+            with open(upload_data['dump_path_light_plain'], "wb") as f_out:
+                try:
+                    eapi2_tmp_dbconn.exportRepository(f_out)
+                finally:
+                    eapi2_tmp_dbconn.close()
 
             os.remove(temp_eapi2_dbfile)
+            # opener = cmethod[0]
+            self._compress_file(upload_data['dump_path_light_plain'],
+                upload_data['dump_path_light'], cmethod[0])
             self._create_file_checksum(upload_data['dump_path_light'],
                 upload_data['dump_path_digest_light'])
+            entropy.tools.create_block_manifest_file(
+                upload_data['dump_path_light_plain'])
 
         if 1 not in disabled_eapis:
 
@@ -3596,12 +3596,20 @@ class Server(Client):
             txc.set_verbosity(False)
             with txc as handler:
 
+                pkgfiles = {}
+                for package_id in package_ids:
+                    pkgfile = dbconn.retrieveDownloadURL(package_id)
+                    pkgfiles[package_id] = \
+                        self.complete_remote_package_relative_path(
+                            pkgfile, repository_id)
+                # fetch all the remote checksums at once
+                remote_md5s = handler.get_md5_many(
+                    sorted(set(pkgfiles.values())))
+
                 for package_id in package_ids:
 
                     currentcounter += 1
-                    pkgfile = dbconn.retrieveDownloadURL(package_id)
-                    pkgfile = self.complete_remote_package_relative_path(
-                        pkgfile, repository_id)
+                    pkgfile = pkgfiles[package_id]
                     pkghash = dbconn.retrieveDigest(package_id)
 
                     self.output(
@@ -3617,7 +3625,7 @@ class Server(Client):
                         count = (currentcounter, totalcounter,)
                     )
 
-                    ck_remote = handler.get_md5(pkgfile)
+                    ck_remote = remote_md5s.get(pkgfile)
                     if ck_remote is None:
                         self.output(
                             "[%s] %s: %s %s" % (
@@ -4811,12 +4819,22 @@ class Server(Client):
             r_matches = list(filter(rfilter, removed))
             r_matches.sort(key = rsort)
 
+            # fetch all the reverse dependencies at once, per repository
+            r_repo_map = {}
+            for package_id, repository_id in r_matches:
+                obj = r_repo_map.setdefault(repository_id, set())
+                obj.add(package_id)
+            reverse_map = {}
+            for repository_id, package_ids in r_repo_map.items():
+                repo = self.open_repository(repository_id)
+                reverse_map[repository_id] = \
+                    repo.retrieveReverseDependenciesMap(package_ids)
+
             result = []
             for package_id, repository_id in r_matches:
 
                 repo = self.open_repository(repository_id)
-                reverse_package_ids = repo.retrieveReverseDependencies(
-                    package_id)
+                reverse_package_ids = reverse_map[repository_id][package_id]
 
                 # filter out packages pointing to multiple slots
                 sure_reverse_package_ids = set()
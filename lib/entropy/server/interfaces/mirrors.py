@@ -17,10 +17,6 @@ import threading
 import multiprocessing
 import socket
 import codecs
-try:
-    from Queue import Queue
-except ImportError:
-    from queue import Queue
 
 from entropy.exceptions import EntropyPackageException
 from entropy.output import red, darkgreen, bold, brown, blue, darkred, \
@@ -1101,30 +1097,28 @@ class Server(object):
         remote_packages_data = {}
         remote_packages = []
         branch = self._settings['repositories']['branch']
-        fifo_q = Queue()
 
-        def get_content(lookup_dir):
+        def get_content(lookup_dirs):
             only_dir = self._entropy.complete_remote_package_relative_path(
                 "", repository_id)
-            db_url_dir = lookup_dir[len(only_dir):]
-
-            # create path to lock file if it doesn't exist
-            if not txc_handler.is_dir(lookup_dir):
-                txc_handler.makedirs(lookup_dir)
-
-            info = txc_handler.list_content_metadata(lookup_dir)
+            # list all the directories at the same depth at once
+            infos = txc_handler.list_content_metadata_many(lookup_dirs)
 
             dirs = []
-            for path, size, user, group, perms in info:
-
-                if perms.startswith("d"):
-                    fifo_q.put(os.path.join(lookup_dir, path))
-                else:
-                    rel_path = os.path.join(db_url_dir, path)
-                    remote_packages.append(rel_path)
-                    remote_packages_data[rel_path] = int(size)
-
-        # initialize the queue
+            for lookup_dir in lookup_dirs:
+                db_url_dir = lookup_dir[len(only_dir):]
+                for path, size, user, group, perms in infos[lookup_dir]:
+
+                    if perms.startswith("d"):
+                        dirs.append(os.path.join(lookup_dir, path))
+                    else:
+                        rel_path = os.path.join(db_url_dir, path)
+                        remote_packages.append(rel_path)
+                        remote_packages_data[rel_path] = int(size)
+            return dirs
+
+        # initialize the lookup directories
+        lookup_dirs = []
         pkgs_dir_types = self._entropy._get_pkg_dir_names()
         for pkg_dir_type in pkgs_dir_types:
 
@@ -1133,10 +1127,13 @@ class Server(object):
             remote_dir = os.path.join(remote_dir, etpConst['currentarch'],
                 branch)
 
-            fifo_q.put(remote_dir)
+            # create path to lock file if it doesn't exist
+            if not txc_handler.is_dir(remote_dir):
+                txc_handler.makedirs(remote_dir)
+            lookup_dirs.append(remote_dir)
 
-        while not fifo_q.empty():
-            get_content(fifo_q.get())
+        while lookup_dirs:
+            lookup_dirs = get_content(lookup_dirs)
 
         return remote_packages, remote_packages_data
 
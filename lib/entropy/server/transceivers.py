@@ -177,11 +177,10 @@ class TransceiverServerHandler:
             print_traceback()
             return True, fine, broken # issues
 
-        maxcount = len(self.myfiles)
-        counter = 0
-
         with txc as handler:
 
+            transfers = []
+            checked_dirs = set()
             for mypath in self.myfiles:
 
                 base_dir = self.txc_basedir
@@ -191,8 +190,10 @@ class TransceiverServerHandler:
                         continue
                     base_dir, mypath = mypath
 
-                if not handler.is_dir(base_dir):
-                    handler.makedirs(base_dir)
+                if base_dir not in checked_dirs:
+                    if not handler.is_dir(base_dir):
+                        handler.makedirs(base_dir)
+                    checked_dirs.add(base_dir)
 
                 mypath_fn = os.path.basename(mypath)
                 remote_path = os.path.join(base_dir, mypath_fn)
@@ -207,6 +208,7 @@ class TransceiverServerHandler:
                     syncer = handler.delete
                     myargs = (remote_path,)
 
+                file_action = action
                 fallback_syncer, fallback_args = None, None
                 # upload -> remote copy herustic support
                 # if a package file might have been already uploaded
@@ -222,7 +224,22 @@ class TransceiverServerHandler:
                     if new_syncer is not None:
                         fallback_syncer, fallback_args = syncer, myargs
                         syncer, myargs = new_syncer, new_args
-                        action = "copy"
+                        file_action = "copy"
+
+                transfers.append((mypath, base_dir, remote_path, syncer,
+                    myargs, fallback_syncer, fallback_args, file_action))
+
+            batched = {}
+            if not (self.download or self.remove):
+                batched = self._batch_upload(handler, uri, transfers)
+
+            maxcount = len(transfers)
+            counter = 0
+
+            for index, transfer in enumerate(transfers):
+
+                (mypath, base_dir, remote_path, syncer, myargs,
+                 fallback_syncer, fallback_args, action) = transfer
 
                 counter += 1
                 tries = 0
@@ -244,14 +261,21 @@ class TransceiverServerHandler:
                         level = "info",
                         header = red(" @@ ")
                     )
-                    rc = syncer(*myargs)
-                    if (not rc) and (fallback_syncer is not None):
-                        # if we have a fallback syncer, try it first
-                        # before giving up.
-                        rc = fallback_syncer(*myargs)
+                    if index in batched:
+                        # already uploaded by _batch_upload(), verify it
+                        # and upload it again if it is broken
+                        rc, remote_md5 = True, batched.pop(index)
+                    else:
+                        rc = syncer(*myargs)
+                        if (not rc) and (fallback_syncer is not None):
+                            # if we have a fallback syncer, try it first
+                            # before giving up.
+                            rc = fallback_syncer(*fallback_args)
+                        remote_md5 = None
+                        if rc and not (self.download or self.remove):
+                            remote_md5 = handler.get_md5(remote_path)
 
                     if rc and not (self.download or self.remove):
-                        remote_md5 = handler.get_md5(remote_path)
                         rc = self.handler_verify_upload(mypath, uri,
                             counter, maxcount, tries, remote_md5 = remote_md5)
                     if rc:
@@ -331,6 +355,51 @@ class TransceiverServerHandler:
 
         return fail, fine, broken
 
+    def _batch_upload(self, handler, uri, transfers):
+        """
+        Upload the files that have to go to the same remote directory
+        with a single transfer and fetch their remote checksums at once.
+        Return a dict mapping the index of every uploaded transfer to
+        its remote MD5 checksum (or None, if not supported).
+        Failed batches are left to the per-file upload logic.
+        """
+        crippled_uri = EntropyTransceiver.get_uri_name(uri)
+        dir_map = {}
+        for index, transfer in enumerate(transfers):
+            mypath, base_dir, remote_path, syncer = transfer[:4]
+            if syncer != handler.upload:
+                continue
+            obj = dir_map.setdefault(base_dir, [])
+            obj.append(index)
+
+        batched = {}
+        for base_dir, indexes in sorted(dir_map.items()):
+            if len(indexes) < 2:
+                continue
+
+            self._entropy.output(
+                "[%s|%s] %s: %s" % (
+                    blue(crippled_uri),
+                    brown(_("batch")),
+                    blue(_("uploading files")),
+                    darkgreen(str(len(indexes))),
+                ),
+                importance = 0,
+                level = "info",
+                header = red(" @@ ")
+            )
+            uploaded = handler.upload_many(
+                [transfers[x][0] for x in indexes], base_dir)
+            if not uploaded:
+                continue
+
+            remote_md5s = handler.get_md5_many(
+                [transfers[x][2] for x in indexes])
+            for index in indexes:
+                batched[index] = remote_md5s.get(transfers[index][2])
+
+        return batched
+
     def _copy_herustic_support(self, handler, local_path,
             txc_basedir, remote_path):
         """
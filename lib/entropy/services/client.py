@@ -17,7 +17,6 @@ import errno
 import json
 import threading
 import hashlib
-import ssl
 import socket
 
 from entropy.const import const_is_python3, const_convert_to_rawstring, \
@@ -40,6 +39,7 @@ from entropy.const import const_debug_write, const_setup_file, etpConst, \
     const_convert_to_unicode, const_isstring, const_debug_enabled
 from entropy.core.settings.base import SystemSettings
 from entropy.exceptions import EntropyException
+from entropy.fetchers import HTTPConnectionPool
 import entropy.tools
 import entropy.dep
 
@@ -483,6 +483,8 @@ class WebService(object):
         """
         Given a function name and the request data (dict format), do the actual
         HTTP request and return the response object to caller.
+        Requests are issued over persistent connections taken from the
+        process-wide HTTPConnectionPool.
         WARNING: params and file_params dict keys must be ASCII string only.
 
         @param function_name: name of the function that called this method
@@ -507,180 +509,172 @@ class WebService(object):
             "WebService _generic_post_handler, calling: %s at %s -- %s,"
             " tx_callback: %s, timeout: %s" % (self._request_host, request_path,
                 params, self._transfer_callback, timeout,))
-        connection = None
-        try:
-            if self._request_protocol == "http":
-                connection = httplib.HTTPConnection(self._request_host,
-                    timeout = timeout)
-            elif self._request_protocol == "https":
-                ssl_context = None
-                if hasattr(ssl, 'create_default_context'):
-                    ssl_context = ssl.create_default_context(
-                        purpose = ssl.Purpose.CLIENT_AUTH)
-                connection = httplib.HTTPSConnection(
-                    self._request_host, timeout = timeout, context = ssl_context)
-            else:
-                raise WebService.RequestError("invalid request protocol",
-                    method = function_name)
-
-            headers = {
-                "Accept": "text/plain",
-                "User-Agent": self._generate_user_agent(function_name),
-            }
 
-            if file_params is None:
-                file_params = {}
-            # autodetect file parameters in params
-            for k in list(params.keys()):
-                if isinstance(params[k], (tuple, list)) \
-                    and (len(params[k]) == 2):
-                    f_name, f_obj = params[k]
-                    if isinstance(f_obj, file):
-                        file_params[k] = params[k]
-                        del params[k]
-                elif const_isunicode(params[k]):
-                    # convert to raw string
-                    params[k] = const_convert_to_rawstring(params[k],
-                        from_enctype = "utf-8")
-                elif not const_isstring(params[k]):
-                    # invalid ?
-                    if params[k] is None:
-                        # will be converted to ""
-                        continue
-                    int_types = const_get_int()
-                    supported_types = (float, list, tuple) + int_types
-                    if not isinstance(params[k], supported_types):
-                        raise WebService.UnsupportedParameters(
-                            "%s is unsupported type %s" % (k, type(params[k])))
-                    list_types = (list, tuple)
-                    if isinstance(params[k], list_types):
-                        # not supporting nested lists
-                        non_str = [x for x in params[k] if not \
-                            const_isstring(x)]
-                        if non_str:
-                            raise WebService.UnsupportedParameters(
-                                "%s is unsupported type %s" % (k,
-                                    type(params[k])))
-
-            body = None
-            if not file_params:
-                headers["Content-Type"] = "application/x-www-form-urlencoded"
-                encoded_params = urllib_parse.urlencode(params)
-                data_size = len(encoded_params)
-                if self._transfer_callback is not None:
-                    self._transfer_callback(0, data_size, False)
+        if self._request_protocol not in ("http", "https"):
+            raise WebService.RequestError("invalid request protocol",
+                method = function_name)
 
-                if data_size < 65536:
-                    try:
-                        connection.request("POST", request_path, encoded_params,
-                            headers)
-                    except socket.error as err:
-                        raise WebService.RequestError(err,
-                            method = function_name)
-                else:
-                    try:
-                        connection.request("POST", request_path, None, headers)
-                    except socket.error as err:
-                        raise WebService.RequestError(err,
-                            method = function_name)
-                    sio = StringIO(encoded_params)
-                    data_size = len(encoded_params)
-                    while True:
-                        chunk = sio.read(65535)
-                        if not chunk:
-                            break
-                        try:
-                            connection.send(chunk)
-                        except socket.error as err:
-                            raise WebService.RequestError(err,
-                                method = function_name)
-                        if self._transfer_callback is not None:
-                            self._transfer_callback(sio.tell(),
-                                data_size, False)
-                # for both ways, send a signal through the callback
-                if self._transfer_callback is not None:
-                    self._transfer_callback(data_size, data_size, False)
+        headers = {
+            "Accept": "text/plain",
+            "User-Agent": self._generate_user_agent(function_name),
+        }
 
-            else:
-                headers["Content-Type"] = "multipart/form-data; boundary=" + \
-                    multipart_boundary
-                body_file, body_fpath = self._encode_multipart_form(params,
-                    file_params, multipart_boundary)
+        if file_params is None:
+            file_params = {}
+        # autodetect file parameters in params
+        for k in list(params.keys()):
+            if isinstance(params[k], (tuple, list)) \
+                and (len(params[k]) == 2):
+                f_name, f_obj = params[k]
+                if isinstance(f_obj, file):
+                    file_params[k] = params[k]
+                    del params[k]
+            elif const_isunicode(params[k]):
+                # convert to raw string
+                params[k] = const_convert_to_rawstring(params[k],
+                    from_enctype = "utf-8")
+            elif not const_isstring(params[k]):
+                # invalid ?
+                if params[k] is None:
+                    # will be converted to ""
+                    continue
+                int_types = const_get_int()
+                supported_types = (float, list, tuple) + int_types
+                if not isinstance(params[k], supported_types):
+                    raise WebService.UnsupportedParameters(
+                        "%s is unsupported type %s" % (k, type(params[k])))
+                list_types = (list, tuple)
+                if isinstance(params[k], list_types):
+                    # not supporting nested lists
+                    non_str = [x for x in params[k] if not \
+                        const_isstring(x)]
+                    if non_str:
+                        raise WebService.UnsupportedParameters(
+                            "%s is unsupported type %s" % (k,
+                                type(params[k])))
+
+        body_file, body_fpath, encoded_params = None, None, None
+        if not file_params:
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+            encoded_params = urllib_parse.urlencode(params)
+            data_size = len(encoded_params)
+        else:
+            headers["Content-Type"] = "multipart/form-data; boundary=" + \
+                multipart_boundary
+            body_file, body_fpath = self._encode_multipart_form(params,
+                file_params, multipart_boundary)
+            data_size = body_file.tell()
+            headers["Content-Length"] = str(data_size)
+
+        pool = HTTPConnectionPool()
+        try:
+            # a persistent connection might have been closed by the server
+            # while sitting in the pool. Requests are not idempotent, so
+            # they are resubmitted, on a new connection, only if they could
+            # not be sent at all.
+            for attempt in range(2):
+                # certificates are not validated, as it's always been.
+                connection, reused = pool.acquire(
+                    self._request_protocol, self._request_host, None,
+                    timeout, validate_cert = False, fresh = attempt > 0)
+                reusable = False
+                sent = False
                 try:
-                    data_size = body_file.tell()
-                    headers["Content-Length"] = str(data_size)
-                    body_file.seek(0)
-                    if self._transfer_callback is not None:
-                        self._transfer_callback(0, data_size, False)
-
-                    try:
-                        connection.request("POST", request_path, None, headers)
-                    except socket.error as err:
-                        raise WebService.RequestError(err,
-                            method = function_name)
-                    while True:
-                        chunk = body_file.read(65535)
-                        if not chunk:
-                            break
-                        try:
-                            connection.send(chunk)
-                        except socket.error as err:
-                            raise WebService.RequestError(err,
-                                method = function_name)
-                        if self._transfer_callback is not None:
-                            self._transfer_callback(body_file.tell(),
-                                data_size, False)
-                    if self._transfer_callback is not None:
-                        self._transfer_callback(data_size, data_size, False)
+                    self._send_post_request(
+                        connection, request_path, headers, encoded_params,
+                        body_file, data_size)
+                    sent = True
+                    outcome, response = self._read_post_response(
+                        connection)
+                    reusable = True
+                except socket.timeout as err:
+                    raise WebService.RequestError(err,
+                        method = function_name)
+                except (socket.error, httplib.HTTPException) as err:
+                    if reused and not sent:
+                        continue
+                    raise WebService.RequestError(err,
+                        method = function_name)
                 finally:
-                    body_file.close()
-                    os.remove(body_fpath)
+                    pool.release(
+                        self._request_protocol, self._request_host, None,
+                        connection, reusable = reusable)
+
+                const_debug_write(__name__, "WebService.%s(%s), "
+                    "response header: %s" % (
+                        function_name, params, response.getheaders(),))
+                if const_is_python3():
+                    outcome = const_convert_to_unicode(outcome)
+                if not outcome:
+                    return None, response
+                return outcome, response
 
-            try:
-                response = connection.getresponse()
-            except socket.error as err:
-                raise WebService.RequestError(err,
-                    method = function_name)
-            const_debug_write(__name__, "WebService.%s(%s), "
-                "response header: %s" % (
-                    function_name, params, response.getheaders(),))
-            total_length = response.getheader("Content-Length", "-1")
-            try:
-                total_length = int(total_length)
-            except ValueError:
-                total_length = -1
-            outcome = const_convert_to_rawstring("")
-            current_len = 0
-            if self._transfer_callback is not None:
-                self._transfer_callback(current_len, total_length, True)
+        finally:
+            if body_file is not None:
+                body_file.close()
+                os.remove(body_fpath)
+
+    def _send_post_request(self, connection, request_path, headers,
+                           encoded_params, body_file, data_size):
+        """
+        Send a POST request using the given connection. The request body
+        is either the urlencoded parameters string or the (multipart) body
+        file object.
+        """
+        if self._transfer_callback is not None:
+            self._transfer_callback(0, data_size, False)
+
+        if body_file is None and data_size < 65536:
+            connection.request("POST", request_path, encoded_params,
+                headers)
+        else:
+            connection.request("POST", request_path, None, headers)
+            if body_file is None:
+                body_file = StringIO(encoded_params)
+            else:
+                body_file.seek(0)
             while True:
-                try:
-                    chunk = response.read(65536)
-                except socket.error as err:
-                    raise WebService.RequestError(err,
-                        method = function_name)
+                chunk = body_file.read(65535)
                 if not chunk:
                     break
-                outcome += chunk
-                current_len += len(chunk)
+                connection.send(chunk)
                 if self._transfer_callback is not None:
-                    self._transfer_callback(current_len, total_length, True)
+                    self._transfer_callback(body_file.tell(),
+                        data_size, False)
+        # for both ways, send a signal through the callback
+        if self._transfer_callback is not None:
+            self._transfer_callback(data_size, data_size, False)
 
+    def _read_post_response(self, connection):
+        """
+        Read the response to the POST request sent through
+        _send_post_request().
+        Return a tuple composed by the raw response data and the
+        HTTPResponse object.
+        """
+        response = connection.getresponse()
+        total_length = response.getheader("Content-Length", "-1")
+        try:
+            total_length = int(total_length)
+        except ValueError:
+            total_length = -1
+        outcome = const_convert_to_rawstring("")
+        current_len = 0
+        if self._transfer_callback is not None:
+            self._transfer_callback(current_len, total_length, True)
+        while True:
+            chunk = response.read(65536)
+            if not chunk:
+                break
+            outcome += chunk
+            current_len += len(chunk)
             if self._transfer_callback is not None:
-                self._transfer_callback(total_length, total_length, True)
+                self._transfer_callback(current_len, total_length, True)
 
-            if const_is_python3():
-                outcome = const_convert_to_unicode(outcome)
-            if not outcome:
-                return None, response
-            return outcome, response
+        if self._transfer_callback is not None:
+            self._transfer_callback(total_length, total_length, True)
 
-        except httplib.HTTPException as err:
-            raise WebService.RequestError(err,
-                method = function_name)
-        finally:
-            if connection is not None:
-                connection.close()
+        return outcome, response
 
     def _setup_credentials(self, request_params):
         """
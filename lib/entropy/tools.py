@@ -30,9 +30,15 @@ import random
 import traceback
 import gzip
 import bz2
+import zlib
 import mmap
 import codecs
 import struct
+import threading
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
 
 from entropy.output import print_generic
 from entropy.const import etpConst, const_kill_threads, const_islive, \
@@ -43,6 +49,23 @@ from entropy.exceptions import FileNotFound, InvalidAtom, DirectoryNotFound
 
 
 _READ_SIZE = 1024000
+# Entropy package footer: Entropy metadata offset, followed
+# by etpConst['databaseendtag']
+_EDB_FOOTER_FORMAT = ">Q"
+_EDB_FOOTER_SIZE = struct.calcsize(_EDB_FOOTER_FORMAT)
+# compressed tarballs unpacked through a decompression pipeline, by magic:
+# (compression, external multithreaded decompressors along with their
+# successful exit statuses, trailing garbage warnings included)
+_TARBALL_COMPRESSIONS = (
+    (b"BZh", "bz2", (("lbzip2", (0, 4)), ("pbzip2", (0,)))),
+    (b"\x1f\x8b", "gz", (("pigz", (0, 2)),)),
+)
+# maximum number of decompressed chunks buffered ahead of extraction
+_UNPACK_QUEUE_SIZE = 16
+# extracted regular files bigger than this are preallocated
+_UNPACK_PREALLOCATE_SIZE = 8 * _READ_SIZE
+# number of extracted regular files whose metadata is applied at once
+_UNPACK_METADATA_BATCH = 512
 
 
 def is_root():
@@ -267,22 +290,7 @@ def get_remote_data(url, timeout = 5):
         import urllib2 as urlmod
 
     # now pray the server
-    from entropy.core.settings.base import SystemSettings
-    sys_settings = SystemSettings()
-    proxy_settings = sys_settings['system']['proxy']
-
-    mydict = {}
-    if proxy_settings['ftp']:
-        mydict['ftp'] = proxy_settings['ftp']
-    if proxy_settings['http']:
-        mydict['http'] = proxy_settings['http']
-    if mydict:
-        mydict['username'] = proxy_settings['username']
-        mydict['password'] = proxy_settings['password']
-        add_proxy_opener(urlmod, mydict)
-    else:
-        # unset
-        urlmod._opener = None
+    _setup_remote_proxy(urlmod)
 
     item = None
     try:
@@ -305,6 +313,76 @@ def get_remote_data(url, timeout = 5):
         return False
     return result
 
+def is_url_reachable(url, timeout = 5):
+    """
+    Determine whether the server at given URL (all the ones supported by
+    Python urllib) can be reached. Any server reply, HTTP errors included,
+    makes the URL reachable. Local (file://) URLs are reachable if their
+    path exists, URLs not supported by urllib (rsync, ssh) are assumed to
+    be reachable.
+
+    @param url: URL string
+    @type url: string
+    @keyword timeout: connection timeout in seconds
+    @type timeout: int
+    @return: True, if the URL can be reached
+    @rtype: bool
+    """
+    if const_is_python3():
+        import urllib.request as urlmod
+        import urllib.error as urlerrmod
+    else:
+        import urllib2 as urlmod
+        urlerrmod = urlmod
+
+    url_data = spliturl(url)
+    if url_data.scheme == "file":
+        return os.path.exists(url_data.path)
+    if url_data.scheme not in ("http", "https", "ftp"):
+        return True
+
+    _setup_remote_proxy(urlmod)
+
+    item = None
+    try:
+        item = urlmod.urlopen(url, timeout = timeout)
+    except urlerrmod.HTTPError:
+        # the server replied
+        return True
+    except Exception:
+        # urllib2.URLError
+        # httplib.BadStatusLine
+        # httplib.InvalidURL
+        # ValueError
+        # IOError
+        return False
+    finally:
+        if item is not None:
+            item.close()
+    return True
+
+def _setup_remote_proxy(urlmod):
+    """
+    Setup (or unset) the urllib module proxy opener using the System
+    Settings proxy configuration.
+    """
+    from entropy.core.settings.base import SystemSettings
+    sys_settings = SystemSettings()
+    proxy_settings = sys_settings['system']['proxy']
+
+    mydict = {}
+    if proxy_settings['ftp']:
+        mydict['ftp'] = proxy_settings['ftp']
+    if proxy_settings['http']:
+        mydict['http'] = proxy_settings['http']
+    if mydict:
+        mydict['username'] = proxy_settings['username']
+        mydict['password'] = proxy_settings['password']
+        add_proxy_opener(urlmod, mydict)
+    else:
+        # unset
+        urlmod._opener = None
+
 def _is_png_file(path):
     with open(path, "rb") as f:
         x = f.read(4)
@@ -1503,8 +1581,10 @@ def aggregate_entropy_metadata(entropy_package_file, entropy_metadata_file):
     @type entropy_metadata_file: string
     """
     mmap_size_th = 4096000 # 4mb threshold
+    raw_db_tag = const_convert_to_rawstring(etpConst['databasestarttag'])
     with open(entropy_package_file, "ab") as f:
-        f.write(const_convert_to_rawstring(etpConst['databasestarttag']))
+        edb_position = os.fstat(f.fileno()).st_size + len(raw_db_tag)
+        f.write(raw_db_tag)
         with open(entropy_metadata_file, "rb") as g:
             f_size = os.lstat(entropy_metadata_file).st_size
             mmap_f = None
@@ -1529,6 +1609,10 @@ def aggregate_entropy_metadata(entropy_package_file, entropy_metadata_file):
                 if mmap_f is not None:
                     mmap_f.close()
 
+        # fixed-size footer, see _locate_edb()
+        f.write(struct.pack(_EDB_FOOTER_FORMAT, edb_position))
+        f.write(const_convert_to_rawstring(etpConst['databaseendtag']))
+
 def dump_entropy_metadata(entropy_package_file, entropy_metadata_file):
     """
     Dump Entropy package metadata from Entropy package file to
@@ -1571,15 +1655,21 @@ def dump_entropy_metadata(entropy_package_file, entropy_metadata_file):
                 start_position = _locate_edb(old)
             if start_position is None:
                 return False
+            start_position, end_position = start_position
+
+            if old_mmap is None:
+                reader = old
+            else:
+                reader = old_mmap
+            reader.seek(start_position)
+            remaining = end_position - start_position
 
             with open(entropy_metadata_file, "wb") as db:
-                while True:
-                    if old_mmap is None:
-                        data = old.read(_READ_SIZE)
-                    else:
-                        data = old_mmap.read(_READ_SIZE)
+                while remaining > 0:
+                    data = reader.read(min(_READ_SIZE, remaining))
                     if not data:
                         break
+                    remaining -= len(data)
                     db.write(data)
         finally:
             if old_mmap is not None:
@@ -1588,44 +1678,57 @@ def dump_entropy_metadata(entropy_package_file, entropy_metadata_file):
     return True
 
 def _locate_edb(fileobj):
+    """
+    Locate the Entropy metadata embedded in the given Entropy package file
+    object (or mmap object).
+
+    Packages generated by aggregate_entropy_metadata() carry a fixed-size
+    footer recording the metadata offset. Older ones are scanned backwards,
+    block by block, looking for the metadata start tag.
 
-    # position old to the end
+    @param fileobj: Entropy package file object
+    @type fileobj: file object or mmap.mmap
+    @return: tuple composed by metadata start and end offsets, or None
+    @rtype: tuple or None
+    """
     fileobj.seek(0, os.SEEK_END)
-    # read backward until we find
-    xbytes = fileobj.tell()
-    counter = xbytes - 1
-
-    db_tag = etpConst['databasestarttag']
-    # for Python 3.x
-    raw_db_tag = const_convert_to_rawstring(db_tag)
-    db_tag_len = len(db_tag)
+    file_size = fileobj.tell()
+
+    raw_db_tag = const_convert_to_rawstring(etpConst['databasestarttag'])
+    db_tag_len = len(raw_db_tag)
+
+    raw_end_tag = const_convert_to_rawstring(etpConst['databaseendtag'])
+    footer_len = _EDB_FOOTER_SIZE + len(raw_end_tag)
+    if file_size >= footer_len + db_tag_len:
+        fileobj.seek(file_size - footer_len)
+        footer = fileobj.read(footer_len)
+        if footer.endswith(raw_end_tag):
+            start_position = struct.unpack(
+                _EDB_FOOTER_FORMAT, footer[:_EDB_FOOTER_SIZE])[0]
+            end_position = file_size - footer_len
+            if db_tag_len <= start_position <= end_position:
+                fileobj.seek(start_position - db_tag_len)
+                if fileobj.read(db_tag_len) == raw_db_tag:
+                    return start_position, end_position
+
     # NOTE: it was 30Mb, but app-doc/php-docs db size was 31MB
     # xonotic-data wants more, raise to 500Mb and forget
     give_up_threshold = 1024000 * 500 # 500Mb
-    # cannot index a bytes object in Python3, it returns int !
-    entry_point = const_convert_to_rawstring(db_tag[::-1][0])
-    max_read_len = 8
-    start_position = None
-
-    while counter >= 0:
-        cur_threshold = abs((counter-xbytes))
-        if cur_threshold >= give_up_threshold:
-            start_position = None
-            break
-        fileobj.seek(counter-xbytes, os.SEEK_END)
-        read_bytes = fileobj.read(max_read_len)
-        read_len = len(read_bytes)
-        entry_idx = read_bytes.rfind(entry_point)
-        if entry_idx != -1:
-            rollback = (read_len - entry_idx) * -1
-            fileobj.seek(rollback, os.SEEK_CUR)
-            chunk = fileobj.read(db_tag_len)
-            if chunk == raw_db_tag:
-                start_position = fileobj.tell()
-                break
-        counter -= read_len
+    lower_bound = max(0, file_size - give_up_threshold)
+
+    # blocks overlap by db_tag_len - 1 bytes, so that tags crossing
+    # block boundaries are found as well
+    end = file_size
+    while end > lower_bound:
+        start = max(lower_bound, end - _READ_SIZE)
+        fileobj.seek(start)
+        block = fileobj.read(end - start + db_tag_len - 1)
+        tag_idx = block.rfind(raw_db_tag)
+        if tag_idx != -1:
+            return start + tag_idx + db_tag_len, file_size
+        end = start
 
-    return start_position
+    return None
 
 def remove_entropy_metadata(entropy_package_file, save_path):
     """
@@ -1642,10 +1745,10 @@ def remove_entropy_metadata(entropy_package_file, save_path):
     """
     with open(entropy_package_file, "rb") as old:
 
-        start_position = _locate_edb(old)
-        if not start_position:
-            old.close()
+        edb_range = _locate_edb(old)
+        if edb_range is None:
             return False
+        start_position, _end_position = edb_range
 
         with open(save_path, "wb") as new:
             old.seek(0)
@@ -1746,6 +1849,134 @@ def create_sha1_file(filepath):
         f.write("\n")
     return hashfile
 
+_BLOCK_MANIFEST_HEADER = "entropy-block-manifest 1"
+# content-defined blocks end at the first line whose CRC32 matches the
+# mask once _BLOCK_MIN_SIZE bytes are reached (~1.6KiB blocks on
+# repository SQL dumps), or at _BLOCK_MAX_SIZE bytes
+_BLOCK_BOUNDARY_MASK = 0xf
+_BLOCK_MIN_SIZE = 512
+_BLOCK_MAX_SIZE = 65536
+_BLOCK_ENTRY = struct.Struct(">I8s")
+
+def content_defined_blocks(file_obj):
+    """
+    Split the content of a (line based) file into blocks whose
+    boundaries depend on the content itself, so that inserting or
+    removing lines only changes the surrounding blocks.
+
+    @param file_obj: file object, opened in binary mode
+    @type file_obj: file object
+    @return: generator of data blocks
+    @rtype: generator
+    """
+    lines = []
+    size = 0
+    for line in file_obj:
+        lines.append(line)
+        size += len(line)
+        if size >= _BLOCK_MAX_SIZE or (size >= _BLOCK_MIN_SIZE and \
+                not zlib.crc32(line) & _BLOCK_BOUNDARY_MASK):
+            yield const_convert_to_rawstring("").join(lines)
+            del lines[:]
+            size = 0
+    if lines:
+        yield const_convert_to_rawstring("").join(lines)
+
+def block_digest(data):
+    """
+    Return the digest of a data block as stored in block manifest files.
+
+    @param data: data block
+    @type data: bytes
+    @return: raw digest
+    @rtype: bytes
+    """
+    return hashlib.md5(data).digest()[:8]
+
+def create_block_manifest_file(filepath):
+    """
+    Create a block checksum manifest file off filepath, containing the
+    file length and SHA256 plus the length and digest of every block
+    (see content_defined_blocks()). It lets clients rebuild the file from
+    a local, outdated copy, fetching only the blocks that changed (see
+    entropy.fetchers.BlockSyncFetcher).
+
+    @param filepath: file path to read
+    @type filepath: string
+    @return: path to block manifest file
+    @rtype: string
+    """
+    entries = []
+    file_sha = hashlib.sha256()
+    length = 0
+    with open(filepath, "rb") as f_in:
+        for block in content_defined_blocks(f_in):
+            file_sha.update(block)
+            entries.append(_BLOCK_ENTRY.pack(len(block), block_digest(block)))
+            length += len(block)
+
+    header = "%s\nlength %d\nblocks %d\nsha256 %s\n\n" % (
+        _BLOCK_MANIFEST_HEADER, length, len(entries),
+        file_sha.hexdigest(),)
+    manifest_path = filepath + etpConst['blockmanifestfileext']
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "wb") as f_out:
+        f_out.write(const_convert_to_rawstring(header))
+        f_out.write(const_convert_to_rawstring("").join(entries))
+    os.rename(tmp_path, manifest_path)
+    return manifest_path
+
+def read_block_manifest_file(manifest_path):
+    """
+    Read a block checksum manifest file created by
+    create_block_manifest_file().
+
+    @param manifest_path: path to block manifest file
+    @type manifest_path: string
+    @return: dict containing "length", "sha256" and "blocks" (list of
+        (block length, block digest) tuples) keys
+    @rtype: dict
+    @raise ValueError: if manifest_path contains invalid data
+    """
+    with open(manifest_path, "rb") as f_in:
+        data = f_in.read()
+
+    sep = const_convert_to_rawstring("\n\n")
+    try:
+        header_len = data.index(sep)
+    except ValueError:
+        raise ValueError("invalid block manifest file")
+    lines = const_convert_to_unicode(data[:header_len]).split("\n")
+    if lines[0] != _BLOCK_MANIFEST_HEADER:
+        raise ValueError("unsupported block manifest file")
+
+    meta = {}
+    for line in lines[1:]:
+        key, _sep, value = line.partition(" ")
+        meta[key] = value
+    try:
+        length = int(meta["length"])
+        count = int(meta["blocks"])
+        sha256_hash = meta["sha256"]
+    except (KeyError, ValueError):
+        raise ValueError("invalid block manifest file")
+    if not re.match(r"^[a-f0-9]{64}$", sha256_hash):
+        raise ValueError("invalid block manifest file")
+
+    entries = data[header_len + len(sep):]
+    if count < 0 or len(entries) != count * _BLOCK_ENTRY.size:
+        raise ValueError("invalid block manifest file")
+    blocks = [_BLOCK_ENTRY.unpack_from(entries, x * _BLOCK_ENTRY.size) \
+                  for x in range(count)]
+    if sum(x[0] for x in blocks) != length:
+        raise ValueError("invalid block manifest file")
+
+    return {
+        'length': length,
+        'sha256': sha256_hash,
+        'blocks': blocks,
+    }
+
 def compare_md5(filepath, checksum):
     """
     Compare MD5 of filepath with the one given (checksum).
@@ -2008,8 +2239,10 @@ def is_valid_uri(url):
         # invalid IPv6 URL
         return False
 
-def _fix_uid_gid(tarinfo, epath):
+def _fix_uid_gid(tarinfo, epath, ids_cache = None):
     # workaround for buggy tar files
+    # ids_cache, if given, is a dict used to memoize (uname, gname)
+    # -> (uid, gid) lookups across the members of a tarball.
     uname = tarinfo.uname
     gname = tarinfo.gname
     ugdata_valid = False
@@ -2027,8 +2260,14 @@ def _fix_uid_gid(tarinfo, epath):
         if ugdata_valid: # NOTE: backward compat. remove after 2012
             # get uid/gid
             # if not found, returns -1 that won't change anything
-            uid, gid = get_uid_from_user(uname), \
-                get_gid_from_group(gname)
+            ids = None
+            if ids_cache is not None:
+                ids = ids_cache.get((uname, gname))
+            if ids is None:
+                ids = get_uid_from_user(uname), get_gid_from_group(gname)
+                if ids_cache is not None:
+                    ids_cache[(uname, gname)] = ids
+            uid, gid = ids
             if tarinfo.issym() and hasattr(os, "lchown"):
                 os.lchown(epath, uid, gid)
             else:
@@ -2085,30 +2324,246 @@ def apply_tarball_ownership(filepath, prefix_path):
             tar.close()
 
 
-def uncompress_tarball(filepath, extract_path = None, catch_empty = False):
+class _TarFile(tarfile.TarFile):
+    """
+    TarFile class used by uncompress_tarball(). Regular files are written
+    using larger buffers and big ones are preallocated, stale links are
+    replaced like Python 3 does.
     """
-    Unpack tarball file (supported compression algorithm is given by tarfile
-    module) respecting directory structure, mtime and permissions.
 
-    @param filepath: path to tarball file
-    @type filepath: string
-    @keyword extract_path: path where to extract tarball
-    @type extract_path: string
-    @keyword catch_empty: do not raise exceptions when trying to unpack empty
-        file
-    @type catch_empty: bool
-    @return: exit status
-    @rtype: int
+    def makefile(self, tarinfo, targetpath):
+        """
+        Overridden from tarfile.TarFile.
+        """
+        if tarinfo.issparse():
+            return tarfile.TarFile.makefile(self, tarinfo, targetpath)
+
+        source = self.fileobj
+        source.seek(tarinfo.offset_data)
+        size = tarinfo.size
+        with open(targetpath, "wb") as target:
+            if size >= _UNPACK_PREALLOCATE_SIZE and \
+                    hasattr(os, "posix_fallocate"):
+                try:
+                    os.posix_fallocate(target.fileno(), 0, size)
+                except OSError:
+                    # not supported by the filesystem
+                    pass
+            while size > 0:
+                data = source.read(min(size, _READ_SIZE))
+                if not data:
+                    raise tarfile.ReadError("unexpected end of data")
+                target.write(data)
+                size -= len(data)
+
+    def makelink(self, tarinfo, targetpath):
+        """
+        Overridden from tarfile.TarFile.
+        """
+        if os.path.islink(targetpath) or os.path.isfile(targetpath):
+            os.unlink(targetpath)
+        return tarfile.TarFile.makelink(self, tarinfo, targetpath)
+
+
+class _TarballDecompressor(object):
+    """
+    Read-only file object returning the uncompressed content of a bz2 or
+    gzip compressed tarball. Decompression happens in a separate thread,
+    ahead of the reader, through a bounded queue. Concatenated streams
+    are supported (as created by pbzip2 or pigz) while trailing data,
+    like Entropy package metadata, is ignored.
+    """
+
+    _MAGIC = {
+        "bz2": b"BZh",
+        "gz": b"\x1f\x8b",
+    }
+
+    def __init__(self, filepath, compression):
+        """
+        Object constructor.
+
+        @param filepath: path to tarball file
+        @type filepath: string
+        @param compression: tarball compression, either "bz2" or "gz"
+        @type compression: string
+        """
+        self._filepath = filepath
+        self._compression = compression
+        self._magic = self._MAGIC[compression]
+        self._queue = Queue(_UNPACK_QUEUE_SIZE)
+        self._chunk = b""
+        self._offset = 0
+        self._eof = False
+        self._stop = False
+        self._thread = threading.Thread(target = self._decompress)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _new_decompressor(self):
+        """
+        Return a new decompressor object for the next compressed stream.
+        """
+        if self._compression == "bz2":
+            return bz2.BZ2Decompressor()
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def _decompress(self):
+        """
+        Decompression thread body.
+        """
+        try:
+            self._decompress_streams()
+        except Exception as err:
+            self._queue.put(err)
+        else:
+            self._queue.put(None)
+
+    def _decompress_streams(self):
+        """
+        Decompress all the compressed streams in the tarball file,
+        queueing the uncompressed data.
+        """
+        decompressor = self._new_decompressor()
+        with open(self._filepath, "rb") as tar_f:
+            data = tar_f.read(_READ_SIZE)
+            while data and not self._stop:
+                try:
+                    chunk = decompressor.decompress(data)
+                    unused = decompressor.unused_data
+                except EOFError:
+                    # bz2 stream already terminated
+                    chunk, unused = b"", data
+                if chunk:
+                    self._queue.put(chunk)
+
+                if not unused:
+                    data = tar_f.read(_READ_SIZE)
+                    continue
+
+                # end of stream, is another one following?
+                if len(unused) < len(self._magic):
+                    unused += tar_f.read(_READ_SIZE)
+                if not unused.startswith(self._magic):
+                    return
+                decompressor = self._new_decompressor()
+                data = unused
+
+        if not self._stop and not self._stream_ended(decompressor):
+            raise EOFError(
+                "compressed file ended before the end-of-stream marker")
+
+    @staticmethod
+    def _stream_ended(decompressor):
+        """
+        Return whether the given decompressor reached the end of its
+        compressed stream.
+        """
+        eof = getattr(decompressor, "eof", None)
+        if eof is not None:
+            return eof
+
+        # Python 2.x decompressors do not expose the eof attribute, feed
+        # them a dummy byte: terminated streams either refuse it (bz2)
+        # or store it as unused data (zlib).
+        try:
+            decompressor.decompress(b"\0")
+        except EOFError:
+            return True
+        except (IOError, zlib.error):
+            return False
+        return bool(decompressor.unused_data)
+
+    def read(self, size = -1):
+        """
+        Read at most size bytes of uncompressed data.
+        """
+        pieces = []
+        missing = size
+        while size < 0 or missing > 0:
+            if self._offset >= len(self._chunk):
+                if self._eof:
+                    break
+                item = self._queue.get()
+                if item is None:
+                    self._eof = True
+                    continue
+                if isinstance(item, Exception):
+                    self._eof = True
+                    raise item
+                self._chunk, self._offset = item, 0
+                continue
+
+            if size < 0:
+                piece = self._chunk[self._offset:]
+            else:
+                piece = self._chunk[self._offset:self._offset + missing]
+            self._offset += len(piece)
+            missing -= len(piece)
+            pieces.append(piece)
+
+        return b"".join(pieces)
+
+    def close(self):
+        """
+        Stop the decompression thread.
+        """
+        self._stop = True
+        while self._thread.is_alive():
+            # unblock the decompression thread
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._thread.join(0.1)
+        self._chunk = b""
+
+
+def _find_executable(name):
     """
-    if extract_path is None:
-        extract_path = os.path.dirname(filepath)
-    if not os.path.isfile(filepath):
-        raise FileNotFound('FileNotFound: archive does not exist')
+    Return the path to the given executable, looking into PATH, or None
+    if not found.
+    """
+    for path in collect_paths():
+        if not path:
+            continue
+        exec_path = os.path.join(path, name)
+        if os.path.isfile(exec_path) and os.access(exec_path, os.X_OK):
+            return exec_path
+    return None
+
+
+def _tarball_compression(filepath):
+    """
+    Return the compression and the list of available external decompressors
+    (executable path, successful exit statuses) of the given tarball, or
+    (None, []) if not supported by the decompression pipeline.
+    """
+    with open(filepath, "rb") as tar_f:
+        magic = tar_f.read(3)
+
+    for tar_magic, compression, decompressors in _TARBALL_COMPRESSIONS:
+        if magic.startswith(tar_magic):
+            available = []
+            for name, exit_statuses in decompressors:
+                exec_path = _find_executable(name)
+                if exec_path is not None:
+                    available.append((exec_path, exit_statuses))
+            return compression, available
+    return None, []
+
+
+def _unpack_tarball(tar, encoded_path):
+    """
+    Extract the members of the given TarFile object into encoded_path,
+    applying their metadata, and return whether anything was extracted.
+    Regular files metadata is applied in batches, directories and other
+    entries metadata is applied at the end.
+    """
+    ids_cache = {}
 
     def _setup_file_metadata(tarinfo, epath):
         try:
             tar.chown(tarinfo, epath)
-            _fix_uid_gid(tarinfo, epath)
+            _fix_uid_gid(tarinfo, epath, ids_cache = ids_cache)
 
             # no longer touch utime using Tarinfo, behaviour seems
             # buggy and introduces an unwanted delay on some conditions.
@@ -2129,75 +2584,174 @@ def uncompress_tarball(filepath, extract_path = None, catch_empty = False):
             if tar.errorlevel > 1:
                 raise
 
+    def _flush_files_metadata():
+        for tarinfo, epath in files:
+            _setup_file_metadata(tarinfo, epath)
+        del files[:]
+
     is_python_3 = const_is_python3()
-    tar = None
     extracted_something = False
-    try:
+    entries = []
+    files = []
 
-        try:
-            tar = tarfile.open(filepath, "r")
-        except tarfile.ReadError:
-            if catch_empty:
-                return 0
-            raise
-        except EOFError:
-            return -1
+    deleter_counter = 3
+    for tarinfo in tar:
+        epath = os.path.join(encoded_path, tarinfo.name)
+
+        if tarinfo.isdir():
+            # Extract directory with a safe mode, so that
+            # all files below can be extracted as well.
+            try:
+                os.makedirs(epath, 0o777)
+            except EnvironmentError:
+                pass
+
+        if is_python_3:
+            tar.extract(tarinfo, encoded_path,
+                set_attrs=not tarinfo.isdir())
+        else:
+            tar.extract(tarinfo, encoded_path)
+
+        if tarinfo.isreg():
+            # apply metadata to files in small batches
+            # not wasting RAM growing entries.
+            files.append((tarinfo, epath))
+            if len(files) >= _UNPACK_METADATA_BATCH:
+                _flush_files_metadata()
+        else:
+            # delay file metadata setup for dirs
+            # or syms that might be dirs or other
+            # things. This because entries can grow
+            # big and use a lot of RAM.
+            entries.append((tarinfo, epath))
+
+        extracted_something = True
 
-        encoded_path = extract_path
         if not is_python_3:
-            encoded_path = encoded_path.encode('utf-8')
-        entries = []
+            # this does work only with Python 2.x
+            # doing that in Python 3.x will result in
+            # partial extraction
+            deleter_counter -= 1
+            if deleter_counter == 0:
+                del tar.members[:]
+                deleter_counter = 3
 
-        deleter_counter = 3
-        for tarinfo in tar:
-            epath = os.path.join(encoded_path, tarinfo.name)
+    if not is_python_3:
+        del tar.members[:]
 
-            if tarinfo.isdir():
-                # Extract directory with a safe mode, so that
-                # all files below can be extracted as well.
-                try:
-                    os.makedirs(epath, 0o777)
-                except EnvironmentError:
-                    pass
+    _flush_files_metadata()
 
-            if is_python_3:
-                tar.extract(tarinfo, encoded_path,
-                    set_attrs=not tarinfo.isdir())
-            else:
-                tar.extract(tarinfo, encoded_path)
+    entries.sort(key = lambda x: x[0].name)
+    entries.reverse()
+    # set correct owner, mtime and filemode on files
+    # we need to check both files and directories because
+    #  we have to fix uid and gid from broken archives
+    for tarinfo, epath in entries:
+        _setup_file_metadata(tarinfo, epath)
 
-            if tarinfo.isreg():
-                # apply metadata to files instantly
-                # not wasting RAM growing entries.
-                _setup_file_metadata(tarinfo, epath)
-            else:
-                # delay file metadata setup for dirs
-                # or syms that might be dirs or other
-                # things. This because entries can grow
-                # big and use a lot of RAM.
-                entries.append((tarinfo, epath))
-
-            extracted_something = True
-
-            if not is_python_3:
-                # this does work only with Python 2.x
-                # doing that in Python 3.x will result in
-                # partial extraction
-                deleter_counter -= 1
-                if deleter_counter == 0:
-                    del tar.members[:]
-                    deleter_counter = 3
+    return extracted_something
 
-        if not is_python_3:
+
+def _uncompress_tarball_external(filepath, encoded_path, exec_path,
+                                 exit_statuses):
+    """
+    Unpack the given tarball using an external (multithreaded)
+    decompressor. Return whether anything was extracted or None
+    if the decompressor failed.
+    """
+    with open(os.devnull, "wb") as null:
+        try:
+            proc = subprocess.Popen(
+                (exec_path, "-d", "-c", filepath),
+                stdout = subprocess.PIPE, stderr = null)
+        except OSError:
+            # cannot be executed, let the caller fall back
+            return None
+
+    tar = None
+    extracted_something = None
+    try:
+        try:
+            tar = _TarFile.open(fileobj = proc.stdout, mode = "r|")
+            extracted_something = _unpack_tarball(tar, encoded_path)
+        except (tarfile.ReadError, EOFError):
+            # truncated or invalid stream, let the caller
+            # retry without the external decompressor.
+            extracted_something = None
+
+        # reap the rest of the uncompressed data
+        while proc.stdout.read(_READ_SIZE):
+            pass
+        proc.wait()
+        if proc.returncode not in exit_statuses:
+            extracted_something = None
+
+    finally:
+        if tar is not None:
+            tar.close()
             del tar.members[:]
+        if proc.returncode is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
 
-        entries.sort(key = lambda x: x[0].name)
-        entries.reverse()
-        # set correct owner, mtime and filemode on files
-        # we need to check both files and directories because
-        #  we have to fix uid and gid from broken archives
-        for tarinfo, epath in entries:
-            _setup_file_metadata(tarinfo, epath)
+    return extracted_something
+
+
+def uncompress_tarball(filepath, extract_path = None, catch_empty = False):
+    """
+    Unpack tarball file (supported compression algorithm is given by tarfile
+    module) respecting directory structure, mtime and permissions.
+    bz2 and gzip compressed tarballs are decompressed in parallel with
+    the extraction, through multithreaded lbzip2, pbzip2 or pigz if
+    available, falling back to a decompression thread otherwise.
+
+    @param filepath: path to tarball file
+    @type filepath: string
+    @keyword extract_path: path where to extract tarball
+    @type extract_path: string
+    @keyword catch_empty: do not raise exceptions when trying to unpack empty
+        file
+    @type catch_empty: bool
+    @return: exit status
+    @rtype: int
+    """
+    if extract_path is None:
+        extract_path = os.path.dirname(filepath)
+    if not os.path.isfile(filepath):
+        raise FileNotFound('FileNotFound: archive does not exist')
+
+    encoded_path = extract_path
+    if not const_is_python3():
+        encoded_path = encoded_path.encode('utf-8')
+
+    compression, decompressors = _tarball_compression(filepath)
+    extracted_something = None
+    for exec_path, exit_statuses in decompressors:
+        extracted_something = _uncompress_tarball_external(
+            filepath, encoded_path, exec_path, exit_statuses)
+        if extracted_something is not None:
+            break
+
+    tar = None
+    stream = None
+    try:
+
+        if extracted_something is None:
+            try:
+                if compression is not None:
+                    stream = _TarballDecompressor(filepath, compression)
+                    tar = _TarFile.open(fileobj = stream, mode = "r|")
+                else:
+                    tar = _TarFile.open(filepath, "r")
+            except tarfile.ReadError:
+                if catch_empty:
+                    return 0
+                raise
+            except EOFError:
+                return -1
+
+            extracted_something = _unpack_tarball(tar, encoded_path)
 
     except EOFError:
         return -1
@@ -2205,6 +2759,8 @@ def uncompress_tarball(filepath, extract_path = None, catch_empty = False):
         if tar is not None:
             tar.close()
             del tar.members[:]
+        if stream is not None:
+            stream.close()
 
     if extracted_something:
         return 0
@@ -15,6 +15,11 @@ import errno
 import time
 import shutil
 import codecs
+try:
+    from shlex import quote as shell_quote
+except ImportError:
+    # python 2.x
+    from pipes import quote as shell_quote
 
 from entropy.const import const_isnumber, const_debug_write, \
     const_mkdtemp, const_mkstemp, etpConst
@@ -35,6 +40,12 @@ class EntropySshUriHandler(EntropyUriHandler):
     _DEFAULT_PORT = 22
     _TXC_CMD = "/usr/bin/scp"
     _SSH_CMD = "/usr/bin/ssh"
+    # idle time, in seconds, after which the shared master connection
+    # goes away if close() is never called
+    _MASTER_PERSIST = 600
+    # maximum amount of paths handled by a single remote command
+    _BATCH_SIZE = 256
+    _BATCH_MARKER = "@@entropy-batch@@"
 
     @staticmethod
     def approve_uri(uri):
@@ -62,6 +73,10 @@ class EntropySshUriHandler(EntropyUriHandler):
         self.__host = EntropySshUriHandler.get_uri_name(self._uri)
         self.__user, self.__port, self.__dir = self.__extract_scp_data(
             self._uri)
+        # all the ssh and scp commands share a single master connection,
+        # started on first use
+        self.__control_dir = None
+        self.__control_path = None
 
     def __enter__(self):
         pass
@@ -184,12 +199,55 @@ class EntropySshUriHandler(EntropyUriHandler):
 
         return exec_rc, output, error
 
-    def _setup_common_args(self, remote_path):
+    def _setup_timeout_args(self):
         args = []
         if const_isnumber(self._timeout):
             args += ["-o", "ConnectTimeout=%s" % (self._timeout,),
                 "-o", "ServerAliveCountMax=4", # hardcoded
                 "-o", "ServerAliveInterval=15"] # hardcoded
+        return args
+
+    def _start_master(self):
+        """
+        Start the master connection shared by all the ssh and scp commands,
+        return the path to its control socket or an empty string if it
+        cannot be started.
+        """
+        control_dir = const_mkdtemp(prefix="ssh_plugin.master")
+        control_path = os.path.join(control_dir, "master")
+
+        args, remote_str = self._setup_fs_args(multiplex = False)
+        args += self._setup_timeout_args()
+        args += ["-M", "-N", "-f", "-o", "ControlPath=%s" % (control_path,),
+            "-o", "ControlPersist=%d" % (
+                EntropySshUriHandler._MASTER_PERSIST,),
+            remote_str]
+        exec_rc, output, error = self._exec_cmd(args)
+        const_debug_write(__name__,
+            "_start_master(), rc: %s, err: %s" % (exec_rc, error,))
+        if exec_rc != os.EX_OK or not os.path.exists(control_path):
+            shutil.rmtree(control_dir, True)
+            return ""
+
+        self.__control_dir = control_dir
+        return control_path
+
+    def _setup_multiplex_args(self):
+        """
+        Return the ssh (and scp) arguments making a command use the shared
+        master connection. If the master connection cannot be started,
+        commands open their own connection.
+        """
+        if self.__control_path is None:
+            self.__control_path = self._start_master()
+        if not self.__control_path:
+            return []
+        return ["-o", "ControlMaster=no",
+            "-o", "ControlPath=%s" % (self.__control_path,)]
+
+    def _setup_common_args(self, remote_path):
+        args = self._setup_timeout_args()
+        args += self._setup_multiplex_args()
         if self._speed_limit:
             args += ["-l", str(self._speed_limit*8)] # scp wants kbits/sec
         remote_ptr = os.path.join(self.__dir, remote_path)
@@ -305,62 +363,117 @@ class EntropySshUriHandler(EntropyUriHandler):
 
     def upload_many(self, load_path_list, remote_dir):
 
-        def do_rm(path):
+        def do_rmdir(path):
             try:
-                os.remove(path)
-            except OSError:
+                shutil.rmtree(path, True)
+            except (shutil.Error, OSError, IOError,):
                 pass
 
-        # first of all, copy files renaming them
+        # first of all, symlink files to their temporary names,
+        # scp follows symlinks
+        tmp_dir = const_mkdtemp(prefix="ssh_plugin.upload_many")
         tmp_file_map = {}
         try:
             for load_path in load_path_list:
-                tmp_fd, tmp_path = const_mkstemp(
-                    suffix = EntropyUriHandler.TMP_TXC_FILE_EXT,
-                    prefix = "._%s" % (os.path.basename(load_path),))
-                os.close(tmp_fd)
-                shutil.copy2(load_path, tmp_path)
-                tmp_file_map[tmp_path] = load_path
-
-            args = [EntropySshUriHandler._TXC_CMD]
-            c_args, remote_str = self._setup_common_args(remote_dir)
-
-            args += c_args
-            args += ["-B", "-P", str(self.__port)]
-            args += sorted(tmp_file_map.keys())
-            args += [remote_str]
-
-            upload_sts = self._fork_cmd(args) == os.EX_OK
-            if not upload_sts:
-                return False
-
-            # atomic rename
-            rename_fine = True
-            for tmp_path, orig_path in tmp_file_map.items():
-                tmp_file = os.path.basename(tmp_path)
-                orig_file = os.path.basename(orig_path)
-                tmp_remote_path = os.path.join(remote_dir, tmp_file)
-                remote_path = os.path.join(remote_dir, orig_file)
-                self.output(
-                    "<-> %s %s %s" % (
-                        brown(tmp_file),
-                        teal("=>"),
-                        darkgreen(orig_file),
-                    ),
-                    header = "    ",
-                    back = True
-                )
-                rc = self.rename(tmp_remote_path, remote_path)
-                if not rc:
-                    rename_fine = False
+                orig_file = os.path.basename(load_path)
+                tmp_file = orig_file + EntropyUriHandler.TMP_TXC_FILE_EXT
+                if tmp_file in tmp_file_map:
+                    continue
+                os.symlink(os.path.abspath(load_path),
+                           os.path.join(tmp_dir, tmp_file))
+                tmp_file_map[tmp_file] = orig_file
+
+            tmp_paths = sorted(
+                os.path.join(tmp_dir, x) for x in tmp_file_map)
+            batch_size = EntropySshUriHandler._BATCH_SIZE
+            for index in range(0, len(tmp_paths), batch_size):
+                args = [EntropySshUriHandler._TXC_CMD]
+                c_args, remote_str = self._setup_common_args(remote_dir)
+
+                args += c_args
+                args += ["-B", "-P", str(self.__port)]
+                args += tmp_paths[index:index + batch_size]
+                args += [remote_str]
+
+                upload_sts = self._fork_cmd(args) == os.EX_OK
+                if not upload_sts:
+                    return False
         finally:
-            for path in tmp_file_map.keys():
-                do_rm(path)
+            do_rmdir(tmp_dir)
+
+        # atomic rename, all at once
+        commands = []
+        for tmp_file, orig_file in sorted(tmp_file_map.items()):
+            commands.append((orig_file, "mv %s %s && echo OK" % (
+                self._quote_remote_path(os.path.join(remote_dir, tmp_file)),
+                self._quote_remote_path(
+                    os.path.join(remote_dir, orig_file)),)))
+        outcome = self._exec_batch(commands)
+
+        rename_fine = True
+        for tmp_file, orig_file in sorted(tmp_file_map.items()):
+            self.output(
+                "<-> %s %s %s" % (
+                    brown(tmp_file),
+                    teal("=>"),
+                    darkgreen(orig_file),
+                ),
+                header = "    ",
+                back = True
+            )
+            if outcome.get(orig_file) != ["OK"]:
+                rename_fine = False
 
         return rename_fine
 
-    def _setup_fs_args(self):
+    def _quote_remote_path(self, remote_path):
+        """
+        Return the remote path, shell quoted, for use in remote commands.
+        The home directory shortcut is preserved.
+        """
+        remote_ptr = os.path.join(self.__dir, remote_path)
+        if remote_ptr.startswith("~/"):
+            return "~/" + shell_quote(remote_ptr[2:])
+        return shell_quote(remote_ptr)
+
+    def _exec_batch(self, commands):
+        """
+        Execute many remote shell commands, given as (key, command) pairs,
+        through as few ssh invocations as possible. Return a dict mapping
+        keys to the list of output lines of their command; keys whose
+        command could not be executed are missing.
+        """
+        marker = EntropySshUriHandler._BATCH_MARKER
+        batch_size = EntropySshUriHandler._BATCH_SIZE
+        outcome = {}
+        for index in range(0, len(commands), batch_size):
+            batch = commands[index:index + batch_size]
+            script = "; ".join(
+                "echo %s%d; %s" % (marker, count, command)
+                for count, (key, command) in enumerate(batch))
+
+            args, remote_str = self._setup_fs_args()
+            args += [remote_str, script]
+            exec_rc, output, error = self._exec_cmd(args)
+            if exec_rc == 255:
+                # ssh error, output may be truncated
+                const_debug_write(__name__,
+                    "_exec_batch(), ssh error: %s" % (error,))
+                continue
+
+            lines = None
+            for line in output.split("\n"):
+                if line.startswith(marker):
+                    key = batch[int(line[len(marker):])][0]
+                    lines = outcome.setdefault(key, [])
+                elif line and lines is not None:
+                    lines.append(line)
+        return outcome
+
+    def _setup_fs_args(self, multiplex = True):
         args = [EntropySshUriHandler._SSH_CMD, "-p", str(self.__port)]
+        if multiplex:
+            args += self._setup_multiplex_args()
         remote_str = ""
         if self.__user:
             remote_str += self.__user + "@"
@@ -414,6 +527,18 @@ class EntropySshUriHandler(EntropyUriHandler):
             return None
         return output.strip().split()[0]
 
+    def get_md5_many(self, remote_paths):
+        outcome = self._exec_batch([
+            (x, "md5sum %s" % (self._quote_remote_path(x),))
+            for x in remote_paths])
+        data = {}
+        for remote_path in remote_paths:
+            lines = outcome.get(remote_path)
+            data[remote_path] = None
+            if lines:
+                data[remote_path] = lines[0].strip().split()[0]
+        return data
+
     def list_content(self, remote_path):
         args, remote_str = self._setup_fs_args()
         remote_ptr = os.path.join(self.__dir, remote_path)
@@ -430,9 +555,11 @@ class EntropySshUriHandler(EntropyUriHandler):
         exec_rc, output, error = self._exec_cmd(args)
         if exec_rc:
             return []
+        return self._parse_list_content_metadata(output.split("\n"))
 
+    def _parse_list_content_metadata(self, lines):
         data = []
-        for item in output.split("\n"):
+        for item in lines:
             item = item.strip().split()
             if len(item) < 5:
                 continue
@@ -441,6 +568,14 @@ class EntropySshUriHandler(EntropyUriHandler):
             data.append((name, size, owner, group, perms,))
         return data
 
+    def list_content_metadata_many(self, remote_paths):
+        outcome = self._exec_batch([
+            (x, "ls -1lA %s" % (self._quote_remote_path(x),))
+            for x in remote_paths])
+        return dict(
+            (x, self._parse_list_content_metadata(outcome.get(x, [])))
+            for x in remote_paths)
+
     def is_dir(self, remote_path):
         args, remote_str = self._setup_fs_args()
         remote_ptr = os.path.join(self.__dir, remote_path)
@@ -473,4 +608,13 @@ class EntropySshUriHandler(EntropyUriHandler):
         return
 
     def close(self):
-        return
+        control_path = self.__control_path
+        self.__control_path = None
+        if control_path:
+            args, remote_str = self._setup_fs_args(multiplex = False)
+            args += ["-o", "ControlPath=%s" % (control_path,),
+                "-O", "exit", remote_str]
+            self._exec_cmd(args)
+        if self.__control_dir is not None:
+            shutil.rmtree(self.__control_dir, True)
+            self.__control_dir = None
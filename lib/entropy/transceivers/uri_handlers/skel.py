@@ -301,6 +301,19 @@ class EntropyUriHandler(TextInterface):
         """
         raise NotImplementedError()
 
+    def get_md5_many(self, remote_paths):
+        """
+        Return MD5 checksums of many files at once. URI handlers able to
+        do it in a single remote round trip should override this method.
+
+        @param remote_paths: list of remote paths to handle
+        @type remote_paths: list
+        @return: dict mapping each remote path to its MD5 checksum in
+            hexdigest form, or None (if not supported or not available)
+        @rtype: dict
+        """
+        return dict((x, self.get_md5(x)) for x in remote_paths)
+
     def list_content(self, remote_path):
         """
         List content of directory referenced at URI.
@@ -327,6 +340,20 @@ class EntropyUriHandler(TextInterface):
         """
         raise NotImplementedError()
 
+    def list_content_metadata_many(self, remote_paths):
+        """
+        List content of many directories at once, see
+        list_content_metadata(). URI handlers able to do it in a single
+        remote round trip should override this method.
+
+        @param remote_paths: list of remote paths to handle
+        @type remote_paths: list
+        @return: dict mapping each remote path to its content
+        @rtype: dict
+        @raise ValueError: if one of remote_paths does not exist
+        """
+        return dict((x, self.list_content_metadata(x)) for x in remote_paths)
+
     def is_path_available(self, remote_path):
         """
         Given a remote path (which can point to dir or file), determine whether
@@ -6,19 +6,30 @@ sys.path.insert(0, '.')
 sys.path.insert(0, '../')
 import unittest
 import os
+import json
 import shutil
 import signal
+import threading
 import time
 
 from entropy.client.interfaces import Client
 from entropy.client.interfaces.db import InstalledPackagesRepository
 from entropy.client.interfaces.package.actions._triggers import Trigger
-from entropy.cache import EntropyCacher
-from entropy.const import etpConst, const_mkdtemp
+from entropy.client.interfaces.package import _content as Content
+from entropy.client.interfaces.package.actions.install import \
+    _PackageInstallAction
+from entropy.client.interfaces.package.pipeline import \
+    PackageInstallPipeline
+from entropy.client.mirrors import MirrorScores
+from entropy.client.services.interfaces import ClientWebService
+from entropy.services.client import WebService
+from entropy.cache import EntropyCacher, EntropyCacheStore
+from entropy.const import etpConst, const_mkdtemp, const_mkstemp
 from entropy.output import set_mute
 from entropy.core.settings.base import SystemSettings
 from entropy.db import EntropyRepository
 from entropy.exceptions import RepositoryError, EntropyPackageException
+import entropy.dep
 import entropy.tools
 import tests._misc as _misc
 
@@ -142,6 +153,95 @@ class EntropyClientTest(unittest.TestCase):
         finally:
             shutil.rmtree(tmp_dir, True)
 
+    def test_cacher_sqlite_store(self):
+        cacher = self.Client._cacher
+        tmp_dir = const_mkdtemp()
+        cacher.start()
+        backend = EntropyCacher.STORE_BACKEND
+        try:
+            EntropyCacher.STORE_BACKEND = "sqlite"
+            cacher.push("foo/bar", (1, 2, 3,), cache_dir = tmp_dir)
+            cacher.push("foo/baz", set([1]), cache_dir = tmp_dir)
+            cacher.push("abc", "def", cache_dir = tmp_dir)
+            cacher.sync()
+            self.assertEqual(os.listdir(tmp_dir),
+                [EntropyCacheStore.FILE_NAME])
+            self.assertEqual(cacher.pop("foo/bar", cache_dir = tmp_dir),
+                (1, 2, 3,))
+            EntropyCacher.clear_cache_item("foo/", cache_dir = tmp_dir)
+            self.assertEqual(cacher.pop("foo/bar", cache_dir = tmp_dir), None)
+            self.assertEqual(cacher.pop("foo/baz", cache_dir = tmp_dir), None)
+            self.assertEqual(cacher.pop("abc", cache_dir = tmp_dir), "def")
+        finally:
+            EntropyCacher.STORE_BACKEND = backend
+            cacher.stop()
+            shutil.rmtree(tmp_dir, True)
+
+    def test_mirror_scores(self):
+        scores = MirrorScores()
+        scores.clear()
+        try:
+            self.assertEqual(scores.score("http://a.example.org/pkgs"), None)
+            scores.record("http://a.example.org/pkgs/foo.tbz2",
+                transfer_rate = 1000.0, time_to_first_byte = 0.5)
+            scores.record("http://b.example.org/pkgs",
+                transfer_rate = 4000.0, time_to_first_byte = 0.1)
+            scores.record("http://c.example.org/pkgs", error = True)
+            # records are per host
+            self.assertEqual(scores.score("http://a.example.org/other"),
+                scores.score("http://a.example.org/pkgs"))
+            self.assertEqual(scores.score("http://c.example.org/pkgs"), 0.0)
+            self.assertEqual(
+                scores.sort(["http://c.example.org/pkgs",
+                             "http://a.example.org/pkgs",
+                             "http://b.example.org/pkgs"]),
+                ["http://b.example.org/pkgs",
+                 "http://a.example.org/pkgs",
+                 "http://c.example.org/pkgs"])
+
+            # errors make the score decay
+            old_score = scores.score("http://b.example.org/pkgs")
+            scores.record("http://b.example.org/pkgs", error = True)
+            self.assertTrue(
+                scores.score("http://b.example.org/pkgs") < old_score)
+        finally:
+            scores.clear()
+
+    def test_content_file(self):
+        # sorted in reverse order, like the files generated from
+        # retrieveContentIter(order_by = "file", reverse = True)
+        content = [("/usr/share/\u00e8|x", "sym"), ("/usr/bin/foo", "obj"),
+            ("/usr/bin", "dir"), ("/usr", "dir")]
+        tmp_fd, tmp_path = const_mkstemp(prefix="test_content_file")
+        os.close(tmp_fd)
+        try:
+            with Content.FileContentWriter(tmp_path) as tmp_w:
+                for path, ftype in content:
+                    tmp_w.write(3, path, ftype)
+            reader = Content.FileContentReader(tmp_path)
+            self.assertEqual(list(reader), [(3, x, y) for x, y in content])
+            # readers can be iterated more than once
+            self.assertEqual(len(list(reader)), len(content))
+
+            def _cmp_func(_path, _spath):
+                if _path > _spath:
+                    return -1
+                elif _path == _spath:
+                    return 0
+                return 1
+            Content.merge_content_file(tmp_path,
+                [("/usr/lib", "dir"), ("/usr/bin", "dir"), ("/etc", "dir")],
+                _cmp_func)
+            self.assertEqual(
+                [x for _pkg_id, x, _ftype in reader],
+                ["/usr/share/\u00e8|x", "/usr/lib", "/usr/bin/foo",
+                 "/usr/bin", "/usr", "/etc"])
+
+            Content.filter_content_file(tmp_path, lambda x: x != "/usr")
+            self.assertEqual(len(list(reader)), 5)
+        finally:
+            os.remove(tmp_path)
+
     def test_clear_cache(self):
         current_dir = self.Client._cacher.current_directory()
         test_file = os.path.join(current_dir, "asdasd")
@@ -193,6 +293,69 @@ class EntropyClientTest(unittest.TestCase):
             set_mute(False)
         self.assertRaises(RepositoryError, test_load)
 
+    def test_dependency_tree_prefetch(self):
+        dbconn = self.Client._init_generic_temp_repository(
+            self.mem_repoid, self.mem_repo_desc, temp_file = ":memory:")
+        rdepend_id = etpConst['dependency_type_ids']['rdepend_id']
+        pdepend_id = etpConst['dependency_type_ids']['pdepend_id']
+        keys = [entropy.dep.dep_getkey(x) for x in (
+                _misc.get_test_package_atom(),
+                _misc.get_test_package_atom2(),
+                _misc.get_test_package_atom3(),
+                _misc.get_test_package_atom4())]
+        deps = [
+            ((keys[1], rdepend_id), (keys[3], pdepend_id)),
+            ((keys[2], rdepend_id),),
+            (),
+            ((keys[0], rdepend_id), (keys[2], rdepend_id)),
+        ]
+        # packages files have been produced on amd64
+        keywords = etpConst['keywords'].copy()
+        etpConst['keywords'].add("amd64")
+        try:
+            package_ids = []
+            for test_pkg, pkg_deps in zip(
+                    (_misc.get_test_package(), _misc.get_test_package2(),
+                     _misc.get_test_package3(), _misc.get_test_package4()),
+                    deps):
+                data = self.Spm.extract_package_metadata(test_pkg)
+                data['pkg_dependencies'] = pkg_deps
+                data['conflicts'] = set()
+                package_ids.append(dbconn.addPackage(data))
+
+            matches = [(package_ids[0], self.mem_repoid),
+                       (package_ids[2], self.mem_repoid)]
+            calls = []
+            deps_list_map = dbconn.retrieveDependenciesListMap
+            def _deps_list_map(*args, **kwargs):
+                calls.append(args)
+                return deps_list_map(*args, **kwargs)
+            dbconn.retrieveDependenciesListMap = _deps_list_map
+
+            trees = []
+            batched_calls = []
+            set_mute(True)
+            try:
+                for disable in (None, "1"):
+                    self.Client.DISABLE_FRONTIER_PREFETCH = disable
+                    del calls[:]
+                    trees.append(self.Client._get_required_packages(
+                        matches[:], quiet = True))
+                    batched_calls.append(len(calls))
+            finally:
+                set_mute(False)
+                del self.Client.DISABLE_FRONTIER_PREFETCH
+
+            prefetch_tree, tree = trees
+            self.assertEqual(prefetch_tree, tree)
+            self.assertEqual(
+                sorted(x for k, v in tree.items() if k for x in v),
+                sorted((x, self.mem_repoid) for x in package_ids))
+            self.assertTrue(batched_calls[0] > 0)
+            self.assertEqual(batched_calls[1], 0)
+        finally:
+            etpConst['keywords'] = keywords
+
     def test_package_repository(self):
         test_pkg = _misc.get_test_entropy_package()
         # this might fail on 32bit arches
@@ -376,6 +539,379 @@ else:
         etpConst['entropyunpackdir'] = old_unpackdir
 
 
+class _FakePipelineAction(object):
+
+    def __init__(self, log, name, match, exit_st):
+        self._log = log
+        self._name = name
+        self._match = match
+        self._exit_st = exit_st
+
+    def start(self):
+        self._log.append((self._name, self._match))
+        return self._exit_st
+
+    def setup(self):
+        return
+
+    def package_path(self):
+        (package_id, _repository_id), = self._match
+        return os.path.join(
+            _FakePipelineClient.PACKAGES_DIR, "%d.tbz2" % (package_id,))
+
+    def prepare(self):
+        self._log.append(("prepare", self._match))
+        return self._exit_st
+
+    def finalize(self):
+        self._log.append(("finalize_" + self._name, self._match))
+
+
+class _FakePipelineFactory(object):
+
+    FETCH_ACTION = "fetch"
+    MULTI_FETCH_ACTION = "multi_fetch"
+    INSTALL_ACTION = "install"
+
+    def __init__(self, log, fetch_status):
+        self._log = log
+        self._fetch_status = fetch_status
+
+    def get(self, action, match, opts = None):
+        if action == self.INSTALL_ACTION:
+            self._log.append(("get_install", match))
+            return _FakePipelineAction(self._log, "merge", match, 0)
+        if action == self.MULTI_FETCH_ACTION:
+            matches = tuple(match)
+        else:
+            matches = (match,)
+        exit_st = 0
+        for pkg_match in matches:
+            exit_st = exit_st or self._fetch_status.get(pkg_match, 0)
+        return _FakePipelineAction(self._log, action, matches, exit_st)
+
+
+class _FakePipelineClient(object):
+
+    PACKAGES_DIR = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "packages")
+
+    def __init__(self, fetch_status = None, mirrors = None):
+        self.log = []
+        if fetch_status is None:
+            fetch_status = {}
+        if mirrors is None:
+            mirrors = ["file://" + self.PACKAGES_DIR]
+        self._factory = _FakePipelineFactory(self.log, fetch_status)
+        self._mirrors = mirrors
+
+    def PackageActionFactory(self):
+        return self._factory
+
+    def Settings(self):
+        return {
+            'repositories': {
+                'available': {
+                    'repo': {
+                        'packages': self._mirrors,
+                    },
+                },
+            },
+        }
+
+    def _is_package_repository(self, repository_id):
+        return False
+
+    def output(self, *args, **kwargs):
+        self.log.append(("output", args[0]))
+
+
+class PackageInstallPipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self._queue = [(x, "repo") for x in range(1, 6)]
+
+    def _consume(self, pipeline):
+        """
+        Merge the packages handed over by the pipeline, like equo install
+        does, returning the list of merged package matches and the
+        yielded exit statuses.
+        """
+        merged = []
+        statuses = []
+        active = [0]
+        pipeline.start()
+        try:
+            for pkg_match, pkg, exit_st in pipeline:
+                statuses.append((pkg_match, exit_st))
+                try:
+                    if exit_st == 0:
+                        active[0] += 1
+                        self.assertEqual(active[0], 1)
+                        # give the stages time to run ahead
+                        time.sleep(0.01)
+                        exit_st = pkg.start()
+                        merged.append(pkg_match)
+                        active[0] -= 1
+                finally:
+                    if pkg is not None:
+                        pkg.finalize()
+                if exit_st != 0:
+                    break
+        finally:
+            pipeline.stop()
+        return merged, statuses
+
+    def test_pipeline_merge_order(self):
+        client = _FakePipelineClient()
+        pipeline = PackageInstallPipeline(client, self._queue)
+        merged, statuses = self._consume(pipeline)
+
+        self.assertEqual(merged, self._queue)
+        self.assertEqual(statuses, [(x, 0) for x in self._queue])
+
+        log = client.log
+        merges = [x for x in log if x[0] == "merge"]
+        self.assertEqual(merges, [("merge", x) for x in self._queue])
+        for pkg_match in self._queue:
+            fetch_idx = log.index(("fetch", (pkg_match,)))
+            prepare_idx = log.index(("prepare", pkg_match))
+            merge_idx = log.index(("merge", pkg_match))
+            self.assertTrue(fetch_idx < prepare_idx < merge_idx)
+
+        # at most UNPACK_AHEAD packages are prepared ahead of the merge
+        for pos, pkg_match in enumerate(self._queue):
+            merge_idx = log.index(("merge", pkg_match))
+            prepared = [x for x in log[:merge_idx] if x[0] == "prepare"]
+            self.assertTrue(
+                len(prepared) <= pos + 1 + pipeline.UNPACK_AHEAD)
+
+    def test_pipeline_fetch_failure(self):
+        failing = self._queue[2]
+        client = _FakePipelineClient(fetch_status = {failing: 1})
+        pipeline = PackageInstallPipeline(client, self._queue)
+        merged, statuses = self._consume(pipeline)
+
+        self.assertEqual(merged, self._queue[:2])
+        self.assertEqual(statuses[-1], (failing, 1))
+        log = client.log
+        self.assertFalse(("prepare", failing) in log)
+        for pkg_match in self._queue[3:]:
+            self.assertFalse(("get_install", pkg_match) in log)
+            self.assertFalse(("fetch", (pkg_match,)) in log)
+        # every created action has been finalized
+        self.assertEqual(len([x for x in log if x[0] == "get_install"]),
+            len([x for x in log if x[0] == "finalize_merge"]))
+
+    def test_pipeline_multifetch_checksum_failure(self):
+        # checksum verification failures are reported by the fetch
+        # actions through their exit status, like download errors.
+        failing = self._queue[3]
+        client = _FakePipelineClient(fetch_status = {failing: 2})
+        pipeline = PackageInstallPipeline(client, self._queue, multifetch = 2)
+        merged, statuses = self._consume(pipeline)
+
+        # the whole multifetch chunk containing the failing package fails
+        self.assertEqual(merged, self._queue[:2])
+        self.assertEqual(statuses[-1], (self._queue[2], 2))
+        log = client.log
+        self.assertTrue(
+            ("multi_fetch", tuple(self._queue[2:4])) in log)
+        self.assertFalse(("multi_fetch", tuple(self._queue[4:])) in log)
+        self.assertFalse(("fetch", tuple(self._queue[4:])) in log)
+        for pkg_match in self._queue[2:]:
+            self.assertFalse(("merge", pkg_match) in log)
+
+    def test_pipeline_unreachable_repository(self):
+        tmp_dir = const_mkdtemp()
+        missing_dir = os.path.join(tmp_dir, "missing")
+        client = _FakePipelineClient(
+            mirrors = ["file://" + missing_dir, "file://" + missing_dir])
+        pipeline = PackageInstallPipeline(client, self._queue)
+        try:
+            merged, statuses = self._consume(pipeline)
+        finally:
+            shutil.rmtree(tmp_dir, True)
+
+        # nothing is downloaded nor merged
+        self.assertEqual(merged, [])
+        self.assertEqual(statuses, [(self._queue[0], 1)])
+        log = client.log
+        for pkg_match in self._queue:
+            self.assertFalse(("fetch", (pkg_match,)) in log)
+            self.assertFalse(("prepare", pkg_match) in log)
+        self.assertEqual(len([x for x in log if x[0] == "output"]), 1)
+
+    def test_pipeline_reachable_repository(self):
+        tmp_dir = const_mkdtemp()
+        missing_dir = os.path.join(tmp_dir, "missing")
+        # the second mirror is reachable
+        client = _FakePipelineClient(
+            mirrors = ["file://" + missing_dir, "file://" + tmp_dir])
+        pipeline = PackageInstallPipeline(client, self._queue)
+        try:
+            merged, statuses = self._consume(pipeline)
+        finally:
+            shutil.rmtree(tmp_dir, True)
+        self.assertEqual(merged, self._queue)
+
+        # packages already available locally need no mirror
+        tmp_dir = const_mkdtemp()
+        old_packages_dir = _FakePipelineClient.PACKAGES_DIR
+        _FakePipelineClient.PACKAGES_DIR = tmp_dir
+        try:
+            for package_id, _repository_id in self._queue:
+                with open(os.path.join(tmp_dir, "%d.tbz2" % (
+                            package_id,)), "w") as pkg_f:
+                    pkg_f.write("")
+            client = _FakePipelineClient(
+                mirrors = ["file://" + os.path.join(tmp_dir, "missing")])
+            pipeline = PackageInstallPipeline(client, self._queue)
+            merged, statuses = self._consume(pipeline)
+        finally:
+            _FakePipelineClient.PACKAGES_DIR = old_packages_dir
+            shutil.rmtree(tmp_dir, True)
+        self.assertEqual(merged, self._queue)
+
+    def test_install_action_without_pipeline(self):
+        log = []
+
+        class _Spm(object):
+            @staticmethod
+            def entropy_install_setup_hook(entropy_client, metadata):
+                log.append("setup_hook")
+                return 0
+
+        class _Client(_FakePipelineClient):
+            def Spm_class(self):
+                return _Spm
+
+        class _Action(_PackageInstallAction):
+            def setup(self):
+                if self._meta is not None:
+                    return
+                def _phase(name):
+                    def _func():
+                        log.append(name)
+                        return 0
+                    return _func
+                image_phase = _phase("unpack")
+                self._meta = {
+                    'phases': [_phase("remove_conflicts"), image_phase,
+                               _phase("setup_package")],
+                    'image_phase': image_phase,
+                    'prepared': False,
+                }
+
+        # not pipelined: start() runs the setup hook and the image phase
+        action = _Action(_Client(), (1, "repo"))
+        self.assertEqual(action.start(), 0)
+        self.assertEqual(log, ["setup_hook", "remove_conflicts", "unpack",
+                               "setup_package"])
+
+        # pipelined: prepare() runs them, start() skips them
+        del log[:]
+        action = _Action(_Client(), (1, "repo"))
+        self.assertEqual(action.prepare(), 0)
+        self.assertEqual(log, ["setup_hook", "unpack"])
+        self.assertEqual(action.prepare(), 0)
+        self.assertEqual(action.start(), 0)
+        self.assertEqual(log, ["setup_hook", "unpack", "remove_conflicts",
+                               "setup_package"])
+
+
+class _FakeResponse(object):
+
+    status = 200
+
+
+class _FakeClientWebService(ClientWebService):
+    """
+    ClientWebService answering get_votes requests locally, counting the
+    remote calls.
+    """
+
+    def __init__(self, votes):
+        self._cache_dir_lock = threading.RLock()
+        self._transfer_callback = None
+        self._entropy = None
+        self._repository_id = "test_repo"
+        self._cache_aging_days = None
+        self._request_url = "http://localhost/"
+        self._live_cache = {}
+        self._votes = votes
+        self.requests = []
+
+    @property
+    def _cacher(self):
+        return EntropyCacher()
+
+    def _generic_post_handler(self, function_name, params, file_params,
+                              timeout):
+        package_names = params["package_names"].split()
+        self.requests.append((function_name, package_names))
+        data = {
+            "api_rev": WebService.SUPPORTED_API_LEVEL,
+            "code": WebService.WEB_SERVICE_RESPONSE_CODE_OK,
+            "r": dict((x, self._votes[x]) for x in package_names \
+                          if x in self._votes),
+        }
+        return json.dumps(data), _FakeResponse()
+
+
+class ClientWebServiceCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self._cache_dir = WebService.CACHE_DIR
+        WebService.CACHE_DIR = const_mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(WebService.CACHE_DIR, True)
+        WebService.CACHE_DIR = self._cache_dir
+
+    def _cache_files(self):
+        cache_files = {}
+        for currentdir, subdirs, files in os.walk(WebService.CACHE_DIR):
+            for name in files:
+                path = os.path.join(currentdir, name)
+                cache_files[path] = os.stat(path).st_mtime
+        return cache_files
+
+    def test_multi_package_cache(self):
+        votes = {"app-misc/foo": 4.0, "app-misc/bar": 2.5}
+        package_names = ["app-misc/foo", "app-misc/bar", "app-misc/baz"]
+        webserv = _FakeClientWebService(votes)
+
+        outcome = webserv.get_votes(package_names)
+        self.assertEqual(outcome, votes)
+        self.assertEqual(webserv.requests, [("get_votes", package_names)])
+
+        # the per-package cached lookups are satisfied
+        webserv._live_cache.clear()
+        for package_name in package_names:
+            outcome = webserv.get_votes([package_name], cached = True)
+            expected = {}
+            if package_name in votes:
+                expected[package_name] = votes[package_name]
+            self.assertEqual(outcome, expected)
+        self.assertEqual(len(webserv.requests), 1)
+
+        # a multi-package call served by the cache is not split again
+        cache_files = self._cache_files()
+        for path in cache_files:
+            os.utime(path, (0, 0))
+        webserv._live_cache.clear()
+        self.assertEqual(webserv.get_votes(package_names), votes)
+        self.assertEqual(len(webserv.requests), 1)
+        self.assertEqual(set(self._cache_files().values()), set([0]))
+
+        # only the cache is used
+        webserv._live_cache.clear()
+        self.assertRaises(WebService.CacheMiss, webserv.get_votes,
+            ["app-misc/qux"], cached = True)
+        self.assertEqual(len(webserv.requests), 1)
+
+
 if __name__ == '__main__':
     unittest.main()
     raise SystemExit(0)
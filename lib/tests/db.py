@@ -14,6 +14,7 @@ from entropy.output import set_mute
 from entropy.core.settings.base import SystemSettings
 from entropy.misc import ParallelTask
 from entropy.db import EntropyRepository
+from entropy.db.cache import EntropyRepositoryCacher
 import tests._misc as _misc
 
 import entropy.dep
@@ -242,6 +243,68 @@ class EntropyRepositoryTest(unittest.TestCase):
             content,
             tuple(sorted(orig_content, key = lambda x: x[0])))
 
+    def test_content_compaction(self):
+        test_pkg = _misc.get_test_package3()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        idpackage = self.test_db.addPackage(data)
+        self.assertTrue(self.test_db._isContentCompacted())
+
+        content = self.test_db.retrieveContent(
+            idpackage, extended = True, order_by = "file")
+        for path, ftype in content:
+            self.assertEqual(self.test_db.searchBelongs(path),
+                frozenset([idpackage]))
+
+        # go back to the old layout and migrate it
+        self.test_db._cursor().executescript("""
+        CREATE TABLE content_old (
+            idpackage INTEGER, file VARCHAR, type VARCHAR);
+        INSERT INTO content_old SELECT * FROM content;
+        DROP VIEW content;
+        DROP TABLE contentfiles;
+        DROP TABLE contentdirs;
+        ALTER TABLE content_old RENAME TO content;
+        """)
+        self.test_db._clearLiveCache("_doesTableExist")
+        self.assertFalse(self.test_db._isContentCompacted())
+        self.assertEqual(content, self.test_db.retrieveContent(
+            idpackage, extended = True, order_by = "file"))
+
+        self.test_db._migrateContentDirs()
+        self.assertTrue(self.test_db._isContentCompacted())
+        self.assertEqual(content, self.test_db.retrieveContent(
+            idpackage, extended = True, order_by = "file"))
+
+        # the "content" view accepts the old SQL
+        self.test_db._cursor().execute("""
+        INSERT INTO content VALUES (?, ?, ?)""",
+            (idpackage, "/usr/bin/foo", "obj"))
+        self.assertEqual(self.test_db.isFileAvailable(
+            "/usr/bin/foo", get_id = True), frozenset([idpackage]))
+        self.test_db._cursor().execute("""
+        DELETE FROM content WHERE file = ?""", ("/usr/bin/foo",))
+        self.assertFalse(self.test_db.isFileAvailable("/usr/bin/foo"))
+
+        self.test_db.removePackage(idpackage)
+        self.test_db.clean()
+        self.assertEqual(self.test_db.listAllFiles(count = True), 0)
+        cur = self.test_db._cursor().execute(
+            "SELECT count(*) FROM contentdirs")
+        self.assertEqual(cur.fetchone()[0], 0)
+
+    def test_search_belongs_map(self):
+        test_pkg = _misc.get_test_package3()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        idpackage = self.test_db.addPackage(data)
+
+        paths = list(self.test_db.retrieveContent(idpackage))
+        paths += ["/usr/bin/not-available", "not-available"]
+        belongs_map = self.test_db.searchBelongsMap(paths)
+        self.assertEqual(belongs_map, dict((x, self.test_db.searchBelongs(x))
+            for x in paths if self.test_db.searchBelongs(x)))
+        self.assertEqual(len(belongs_map), len(paths) - 2)
+        self.assertEqual(self.test_db.searchBelongsMap([]), {})
+
     def test_db_creation(self):
         self.assertTrue(isinstance(self.test_db, EntropyRepository))
         self.assertEqual(self.test_db_name, self.test_db.repository_id())
@@ -749,9 +812,313 @@ class EntropyRepositoryTest(unittest.TestCase):
             key_slot = True)
         self.assertEqual(rev_deps_t, (('app-dicts/aspell-es', '0'),))
 
+        rev_deps_map = self.test_db.retrieveReverseDependenciesMap(
+            [idpackage, idpackage2])
+        self.assertEqual(rev_deps_map,
+            {idpackage: rev_deps, idpackage2: rev_deps2})
+
         pkg_data = self.test_db.retrieveUnusedPackageIds()
         self.assertEqual(pkg_data, tuple())
 
+    def test_db_dependencies_map(self):
+
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        test_pkg2 = _misc.get_test_package2()
+        data2 = self.Spm.extract_package_metadata(test_pkg2)
+        test_pkg3 = _misc.get_test_package3()
+        data3 = self.Spm.extract_package_metadata(test_pkg3)
+        pdepend_id = etpConst['dependency_type_ids']['pdepend_id']
+        bdepend_id = etpConst['dependency_type_ids']['bdepend_id']
+        data['pkg_dependencies'] += ((
+                _misc.get_test_package_atom2(), pdepend_id),)
+        data['conflicts'] |= set(["app-foo/conflicting"])
+        # no dependencies at all
+        data3['pkg_dependencies'] = ()
+        data3['conflicts'] = set()
+
+        idpackage = self.test_db.addPackage(data)
+        idpackage2 = self.test_db.addPackage(data2)
+        idpackage3 = self.test_db.addPackage(data3)
+        # the last one is unknown
+        package_ids = [idpackage, idpackage2, idpackage3, idpackage3 + 1]
+
+        def _check():
+            for excluded in (None, [pdepend_id], [pdepend_id, bdepend_id]):
+                deps_map = self.test_db.retrieveDependenciesListMap(
+                    package_ids, exclude_deptypes = excluded)
+                self.assertEqual(deps_map, dict((x,
+                    self.test_db.retrieveDependenciesList(
+                        x, exclude_deptypes = excluded,
+                        resolve_conditional_deps = False)) \
+                            for x in package_ids))
+
+            for kwargs in ({}, {"deptype": pdepend_id},
+                           {"exclude_deptypes": [pdepend_id]},
+                           {"resolve_conditional_deps": False}):
+                deps_map = self.test_db.retrieveDependenciesMap(
+                    package_ids, **kwargs)
+                self.assertEqual(deps_map, dict((x,
+                    self.test_db.retrieveDependencies(x, **kwargs)) \
+                        for x in package_ids))
+
+            deps_map = self.test_db.retrieveDependenciesListMap(package_ids)
+            self.assertEqual(deps_map[idpackage3], frozenset())
+            self.assertEqual(deps_map[idpackage3 + 1], frozenset())
+            self.assertTrue("!app-foo/conflicting" in deps_map[idpackage])
+            post_deps = self.test_db.retrieveDependenciesMap(
+                package_ids, deptype = pdepend_id)
+            self.assertEqual(post_deps[idpackage],
+                frozenset([_misc.get_test_package_atom2()]))
+            self.assertEqual(post_deps[idpackage3 + 1], frozenset())
+            self.assertEqual(self.test_db.retrieveDependenciesMap([]), {})
+
+        # memoized dependencies
+        self.assertFalse(self.test_db.directed())
+        _check()
+        # plain SQL queries
+        with self.test_db.direct():
+            _check()
+
+    def test_db_checksum_state(self):
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        test_pkg2 = _misc.get_test_package2()
+        data2 = self.Spm.extract_package_metadata(test_pkg2)
+
+        self.assertTrue(self.test_db._checksumChangesSupported())
+        idpackage = self.test_db.addPackage(data)
+        idpackage2 = self.test_db.addPackage(data2)
+        # same packages, different insertion order
+        self.test_db2.addPackage(data2, package_id = idpackage2)
+        self.test_db2.addPackage(data, package_id = idpackage)
+        checksum = self.test_db.checksum()
+        self.assertEqual(checksum, self.test_db2.checksum())
+
+        self.test_db.setSlot(idpackage, "foo")
+        self.assertNotEqual(checksum, self.test_db.checksum())
+        self.test_db.setSlot(idpackage, data['slot'])
+        self.assertEqual(checksum, self.test_db.checksum())
+
+        self.test_db.setCategory(idpackage, "foo-bar")
+        self.assertNotEqual(checksum, self.test_db.checksum())
+        self.test_db.setCategory(idpackage, data['category'])
+        self.assertEqual(checksum, self.test_db.checksum())
+
+        self.test_db.setDependency(1, "app-foo/bar")
+        self.test_db.removePackage(idpackage2)
+        scratch_state = self.test_db._computeChecksumState(False)[0]
+        self.assertEqual(self.test_db._getChecksumState(), scratch_state)
+
+        # the changes are folded into the stored state on commit
+        self.test_db.commit()
+        self.assertEqual(self.test_db._checksumGeneration(), None)
+        self.assertEqual(self.test_db._loadChecksumState(), scratch_state)
+        checksum = self.test_db.checksum()
+
+        # writes by code not aware of the checksum state, not changing
+        # the package identifiers, are detected as well
+        self.test_db._cursor().execute("""
+        UPDATE extrainfo SET digest = ? WHERE idpackage = ?
+        """, ("0" * 32, idpackage))
+        self.assertNotEqual(checksum, self.test_db.checksum())
+        self.test_db._cursor().execute("""
+        UPDATE extrainfo SET digest = ? WHERE idpackage = ?
+        """, (data['digest'], idpackage))
+        self.assertEqual(checksum, self.test_db.checksum())
+        self.test_db.commit()
+        self.assertEqual(self.test_db._loadChecksumState(), scratch_state)
+
+    def test_db_align_databases(self):
+        data = self.Spm.extract_package_metadata(_misc.get_test_package())
+        data2 = self.Spm.extract_package_metadata(_misc.get_test_package2())
+        data3 = self.Spm.extract_package_metadata(_misc.get_test_package3())
+
+        fd, old_db_path = const_mkstemp()
+        os.close(fd)
+        fd, new_db_path = const_mkstemp()
+        os.close(fd)
+        old_db = self.__open_test_db(old_db_path)
+        new_db = self.__open_test_db(new_db_path)
+        old_db.addPackage(data, package_id = 1)
+        old_db.addPackage(data2, package_id = 2)
+        new_db.addPackage(data2, package_id = 2)
+        new_db.addPackage(data3, package_id = 3)
+        new_db.commit()
+        self.assertTrue(old_db._canAlignAttached(new_db))
+        # in-memory repositories cannot be attached
+        self.assertFalse(old_db._canAlignAttached(self.test_db))
+
+        set_mute(True)
+        rc = old_db.alignDatabases(new_db)
+        set_mute(False)
+        self.assertEqual(rc, 1)
+        self.assertEqual(old_db.listAllPackageIds(), frozenset([2, 3]))
+        self.assertEqual(old_db.checksum(), new_db.checksum())
+        self.assertEqual(old_db._getChecksumState(),
+                         old_db._computeChecksumState(False)[0])
+
+        old_data = old_db.getPackageData(3)
+        new_data = new_db.getPackageData(3)
+        _misc.clean_pkg_metadata(old_data)
+        _misc.clean_pkg_metadata(new_data)
+        self.assertEqual(old_data, new_data)
+        self.assertEqual(
+            old_db.retrieveContent(3, extended = True, order_by = "file"),
+            new_db.retrieveContent(3, extended = True, order_by = "file"))
+        self.assertEqual(old_db.searchBelongs(
+            sorted(new_db.retrieveContent(3))[0]), frozenset([3]))
+        self.assertEqual(old_db.alignDatabases(new_db), -1)
+
+        old_db.close()
+        new_db.close()
+
+    def test_db_align_databases_generic(self):
+        data = self.Spm.extract_package_metadata(_misc.get_test_package())
+        data2 = self.Spm.extract_package_metadata(_misc.get_test_package2())
+        data3 = self.Spm.extract_package_metadata(_misc.get_test_package3())
+        mirrors = ["http://mirror%d.example.org/distfiles" % (x,) \
+                       for x in range(5)]
+        data3['sources'] = set(data3['sources']) | set(
+            ["mirror://gentoo/foo-1.0.tar.gz"])
+        data3['mirrorlinks'] = [["gentoo", mirrors]]
+        # stale mirrors, to be replaced by the aligned package ones
+        old_data = data.copy()
+        old_data['sources'] = set(data['sources']) | set(
+            ["mirror://gentoo/bar-1.0.tar.gz"])
+        old_data['mirrorlinks'] = [["gentoo", mirrors[:1]]]
+
+        repos = []
+        for _idx in range(3):
+            fd, db_path = const_mkstemp()
+            os.close(fd)
+            repos.append(self.__open_test_db(db_path))
+        new_db, attached_db, generic_db = repos
+        new_db.addPackage(data, package_id = 1)
+        new_db.addPackage(data2, package_id = 2)
+        new_db.addPackage(data3, package_id = 3)
+        new_db.commit()
+        for repo in (attached_db, generic_db):
+            repo.addPackage(data2, package_id = 2)
+            repo.addPackage(old_data, package_id = 4)
+        generic_db._canAlignAttached = lambda dbconn: False
+        self.assertTrue(attached_db._canAlignAttached(new_db))
+
+        set_mute(True)
+        try:
+            self.assertEqual(attached_db.alignDatabases(new_db), 1)
+            self.assertEqual(generic_db.alignDatabases(new_db), 1)
+        finally:
+            set_mute(False)
+
+        package_ids = new_db.listAllPackageIds()
+        self.assertEqual(attached_db.listAllPackageIds(), package_ids)
+        self.assertEqual(generic_db.listAllPackageIds(), package_ids)
+        for package_id in package_ids:
+            attached_data = attached_db.getPackageData(package_id)
+            generic_data = generic_db.getPackageData(package_id)
+            _misc.clean_pkg_metadata(attached_data)
+            _misc.clean_pkg_metadata(generic_data)
+            self.assertEqual(attached_data, generic_data)
+        self.assertEqual(attached_db.retrieveMirrorData("gentoo"),
+                         frozenset(mirrors))
+
+        for repo in repos:
+            repo.close()
+
+    def test_db_packages_data(self):
+        package_ids = []
+        for test_pkg in (_misc.get_test_package(), _misc.get_test_package2(),
+                         _misc.get_test_package3()):
+            data = self.Spm.extract_package_metadata(test_pkg)
+            package_ids.append(self.test_db.addPackage(data))
+        package_ids.reverse()
+        package_ids += [9999, package_ids[0]]
+
+        for kwargs in ({}, {"get_content": False},
+                       {"content_insert_formatted": True,
+                        "get_changelog": False}):
+            pkgs_data = list(self.test_db.getPackagesData(
+                package_ids, **kwargs))
+            self.assertEqual(pkgs_data, [
+                (x, self.test_db.getPackageData(x, **kwargs)) \
+                    for x in package_ids])
+            self.assertTrue(pkgs_data[0][1] is not pkgs_data[-1][1])
+        self.assertEqual(list(self.test_db.getPackagesData([])), [])
+
+    def test_db_atom_match_many(self):
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        test_pkg2 = _misc.get_test_package2()
+        data2 = self.Spm.extract_package_metadata(test_pkg2)
+        self.test_db.addPackage(data)
+        self.test_db.addPackage(data2)
+
+        atoms = [data['key'], data['atom'], ">=" + data['atom'],
+            data['key'] + ":" + data['slot'], data2['name'],
+            data2['key'], "app-foo/does-not-exist"]
+        for multi_match in (False, True):
+            for extended in (False, True):
+                expected = dict((atom, self.test_db.atomMatch(atom,
+                    multiMatch = multi_match, extendedResults = extended,
+                    useCache = False)) for atom in atoms)
+                out = self.test_db.atomMatchMany(atoms,
+                    multiMatch = multi_match, extendedResults = extended,
+                    useCache = False)
+                self.assertEqual(out, expected)
+
+    def test_db_keywords_license_map(self):
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        test_pkg2 = _misc.get_test_package2()
+        data2 = self.Spm.extract_package_metadata(test_pkg2)
+        package_ids = [self.test_db.addPackage(data),
+                       self.test_db.addPackage(data2)]
+
+        self.assertEqual(self.test_db.retrieveKeywordsMap(package_ids),
+            dict((x, self.test_db.retrieveKeywords(x)) for x in package_ids))
+        self.assertEqual(self.test_db.retrieveLicenseMap(package_ids),
+            dict((x, self.test_db.retrieveLicense(x)) for x in package_ids))
+        self.assertEqual(self.test_db.retrieveKeywordsMap([]), {})
+
+    def test_db_search_index(self):
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        test_pkg2 = _misc.get_test_package2()
+        data2 = self.Spm.extract_package_metadata(test_pkg2)
+
+        # test_db uses LIKE queries, test_db2 the search index
+        self.test_db2.setIndexing(True)
+        self.test_db2.createAllIndexes()
+        if self.test_db2._searchIndexTable() is None:
+            # FTS5 not supported by the SQLite library
+            return
+
+        for repo in (self.test_db, self.test_db2):
+            idpackage = repo.addPackage(data)
+            idpackage2 = repo.addPackage(data2)
+            repo.setAtom(idpackage2, "app-foo/indexed-1.0")
+
+        keywords = [data['name'], data['category'], data2['name'],
+            "indexed", "app-foo/does-not-exist"]
+        for keyword in keywords:
+            self.assertEqual(
+                sorted(self.test_db.searchPackages(keyword)),
+                sorted(self.test_db2.searchPackages(keyword)))
+            self.assertEqual(
+                self.test_db.searchDescription(keyword),
+                self.test_db2.searchDescription(keyword))
+
+        ranked = self.test_db2.searchRanked(data['name'])
+        self.assertEqual(ranked[0][0], idpackage)
+        self.assertEqual(
+            [x[0] for x in ranked],
+            [x[0] for x in self.test_db.searchRanked(data['name'])])
+
+        self.test_db2.removePackage(idpackage)
+        self.assertEqual(self.test_db2.searchPackages(
+                data['name'], just_id = True), tuple())
+
     def test_similar(self):
         test_pkg = _misc.get_test_package()
         data = self.Spm.extract_package_metadata(test_pkg)
@@ -899,6 +1266,52 @@ class EntropyRepositoryTest(unittest.TestCase):
         os.remove(buf_file)
         os.remove(new_db_path)
 
+    def test_db_import_export_binary(self):
+
+        test_pkg = _misc.get_test_package2()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        data['changelog'] = const_convert_to_unicode(
+            "#248083).\n\n  06 Feb 2009; Ra\xc3\xbal Porcel")
+        idpackage = self.test_db.addPackage(data)
+        db_data = self.test_db.getPackageData(idpackage)
+        _misc.clean_pkg_metadata(db_data)
+
+        set_mute(True)
+
+        fd, buf_file = const_mkstemp()
+        os.close(fd)
+        with open(buf_file, "wb") as buf:
+            self.test_db.exportRepository(buf, binary = True)
+        with open(buf_file, "rb") as buf:
+            self.assertEqual(
+                buf.read(len(self.test_db._BINARY_DUMP_MAGIC)),
+                self.test_db._BINARY_DUMP_MAGIC)
+
+        fd, new_db_path = const_mkstemp()
+        os.close(fd)
+        rc = self.test_db.importRepository(buf_file, new_db_path)
+        self.assertEqual(rc, 0)
+        new_db = self.Client.open_generic_repository(new_db_path)
+        new_db_data = new_db.getPackageData(idpackage)
+        _misc.clean_pkg_metadata(new_db_data)
+        new_db_checksum = new_db.checksum(strict = False)
+        new_db.close()
+        set_mute(False)
+
+        self.assertEqual(new_db_data, db_data)
+        self.assertEqual(new_db_checksum,
+            self.test_db.checksum(strict = False))
+
+        # truncated dumps are rejected, leaving the target untouched
+        with open(buf_file, "r+b") as buf:
+            buf.truncate(os.path.getsize(buf_file) // 2)
+        rc = self.test_db.importRepository(buf_file, new_db_path)
+        self.assertEqual(rc, 1)
+        self.assertFalse(os.path.lexists(
+            new_db_path + ".import_repository"))
+        os.remove(buf_file)
+        os.remove(new_db_path)
+
     def test_use_defaults(self):
         test_pkg = _misc.get_test_package()
         data = self.Spm.extract_package_metadata(test_pkg)
@@ -1165,6 +1578,55 @@ class EntropyRepositoryTest(unittest.TestCase):
             self.assertEquals(self.test_db.directed(), True)
 
 
+class EntropyRepositoryCacherTest(unittest.TestCase):
+
+    def setUp(self):
+        self._cacher = EntropyRepositoryCacher()
+        self._cacher.clear()
+        self._ns = "test_cacher_ns_"
+
+    def tearDown(self):
+        self._cacher.set_budget(self._ns)
+        self._cacher.clear()
+
+    def test_cacher_budget(self):
+        self._cacher.set_budget(self._ns, max_entries = 2)
+        self._cacher.set(self._ns + "checksum_1", "a", namespace = self._ns)
+        self._cacher.set(self._ns + "checksum_2", "b", namespace = self._ns)
+        # checksum_1 becomes the most recently used
+        self.assertEqual(
+            self._cacher.get(self._ns + "checksum_1", namespace = self._ns),
+            "a")
+        self._cacher.set(self._ns + "checksum_3", "c", namespace = self._ns)
+        self.assertEqual(
+            self._cacher.get(self._ns + "checksum_2", namespace = self._ns),
+            None)
+        self.assertEqual(self._cacher.usage(self._ns)[0], 2)
+
+        stats = self._cacher.stats(self._ns)["checksum"]
+        self.assertEqual(stats, {"hits": 1, "misses": 1, "evictions": 1})
+
+    def test_cacher_weakref(self):
+        data = set([1, 2])
+        self._cacher.set(self._ns + "foo", data, namespace = self._ns)
+        self.assertTrue(self._cacher.get(self._ns + "foo") is data)
+        del data
+        self.assertEqual(self._cacher.get(self._ns + "foo"), None)
+        self.assertEqual(self._cacher.keys(), [])
+
+    def test_cacher_weakref_budget(self):
+        self._cacher.set_budget(self._ns, max_entries = 1)
+        data = set([1, 2])
+        self._cacher.set(self._ns + "foo", data, namespace = self._ns)
+        self._cacher.set(self._ns + "checksum_1", "a", namespace = self._ns)
+        self.assertEqual(self._cacher.usage(self._ns)[0], 1)
+        self.assertTrue(
+            self._cacher.get(self._ns + "foo", namespace = self._ns) is data)
+        self.assertEqual(
+            self._cacher.get(self._ns + "checksum_1", namespace = self._ns),
+            "a")
+
+
 if __name__ == '__main__':
     unittest.main()
     raise SystemExit(0)
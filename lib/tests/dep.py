@@ -132,6 +132,35 @@ class DepTest(unittest.TestCase):
             ('3.4', '2222', 0), ('1.0', '2222', 1)]
         self.assertEqual(et.get_entropy_newer_version(vers), out_vers)
 
+    def test_version_key(self):
+        vers = ["1.0", "1.0.0", "1.02", "1.1", "1.0a", "1.0_rc1", "1.0_p1",
+            "1.0_pre1_p2", "1.0_pre1", "1.0-r1", "2", "1.0_alpha"]
+        for ver_a in vers:
+            for ver_b in vers:
+                cmp_rc = et.compare_versions(ver_a, ver_b)
+                key_a, key_b = et.version_key(ver_a), et.version_key(ver_b)
+                self.assertEqual(cmp_rc > 0, key_a > key_b)
+                self.assertEqual(cmp_rc < 0, key_a < key_b)
+        self.assertEqual(et.version_key("foo"), None)
+        # "_p" and "_p0" compare equal, sorting falls back to
+        # compare_versions()
+        vers = ["1.0_p-r1", "1.0-r2", "1.0_p0"]
+        self.assertEqual(et.get_newer_version(vers), vers)
+
+    def test_parse_atom(self):
+        atom = ">=app-foo/foo-1.2.3:2.3.4[ciao]#2.2.2-foo~1"
+        parsed = et.parse_atom(atom)
+        self.assertTrue(parsed is et.parse_atom(atom))
+        self.assertEqual(parsed.key, "app-foo/foo")
+        self.assertEqual(parsed.category, "app-foo")
+        self.assertEqual(parsed.name, "foo")
+        self.assertEqual(parsed.version, "1.2.3-r0")
+        self.assertEqual(parsed.direction, ">=")
+        self.assertEqual(parsed.slot, "2.3.4")
+        self.assertEqual(parsed.tag, "2.2.2-foo")
+        self.assertEqual(parsed.revision, 1)
+        self.assertEqual(parsed.usedeps, ("ciao",))
+
     def test_create_package_filename(self):
         package_category = "app-foo"
         package_name = "foo"
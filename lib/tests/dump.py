@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import sys
+sys.path.insert(0, '.')
+sys.path.insert(0, '../')
+import os
+import shutil
+import unittest
+from entropy.const import const_mkdtemp, const_convert_to_unicode
+import entropy.dump
+
+class DumpTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = const_mkdtemp(prefix="entropy.tests.dump")
+        self._objs = [
+            (1, 2, 3,),
+            frozenset([(1, 0,), (2, 1,)]),
+            set([1, 2, 3]),
+            {1: "foo", 2: (None, True,)},
+            const_convert_to_unicode('èòàèòà', 'utf-8'),
+            None,
+            ]
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp_dir, True)
+
+    def test_dump_load(self):
+        for serializer in ("pickle", "compact"):
+            orig = entropy.dump.get_serializer()
+            entropy.dump.set_serializer(serializer)
+            try:
+                for count, obj in enumerate(self._objs):
+                    name = "obj_%d" % (count,)
+                    entropy.dump.dumpobj(name, obj, dump_dir = self._tmp_dir)
+                    self.assertEqual(
+                        entropy.dump.loadobj(name, dump_dir = self._tmp_dir),
+                        obj)
+                    data = entropy.dump.serialize_string(obj)
+                    self.assertTrue(data.startswith(entropy.dump.DUMP_MAGIC))
+                    self.assertEqual(
+                        entropy.dump.unserialize_string(data), obj)
+            finally:
+                entropy.dump.set_serializer(orig.NAME)
+
+    def test_compact_fallback(self):
+        orig = entropy.dump.get_serializer()
+        entropy.dump.set_serializer("compact")
+        try:
+            # marshal does not support exceptions, pickle is used
+            obj = (1, ValueError("foo"),)
+            data = entropy.dump.serialize_string(obj)
+            new_obj = entropy.dump.unserialize_string(data)
+            self.assertEqual(new_obj[0], 1)
+            self.assertEqual(new_obj[1].args, ("foo",))
+        finally:
+            entropy.dump.set_serializer(orig.NAME)
+
+    def test_legacy_invalidation(self):
+        legacy_path = os.path.join(
+            self._tmp_dir, "legacy" + entropy.dump.D_EXT)
+        with open(legacy_path, "wb") as legacy_f:
+            legacy_f.write(b"(lp0\nI1\naI2\na.")
+
+        # persistent objects (complete_path) are still loaded
+        self.assertEqual(
+            entropy.dump.loadobj(legacy_path, complete_path = True), [1, 2])
+        self.assertTrue(os.path.isfile(legacy_path))
+
+        # cache objects are discarded
+        self.assertEqual(
+            entropy.dump.loadobj("legacy", dump_dir = self._tmp_dir), None)
+        self.assertFalse(os.path.isfile(legacy_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
+    raise SystemExit(0)
@@ -1,14 +1,87 @@
 # -*- coding: utf-8 -*-
 import sys
 import os
+import shutil
 sys.path.insert(0, '.')
 sys.path.insert(0, '../')
 import unittest
+import socket
+import threading
+try:
+    import BaseHTTPServer as httpserver
+    import SocketServer as socketserver
+except ImportError:
+    # python 3.x
+    import http.server as httpserver
+    import socketserver
 import tests._misc as _misc
-from entropy.fetchers import UrlFetcher, MultipleUrlFetcher
+from entropy.const import const_mkdtemp
+from entropy.fetchers import UrlFetcher, MultipleUrlFetcher, \
+    HTTPConnectionPool, BlockSyncFetcher
 from entropy.output import set_mute
 import entropy.tools
 
+
+class _RangeRequestHandler(httpserver.BaseHTTPRequestHandler):
+    """
+    Minimal HTTP request handler serving the server "payload" attribute
+    at any path, supporting single HTTP Range requests, unless the server
+    "ranges" attribute is False. If the server "broken_ranges" attribute
+    is True, Range requests other than the initial probe fail.
+    """
+
+    def log_message(self, *args):
+        return
+
+    def do_GET(self):
+        payload = self.server.payload
+        size = len(payload)
+        range_header = self.headers.get("Range")
+        if not getattr(self.server, "ranges", True):
+            range_header = None
+        if range_header and range_header != "bytes=0-0" and \
+                getattr(self.server, "broken_ranges", False):
+            self.send_error(500)
+            return
+        if range_header:
+            self.server.range_requests += 1
+            start, end = range_header.split("=", 1)[1].split("-")
+            start, end = int(start), int(end or size - 1)
+            self.send_response(206)
+            self.send_header("Content-Range",
+                "bytes %d-%d/%d" % (start, end, size))
+        else:
+            start, end = 0, size - 1
+            self.send_response(200)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        self.wfile.write(payload[start:end + 1])
+
+
+class _KeepAliveRequestHandler(_RangeRequestHandler):
+    """
+    HTTP/1.1 (persistent connections) flavour of _RangeRequestHandler,
+    counting the accepted connections.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        _RangeRequestHandler.setup(self)
+        self.server.connections += 1
+        self.server.sockets.append(self.request)
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn,
+                           httpserver.HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # connections dropped on purpose by the tests
+        if isinstance(sys.exc_info()[1], socket.error):
+            return
+        httpserver.HTTPServer.handle_error(self, request, client_address)
+
 class FetchersTest(unittest.TestCase):
 
     def setUp(self):
@@ -47,6 +120,318 @@ class FetchersTest(unittest.TestCase):
         self.assertEqual(rc.pop(1), ck_sum)
         os.remove(path_to_save)
 
+    def test_multiple_urlfetcher_mirror_scores(self):
+
+        file_path = "file://" + os.path.realpath(self._random_file)
+        missing_path = "file://" + os.path.realpath(
+            self._random_file) + ".missing"
+        path_to_save = os.path.join(os.path.dirname(self._random_file),
+            "test_urlfetcher")
+
+        class _Scores(object):
+            def __init__(self):
+                self.records = []
+            def record(self, url, error = False, **kwargs):
+                self.records.append((url, error))
+
+        # only the first url is downloaded, no failover to the others
+        scores = _Scores()
+        set_mute(True)
+        fetcher = MultipleUrlFetcher(
+            [([missing_path, file_path], path_to_save,)],
+            show_speed = False, resume = False, mirror_scores = scores)
+        rc = fetcher.download()
+        set_mute(False)
+        self.assertEqual(rc, {1: UrlFetcher.GENERIC_FETCH_ERROR})
+        self.assertEqual(scores.records, [(missing_path, True)])
+        if os.path.isfile(path_to_save):
+            os.remove(path_to_save)
+
+    def test_urlfetcher_segmented_http_fetch(self):
+
+        server = httpserver.HTTPServer(("127.0.0.1", 0), _RangeRequestHandler)
+        server.payload = os.urandom(256 * 1024)
+        server.range_requests = 0
+        server_th = threading.Thread(target = server.serve_forever)
+        server_th.daemon = True
+        server_th.start()
+
+        tmp_dir = const_mkdtemp()
+        min_size = UrlFetcher.SEGMENT_MIN_SIZE
+        try:
+            UrlFetcher.SEGMENT_MIN_SIZE = 32 * 1024
+            url = "http://127.0.0.1:%d/foo.tbz2" % (server.server_port,)
+            path_to_save = os.path.join(tmp_dir, "foo.tbz2")
+
+            fetcher = UrlFetcher(url, path_to_save, show_speed = False,
+                resume = False, segments = 4)
+            rc = fetcher.download()
+            self.assertEqual(rc, entropy.tools.md5sum(path_to_save))
+            with open(path_to_save, "rb") as down_f:
+                self.assertEqual(down_f.read(), server.payload)
+            # one probe plus four segments
+            self.assertEqual(server.range_requests, 5)
+            self.assertFalse(os.path.lexists(
+                path_to_save + UrlFetcher.SEGMENT_STATE_EXT))
+
+            # resume: only the incomplete segment is fetched
+            size = len(server.payload)
+            with open(path_to_save + UrlFetcher.SEGMENT_STATE_EXT,
+                      "w") as state_f:
+                state_f.write("size %d\n" % (size,))
+                state_f.write("0 %d %d\n" % (size // 2, size // 2))
+                state_f.write("%d %d %d\n" % (size // 2, size, size // 2))
+            with open(path_to_save, "r+b") as down_f:
+                down_f.seek(size // 2)
+                down_f.write(b"\0" * (size - size // 2))
+
+            server.range_requests = 0
+            fetcher = UrlFetcher(url, path_to_save, show_speed = False,
+                resume = True, segments = 4)
+            rc = fetcher.download()
+            self.assertTrue(fetcher.is_resumed())
+            self.assertEqual(server.range_requests, 2)
+            with open(path_to_save, "rb") as down_f:
+                self.assertEqual(down_f.read(), server.payload)
+        finally:
+            UrlFetcher.SEGMENT_MIN_SIZE = min_size
+            server.shutdown()
+            server.server_close()
+            shutil.rmtree(tmp_dir, True)
+
+    def test_urlfetcher_segmented_http_fetch_fallback(self):
+
+        server = httpserver.HTTPServer(("127.0.0.1", 0), _RangeRequestHandler)
+        server.payload = os.urandom(256 * 1024)
+        server.range_requests = 0
+        server_th = threading.Thread(target = server.serve_forever)
+        server_th.daemon = True
+        server_th.start()
+
+        tmp_dir = const_mkdtemp()
+        min_size = UrlFetcher.SEGMENT_MIN_SIZE
+        try:
+            UrlFetcher.SEGMENT_MIN_SIZE = 32 * 1024
+            url = "http://127.0.0.1:%d/foo.tbz2" % (server.server_port,)
+            path_to_save = os.path.join(tmp_dir, "foo.tbz2")
+            state_path = path_to_save + UrlFetcher.SEGMENT_STATE_EXT
+
+            def _broken_download():
+                server.ranges = True
+                server.broken_ranges = True
+                fetcher = UrlFetcher(url, path_to_save, show_speed = False,
+                    resume = True, segments = 4)
+                self.assertEqual(fetcher.download(),
+                    UrlFetcher.GENERIC_FETCH_ERROR)
+                # preallocated file, and its state
+                self.assertEqual(os.path.getsize(path_to_save),
+                    len(server.payload))
+                self.assertTrue(os.path.isfile(state_path))
+                server.broken_ranges = False
+
+            # resumed by a plain download, Range is no longer supported
+            _broken_download()
+            server.ranges = False
+            fetcher = UrlFetcher(url, path_to_save, show_speed = False,
+                resume = True, segments = 4)
+            rc = fetcher.download()
+            self.assertEqual(rc, entropy.tools.md5sum(path_to_save))
+            with open(path_to_save, "rb") as down_f:
+                self.assertEqual(down_f.read(), server.payload)
+            self.assertFalse(os.path.lexists(state_path))
+
+            # resumed by a segmented download, without the state
+            os.remove(path_to_save)
+            _broken_download()
+            os.remove(state_path)
+            fetcher = UrlFetcher(url, path_to_save, show_speed = False,
+                resume = True, segments = 4)
+            rc = fetcher.download()
+            self.assertEqual(rc, entropy.tools.md5sum(path_to_save))
+            with open(path_to_save, "rb") as down_f:
+                self.assertEqual(down_f.read(), server.payload)
+        finally:
+            UrlFetcher.SEGMENT_MIN_SIZE = min_size
+            server.shutdown()
+            server.server_close()
+            shutil.rmtree(tmp_dir, True)
+
+    def test_http_connection_pool(self):
+
+        server = _ThreadingHTTPServer(
+            ("127.0.0.1", 0), _KeepAliveRequestHandler)
+        server.payload = os.urandom(64 * 1024)
+        server.range_requests = 0
+        server.connections = 0
+        server.sockets = []
+        server_th = threading.Thread(target = server.serve_forever)
+        server_th.daemon = True
+        server_th.start()
+
+        tmp_dir = const_mkdtemp()
+        pool = HTTPConnectionPool()
+        pool.clear()
+        try:
+            url = "http://127.0.0.1:%d/foo.tbz2" % (server.server_port,)
+            path_to_save = os.path.join(tmp_dir, "foo.tbz2")
+            for _idx in range(3):
+                fetcher = UrlFetcher(url, path_to_save, show_speed = False,
+                    resume = False, connection_pool = pool)
+                rc = fetcher.download()
+                self.assertEqual(rc, entropy.tools.md5sum(path_to_save))
+            # the same connection has been used for all the downloads
+            self.assertEqual(server.connections, 1)
+
+            set_mute(True)
+            url_path_list = [
+                (url, os.path.join(tmp_dir, "bar%d.tbz2" % (x,)))
+                for x in range(HTTPConnectionPool.MAX_PER_HOST * 2)]
+            fetcher = MultipleUrlFetcher(url_path_list, show_speed = False,
+                resume = False, connection_pool = pool)
+            rc = fetcher.download()
+            set_mute(False)
+            self.assertEqual(len(rc), len(url_path_list))
+            self.assertEqual(set(rc.values()), set([
+                entropy.tools.md5sum(path_to_save)]))
+            self.assertTrue(
+                server.connections <= HTTPConnectionPool.MAX_PER_HOST)
+        finally:
+            pool.clear()
+            server.shutdown()
+            server.server_close()
+            shutil.rmtree(tmp_dir, True)
+
+    def test_http_connection_pool_stale(self):
+
+        server = _ThreadingHTTPServer(
+            ("127.0.0.1", 0), _KeepAliveRequestHandler)
+        server.payload = os.urandom(1024)
+        server.range_requests = 0
+        server.connections = 0
+        server.sockets = []
+        server_th = threading.Thread(target = server.serve_forever)
+        server_th.daemon = True
+        server_th.start()
+
+        pool = HTTPConnectionPool()
+        pool.clear()
+        is_dropped = pool._is_dropped
+        url = "http://127.0.0.1:%d/foo.tbz2" % (server.server_port,)
+
+        def _fill_pool():
+            # two idle keep-alive connections, then the server
+            # drops them, like when restarted.
+            conns = []
+            for _idx in range(2):
+                conn, _reused = pool.acquire(
+                    "http", "127.0.0.1", server.server_port, 5.0)
+                conn.request("GET", "/")
+                self.assertEqual(conn.getresponse().read(), server.payload)
+                conns.append(conn)
+            for conn in conns:
+                pool.release("http", "127.0.0.1", server.server_port, conn)
+            for sock in server.sockets:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+            del server.sockets[:]
+
+        try:
+            # dropped connections are detected before being used
+            _fill_pool()
+            connections = server.connections
+            response = pool.urlopen(url, {}, 5.0)
+            self.assertEqual(response.read(), server.payload)
+            response.close()
+            self.assertEqual(server.connections, connections + 1)
+
+            # undetected ones fail and are retried on a new connection,
+            # not on the other stale one.
+            pool.clear()
+            pool._is_dropped = lambda conn: False
+            _fill_pool()
+            connections = server.connections
+            response = pool.urlopen(url, {}, 5.0)
+            self.assertEqual(response.read(), server.payload)
+            response.close()
+            self.assertEqual(server.connections, connections + 1)
+        finally:
+            pool._is_dropped = is_dropped
+            pool.clear()
+            server.shutdown()
+            server.server_close()
+
+    def test_block_sync_fetch(self):
+
+        server = _ThreadingHTTPServer(
+            ("127.0.0.1", 0), _KeepAliveRequestHandler)
+        line = "INSERT INTO baseinfo VALUES(%d,'app-misc/foo%d','%s');\n"
+        old_lines = [line % (x, x, "1.0") for x in range(4000)]
+        new_lines = old_lines[:]
+        # a package update, a package removal and new packages
+        new_lines[1000] = line % (1000, 1000, "1.1")
+        del new_lines[2500]
+        new_lines.extend(line % (x, x, "1.0") for x in range(4000, 4050))
+        old_payload = "".join(old_lines).encode("ascii")
+        new_payload = "".join(new_lines).encode("ascii")
+        server.payload = new_payload
+        server.range_requests = 0
+        server.connections = 0
+        server.sockets = []
+        server_th = threading.Thread(target = server.serve_forever)
+        server_th.daemon = True
+        server_th.start()
+
+        tmp_dir = const_mkdtemp()
+        pool = HTTPConnectionPool()
+        try:
+            remote_path = os.path.join(tmp_dir, "packages.db.dumplight")
+            with open(remote_path, "wb") as remote_f:
+                remote_f.write(new_payload)
+            manifest = entropy.tools.read_block_manifest_file(
+                entropy.tools.create_block_manifest_file(remote_path))
+            self.assertEqual(manifest['length'], len(new_payload))
+
+            seed_path = os.path.join(tmp_dir, "packages.db.seed")
+            with open(seed_path, "wb") as seed_f:
+                seed_f.write(old_payload)
+            url = "http://127.0.0.1:%d/packages.db.dumplight" % (
+                server.server_port,)
+            path_to_save = os.path.join(tmp_dir, "rebuilt")
+
+            fetcher = BlockSyncFetcher(url, path_to_save, manifest,
+                seed_path, connection_pool = pool)
+            rc = fetcher.download()
+            self.assertEqual(rc, manifest['sha256'])
+            with open(path_to_save, "rb") as down_f:
+                self.assertEqual(down_f.read(), new_payload)
+            reused_size, fetched_size = fetcher.get_statistics()
+            self.assertEqual(reused_size + fetched_size, len(new_payload))
+            self.assertTrue(fetched_size < len(new_payload) // 10)
+            # one Range request per changed area at most
+            self.assertTrue(0 < server.range_requests <= 3)
+
+            # too much data to fetch
+            fetcher = BlockSyncFetcher(url, path_to_save, manifest,
+                seed_path, max_fetch_size = 1, connection_pool = pool)
+            self.assertEqual(fetcher.download(),
+                             UrlFetcher.GENERIC_FETCH_ERROR)
+            self.assertFalse(os.path.lexists(path_to_save))
+
+            # mirror content not matching the manifest
+            server.payload = new_payload[:-1] + b"!"
+            fetcher = BlockSyncFetcher(url, path_to_save, manifest,
+                seed_path, connection_pool = pool)
+            self.assertEqual(fetcher.download(),
+                             UrlFetcher.GENERIC_FETCH_ERROR)
+            self.assertFalse(os.path.lexists(path_to_save))
+        finally:
+            pool.clear()
+            server.shutdown()
+            server.server_close()
+            shutil.rmtree(tmp_dir, True)
+
 if __name__ == '__main__':
     unittest.main()
     raise SystemExit(0)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import sys
+sys.path.insert(0, '.')
+sys.path.insert(0, '../')
+import unittest
+import random
+from entropy.graph import Graph, TopologicalSorter
+
+
+class GraphTest(unittest.TestCase):
+
+    def _assert_sorted(self, adj_map, sorted_map):
+        levels = {}
+        for dep_level, component in sorted_map.items():
+            for item in component:
+                self.assertFalse(item in levels)
+                levels[item] = dep_level
+        self.assertEqual(sorted(levels.keys()), sorted(adj_map.keys()))
+        for item, deps in adj_map.items():
+            for dep in deps:
+                # items come before their dependencies, unless
+                # they are part of the same cycle
+                self.assertTrue(levels[item] <= levels[dep])
+
+    def test_graph_solve(self):
+        graph = Graph()
+        graph.add("a", set(["b", "c"]))
+        graph.add("b", set(["c"]))
+        graph.add("c", set())
+        self.assertEqual(graph.solve(), {1: ("a",), 2: ("b",), 3: ("c",)})
+        graph.destroy()
+
+    def test_graph_solve_cycle(self):
+        graph = Graph()
+        graph.add("a", set(["b"]))
+        graph.add("b", set(["c"]))
+        graph.add("c", set(["b", "d"]))
+        sorted_map = graph.solve()
+        self.assertEqual(len(sorted_map), 3)
+        self.assertEqual(sorted_map[1], ("a",))
+        self.assertEqual(sorted(sorted_map[2]), ["b", "c"])
+        self.assertEqual(sorted_map[3], ("d",))
+        graph.destroy()
+
+    def test_graph_incremental(self):
+        rnd = random.Random(1234)
+        nodes = list(range(300))
+        graph = Graph()
+        adj_map = dict((x, set()) for x in nodes)
+        for count in range(3):
+            for node in nodes:
+                deps = set(rnd.sample(nodes, rnd.randint(0, 3)))
+                adj_map[node] |= deps
+                graph.add(node, deps)
+            # solving doesn't prevent further additions
+            self._assert_sorted(adj_map, graph.solve())
+
+            graph_adj_map = dict((x.item(), set(y.item() for y in z)) \
+                for x, z in graph.get_adjacency_map().items())
+            self.assertEqual(graph_adj_map, adj_map)
+            self._assert_sorted(adj_map, TopologicalSorter(adj_map).sort())
+            self.assertEqual(len(graph.solve_nodes()), len(graph.solve()))
+        graph.destroy()
+
+    def test_graph_deep(self):
+        # deeper than the Python recursion limit
+        depth = sys.getrecursionlimit() * 5
+        graph = Graph()
+        for node in range(depth):
+            graph.add(node, set([node + 1]))
+        graph.add(depth, set([0]))
+        sorted_map = graph.solve()
+        self.assertEqual(len(sorted_map), 1)
+        self.assertEqual(len(sorted_map[1]), depth + 1)
+        graph.destroy()
+
+        graph = Graph()
+        for node in range(depth):
+            graph.add(node, set([node + 1]))
+        sorted_map = graph.solve()
+        self.assertEqual(len(sorted_map), depth + 1)
+        self.assertEqual(sorted_map[1], (0,))
+        self.assertEqual(sorted_map[depth + 1], (depth,))
+        graph.destroy()
+
+
+if __name__ == '__main__':
+    unittest.main()
+    raise SystemExit(0)
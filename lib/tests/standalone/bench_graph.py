@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# entropy.graph benchmark over synthetic graphs, run from lib/:
+#   python tests/standalone/bench_graph.py [nodes]
+import sys
+import time
+import random
+sys.path.insert(0, '.')
+sys.path.insert(0, '../')
+
+from entropy.graph import Graph
+
+
+def _timed(label, func, *args):
+    start = time.time()
+    out = func(*args)
+    sys.stdout.write("%-40s %8.3fs\n" % (label, time.time() - start))
+    sys.stdout.flush()
+    return out
+
+
+def _build(edges_map):
+    graph = Graph()
+    for node, deps in edges_map.items():
+        graph.add(node, deps)
+    return graph
+
+
+def _bench(name, edges_map):
+    graph = _timed("%s: Graph.add()" % (name,), _build, edges_map)
+    _timed("%s: Graph.solve()" % (name,), graph.solve)
+    # adding a node must not require a full rebuild
+    graph.add(-1, set([0]))
+    _timed("%s: Graph.solve() after add()" % (name,), graph.solve)
+    _timed("%s: Graph.get_adjacency_map()" % (name,),
+           graph.get_adjacency_map)
+    graph.destroy()
+
+
+if __name__ == "__main__":
+
+    nodes = 50000
+    if len(sys.argv) > 1:
+        nodes = int(sys.argv[1])
+    rnd = random.Random(0)
+
+    # a single dependency chain, as deep as the graph
+    _bench("chain", dict((x, set([x + 1])) for x in range(nodes)))
+
+    # a package-like graph: mostly dependencies towards lower
+    # layers, with some cycles
+    edges_map = {}
+    for node in range(nodes):
+        deps = set()
+        for _count in range(rnd.randint(0, 8)):
+            if rnd.random() < 0.02:
+                deps.add(rnd.randint(0, nodes - 1))
+            elif node + 1 < nodes:
+                deps.add(rnd.randint(node + 1, nodes - 1))
+        edges_map[node] = deps
+    _bench("layered", edges_map)
+
+    # one big strongly connected component
+    _bench("cycle", dict((x, set([(x + 1) % nodes, (x * 7) % nodes])) \
+                             for x in range(nodes)))
+
+    raise SystemExit(0)
@@ -4,7 +4,7 @@ import os
 sys.path.insert(0, '.')
 sys.path.insert(0, '../')
 import unittest
-from entropy.const import const_convert_to_rawstring, \
+from entropy.const import etpConst, const_convert_to_rawstring, \
     const_convert_to_unicode, const_mkstemp, const_mkdtemp
 import entropy.tools as et
 from entropy.client.interfaces import Client
@@ -13,6 +13,15 @@ import tests._misc as _misc
 import subprocess
 import shutil
 import stat
+import tarfile
+import io
+import socket
+import threading
+try:
+    import BaseHTTPServer as httpserver
+except ImportError:
+    # python 3.x
+    import http.server as httpserver
 
 class ToolsTest(unittest.TestCase):
 
@@ -63,6 +72,37 @@ class ToolsTest(unittest.TestCase):
 
         os.remove(tmp_path)
 
+    def test_aggregate_entropy_metadata(self):
+        fd, tmp_path = const_mkstemp()
+        os.close(fd)
+        fd, edb_path = const_mkstemp()
+        os.close(fd)
+        fd, new_edb_path = const_mkstemp()
+        os.close(fd)
+
+        for test_pkg in self.test_pkgs:
+            # old-style package, without footer
+            self.assertTrue(et.dump_entropy_metadata(test_pkg, edb_path))
+            self.assertTrue(et.remove_entropy_metadata(test_pkg, tmp_path))
+            pkg_md5 = et.md5sum(tmp_path)
+
+            et.aggregate_entropy_metadata(tmp_path, edb_path)
+            self.assertTrue(et.is_entropy_package_file(tmp_path))
+            with open(tmp_path, "rb") as pkg_f:
+                pkg_f.seek(0, os.SEEK_END)
+                edb_end = pkg_f.tell() - et._EDB_FOOTER_SIZE - \
+                    len(etpConst['databaseendtag'])
+                # footer is used
+                self.assertEqual(et._locate_edb(pkg_f)[1], edb_end)
+            self.assertTrue(et.dump_entropy_metadata(tmp_path, new_edb_path))
+            self.assertEqual(et.md5sum(edb_path), et.md5sum(new_edb_path))
+
+            self.assertTrue(et.remove_entropy_metadata(tmp_path, edb_path))
+            self.assertEqual(pkg_md5, et.md5sum(edb_path))
+
+        for path in (tmp_path, edb_path, new_edb_path):
+            os.remove(path)
+
     def test_tb(self):
         # traceback test
         tb = None
@@ -85,6 +125,41 @@ class ToolsTest(unittest.TestCase):
         os.close(fd)
         os.remove(tmp_path)
 
+    def test_is_url_reachable(self):
+        tmp_dir = const_mkdtemp()
+        try:
+            self.assertTrue(et.is_url_reachable("file://" + tmp_dir))
+            self.assertFalse(et.is_url_reachable(
+                    "file://" + os.path.join(tmp_dir, "missing")))
+        finally:
+            shutil.rmtree(tmp_dir, True)
+        self.assertTrue(et.is_url_reachable("rsync://localhost/entropy"))
+
+        class _Handler(httpserver.BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                return
+
+        # any server reply, errors included
+        server = httpserver.HTTPServer(("127.0.0.1", 0), _Handler)
+        server_th = threading.Thread(target = server.serve_forever)
+        server_th.daemon = True
+        server_th.start()
+        url = "http://127.0.0.1:%d/entropy" % (server.server_address[1],)
+        try:
+            self.assertTrue(et.is_url_reachable(url))
+        finally:
+            server.shutdown()
+            server.server_close()
+            server_th.join()
+
+        # nobody listening anymore
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        self.assertFalse(et.is_url_reachable(
+                "http://127.0.0.1:%d/entropy" % (port,), timeout = 2))
+
     def test_supported_img_file(self):
         fd, tmp_path = const_mkstemp()
 
@@ -638,6 +713,191 @@ class ToolsTest(unittest.TestCase):
 
         self.assertEqual(path_perms, new_path_perms)
 
+
+class UncompressTarballTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = const_mkdtemp()
+        self._find_executable = et._find_executable
+        self._metadata_batch = et._UNPACK_METADATA_BATCH
+
+    def tearDown(self):
+        et._find_executable = self._find_executable
+        et._UNPACK_METADATA_BATCH = self._metadata_batch
+        shutil.rmtree(self._tmp_dir, True)
+
+    def _make_tarball(self, compression):
+        """
+        Create a compressed tarball containing directories, regular files
+        with different modes, owners and mtimes, and symlinks.
+        """
+        tar_path = os.path.join(self._tmp_dir, "test.tar." + compression)
+        tar = tarfile.open(tar_path, "w:" + compression)
+        try:
+            def _add(name, type_, mode, data = b"", linkname = "",
+                     owner = "root"):
+                tarinfo = tarfile.TarInfo(name)
+                tarinfo.type = type_
+                tarinfo.mode = mode
+                tarinfo.mtime = 1300000000 + len(name)
+                tarinfo.uname = owner
+                tarinfo.gname = owner
+                tarinfo.linkname = linkname
+                fileobj = None
+                if type_ == tarfile.REGTYPE:
+                    tarinfo.size = len(data)
+                    fileobj = io.BytesIO(data)
+                tar.addfile(tarinfo, fileobj)
+
+            _add("usr", tarfile.DIRTYPE, 0o755)
+            _add("usr/bin", tarfile.DIRTYPE, 0o750)
+            _add("usr/share", tarfile.DIRTYPE, 0o700, owner = "daemon")
+            for idx in range(10):
+                _add("usr/bin/file%d" % (idx,), tarfile.REGTYPE,
+                     (0o755, 0o644, 0o600, 0o4711)[idx % 4],
+                     data = const_convert_to_rawstring("data%d" % (idx,)) * (
+                         idx * 20000),
+                     owner = ("root", "daemon")[idx % 2])
+            _add("usr/share/link", tarfile.SYMTYPE, 0o777,
+                 linkname = "../bin/file1")
+            _add("usr/share/empty", tarfile.DIRTYPE, 0o711)
+        finally:
+            tar.close()
+        return tar_path
+
+    def _tree(self, root):
+        """
+        Return a dict describing the tree at root: path -> (type, mode,
+        uid, gid, content or link target, mtime of regular files).
+        """
+        tree = {}
+        for currentdir, subdirs, files in os.walk(root):
+            for name in subdirs + files:
+                path = os.path.join(currentdir, name)
+                fstat = os.lstat(path)
+                mtime = None
+                if stat.S_ISLNK(fstat.st_mode):
+                    data = os.readlink(path)
+                    mode = None
+                elif stat.S_ISREG(fstat.st_mode):
+                    with open(path, "rb") as f:
+                        data = f.read()
+                    mode = stat.S_IMODE(fstat.st_mode)
+                    mtime = int(fstat.st_mtime)
+                else:
+                    data = None
+                    mode = stat.S_IMODE(fstat.st_mode)
+                tree[os.path.relpath(path, root)] = (
+                    stat.S_IFMT(fstat.st_mode), mode, fstat.st_uid,
+                    fstat.st_gid, data, mtime)
+        return tree
+
+    def _reference_tree(self, tar_path):
+        ref_dir = os.path.join(self._tmp_dir, "reference")
+        tar = tarfile.open(tar_path, "r")
+        try:
+            tar.extractall(ref_dir)
+        finally:
+            tar.close()
+        return self._tree(ref_dir)
+
+    def _uncompress(self, tar_path):
+        extract_dir = os.path.join(self._tmp_dir, "extract")
+        if os.path.isdir(extract_dir):
+            shutil.rmtree(extract_dir)
+        os.makedirs(extract_dir)
+        rc = et.uncompress_tarball(tar_path, extract_path = extract_dir)
+        self.assertEqual(rc, 0)
+        return self._tree(extract_dir)
+
+    def _fake_decompressor(self, name, script):
+        exec_path = os.path.join(self._tmp_dir, name)
+        with open(exec_path, "w") as exec_f:
+            exec_f.write("#!/bin/sh\n" + script + "\n")
+        os.chmod(exec_path, 0o755)
+        return exec_path
+
+    def test_uncompress_tarball_threaded(self):
+        # no external decompressors, the decompression thread is used
+        et._find_executable = lambda name: None
+        for compression in ("bz2", "gz"):
+            tar_path = self._make_tarball(compression)
+            self.assertEqual(et._tarball_compression(tar_path),
+                             (compression, []))
+            expected = self._reference_tree(tar_path)
+            self.assertTrue(expected)
+            self.assertEqual(self._uncompress(tar_path), expected)
+            shutil.rmtree(os.path.join(self._tmp_dir, "reference"))
+
+    def test_uncompress_tarball_trailing_data(self):
+        # Entropy packages carry their metadata after the tarball
+        et._find_executable = lambda name: None
+        tar_path = self._make_tarball("bz2")
+        expected = self._reference_tree(tar_path)
+        with open(tar_path, "ab") as tar_f:
+            tar_f.write(const_convert_to_rawstring("|ENTROPY|" * 1000))
+        self.assertEqual(self._uncompress(tar_path), expected)
+
+    def test_uncompress_tarball_external(self):
+        gzip_path = et._find_executable("gzip")
+        if gzip_path is None:
+            return
+        exec_path = self._fake_decompressor(
+            "pigz", 'exec "%s" "$@"' % (gzip_path,))
+        et._find_executable = lambda name: \
+            exec_path if name == "pigz" else None
+
+        tar_path = self._make_tarball("gz")
+        self.assertEqual(et._tarball_compression(tar_path),
+                         ("gz", [(exec_path, (0, 2))]))
+        self.assertEqual(self._uncompress(tar_path),
+                         self._reference_tree(tar_path))
+
+    def test_uncompress_tarball_external_fallback(self):
+        tar_path = self._make_tarball("gz")
+        expected = self._reference_tree(tar_path)
+
+        # decompressor failing with garbage output
+        failing_path = self._fake_decompressor(
+            "pigz", "echo garbage; exit 1")
+        et._find_executable = lambda name: \
+            failing_path if name == "pigz" else None
+        self.assertEqual(self._uncompress(tar_path), expected)
+
+        # decompressor printing a valid tarball but failing
+        gzip_path = self._find_executable("gzip")
+        if gzip_path is not None:
+            failing_path = self._fake_decompressor(
+                "pigz", '"%s" "$@"; exit 1' % (gzip_path,))
+            self.assertEqual(self._uncompress(tar_path), expected)
+
+        # decompressor not found at all
+        missing_path = os.path.join(self._tmp_dir, "missing", "pigz")
+        et._find_executable = lambda name: \
+            missing_path if name == "pigz" else None
+        self.assertEqual(self._uncompress(tar_path), expected)
+
+    def test_uncompress_tarball_metadata_batches(self):
+        et._find_executable = lambda name: None
+        tar_path = self._make_tarball("bz2")
+        expected = self._reference_tree(tar_path)
+        for batch in (1, 3, 1000):
+            et._UNPACK_METADATA_BATCH = batch
+            tree = self._uncompress(tar_path)
+            self.assertEqual(tree, expected)
+
+        if os.getuid() == 0:
+            daemon_uid = et.get_uid_from_user("daemon")
+            if daemon_uid != -1:
+                self.assertEqual(tree["usr/bin/file1"][2], daemon_uid)
+                self.assertEqual(tree["usr/share"][2], daemon_uid)
+                self.assertEqual(tree["usr/bin/file0"][2], 0)
+        self.assertEqual(tree["usr/bin/file3"][1], 0o4711)
+        self.assertEqual(tree["usr/bin/file2"][1], 0o600)
+        self.assertEqual(tree["usr/bin"][1], 0o750)
+        self.assertEqual(tree["usr/bin/file5"][5], 1300000000 + len(
+                "usr/bin/file5"))
+
 if __name__ == '__main__':
     unittest.main()
     raise SystemExit(0)
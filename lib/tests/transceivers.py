@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+import sys
+sys.path.insert(0, '.')
+sys.path.insert(0, '../')
+import unittest
+import os
+import shutil
+import subprocess
+from entropy.const import const_mkdtemp
+from entropy.transceivers.uri_handlers.plugins.interfaces.ssh_plugin import \
+    EntropySshUriHandler
+from entropy.server.transceivers import TransceiverServerHandler
+import entropy.server.transceivers as server_transceivers
+import entropy.tools
+
+
+class _LocalSshUriHandler(EntropySshUriHandler):
+    """
+    EntropySshUriHandler running its remote commands with the local shell,
+    ssh errors (exit status 255) can be injected per invocation.
+    """
+
+    def __init__(self, uri):
+        EntropySshUriHandler.__init__(self, uri)
+        self.commands = []
+        self.ssh_errors = set()
+
+    def _setup_multiplex_args(self):
+        return []
+
+    def _exec_cmd(self, args):
+        count = len(self.commands)
+        self.commands.append(args)
+        if count in self.ssh_errors:
+            return 255, "", "ssh: connect to host: Connection refused"
+        proc = subprocess.Popen(["/bin/sh", "-c", args[-1]],
+            stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+        output, error = proc.communicate()
+        return proc.returncode, output.decode("utf-8"), \
+            error.decode("utf-8")
+
+
+class SshUriHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self._remote_dir = const_mkdtemp()
+        self._batch_size = EntropySshUriHandler._BATCH_SIZE
+        self._handler = _LocalSshUriHandler(
+            "ssh://entropy@localhost:" + self._remote_dir)
+        self._handler.set_silent(True)
+        self._files = {}
+        for name in ("foo.tbz2", "bar baz.tbz2", "qux.tbz2"):
+            path = os.path.join(self._remote_dir, name)
+            with open(path, "wb") as file_f:
+                file_f.write(os.urandom(128))
+            self._files[name] = entropy.tools.md5sum(path)
+
+    def tearDown(self):
+        EntropySshUriHandler._BATCH_SIZE = self._batch_size
+        shutil.rmtree(self._remote_dir, True)
+
+    def test_exec_batch(self):
+        commands = [
+            ("a", "echo first; echo second"),
+            ("b", "true"),
+            ("c", "echo missing >&2"),
+            ("d", "false"),
+            ("e", "echo last"),
+        ]
+        outcome = self._handler._exec_batch(commands)
+        self.assertEqual(outcome["a"], ["first", "second"])
+        self.assertEqual(outcome["b"], [])
+        self.assertEqual(outcome["c"], [])
+        self.assertEqual(outcome["d"], [])
+        self.assertEqual(outcome["e"], ["last"])
+        self.assertEqual(len(outcome), 5)
+        # a single ssh invocation
+        self.assertEqual(len(self._handler.commands), 1)
+
+    def test_exec_batch_ssh_error(self):
+        EntropySshUriHandler._BATCH_SIZE = 2
+        commands = [(x, "echo %d" % (x,)) for x in range(5)]
+        # the second batch (keys 2 and 3) hits an ssh error
+        self._handler.ssh_errors.add(1)
+        outcome = self._handler._exec_batch(commands)
+        self.assertEqual(len(self._handler.commands), 3)
+        self.assertEqual(outcome, {0: ["0"], 1: ["1"], 4: ["4"]})
+
+    def test_get_md5_many(self):
+        EntropySshUriHandler._BATCH_SIZE = 2
+        names = sorted(self._files.keys()) + ["missing.tbz2"]
+        data = self._handler.get_md5_many(names)
+        expected = dict(self._files)
+        expected["missing.tbz2"] = None
+        self.assertEqual(data, expected)
+        self.assertEqual(len(self._handler.commands), 2)
+
+        # files of batches failing because of ssh errors have no checksum
+        self._handler.ssh_errors.add(3)
+        data = self._handler.get_md5_many(names)
+        self.assertEqual(data["bar baz.tbz2"], self._files["bar baz.tbz2"])
+        self.assertEqual(data["foo.tbz2"], self._files["foo.tbz2"])
+        self.assertEqual(data["missing.tbz2"], None)
+        self.assertEqual(data["qux.tbz2"], None)
+
+    def test_list_content_metadata_many(self):
+        sub_dir = os.path.join(self._remote_dir, "sub")
+        os.mkdir(sub_dir)
+        with open(os.path.join(sub_dir, "file.tbz2"), "wb") as file_f:
+            file_f.write(b"x" * 10)
+
+        data = self._handler.list_content_metadata_many(
+            ["", "sub", "missing"])
+        self.assertEqual(len(self._handler.commands), 1)
+        self.assertEqual(data["missing"], [])
+
+        sub_data = data["sub"]
+        self.assertEqual(len(sub_data), 1)
+        name, size, _owner, _group, perms = sub_data[0]
+        self.assertEqual((name, size), ("file.tbz2", "10"))
+        self.assertTrue(perms.startswith("-"))
+
+        names = set(x[0] for x in data[""])
+        self.assertTrue(set(["foo.tbz2", "qux.tbz2", "sub"]) <= names)
+
+
+class _FakeOutput(object):
+
+    def output(self, *args, **kwargs):
+        return
+
+
+class _FakeUploadHandler(object):
+    """
+    Fake EntropyUriHandler storing uploaded files into a dict, the remote
+    checksums returned by get_md5_many() can be altered.
+    """
+
+    def __init__(self, batch_upload = True, md5_overrides = None):
+        self._batch_upload = batch_upload
+        if md5_overrides is None:
+            md5_overrides = {}
+        self._md5_overrides = md5_overrides
+        self.remote = {}
+        self.uploads = []
+        self.batches = []
+
+    def is_dir(self, remote_path):
+        return True
+
+    def makedirs(self, remote_path):
+        return True
+
+    def upload(self, load_path, remote_path):
+        self.uploads.append(remote_path)
+        self.remote[remote_path] = entropy.tools.md5sum(load_path)
+        return True
+
+    def upload_many(self, load_path_list, remote_dir):
+        self.batches.append(remote_dir)
+        if not self._batch_upload:
+            return False
+        for load_path in load_path_list:
+            remote_path = os.path.join(
+                remote_dir, os.path.basename(load_path))
+            self.remote[remote_path] = entropy.tools.md5sum(load_path)
+        return True
+
+    def get_md5(self, remote_path):
+        return self.remote.get(remote_path)
+
+    def get_md5_many(self, remote_paths):
+        data = {}
+        for remote_path in remote_paths:
+            data[remote_path] = self._md5_overrides.get(
+                remote_path, self.remote.get(remote_path))
+        return data
+
+
+class _FakeTransceiver(object):
+
+    handler = None
+
+    def __init__(self, uri):
+        self._uri = uri
+
+    @staticmethod
+    def get_uri_name(uri):
+        return uri
+
+    def set_speed_limit(self, speed_limit):
+        return
+
+    def set_output_interface(self, output_interface):
+        return
+
+    def __enter__(self):
+        return _FakeTransceiver.handler
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return
+
+
+class _TransceiverServerHandler(TransceiverServerHandler):
+    """
+    TransceiverServerHandler uploading files, without the Entropy Server
+    settings.
+    """
+
+    def __init__(self, files_to_upload, txc_basedir):
+        self._entropy = _FakeOutput()
+        self.uris = ["ssh://mirror"]
+        self.myfiles = files_to_upload[:]
+        self.speed_limit = None
+        self.download = False
+        self.remove = False
+        self.repo = "test"
+        self._copy_herustic = False
+        self.txc_basedir = txc_basedir
+        self.local_basedir = None
+        self.critical_files = files_to_upload[:]
+        self.handlers_data = {}
+
+
+class TransceiverServerHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = const_mkdtemp()
+        self._files = []
+        for name in ("a.tbz2", "b.tbz2", "c.tbz2"):
+            path = os.path.join(self._tmp_dir, name)
+            with open(path, "wb") as file_f:
+                file_f.write(os.urandom(128))
+            self._files.append(path)
+        # one more file, alone in its remote directory
+        path = os.path.join(self._tmp_dir, "d.tbz2")
+        with open(path, "wb") as file_f:
+            file_f.write(os.urandom(128))
+        self._files.append(("other", path))
+        self._transceiver = server_transceivers.EntropyTransceiver
+        server_transceivers.EntropyTransceiver = _FakeTransceiver
+
+    def tearDown(self):
+        server_transceivers.EntropyTransceiver = self._transceiver
+        _FakeTransceiver.handler = None
+        shutil.rmtree(self._tmp_dir, True)
+
+    def _transceive(self, handler):
+        _FakeTransceiver.handler = handler
+        txc = _TransceiverServerHandler(self._files, "packages")
+        return txc._transceive("ssh://mirror")
+
+    def test_batch_upload(self):
+        handler = _FakeUploadHandler()
+        fail, fine, broken = self._transceive(handler)
+        self.assertFalse(fail)
+        self.assertEqual(fine, set(["ssh://mirror"]))
+        self.assertEqual(broken, set())
+        self.assertEqual(handler.batches, ["packages"])
+        # only the file alone in its directory is uploaded by itself
+        self.assertEqual(handler.uploads, ["other/d.tbz2"])
+        self.assertEqual(len(handler.remote), 4)
+
+    def test_batch_upload_failure(self):
+        handler = _FakeUploadHandler(batch_upload = False)
+        fail, fine, broken = self._transceive(handler)
+        self.assertFalse(fail)
+        self.assertEqual(broken, set())
+        self.assertEqual(handler.batches, ["packages"])
+        # every file goes through the per-file upload
+        self.assertEqual(handler.uploads, ["packages/a.tbz2",
+            "packages/b.tbz2", "packages/c.tbz2", "other/d.tbz2"])
+
+    def test_batch_upload_verification_failure(self):
+        handler = _FakeUploadHandler(
+            md5_overrides = {"packages/b.tbz2": "0" * 32})
+        fail, fine, broken = self._transceive(handler)
+        self.assertFalse(fail)
+        self.assertEqual(broken, set())
+        # the broken file is uploaded again, by itself
+        self.assertEqual(handler.uploads, ["packages/b.tbz2",
+            "other/d.tbz2"])
+
+
+if __name__ == '__main__':
+    unittest.main()
+    raise SystemExit(0)
@@ -22,9 +22,8 @@ this program; if not, write to the Free Software Foundation, Inc.,
 """
 import os
 import time
-import random
 from collections import deque
-from threading import Semaphore, Lock, Timer
+from threading import Semaphore, Lock
 
 from gi.repository import GObject
 
@@ -182,6 +181,12 @@ class ApplicationMetadata(object):
                     task.name = "%sCb{%s, %s}" % (name, repo_id, key)
                     task.start()
 
+        def _discard_requested():
+            for discard_signal in discard_signals:
+                if discard_signal.get():
+                    return True
+            return False
+
         while True:
             sem.acquire()
             for discard_signal in discard_signals:
@@ -238,19 +243,15 @@ class ApplicationMetadata(object):
                     "comment": (webserv.get_comments, {"latest": True,}),
                 }
 
-                for key in keys:
+                if _discard_requested():
+                    break
 
-                    # discard signal received ?
-                    do_discard = False
-                    for discard_signal in discard_signals:
-                        if discard_signal.get():
-                            do_discard = True
-                            break
-                    if do_discard:
-                        break
+                keys = sorted(keys)
+                outcome = {}
+                uncached_map = {}
+                visible_keys = set()
+                for key in keys:
 
-                    uncached_requests = []
-                    outcome = {}
                     for request in request_list:
 
                         request_outcome = outcome.setdefault(request, {})
@@ -261,40 +262,59 @@ class ApplicationMetadata(object):
                                 [key], cache=True, cached=True,
                                 **req_kwargs)[key]
                         except cache_miss:
-                            uncached_requests.append(request)
+                            uncached_map.setdefault(request, []).append(key)
 
                     # checking if we're still visible
-                    is_visible = False
                     for vis_cb in visible_cb_map[key]:
-                        if vis_cb is None:
-                            is_visible = True
+                        if vis_cb is None or vis_cb():
+                            visible_keys.add(key)
                             break
-                        if vis_cb():
-                            is_visible = True
-                            break
-                    if not is_visible:
-                        # don't query the remote service
-                        uncached_requests = []
 
-                    with ApplicationMetadata._REQUEST_COUNT_L:
-                        ApplicationMetadata._REQUEST_COUNT += \
-                            len(uncached_requests)
+                # issue one remote call per request type for all the
+                # uncached keys that are still visible, instead of one
+                # per key.
+                discarded = False
+                for request in request_list:
 
-                    for request in uncached_requests:
+                    # don't query the remote service for invisible keys
+                    uncached_keys = [x for x in uncached_map.get(request, [])
+                                     if x in visible_keys]
+                    request_outcome = outcome[request]
+                    request_func, req_kwargs = request_map[request]
+                    batch_size = ApplicationMetadata._REQUEST_BATCH_SIZE
 
-                        request_outcome = outcome[request]
-                        request_func, req_kwargs = request_map[request]
+                    for idx in range(0, len(uncached_keys), batch_size):
+
+                        if _discard_requested():
+                            discarded = True
+                            break
+
+                        batch = uncached_keys[idx:idx + batch_size]
+                        with ApplicationMetadata._REQUEST_COUNT_L:
+                            ApplicationMetadata._REQUEST_COUNT += 1
 
                         try:
-                            request_outcome[(key, repo_id)] = request_func(
-                                [key], cache = True, **req_kwargs)[key]
+                            batch_outcome = request_func(
+                                batch, cache = True, **req_kwargs)
                         except ws_exception as wse:
                             const_debug_write(
                                 __name__,
                                 "%s, WebServiceExc: %s" % (name, wse,)
                                 )
-                            request_outcome[(key, repo_id)] = None
+                            batch_outcome = {}
+
+                        for key in batch:
+                            request_outcome[(key, repo_id)] = \
+                                batch_outcome.get(key)
+
+                    if discarded:
+                        break
+
+                if discarded:
+                    break
 
+                # fan the results out to the registered callbacks
+                for key in keys:
                     cb_ts_list = pkg_key_map[(key, repo_id)]
                     _callback_launch(key, repo_id, cb_ts_list, outcome)
 
@@ -387,70 +407,9 @@ class ApplicationMetadata(object):
             _complete()
             return local_path
 
-    RATING_RLIMIT = {
-        "t": None,
-        "l": Lock(),
-        "s": 2.0,
-        }
-    ICON_RLIMIT = {
-        "t": None,
-        "l": Lock(),
-        "s": 2.0,
-        }
-
-    @staticmethod
-    def _rate_limited(rlimit_s, webservice, package_key, repository_id,
-                      resched_count):
-        """
-        Determine if an enqueue action request needs to be rate
-        limited.
-        """
-        limit = None
-        with rlimit_s["l"]:
-            last_t = rlimit_s["t"]
-            delta_s = rlimit_s["s"]
-            cur_t = time.time()
-            if last_t is not None:
-                if cur_t <= (last_t + delta_s):
-                    limit = abs(cur_t - last_t)
-
-            if not limit:
-                rlimit_s["t"] = cur_t
-
-        if limit is not None:
-            limit += random.randint(3, 10)
-            resched_count -= 1
-            if resched_count < 0:
-                # do not reschedule anymore
-                return True
-
-            const_debug_write(
-                __name__,
-                "_rate_limited: %s, %s: rlimited, resched: %s, count: %d" % (
-                    package_key, repository_id, limit, resched_count))
-            const_debug_write(
-                __name__,
-                "_rate_limited stats: remote reqs: %d" % (
-                    ApplicationMetadata._REQUEST_COUNT,))
-
-        if limit is not None:
-            in_flight = ApplicationMetadata._RATING_IN_FLIGHT
-            flight_key = (package_key, repository_id)
-            in_flight.add(flight_key)
-            task = Timer(
-                limit,
-                in_flight.discard,
-                args=(flight_key,))
-            task.name = "DropInFlight"
-            task.daemon = True
-            task.start()
-            return True
-
-        return False
-
     @staticmethod
     def _enqueue_rating(webservice, package_key, repository_id, callback,
-                        _still_visible_cb, _resched_count=1):
+                        _still_visible_cb):
         """
         Enqueue the retrieval of the Rating for package key in given repository.
         Once the data is ready, callback() will be called passing the
@@ -466,13 +425,6 @@ class ApplicationMetadata(object):
                 __name__,
                 "_enqueue_rating: %s, %s" % (package_key, repository_id))
 
-        limited = ApplicationMetadata._rate_limited(
-            ApplicationMetadata.RATING_RLIMIT,
-            webservice, package_key, repository_id,
-            _resched_count)
-        if limited:
-            return
-
         request_time = time.time()
         in_flight = ApplicationMetadata._RATING_IN_FLIGHT
         queue = ApplicationMetadata._RATING_QUEUE
@@ -485,7 +437,7 @@ class ApplicationMetadata(object):
 
     @staticmethod
     def _enqueue_icon(webservice, package_key, repository_id, callback,
-                      _still_visible_cb, _resched_count=1):
+                      _still_visible_cb):
         """
         Enqueue the retrieval of the Icon for package key in given repository.
         Once the data is ready, callback() will be called passing the
@@ -501,13 +453,6 @@ class ApplicationMetadata(object):
                 __name__,
                 "_enqueue_icon: %s, %s" % (package_key, repository_id))
 
-        limited = ApplicationMetadata._rate_limited(
-            ApplicationMetadata.ICON_RLIMIT,
-            webservice, package_key, repository_id,
-            _resched_count)
-        if limited:
-            return
-
         request_time = time.time()
         in_flight = ApplicationMetadata._ICON_IN_FLIGHT
         queue = ApplicationMetadata._ICON_QUEUE
@@ -881,6 +826,10 @@ class ApplicationMetadata(object):
     _RATING_WORKERS = 3
     _ICON_WORKERS = 3
 
+    # maximum number of package keys sent to the remote service
+    # in a single request
+    _REQUEST_BATCH_SIZE = 32
+
     _ICON_DISCARD_SIGNALS = []
     _RATING_DISCARD_SIGNALS = []
 